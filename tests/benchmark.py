@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Test for benchmarks of activities and regression detection
+"""
+
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from benchmark import (  # noqa: E402
+    BASELINE_VERSION,
+    SCAN,
+    BaselineError,
+    compare,
+    load_baseline,
+    measure_file,
+    measure_module,
+    summarize,
+)
+
+ACTIVITY = """
+import time
+
+
+def run_fast(scanned_elev, env, **kwargs):
+    pass
+
+
+def run_slow(scanned_elev, env, **kwargs):
+    time.sleep(0.01)
+
+
+def main():
+    run_fast(scanned_elev="elevation", env={})
+    run_slow(scanned_elev="elevation", env={})
+"""
+
+
+def results(times):
+    """Return results with summaries of times for activity functions"""
+    return {
+        "version": BASELINE_VERSION,
+        "machine": {"cpus": 1},
+        "activities": {
+            "activity.py": {
+                "functions": {name: summarize(item) for name, item in times.items()}
+            }
+        },
+    }
+
+
+class TestBenchmark(unittest.TestCase):
+    """Test measurement, baselines, and comparison"""
+
+    def test_summarize(self):
+        """Check statistics of times"""
+        summary = summarize([1.0, 2.0, 4.0])
+        self.assertEqual(summary["median"], 2.0)
+        self.assertEqual(summary["min"], 1.0)
+        self.assertEqual(summary["mad"], 1.0)
+
+    def test_measure_module(self):
+        """Check warmup, repeats, and times of each function"""
+        module = types.ModuleType("activity")
+        calls = []
+        module.run_one = lambda: calls.append("one")
+        module.run_two = lambda: calls.append("two")
+        module.helper = lambda: calls.append("helper")
+
+        def main():
+            module.run_one()
+            module.helper()
+
+        module.main = main
+        times = measure_module(module, warmup=2, repeats=3)
+        self.assertEqual(calls, ["one", "helper"] * 5)
+        self.assertEqual(sorted(times), [SCAN, "run_one", "run_two"])
+        self.assertEqual(len(times["run_one"]), 3)
+        self.assertEqual(times["run_two"], [0, 0, 0])
+        self.assertEqual(times[SCAN], times["run_one"])
+
+    def test_measure_file(self):
+        """Check measurement of an activity file in its own process"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "activity.py")
+            with open(path, "w") as file:
+                file.write(ACTIVITY)
+            summaries = measure_file(path, warmup=1, repeats=2)
+        self.assertEqual(sorted(summaries), [SCAN, "run_fast", "run_slow"])
+        self.assertGreaterEqual(summaries["run_slow"]["min"], 0.01)
+        self.assertEqual(len(summaries[SCAN]["samples"]), 2)
+
+    def test_regression(self):
+        """Check that doubled time fails and noise does not"""
+        baseline = results({"run_a": [1.0, 1.1, 0.9, 1.0, 1.05]})
+        doubled = results({"run_a": [2.0, 2.1, 1.9, 2.0, 2.05]})
+        comparisons, notes = compare(baseline, doubled)
+        self.assertEqual(notes, [])
+        self.assertTrue(comparisons[0].regression)
+        self.assertAlmostEqual(comparisons[0].ratio, 2.0)
+        jitter = results({"run_a": [1.1, 1.0, 1.15, 0.95, 1.1]})
+        comparisons, notes = compare(baseline, jitter)
+        self.assertFalse(comparisons[0].regression)
+        # Noisy times need a larger change.
+        noisy = results({"run_a": [0.5, 1.5, 1.0, 2.0, 0.7]})
+        slower = results({"run_a": [1.2, 2.2, 1.7, 2.7, 1.4]})
+        comparisons, notes = compare(noisy, slower)
+        self.assertFalse(comparisons[0].regression)
+
+    def test_notes(self):
+        """Check new, missing, and failed activities and functions"""
+        baseline = results({"run_a": [1, 1], "run_b": [1, 1]})
+        current = results({"run_a": [1, 1], "run_c": [1, 1]})
+        current["machine"] = {"cpus": 2}
+        current["activities"]["other.py"] = {"functions": {}, "error": "failed"}
+        comparisons, notes = compare(baseline, current)
+        self.assertEqual([item.function for item in comparisons], ["run_a"])
+        self.assertEqual(
+            notes,
+            [
+                "Baseline was created on a different machine",
+                "activity.py: run_c not in baseline",
+                "activity.py: run_b not measured",
+                "other.py: failed (failed)",
+            ],
+        )
+
+    def test_baseline_version(self):
+        """Check that baseline of other version is refused"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            with open(path, "w") as file:
+                json.dump({"version": BASELINE_VERSION + 1, "activities": {}}, file)
+            with self.assertRaises(BaselineError):
+                load_baseline(path)
+            with self.assertRaises(BaselineError):
+                load_baseline(os.path.join(directory, "missing.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Test for change detection with NumPy
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from change_detection import (  # noqa: E402
+    detect_changes,
+    label_components,
+    to_map_coordinates,
+)
+
+
+def flood_fill_sizes(mask, diagonal=False):
+    """Return sorted sizes of connected groups (slow reference)"""
+    seen = np.zeros(mask.shape, dtype=bool)
+    steps = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    if diagonal:
+        steps += [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+    sizes = []
+    rows, cols = mask.shape
+    for start in zip(*np.nonzero(mask)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        stack = [start]
+        size = 0
+        while stack:
+            row, col = stack.pop()
+            size += 1
+            for step_row, step_col in steps:
+                near = (row + step_row, col + step_col)
+                if 0 <= near[0] < rows and 0 <= near[1] < cols:
+                    if mask[near] and not seen[near]:
+                        seen[near] = True
+                        stack.append(near)
+        sizes.append(size)
+    return sorted(sizes)
+
+
+class TestChangeDetection(unittest.TestCase):
+    """Test labeling, filtering, and coordinates of changes"""
+
+    def test_labels(self):
+        """Check groups against flood fill on random masks"""
+        generator = np.random.default_rng(7)
+        for diagonal in (False, True):
+            mask = generator.random((60, 80)) < 0.45
+            labels, count = label_components(mask, diagonal=diagonal)
+            self.assertEqual((labels > 0).tolist(), mask.tolist())
+            sizes = np.bincount(labels.ravel())[1:]
+            self.assertEqual(count, len(sizes))
+            self.assertEqual(sorted(sizes), flood_fill_sizes(mask, diagonal))
+
+    def test_spiral(self):
+        """Check a long winding group which needs many merges"""
+        mask = np.zeros((21, 21), dtype=bool)
+        mask[::2, :] = True
+        mask[1::4, -1] = True
+        mask[3::4, 0] = True
+        labels, count = label_components(mask)
+        self.assertEqual(count, 1)
+
+    def test_detect(self):
+        """Check thresholds, order by size, and the limit"""
+        before = np.zeros((30, 30))
+        after = before.copy()
+        after[2:5, 2:5] = 50  # 9 cells
+        after[10:14, 10:14] = 50  # 16 cells
+        after[20:22, 20:22] = 50  # 4 cells, too small
+        after[0:10, 25:30] = 50  # 50 cells, too large
+        after[25:28, 2:5] = 200  # too high
+        after[25, 25] = np.nan
+        centroids, sizes = detect_changes(before, after, (10, 100), (5, 50), 5)
+        self.assertEqual(sizes.tolist(), [16, 9])
+        self.assertEqual(centroids.tolist(), [[12.0, 12.0], [3.5, 3.5]])
+        centroids, sizes = detect_changes(before, after, (10, 100), (5, 50), 1)
+        self.assertEqual(sizes.tolist(), [16])
+        centroids, sizes = detect_changes(before, before, (10, 100), (5, 50), 5)
+        self.assertEqual(centroids.shape, (0, 2))
+
+    def test_coordinates(self):
+        """Check conversion of cell coordinates to map coordinates"""
+        region = {"n": 200, "s": 100, "e": 1050, "w": 1000, "rows": 50, "cols": 25}
+        points = to_map_coordinates(np.array([[0.5, 0.5], [50, 25]]), region)
+        self.assertEqual(points.tolist(), [[1001, 199], [1050, 100]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+"""
+Test for the GRASS GIS stand-in used to run activities without GRASS GIS
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+FAKE_GRASS = Path(__file__).resolve().parent.parent / "tools" / "fake_grass"
+sys.path.insert(0, str(FAKE_GRASS / "etc" / "python"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "website"))
+
+import grass.script as gs  # noqa: E402
+from grass.exceptions import CalledModuleError  # noqa: E402
+from grass.fake.location import create_mapset, write_gisrc  # noqa: E402
+from grass.script import array as garray  # noqa: E402
+from layer_cache import read_bmp  # noqa: E402
+
+EXECUTABLE = str(FAKE_GRASS / "bin" / "grass")
+ELEVATION = "elev_lid792_1m"
+
+
+class TestFakeGrass(unittest.TestCase):
+    """Test tools of the stand-in in a new location"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = Path(self.directory.name)
+        self.mapset = root / "location" / "test"
+        create_mapset(self.mapset)
+        gisrc = root / "gisrc"
+        write_gisrc(gisrc, self.mapset)
+        self.env = os.environ.copy()
+        self.env["GISRC"] = str(gisrc)
+        gs.run_command("g.region", raster=ELEVATION, res=4, flags="a", env=self.env)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, values):
+        """Write array as a raster in the current region"""
+        data = garray.array(env=self.env)
+        data[...] = values
+        data.write(name, overwrite=True)
+
+    def read(self, name):
+        """Read raster as an array with NaN for nulls"""
+        return np.array(garray.array(name, null="nan", env=self.env))
+
+    def test_region_and_resampling(self):
+        """Check that resampling averages cells into the coarser region"""
+        region = gs.region(env=self.env)
+        self.assertEqual((region["rows"], region["cols"]), (188, 175))
+        self.assertEqual(region["nsres"], 4)
+        gs.run_command("r.resamp.stats", input=ELEVATION, output="coarse", env=self.env)
+        info = gs.raster_info("coarse", env=self.env)
+        self.assertEqual(info["rows"], 188)
+        coarse = self.read("coarse")
+        gs.run_command("g.region", raster=ELEVATION, env=self.env)
+        fine = self.read(ELEVATION)
+        # The aligned region starts 2 m north of the raster.
+        self.assertEqual(region["n"], 220752)
+        self.assertAlmostEqual(coarse[0, 0], fine[:2, :4].mean(), places=4)
+        self.assertAlmostEqual(coarse[1, 0], fine[2:6, :4].mean(), places=4)
+        self.assertFalse(np.isnan(coarse).any())
+
+    def test_mapcalc(self):
+        """Check map algebra with an integer result"""
+        self.write("values", np.arange(188 * 175).reshape(188, 175) / 10)
+        gs.mapcalc("result = if(values > 100, int(values), null())", env=self.env)
+        result = self.read("result")
+        self.assertEqual(gs.raster_info("result", env=self.env)["datatype"], "CELL")
+        self.assertTrue(np.isnan(result[0, 0]))
+        self.assertEqual(result[-1, -1], 3289)
+
+    def test_mapcalc_operators(self):
+        """Check precedence, the conditional operator, and nulls in map algebra"""
+        values = np.arange(188 * 175).reshape(188, 175) % 7 - 3.0
+        values[0, 0] = np.nan
+        self.write("values", values)
+        gs.mapcalc(
+            "result = values > 0 && values < 3 ? -values ^ 2 : "
+            "(values == 0 ? 10 % 4 : max(values, 1) / 2)",
+            env=self.env,
+        )
+        result = self.read("result")
+        with np.errstate(invalid="ignore"):
+            expected = np.where(
+                (values > 0) & (values < 3),
+                -(values**2),
+                np.where(values == 0, 2, np.maximum(values, 1) / 2),
+            )
+        np.testing.assert_array_equal(result, expected)
+        gs.mapcalc("count = 7 / 2 + isnull(values) + !(values)", env=self.env)
+        count = self.read("count")
+        self.assertEqual(gs.raster_info("count", env=self.env)["datatype"], "CELL")
+        # Logical not of null is null.
+        self.assertTrue(np.isnan(count[0, 0]))
+        self.assertEqual(count[0, 3], 4)
+        self.assertEqual(count[0, 4], 3)
+        # Two-argument if gives zero for false condition.
+        gs.mapcalc("positive = if(values > 0, 5)", env=self.env)
+        positive = self.read("positive")
+        self.assertTrue(np.isnan(positive[0, 0]))
+        self.assertEqual(positive[0, 3], 0)
+        self.assertEqual(positive[0, 4], 5)
+
+    def test_independent(self):
+        """Check that the stand-in does not use code of the repository"""
+        code = (
+            "import sys; import grass.script, grass.script.array; "
+            "print(sorted(set(sys.modules) & {names!r}))"
+        ).format(
+            names={
+                path.stem
+                for directory in ("tools", "website")
+                for path in (FAKE_GRASS.parent.parent / directory).glob("*.py")
+            }
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            env=dict(os.environ, PYTHONPATH=str(FAKE_GRASS / "etc" / "python")),
+            cwd=self.directory.name,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+
+    def test_slope_aspect(self):
+        """Check slope and aspect of a plane rising to the east"""
+        self.write("plane", np.arange(175)[np.newaxis, :] * 0.4 + np.zeros((188, 1)))
+        gs.run_command(
+            "r.slope.aspect",
+            elevation="plane",
+            slope="slope",
+            aspect="aspect",
+            env=self.env,
+        )
+        slope = self.read("slope")
+        aspect = self.read("aspect")
+        self.assertTrue(np.isnan(slope[0]).all())
+        self.assertAlmostEqual(slope[1, 1], np.degrees(np.arctan(0.1)), places=4)
+        # The plane faces west.
+        self.assertAlmostEqual(aspect[1, 1], 180, places=4)
+
+    def test_fill_dir(self):
+        """Check that a pit is filled and directions are written"""
+        elevation = np.add.outer(np.arange(188.0), np.arange(175.0))
+        elevation[50, 50] = 0
+        self.write("pit", elevation)
+        gs.run_command(
+            "r.fill.dir",
+            input="pit",
+            output="filled",
+            direction="directions",
+            env=self.env,
+        )
+        filled = self.read("filled")
+        self.assertGreaterEqual(filled[50, 50], min(elevation[49, 49], 98))
+        self.assertTrue((filled >= elevation).all())
+        info = gs.raster_info("directions", env=self.env)
+        self.assertEqual(info["datatype"], "CELL")
+
+    def test_overwrite(self):
+        """Check that existing outputs need overwrite"""
+        gs.run_command("r.resamp.stats", input=ELEVATION, output="coarse", env=self.env)
+        with self.assertRaises(CalledModuleError):
+            gs.run_command(
+                "r.resamp.stats", input=ELEVATION, output="coarse", env=self.env
+            )
+        gs.run_command(
+            "r.resamp.stats",
+            input=ELEVATION,
+            output="coarse",
+            overwrite=True,
+            env=self.env,
+        )
+
+    def test_unknown_tool(self):
+        """Check that a tool which is not implemented is not found"""
+        with self.assertRaises(FileNotFoundError):
+            gs.run_command("r.not.implemented", input=ELEVATION, env=self.env)
+
+    def test_display(self):
+        """Check rendering of a raster and points into an image"""
+        path = Path(self.directory.name) / "image.bmp"
+        env = self.env.copy()
+        env["GRASS_RENDER_FILE"] = str(path)
+        env["GRASS_RENDER_FILE_READ"] = "TRUE"
+        env["GRASS_RENDER_WIDTH"] = "200"
+        env["GRASS_RENDER_HEIGHT"] = "100"
+        gs.run_command("d.erase", env=env)
+        gs.run_command("r.colors", map=ELEVATION, color="grey", env=self.env)
+        gs.run_command("d.rast", map=ELEVATION, env=env)
+        gs.write_command(
+            "v.in.ascii",
+            input="-",
+            output="points",
+            stdin="638650|220375\n",
+            env=self.env,
+        )
+        gs.run_command("d.vect", map="points", color="red", fill_color="red", env=env)
+        image = read_bmp(path)
+        self.assertEqual(image.shape[:2], (100, 200))
+        # Outside of the region (narrower than the image) stays white.
+        self.assertTrue((image[:, 0, :3] == 1).all())
+        # Point in the center of the region
+        np.testing.assert_allclose(image[50, 100, :3], [1, 0, 0])
+        # Raster in grey
+        red, green, blue = image[10, 100, :3]
+        self.assertEqual(red, green)
+        self.assertEqual(green, blue)
+        self.assertLess(red, 1)
+
+    def test_executable(self):
+        """Check that an activity runs through the executable in a new mapset"""
+        mapset = Path(self.directory.name) / "location" / "activity"
+        subprocess.check_call([EXECUTABLE, "-c", str(mapset), "-e"])
+        activity = Path(__file__).parent.parent / "activities" / "simple_example.py"
+        subprocess.check_call(
+            [EXECUTABLE, str(mapset), "--exec", "python3", str(activity)]
+        )
+        self.assertTrue((mapset / "cellhd" / "slope").is_file())
+        self.assertTrue((mapset / "vector" / "contours").is_dir())
+        output = subprocess.run(
+            [EXECUTABLE, str(mapset), "--exec", "r.info", "-g", "map=slope"],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        ).stdout
+        self.assertIn("rows=188", output.splitlines())
+
+
+if __name__ == "__main__":
+    unittest.main()
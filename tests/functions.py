@@ -7,7 +7,15 @@ Test for Python functions in files
 import os
 import shutil
 import subprocess
+import sys
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from resource_usage import exit_code  # noqa: E402
+from worker_pool import WorkerError, WorkerPool  # noqa: E402
 
 
 def is_python_file(path):
@@ -15,53 +23,177 @@ def is_python_file(path):
     return os.path.isfile(path) and path.endswith(".py")
 
 
+def get_all_python_files(directory):
+    """Return Python files in a directory as pairs filename, full_path"""
+    result = []
+    for filename in sorted(os.listdir(directory)):
+        full_path = os.path.join(directory, filename)
+        if not is_python_file(full_path):
+            continue
+        result.append((filename, full_path))
+    return result
+
+
+class RunResult:
+    """Errors (None when successful), wall times, and peak memory of two runs
+
+    The peak memory (resident set size in MB) is the largest one of any
+    process started by the run.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.errors = []
+        self.times = []
+        self.peak_memory = []
+
+    def fail_remaining(self, error):
+        """Record error for runs which did not happen"""
+        while len(self.errors) < 2:
+            self.errors.append(error)
+            self.times.append(0)
+            self.peak_memory.append(0)
+
+
+def call_with_peak_memory(command):
+    """Run command and return its return code and peak memory in MB
+
+    The peak memory is the largest one of the process and its subprocesses.
+    """
+    process = subprocess.Popen(command)
+    unused, status, usage = os.wait4(process.pid, 0)
+    # The process was reaped by wait4, so Popen must not wait for it again.
+    process.returncode = exit_code(status)
+    return process.returncode, usage.ru_maxrss / 1024
+
+
 class TestFunctionsInFiles(unittest.TestCase):
     """Test to go through files and use"""
 
     path = "activities/"
 
     # name of or path to the main GRASS GIS executable and Python executable
-    executable = "grass"
+    # (GRASS_EXECUTABLE can point to the stand-in in tools/fake_grass/bin)
+    executable = os.environ.get("GRASS_EXECUTABLE", "grass")
     python = "python3"
 
     # path to the existing location to use (assuming CI environment)
-    location_path = "nc_spm_08_grass7"
+    location_path = os.environ.get("GRASS_LOCATION", "nc_spm_08_grass7")
     mapset_name = "test"
-    mapset_path = os.path.join(location_path, mapset_name)
+
+    # number of files running at the same time
+    jobs = int(os.environ.get("TEST_JOBS", os.cpu_count() or 1))
+
+    # run files in warm workers (avoids GRASS and Python startup for each run)
+    warm_workers = os.environ.get("WARM_WORKERS", "") == "1"
+
+    # largest memory (resident set size in MB) a process started by a file can use
+    memory_budget = float(os.environ.get("MEMORY_BUDGET_MB", 2048))
 
     def setUp(self):
-        """Creates a mapset used in the tests"""
-        subprocess.check_call([self.executable, "-c", self.mapset_path, "-e"])
+        """Starts workers if requested (each worker creates its own mapset)"""
+        self.pool = None
+        if self.warm_workers:
+            self.pool = WorkerPool(
+                self.executable,
+                os.path.join(self.location_path, self.mapset_name),
+                size=self.jobs,
+                python=self.python,
+            )
+            self.pool.start()
 
     def tearDown(self):
-        """Deletes the mapset"""
-        shutil.rmtree(self.mapset_path, ignore_errors=True)
+        """Stops workers and deletes their mapsets"""
+        if self.pool:
+            self.pool.close()
+
+    def run_twice_in_new_mapset(self, filename, full_path):
+        """Run a file two times in a new mapset which is deleted afterwards"""
+        result = RunResult(filename)
+        name = os.path.splitext(filename)[0]
+        mapset_path = os.path.join(self.location_path, f"{self.mapset_name}_{name}")
+        try:
+            subprocess.check_call([self.executable, "-c", mapset_path, "-e"])
+            for unused in range(2):
+                start = time.perf_counter()
+                return_code, peak_memory = call_with_peak_memory(
+                    [self.executable, mapset_path, "--exec", self.python, full_path]
+                )
+                result.times.append(time.perf_counter() - start)
+                result.peak_memory.append(peak_memory)
+                result.errors.append(
+                    None if return_code == 0 else f"return code {return_code}"
+                )
+        except (OSError, subprocess.CalledProcessError) as error:
+            result.fail_remaining(f"creating mapset failed ({error})")
+        finally:
+            shutil.rmtree(mapset_path, ignore_errors=True)
+        return result
+
+    def run_twice_in_worker(self, filename, full_path):
+        """Run a file two times in one worker after cleaning its mapset"""
+        result = RunResult(filename)
+        with self.pool.acquire() as worker:
+            try:
+                worker.clean_mapset()
+            except WorkerError as error:
+                result.fail_remaining(str(error))
+                return result
+            for unused in range(2):
+                start = time.perf_counter()
+                job = worker.run(full_path)
+                result.times.append(time.perf_counter() - start)
+                result.peak_memory.append((job.peak_rss_kb or 0) / 1024)
+                result.errors.append(None if job.ok else job.error)
+        return result
 
     def test_files_run(self):
         """Check that files run"""
-        for filename in os.listdir(self.path):
-            full_path = os.path.join(self.path, filename)
-            if not is_python_file(full_path):
-                continue
-            return_code = subprocess.call(
-                [self.executable, self.mapset_path, "--exec", self.python, full_path]
-            )
-            self.assertEqual(
-                return_code, 0, msg=("Running {filename} failed".format(**locals()))
-            )
-            return_code = subprocess.call(
-                [self.executable, self.mapset_path, "--exec", self.python, full_path]
-            )
-            self.assertEqual(
-                return_code,
-                0,
-                msg=(
-                    "Running {filename} the second time failed"
-                    ' (maybe missing env=env or env["GRASS_OVERWRITE"] = "1"'.format(
-                        **locals()
-                    )
-                ),
-            )
+        run = self.run_twice_in_worker if self.pool else self.run_twice_in_new_mapset
+        files = get_all_python_files(self.path)
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(lambda item: run(*item), files))
+        for result in results:
+            filename = result.filename
+            with self.subTest(activity=filename):
+                error = result.errors[0]
+                self.assertIsNone(
+                    error,
+                    msg=f"Running {filename} failed: {error}",
+                )
+                error = result.errors[1]
+                self.assertIsNone(
+                    error,
+                    msg=(
+                        f"Running {filename} the second time failed: {error}"
+                        ' (maybe missing env=env or env["GRASS_OVERWRITE"] = "1"'
+                    ),
+                )
+                peak_memory = max(result.peak_memory)
+                self.assertLessEqual(
+                    peak_memory,
+                    self.memory_budget,
+                    msg=(
+                        f"Running {filename} needed {peak_memory:.0f} MB of memory "
+                        f"which is over the budget of {self.memory_budget:.0f} MB "
+                        "(set MEMORY_BUDGET_MB to change the budget)"
+                    ),
+                )
+        print_times(results)
+
+
+def print_times(results):
+    """Print wall time of the first and second run and peak memory of each file"""
+    lines = [
+        f"{'file':<24} {'first run [s]':>14} {'second run [s]':>15} {'peak [MB]':>10}"
+    ]
+    for result in sorted(results, key=lambda item: -sum(item.times)):
+        first, second = result.times
+        peak_memory = max(result.peak_memory)
+        lines.append(
+            f"{result.filename:<24} {first:>14.2f} {second:>15.2f} {peak_memory:>10.0f}"
+        )
+    print("\n".join(lines), file=sys.stderr)
 
 
 if __name__ == "__main__":
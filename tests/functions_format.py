@@ -6,8 +6,13 @@ Test for required internal structure of Python files
 
 import os
 import re
+import sys
 import unittest
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from scan_cost import estimate_file, format_report  # noqa: E402
+
 
 def is_python_file(path):
     """Return True if path is a Python file"""
@@ -30,6 +35,12 @@ class TestContentOfFiles(unittest.TestCase):
 
     path = "activities/"
 
+    # maximum predicted time of one scan for a region of the given size
+    # in calls of r.mapcalc (the costs of tools depend on the machine)
+    scan_budget = 80
+    scan_rows = 500
+    scan_cols = 500
+
     def test_files_have_main_part(self):
         """Check that files contain __name__ == ..."""
         for filename, full_path in get_all_python_files(self.path):
@@ -83,6 +94,22 @@ class TestContentOfFiles(unittest.TestCase):
                 ),
             )
 
+    def test_files_fit_in_scan_budget(self):
+        """Check that predicted time of run_ functions for one scan is in budget"""
+        for filename, full_path in get_all_python_files(self.path):
+            report = estimate_file(full_path, cells=self.scan_rows * self.scan_cols)
+            self.assertLessEqual(
+                report["relative"],
+                self.scan_budget,
+                msg=(
+                    f"File {full_path} is predicted to take more than"
+                    f" {self.scan_budget} r.mapcalc calls for each scan"
+                    " (avoid running expensive tools repeatedly"
+                    " or in a loop in the run_ functions):\n"
+                    + format_report(report, self.scan_budget, relative=True)
+                ),
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Test for profiling of imports of activities
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from import_profile import (  # noqa: E402
+    format_table,
+    parse_importtime,
+    profile_file,
+)
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   _json
+import time:       300 |        400 | json
+import time:        50 |         50 | os
+"""
+
+
+class TestImportProfile(unittest.TestCase):
+    """Test profiling of activity files in new processes"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def activity(self, name, text):
+        """Write an activity file and return its path"""
+        path = Path(self.directory.name) / name
+        path.write_text(text)
+        return path
+
+    def test_parse_importtime(self):
+        """Check that nested imports become children"""
+        tree = parse_importtime(IMPORTTIME)
+        self.assertEqual([node.name for node in tree], ["json", "os"])
+        self.assertEqual([node.name for node in tree[0].children], ["_json"])
+        self.assertEqual(tree[0].cumulative_us, 400)
+
+    def test_deferrable_import(self):
+        """Check that an import used only in a function is reported"""
+        path = self.activity(
+            "deferred.py",
+            "import json\n\n\ndef run_json():\n    return json.dumps({})\n",
+        )
+        report = profile_file(path, python=sys.executable, threshold_us=0)
+        self.assertEqual(report["returncode"], 0)
+        self.assertEqual(report["failed_imports"], [])
+        self.assertEqual(
+            [item["module"] for item in report["deferrable"]], ["json"], msg=report
+        )
+        self.assertNotIn("ERROR", format_table([report]))
+
+    def test_profiler_imports_not_preloaded(self):
+        """Check that modules used by the profiler are attributed to the activity"""
+        path = self.activity(
+            "tools.py", "import argparse\nimport ast\nimport json\nimport subprocess\n"
+        )
+        report = profile_file(path, python=sys.executable)
+        self.assertEqual(report["returncode"], 0)
+        self.assertEqual(
+            [node["name"] for node in report["imports"]],
+            ["argparse", "ast", "json", "subprocess"],
+        )
+
+    def test_failed_import(self):
+        """Check that a module which fails to import is listed as an error"""
+        path = self.activity(
+            "broken.py", "import json\nimport tl_module_which_does_not_exist\n"
+        )
+        report = profile_file(path, python=sys.executable)
+        self.assertEqual(report["returncode"], 1)
+        self.assertEqual(report["failed_imports"], ["tl_module_which_does_not_exist"])
+        self.assertIn("ModuleNotFoundError", report["error"][0])
+        lines = format_table([report]).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("broken.py", lines[1])
+        self.assertIn(
+            "ERROR: failed import of tl_module_which_does_not_exist", lines[1]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Test for incremental updates of flow accumulation, basins, and streams
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from incremental_hydrology import IncrementalHydrology  # noqa: E402
+from synthetic_terrain import generate  # noqa: E402
+
+RESULTS = ["receiver", "accumulation", "basins", "streams"]
+
+
+def upstream_counts(receiver):
+    """Return number of cells draining through each cell (slow reference)"""
+    counts = np.zeros(len(receiver))
+    for cell in range(len(receiver)):
+        while cell >= 0:
+            counts[cell] += 1
+            cell = receiver[cell]
+    return counts
+
+
+class TestIncrementalHydrology(unittest.TestCase):
+    """Test full computation and updates against full computation"""
+
+    def test_compute(self):
+        """Check directions and accumulation on a tilted plane with a pit"""
+        rows, cols = np.indices((5, 6))
+        elevation = (rows + cols).astype(float)
+        elevation[3, 4] = -1
+        hydrology = IncrementalHydrology(stream_threshold=3)
+        hydrology.compute(elevation)
+        drainage = hydrology.drainage()
+        # Cells flow to the north-west (3), the corner and the pit are outlets.
+        self.assertEqual(drainage[2, 2], 3)
+        self.assertEqual(drainage[0, 0], 0)
+        self.assertEqual(drainage[3, 4], 0)
+        self.assertEqual(drainage[4, 5], 3)
+        self.assertEqual(
+            hydrology.accumulation.tolist(),
+            upstream_counts(hydrology.receiver).tolist(),
+        )
+        basins = hydrology.raster(hydrology.basins)
+        self.assertEqual(basins[4, 5], 3 * 6 + 4 + 1)
+        self.assertEqual(basins[1, 1], 1)
+        self.assertEqual(
+            hydrology.streams.tolist(), (hydrology.accumulation >= 3).tolist()
+        )
+
+    def test_updates(self):
+        """Check that updates give the same results as full computation"""
+        elevation = generate(120, 100, seed=5, flat=0).astype(np.float64)
+        hydrology = IncrementalHydrology(stream_threshold=50)
+        hydrology.compute(elevation)
+        generator = np.random.default_rng(1)
+        for unused in range(5):
+            row, col = generator.integers(0, 90, 2)
+            elevation[row : row + 10, col : col + 8] += generator.uniform(-3, 3)
+            elevation[generator.integers(0, 120), generator.integers(0, 100)] = np.nan
+            counts = hydrology.update(elevation)
+            self.assertLess(counts["downstream"], elevation.size / 4)
+            full = IncrementalHydrology(stream_threshold=50)
+            full.compute(elevation)
+            for name in RESULTS:
+                self.assertTrue(
+                    np.array_equal(getattr(hydrology, name), getattr(full, name)),
+                    msg=name,
+                )
+
+    def test_no_change(self):
+        """Check that nothing is updated without a change"""
+        elevation = generate(50, seed=1)
+        hydrology = IncrementalHydrology(tolerance=0.01)
+        hydrology.update(elevation)
+        self.assertEqual(hydrology.last_update["changed"], elevation.size)
+        counts = hydrology.update(elevation + 0.005)
+        self.assertEqual(counts, {"changed": 0, "downstream": 0, "upstream": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
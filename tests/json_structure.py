@@ -4,10 +4,14 @@
 Test for JSON format in activities
 """
 
-import json
 import os
+import sys
 import unittest
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from activity_catalog import load_catalog  # noqa: E402
+
 
 def is_json_file(path):
     """Return True if path is a JSON file"""
@@ -49,130 +53,52 @@ class TestContentOfJsonFiles(unittest.TestCase):
     text_items = ["title", "analyses", "author", "instructions"]
     main_config_file = "config.json"
 
+    def setUp(self):
+        """Get catalog of activities (files are parsed only once for all tests)"""
+        self.catalog = load_catalog(self.path)
+
     def test_files_have_expected_content(self):
         """Check that files contain required pieces"""
-        for filename, full_path in get_all_json_files(self.path):
-            with open(full_path) as file_handle:
-                try:
-                    content = json.load(file_handle)
-                except json.JSONDecodeError as err:  # noqa: F841
-                    self.fail(
-                        "File {full_path} is not properly formatted JSON: {err}".format(
-                            **locals()
-                        )
-                    )
-                self.assertIn(
-                    "tasks",
-                    content,
-                    msg=("tasks key not in {full_path} file".format(**locals())),
-                )
-                tasks = content["tasks"]
-                self.assertIsInstance(
-                    tasks,
-                    list,
-                    msg="tasks must be a list (of tasks), not {provided_type}".format(
-                        provided_type=type(tasks)
-                    ),
-                )
-                self.assertTrue(
-                    tasks, msg="tasks list must contain at least one item (task)"
-                )
-                for task in tasks:
-                    self.assertIsInstance(
-                        task,
-                        dict,
-                        msg="task must be a dictionary, not {provided_type}".format(
-                            provided_type=type(tasks)
-                        ),
-                    )
-                    self.assertTrue(task, msg="task must be a non-empty dictionary")
-                    self.assertIn(
-                        "layers",
-                        task,
-                        msg=(
-                            "layers key not in a task in {full_path} file".format(
-                                **locals()
-                            )
-                        ),
-                    )
-                    for item_key in self.text_items:
-                        self.assertIn(
-                            item_key,
-                            task,
-                            msg=f"task needs to have {item_key} (fix {filename})",
-                        )
-                        item = task[item_key]
-                        self.assertIsInstance(
-                            item,
-                            str,
-                            msg=(
-                                f"{item_key} must be str (string of characters), "
-                                f"not {type(item)} (fix {filename})"
-                            ),
-                        )
-                        self.assertTrue(
-                            item, msg=f"{item_key} must not be empty (fix {filename})"
-                        )
-
-                    layers = task["layers"]
-                    self.assertIsInstance(
-                        layers,
-                        list,
-                        msg=f"layers must be a list (of layers), not {type(layers)}",
-                    )
-                    self.assertTrue(
-                        layers, msg="layers list must contain at least one item (layer)"
-                    )
-                    for layer in layers:
-                        self.assertIsInstance(
-                            layer,
-                            list,
-                            msg=f"layer must be a list (a command), not {type(layer)}",
-                        )
-                        self.assertTrue(
-                            layer,
-                            msg="layer must contain at least one item (module name)",
-                        )
+        for config in self.catalog.configs:
+            with self.subTest(filename=config.path.name):
+                if config.errors:
+                    self.fail("\n".join(config.errors))
 
     def test_python_file_exists(self):
         """Check that referenced file exists"""
-        for filename, full_path in get_all_json_files(self.path):
-            with open(full_path) as file_handle:
-                content = json.load(file_handle)
-                for task in content["tasks"]:
-                    python_file = task["analyses"]
-                    if not os.path.isfile(os.path.join(self.path, python_file)):
-                        self.fail(
-                            "File {full_path} refers to {python_file}"
-                            " which does not exist".format(**locals())
-                        )
+        for config in self.catalog.configs:
+            full_path = config.path
+            for task in config.tasks:
+                python_file = task.analyses
+                if not task.python_file.is_file():
+                    self.fail(
+                        "File {full_path} refers to {python_file}"
+                        " which does not exist".format(**locals())
+                    )
 
     def test_python_filename_matches_json(self):
         """Check that filenames match if there is one task in a JSON file"""
-        for filename, full_path in get_all_json_files(self.path):
+        for config in self.catalog.configs:
+            filename = config.path.name
             if filename == self.main_config_file:
                 # Skip checking the main config file.
                 continue
-            with open(full_path) as file_handle:
-                content = json.load(file_handle)
-                tasks = content["tasks"]
-                # name match makes sense only for files with one task
-                if len(tasks) == 1:
-                    python_file = tasks[0]["analyses"]
-                    python_file_no_ext = os.path.splitext(python_file)[0]
-                    json_file_no_ext = os.path.splitext(filename)[0]
-                    self.assertEqual(
-                        python_file_no_ext,
-                        json_file_no_ext,
-                        msg=(
-                            f"Python filename {python_file}"
-                            " does not match JSON filename {filename}"
-                            " (required for files with only one task)".format(
-                                **locals()
-                            ),
-                        ),
-                    )
-                # else skip the test
+            tasks = config.tasks
+            # name match makes sense only for files with one task
+            if len(tasks) == 1:
+                python_file = tasks[0].analyses
+                python_file_no_ext = os.path.splitext(python_file)[0]
+                json_file_no_ext = os.path.splitext(filename)[0]
+                self.assertEqual(
+                    python_file_no_ext,
+                    json_file_no_ext,
+                    msg=(
+                        f"Python filename {python_file}"
+                        f" does not match JSON filename {filename}"
+                        " (required for files with only one task)"
+                    ),
+                )
+            # else skip the test
 
     def test_files_not_in_root(self):
         """Check that no Python and JSON files are in the root directory"""
@@ -203,19 +129,11 @@ class TestContentOfJsonFiles(unittest.TestCase):
 
     def test_python_file_in_json(self):
         """Check that all Python files are referenced by a JSON config file"""
-        for python_filename, python_full_path in get_all_python_files(self.path):
-            file_mentioned = False
-            for json_filename, json_full_path in get_all_json_files(self.path):
-                with open(json_full_path) as file_handle:
-                    content = json.load(file_handle)
-                    for task in content["tasks"]:
-                        if python_filename == task["analyses"]:
-                            file_mentioned = True
-                            break
-                if file_mentioned:
-                    break
-            self.assertTrue(
-                file_mentioned,
+        referenced = self.catalog.referenced_python_files()
+        for python_filename in self.catalog.python_files:
+            self.assertIn(
+                python_filename,
+                referenced,
                 msg=(
                     "Python file {python_filename} is not referenced"
                     " by any JSON configuration".format(**locals())
@@ -229,16 +147,15 @@ class TestContentOfJsonFiles(unittest.TestCase):
 
     def configuration_is_not_from_template(self, example):
         """Run comparison for one example or template file"""
-        with open(os.path.join(self.path, example)) as file_handle:
-            # assuming we have exactly one task in the template
-            template_task = json.load(file_handle)["tasks"][0]
-        for filename, full_path in get_all_json_files(self.path):
+        # assuming we have exactly one task in the template
+        template_task = self.catalog.config(example).tasks[0].data
+        for config in self.catalog.configs:
+            filename = config.path.name
             # do not check the template itself and main config
             if filename in (example, self.main_config_file):
                 continue
-            with open(full_path) as file_handle:
-                content = json.load(file_handle)
-            for task in content["tasks"]:
+            for task in config.tasks:
+                task = task.data
                 for key in self.text_items:
                     self.assertNotEqual(
                         task[key],
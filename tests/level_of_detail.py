@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+"""
+Test for level of detail of vectors and raster outlines
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "tools"))
+sys.path.insert(0, str(ROOT / "website"))
+# GRASS GIS stand-in for the stage writing maps
+sys.path.insert(0, str(ROOT / "tools" / "fake_grass" / "etc" / "python"))
+
+import grass.script as gs  # noqa: E402
+from grass.fake.location import create_mapset, write_gisrc  # noqa: E402
+from grass.script import array as garray  # noqa: E402
+from layer_cache import read_bmp  # noqa: E402
+from level_of_detail import (  # noqa: E402
+    VectorizationStage,
+    contour_cells,
+    display_resolution,
+    layer_map,
+    outline_cells,
+)
+
+
+class TestLevelOfDetail(unittest.TestCase):
+    """Test display resolution and raster outlines"""
+
+    def test_display_resolution(self):
+        """Check that the longer side of the region fits the display"""
+        region = {"n": 1000, "s": 0, "e": 500, "w": 0}
+        self.assertEqual(display_resolution(region, 500, 500), 2)
+        self.assertEqual(display_resolution(region, 100, 1000), 5)
+
+    def test_outlines(self):
+        """Check one cell wide outlines between areas"""
+        labels = np.array(
+            [
+                [1, 1, 2, 2],
+                [1, 1, 2, 2],
+                [3, 3, 3, np.nan],
+            ]
+        )
+        expected = np.array(
+            [
+                [0, 1, 0, 0],
+                [1, 1, 1, 0],
+                [0, 0, 0, 1],
+            ],
+            dtype=bool,
+        )
+        self.assertEqual(outline_cells(labels).tolist(), expected.tolist())
+        self.assertFalse(outline_cells(np.ones((3, 3))).any())
+
+    def test_contours(self):
+        """Check levels of contours on a slope"""
+        elevation = np.tile(np.arange(0, 10, 1.0), (3, 1))
+        contours = contour_cells(elevation, step=4, minimum=0)
+        self.assertEqual(np.flatnonzero(np.isfinite(contours[0])).tolist(), [4, 8])
+        self.assertEqual(contours[1, 4], 4)
+        self.assertEqual(contours[2, 8], 8)
+        elevation[1, 5] = np.nan
+        contours = contour_cells(elevation, step=4, minimum=0)
+        self.assertTrue(np.isnan(contours[1, 5]))
+
+
+class TestDisplayOnly(unittest.TestCase):
+    """Test outputs written as rasters instead of vectors"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = Path(self.directory.name)
+        create_mapset(root / "location" / "test")
+        write_gisrc(root / "gisrc", root / "location" / "test")
+        self.env = os.environ.copy()
+        self.env["GISRC"] = str(root / "gisrc")
+        gs.run_command(
+            "g.region", n=100, s=0, e=100, w=0, rows=10, cols=10, env=self.env
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_layer_map(self):
+        """Check that map name is found with or without the key"""
+        self.assertEqual(layer_map(["d.vect", "map=basins", "width=2"]), "basins")
+        self.assertEqual(layer_map(["d.vect", "-c", "basins"]), "basins")
+        self.assertIsNone(layer_map(["d.erase"]))
+
+    def test_outlines_displayed_by_d_rast(self):
+        """Check that outlines are written as a raster and shown by d.rast"""
+        labels = garray.array(env=self.env)
+        labels[...] = np.where(np.arange(10) < 5, 1, 2)[np.newaxis, :]
+        labels.write("labels", overwrite=True)
+        stage = VectorizationStage(display_only=True)
+        stage.areas("labels", "basins", env=self.env, color="red")
+        layers = stage.display_layers(
+            [
+                ["d.rast", "map=labels"],
+                ["d.vect", "map=basins", "color=red", "fill_color=none"],
+                ["d.vect", "map=roads"],
+            ]
+        )
+        self.assertEqual(
+            layers,
+            [
+                ["d.rast", "map=labels"],
+                ["d.rast", "map=basins"],
+                ["d.vect", "map=roads"],
+            ],
+        )
+        path = Path(self.directory.name) / "image.bmp"
+        env = self.env.copy()
+        env["GRASS_RENDER_FILE"] = str(path)
+        env["GRASS_RENDER_WIDTH"] = "100"
+        env["GRASS_RENDER_HEIGHT"] = "100"
+        gs.run_command("d.erase", env=env)
+        options = dict(item.split("=", 1) for item in layers[1][1:])
+        gs.run_command(layers[1][0], env=env, **options)
+        image = read_bmp(path)
+        # Outline on the last column of the first area, white elsewhere
+        np.testing.assert_allclose(image[50, 45, :3], [1, 0, 0])
+        np.testing.assert_allclose(image[50, 25, :3], [1, 1, 1])
+        np.testing.assert_allclose(image[50, 75, :3], [1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+"""
+Test for fused evaluation of r.mapcalc expressions
+"""
+
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from map_algebra import (  # noqa: E402
+    MapcalcBatch,
+    UnsupportedExpression,
+    displayed_maps,
+    fused,
+    parse,
+)
+
+
+class MemoryStore:
+    """Store keeping rasters in a dictionary and counting reads and writes"""
+
+    def __init__(self, rasters):
+        self.rasters = dict(rasters)
+        self.reads = []
+        self.writes = []
+
+    def shape(self):
+        return next(iter(self.rasters.values()))[0].shape
+
+    def read(self, name):
+        self.reads.append(name)
+        return self.rasters[name]
+
+    def write(self, name, values, integer):
+        self.writes.append(name)
+        self.rasters[name] = (values, integer)
+
+
+def grass_script_stub(calls):
+    """Return modules grass and grass.script recording tool calls in *calls*"""
+    script = types.ModuleType("grass.script")
+    script.mapcalc = lambda exp, **kwargs: calls.append(("r.mapcalc", exp))
+
+    def run_command(name, **kwargs):
+        calls.append((name, kwargs))
+
+    script.run_command = run_command
+    for name in [
+        "read_command",
+        "write_command",
+        "parse_command",
+        "start_command",
+        "pipe_command",
+        "feed_command",
+        "raster_what",
+        "raster_info",
+    ]:
+        setattr(script, name, run_command)
+    grass = types.ModuleType("grass")
+    grass.script = script
+    return {"grass": grass, "grass.script": script}
+
+
+class TestMapAlgebra(unittest.TestCase):
+    """Test parsing and evaluation of expressions used in activities"""
+
+    def setUp(self):
+        scan = np.array([[1.0, 2.0], [3.0, np.nan]])
+        fill = np.array([[1.5, 2.0], [3.05, 5.0]])
+        self.store = MemoryStore({"scan": (scan, False), "fill": (fill, False)})
+
+    def test_parse_activity_expressions(self):
+        """Check that expressions from the activities are supported"""
+        for expression in [
+            "elev_diff = fill - scan",
+            "ponds = if(fill - scan > 0.1, fill - scan, null())",
+            "shadows = if ( isnull(incidout), 1, null())",
+        ]:
+            self.assertEqual(len(parse(expression)), 1, msg=expression)
+
+    def test_unsupported_expression(self):
+        """Check that neighborhood modifiers are reported as unsupported"""
+        with self.assertRaises(UnsupportedExpression):
+            parse("smooth = (scan[-1,0] + scan[1,0]) / 2")
+
+    def test_conditional_with_nulls(self):
+        """Check that nulls propagate like in r.mapcalc"""
+        batch = MapcalcBatch(store=self.store)
+        batch.add("ponds = if(fill - scan > 0.1, fill - scan, null())")
+        result = batch.flush()["ponds"]
+        np.testing.assert_allclose(result, [[0.5, np.nan], [np.nan, np.nan]])
+
+    def test_two_argument_condition(self):
+        """Check that if(x, a) is zero where x is zero"""
+        batch = MapcalcBatch(store=self.store)
+        batch.add("c = if(scan > 1, 5)")
+        values = batch.flush()["c"]
+        np.testing.assert_array_equal(values, [[0, 5], [5, np.nan]])
+
+    def test_integer_division(self):
+        """Check that division of integers is integer division"""
+        batch = MapcalcBatch(store=self.store)
+        batch.add("a = 7 / 2 + scan * 0\nb = 7.0 / 2 + scan * 0")
+        result = batch.flush()
+        self.assertEqual(result["a"][0, 0], 3)
+        self.assertEqual(result["b"][0, 0], 3.5)
+
+    def test_intermediate_maps_not_written(self):
+        """Check that only kept maps are written and inputs are read once"""
+        batch = MapcalcBatch(store=self.store, keep=["result"])
+        batch.add("diff = fill - scan")
+        batch.add("diff = diff * 2")
+        batch.add("result = if(diff > 0, diff, 0) + scan - scan")
+        result = batch.flush()
+        self.assertEqual(self.store.writes, ["result"])
+        self.assertEqual(sorted(self.store.reads), ["fill", "scan"])
+        np.testing.assert_allclose(result["result"][0], [1.0, 0.0])
+
+    def test_mentioned_names(self):
+        """Check detection of pending maps in tool parameters"""
+        batch = MapcalcBatch(store=self.store)
+        batch.add("diff = fill - scan")
+        self.assertEqual(batch.mentioned(["diff", {"a": "scan"}, 5]), {"diff"})
+        self.assertEqual(batch.mentioned([["scan@PERMANENT"]]), {"scan"})
+        self.assertEqual(batch.mentioned(["other"]), set())
+
+    def test_displayed_maps(self):
+        """Check that map names are collected from layers"""
+        layers = [["d.rast", "map=slope"], ["d.vect", "map=contours", "width=2"]]
+        self.assertEqual(displayed_maps(layers), {"slope", "contours"})
+
+
+class TestFused(unittest.TestCase):
+    """Test lazy evaluation of gs.mapcalc calls in a block"""
+
+    def setUp(self):
+        scan = np.array([[1.0, 2.0], [3.0, np.nan]])
+        self.store = MemoryStore({"scan": (scan, False)})
+        self.calls = []
+        patcher = mock.patch.dict(sys.modules, grass_script_stub(self.calls))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.gs = sys.modules["grass.script"]
+
+    def test_evaluated_at_end(self):
+        """Check that expressions are evaluated together at the end of the block"""
+        with fused(keep={"b"}, store=self.store):
+            self.gs.mapcalc("a = scan * 2")
+            self.gs.mapcalc("b = a + 1")
+            self.assertEqual(self.store.writes, [])
+        self.assertEqual(self.store.writes, ["b"])
+        self.assertEqual(self.calls, [])
+        np.testing.assert_allclose(self.store.rasters["b"][0][0], [3.0, 5.0])
+
+    def test_flush_before_tool(self):
+        """Check that a pending map is written before a tool uses it"""
+        with fused(keep=set(), store=self.store):
+            self.gs.mapcalc("a = scan * 2")
+            self.gs.mapcalc("b = scan * 3")
+            self.gs.run_command("r.colors", map="a", color="viridis")
+            self.assertEqual(self.store.writes, ["a"])
+        self.assertEqual(self.calls, [("r.colors", {"map": "a", "color": "viridis"})])
+
+    def test_tool_reading_input_does_not_flush(self):
+        """Check that a tool using only an input keeps expressions pending"""
+        with fused(keep={"c"}, store=self.store):
+            self.gs.mapcalc("b = scan * 3")
+            self.gs.run_command("r.univar", map="scan")
+            self.gs.mapcalc("c = b + 1")
+            self.assertEqual(self.store.writes, [])
+        self.assertEqual(self.store.writes, ["c"])
+        np.testing.assert_allclose(self.store.rasters["c"][0][0], [4.0, 7.0])
+
+    def test_intermediate_used_after_flush(self):
+        """Check that a map not written by a flush can be used later"""
+        with fused(keep={"b", "c"}, store=self.store):
+            self.gs.mapcalc("a = scan * 2")
+            self.gs.mapcalc("b = a + 1")
+            self.gs.run_command("r.colors", map="b", color="viridis")
+            self.gs.mapcalc("c = a + 2")
+            self.assertEqual(self.store.writes, ["b"])
+            self.gs.run_command("r.colors", map="a", color="viridis")
+        self.assertEqual(self.store.writes, ["b", "a", "c"])
+        np.testing.assert_allclose(self.store.rasters["c"][0][0], [4.0, 6.0])
+
+    def test_flush_before_input_replaced(self):
+        """Check that expressions are evaluated before a tool replaces input"""
+        with fused(keep={"b"}, store=self.store):
+            self.gs.mapcalc("b = scan * 3")
+            self.gs.run_command("r.resamp.filter", input="scan", output="scan")
+            self.assertEqual(self.store.writes, ["b"])
+
+    def test_region_change_writes_maps(self):
+        """Check that all maps are written before the region changes"""
+        with fused(keep={"b"}, store=self.store):
+            self.gs.mapcalc("a = scan * 2")
+            self.gs.mapcalc("b = a + 1")
+            self.gs.run_command("g.region", raster="scan")
+            self.assertEqual(sorted(self.store.writes), ["a", "b"])
+        self.assertEqual(sorted(self.store.writes), ["a", "b"])
+
+    def test_unsupported_expression_reads_pending_map(self):
+        """Check that pending inputs of an unsupported expression are written"""
+        with fused(keep={"c"}, store=self.store):
+            self.gs.mapcalc("a = scan * 2")
+            self.gs.mapcalc("c = a + rand(0, 1)")
+            self.assertEqual(self.store.writes, ["a"])
+        self.assertEqual(self.calls, [("r.mapcalc", "c = a + rand(0, 1)")])
+
+    def test_functions_restored(self):
+        """Check that the original functions are restored after the block"""
+        original = self.gs.mapcalc
+        with self.assertRaises(RuntimeError):
+            with fused(store=self.store):
+                self.assertIsNot(self.gs.mapcalc, original)
+                raise RuntimeError("Failure in the block")
+        self.assertIs(self.gs.mapcalc, original)
+
+
+if __name__ == "__main__":
+    unittest.main()
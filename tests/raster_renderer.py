@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""
+Test for rendering of d.rast layers using NumPy
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "website"))
+
+from layer_cache import composite  # noqa: E402
+from raster_renderer import (  # noqa: E402
+    EXPORT_SCRIPT,
+    NumpyRasterRenderer,
+    UnsupportedLayer,
+    parse_color_file,
+    raster_layer_options,
+    render_raster,
+)
+
+# Color file as written by r.colors for rules="0% aqua\n100% blue"
+PONDS_COLORS = """% 0 10
+nv:255
+*:255
+0:0:255:255 10:0:0:255
+"""
+
+
+class FakeRunner:
+    """Runner writing values of maps as the export script would"""
+
+    def __init__(self, mapset, values):
+        self.mapset = mapset
+        self.values = values
+        self.commands = []
+
+    async def run(self, *args):
+        self.commands.append(args)
+        unused, script, directory, *names = args
+        for index, name in enumerate(names):
+            np.save(Path(directory) / f"{index}.npy", self.values[name])
+
+
+class TestRasterRenderer(unittest.TestCase):
+    """Test color tables and layout of the image"""
+
+    region = {"north": 10, "south": 0, "east": 20, "west": 0, "rows": 2, "cols": 4}
+
+    def test_color_file_rules(self):
+        """Check interpolation, default color, and grey values"""
+        table = parse_color_file(PONDS_COLORS + "20:100 30:200\n")
+        colors = table.colors(np.array([0, 5, 10, 15, 25]))
+        np.testing.assert_array_equal(colors[0], [0, 255, 255])
+        np.testing.assert_array_equal(colors[1], [0, 127.5, 255])
+        np.testing.assert_array_equal(colors[2], [0, 0, 255])
+        np.testing.assert_array_equal(colors[3], [255, 255, 255])
+        np.testing.assert_array_equal(colors[4], [150, 150, 150])
+
+    def test_unsupported(self):
+        """Check that unsupported layers and color files are reported"""
+        self.assertEqual(
+            raster_layer_options(["d.rast", "map=ponds"]), ("ponds", False)
+        )
+        self.assertEqual(
+            raster_layer_options(["d.rast", "ponds", "-n"]), ("ponds", True)
+        )
+        with self.assertRaises(UnsupportedLayer):
+            raster_layer_options(["d.rast", "map=ponds", "values=1-3"])
+        with self.assertRaises(UnsupportedLayer):
+            raster_layer_options(["d.vect", "map=contours"])
+        with self.assertRaises(UnsupportedLayer):
+            parse_color_file("#color\n")
+
+    def test_layout(self):
+        """Check that region keeps aspect ratio and nulls are transparent"""
+        values = np.array([[0, 10, np.nan, 10], [0, 0, 0, 0]])
+        image = render_raster(values, self.region, parse_color_file(PONDS_COLORS), 8, 8)
+        self.assertEqual(image.shape, (8, 8, 4))
+        # Region is twice as wide as tall, so rows 0-1 and 6-7 are empty.
+        self.assertTrue(np.all(image[:2, :, 3] == 0))
+        self.assertTrue(np.all(image[6:, :, 3] == 0))
+        np.testing.assert_allclose(image[2, 0], [0, 1, 1, 1])
+        np.testing.assert_allclose(image[2, 2], [0, 0, 1, 1])
+        np.testing.assert_allclose(image[2, 4], [0, 0, 0, 0])
+        rgb = composite([image])
+        np.testing.assert_array_equal(rgb[2, 4], [255, 255, 255])
+
+    def mapset(self, directory, names):
+        """Create mapset with rasters which have the ponds color table"""
+        mapset = Path(directory) / "location" / "mapset"
+        for element in ["fcell", "colr"]:
+            (mapset / element).mkdir(parents=True)
+        for name in names:
+            (mapset / "fcell" / name).write_text("")
+            (mapset / "colr" / name).write_text(PONDS_COLORS)
+        (mapset / "WIND").write_text(
+            "north: 500\nsouth: 0\neast: 500\nwest: 0\nrows: 500\ncols: 500\n"
+        )
+        return mapset
+
+    def test_render_layer(self):
+        """Check rendering from a mapset with values from the runner"""
+        with tempfile.TemporaryDirectory() as directory:
+            mapset = self.mapset(directory, ["ponds"])
+            values = np.random.default_rng(1).uniform(0, 10, (500, 500))
+            runner = FakeRunner(mapset, {"ponds": values.astype(np.float32)})
+            renderer = NumpyRasterRenderer()
+            start = time.perf_counter()
+            image = asyncio.run(
+                renderer.render(runner, ["d.rast", "map=ponds"], 500, 500)
+            )
+            duration = time.perf_counter() - start
+            self.assertEqual(runner.commands[0][:2], ("python", str(EXPORT_SCRIPT)))
+            self.assertEqual(image.shape, (500, 500, 4))
+            np.testing.assert_allclose(image[:, :, 1], 1 - values / 10, atol=0.01)
+            self.assertLess(duration, 0.5)
+
+    def test_render_layers_together(self):
+        """Check that rasters of all layers are exported by one command"""
+        with tempfile.TemporaryDirectory() as directory:
+            mapset = self.mapset(directory, ["ponds", "depth"])
+            values = {
+                "ponds": np.full((500, 500), 10, dtype=np.float32),
+                "depth": np.zeros((500, 500), dtype=np.float32),
+            }
+            runner = FakeRunner(mapset, values)
+            layers = [
+                ["d.rast", "map=ponds"],
+                ["d.vect", "map=contours"],
+                ["d.rast", "map=depth"],
+                ["d.rast", "map=ponds", "-n"],
+                ["d.rast", "map=no_colors"],
+            ]
+            images = asyncio.run(
+                NumpyRasterRenderer().render_layers(runner, layers, 50, 50)
+            )
+            self.assertEqual(len(runner.commands), 1)
+            self.assertEqual(runner.commands[0][3:], ("ponds", "depth"))
+            self.assertEqual(
+                list(images),
+                [
+                    ("d.rast", "map=ponds"),
+                    ("d.rast", "map=depth"),
+                    ("d.rast", "map=ponds", "-n"),
+                ],
+            )
+            np.testing.assert_allclose(
+                images[("d.rast", "map=ponds")][0, 0], [0, 0, 1, 1]
+            )
+            np.testing.assert_allclose(
+                images[("d.rast", "map=depth")][0, 0], [0, 1, 1, 1]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
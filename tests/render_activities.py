@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+
+"""
+Test for rendering of activities with several tasks
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "website"))
+
+from activity_catalog import ActivityConfig  # noqa: E402
+from render_activities import (  # noqa: E402
+    ActivityWatcher,
+    AsyncGrassRunner,
+    IndexPage,
+    affected_configs,
+    group_tasks,
+    process_activities,
+    process_activity,
+    rebuild_activities,
+)
+from worker_pool import WorkerPool  # noqa: E402
+
+FAKE_GRASS = str(
+    Path(__file__).resolve().parent.parent / "tools" / "fake_grass" / "bin" / "grass"
+)
+
+
+def task(title, analyses, base, layers):
+    """Return task dictionary for a configuration"""
+    return {
+        "title": title,
+        "author": "Author",
+        "instructions": "Instructions",
+        "analyses": analyses,
+        "base": base,
+        "layers": layers,
+    }
+
+
+CONFIG = {
+    "tasks": [
+        task("Slope", "views.py", "elev", [["d.rast", "map=slope"]]),
+        task("Other", "other.py", "elev", [["d.rast", "map=other"]]),
+        task("Aspect", "views.py", "elev", [["d.rast", "map=aspect"]]),
+        task("Small", "views.py", "small", [["d.rast", "map=slope"]]),
+    ]
+}
+
+
+class FakeRunner:
+    """Records commands instead of running them in GRASS GIS"""
+
+    mapset = "mapset"
+
+    def __init__(self):
+        self.commands = []
+
+    async def run_python(self, *args, keep_maps=None):
+        """Record script run"""
+        self.commands.append(("python", Path(args[0]).name))
+
+    async def run_env(self, env, args):
+        """Record rendering command with its image"""
+        self.commands.append((env["GRASS_RENDER_FILE"], " ".join(args)))
+
+
+# Executable standing for GRASS GIS: scripts write their name into the map
+# named shared (after a delay), d.rast records the map content for the image.
+SHARED_MAP_EXECUTABLE = """#!{python}
+import os
+import sys
+import time
+from pathlib import Path
+
+mapset = Path(sys.argv[1])
+command = sys.argv[3:]
+if command[0] == "python":
+    time.sleep(0.1)
+    (mapset / "shared").write_text(Path(command[1]).stem)
+elif command[0] == "d.rast":
+    with open(mapset / "log", "a") as log:
+        image = Path(os.environ["GRASS_RENDER_FILE"]).name
+        log.write(f"{{image}} {{(mapset / 'shared').read_text()}}\\n")
+"""
+
+
+# Activity which sets a region smaller than the default one and uses a helper
+TILES_ACTIVITY = """import os
+
+import grass.script as gs
+from tiles_helper import FACTOR
+
+
+def main():
+    env = os.environ.copy()
+    env["GRASS_OVERWRITE"] = "1"
+    gs.run_command(
+        "g.region", n=220500, s=220100, e=638800, w=638400, res=50, env=env
+    )
+    gs.mapcalc(f"tiles = row() * {FACTOR} + col()", env=env)
+
+
+if __name__ == "__main__":
+    main()
+"""
+
+FUSED_ACTIVITY = """import os
+
+import grass.script as gs
+
+
+def main():
+    env = os.environ.copy()
+    env["GRASS_OVERWRITE"] = "1"
+    gs.run_command(
+        "g.region", n=220500, s=220100, e=638800, w=638400, res=50, env=env
+    )
+    gs.mapcalc("tiles = row() * 2 + col()", env=env)
+    gs.mapcalc("double = tiles * 2", env=env)
+    gs.mapcalc("shown = if(double > 20, double, 0)", env=env)
+
+
+if __name__ == "__main__":
+    main()
+"""
+
+
+@contextmanager
+def working_directory(path):
+    """Change the current directory for the duration of the context"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def process_args(mapset):
+    """Return command line arguments for processing activities in a mapset"""
+    return argparse.Namespace(
+        grass=FAKE_GRASS,
+        mapset_path=str(mapset),
+        jobs=1,
+        timeout=None,
+        layer_cache=None,
+        numpy_rasters=False,
+        fused_mapcalc=False,
+        no_individual_pages=True,
+    )
+
+
+class TestRenderActivities(unittest.TestCase):
+    """Test that all tasks are rendered with shared analyses runs"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "views.json"
+        self.config = ActivityConfig(self.path, content=CONFIG).check()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_group_tasks(self):
+        """Check grouping by analyses file and base map"""
+        groups = group_tasks(self.config.tasks)
+        titles = [[item.title for item in group] for group in groups]
+        self.assertEqual(titles, [["Slope", "Aspect"], ["Other"], ["Small"]])
+
+    def test_process_activity(self):
+        """Check that each group runs analyses once and each task is rendered"""
+        runner = FakeRunner()
+        results = asyncio.run(
+            process_activity(
+                runner, self.config, individual_pages=False, scratch_mapset=False
+            )
+        )
+        self.assertEqual(
+            [(activity["title"], image) for activity, image in results],
+            [
+                ("Slope", "views.png"),
+                ("Other", "views_1.png"),
+                ("Aspect", "views_2.png"),
+                ("Small", "views_3.png"),
+            ],
+        )
+        python_runs = [
+            index
+            for index, command in enumerate(runner.commands)
+            if command[0] == "python"
+        ]
+        self.assertEqual(
+            [runner.commands[index][1] for index in python_runs],
+            ["views.py", "other.py", "views.py"],
+        )
+        images = {}
+        for index, (image, command) in enumerate(runner.commands):
+            if image != "python":
+                # Group of the analyses run before the command
+                group = sum(run < index for run in python_runs)
+                images.setdefault(image, []).append((group, command))
+        self.assertEqual(
+            images,
+            {
+                "views.png": [(1, "d.erase"), (1, "d.rast map=slope")],
+                "views_2.png": [(1, "d.erase"), (1, "d.rast map=aspect")],
+                "views_1.png": [(2, "d.erase"), (2, "d.rast map=other")],
+                "views_3.png": [(3, "d.erase"), (3, "d.rast map=slope")],
+            },
+        )
+
+    def index_titles(self, filename):
+        """Return titles of activities in an index page"""
+        text = Path(filename).read_text()
+        return [part.split("</h2>")[0] for part in text.split("<h2>")[1:]]
+
+    def test_index_page_replace(self):
+        """Check that entries are replaced in place, added, and removed"""
+        filename = Path(self.directory.name) / "index.html"
+        page = IndexPage(title="Index", filename=filename)
+        for key in ["a", "b", "c"]:
+            page.add_activity(task(key, "", "", []), f"{key}.png", key=key)
+        page.finish()
+        page.replace_activities(
+            "b", [(task(title, "", "", []), "b.png") for title in "xy"]
+        )
+        page.replace_activities("c", [])
+        page.replace_activities("d", [(task("d", "", "", []), "d.png")], before="a")
+        page.write()
+        self.assertEqual(self.index_titles(filename), ["d", "a", "x", "y"])
+
+    def test_watcher(self):
+        """Check that a burst of changes is reported once"""
+        directory = Path(self.directory.name)
+        (directory / "notes.txt").write_text("")
+        watcher = ActivityWatcher([directory], interval=0.01, debounce=0.2)
+
+        async def save_files():
+            for name in ["views.py", "views.json", "notes.txt", "views.py"]:
+                (directory / name).write_text(
+                    f"{name} {asyncio.get_running_loop().time()}"
+                )
+                await asyncio.sleep(0.05)
+
+        async def watch():
+            saving = asyncio.ensure_future(save_files())
+            changed = await watcher.changes()
+            await saving
+            return changed
+
+        self.assertEqual(
+            asyncio.run(watch()), {directory / "views.py", directory / "views.json"}
+        )
+
+    def test_rebuild_activities(self):
+        """Check that only activities using changed files run and get new entries"""
+        other = ActivityConfig(
+            Path(self.directory.name) / "other.json",
+            content={
+                "tasks": [task("Other", "other.py", "elev", [["d.rast", "map=o"]])]
+            },
+        ).check()
+        filename = Path(self.directory.name) / "index.html"
+        page = IndexPage(title="Index", filename=filename)
+        page.finish()
+        entries = {}
+        configs = [self.config, other]
+
+        def rebuild(changed):
+            runner = FakeRunner()
+            asyncio.run(
+                rebuild_activities(
+                    runner,
+                    configs,
+                    changed,
+                    entries,
+                    page,
+                    individual_pages=False,
+                )
+            )
+            return [command[1] for command in runner.commands if command[0] == "python"]
+
+        self.assertEqual(rebuild({other.path}), ["other.py"])
+        self.assertEqual(self.index_titles(filename), ["Other"])
+        other_py = Path(self.directory.name) / "other.py"
+        self.assertEqual(
+            rebuild({self.path, other_py}),
+            ["views.py", "other.py", "views.py", "other.py"],
+        )
+        self.assertEqual(
+            self.index_titles(filename), ["Slope", "Other", "Aspect", "Small", "Other"]
+        )
+        configs.remove(other)
+        self.assertEqual(rebuild(set()), [])
+        self.assertEqual(
+            self.index_titles(filename), ["Slope", "Other", "Aspect", "Small"]
+        )
+        self.assertEqual(list(entries), [self.path])
+
+    def test_shared_map_names(self):
+        """Check that activities in one mapset do not render each other's maps"""
+        directory = Path(self.directory.name)
+        executable = directory / "grass"
+        executable.write_text(SHARED_MAP_EXECUTABLE.format(python=sys.executable))
+        executable.chmod(0o755)
+        mapset = directory / "mapset"
+        mapset.mkdir()
+        configs = [
+            ActivityConfig(
+                directory / f"{name}.json",
+                content={
+                    "tasks": [
+                        task(name, f"{name}.py", "elev", [["d.rast", "map=shared"]])
+                    ]
+                },
+            ).check()
+            for name in ["first", "second", "third"]
+        ]
+        args = process_args(mapset)
+        args.grass = str(executable)
+        results = asyncio.run(process_activities(args, configs))
+        self.assertEqual(
+            [image for unused, image in results],
+            ["first.png", "second.png", "third.png"],
+        )
+        self.assertEqual(
+            (mapset / "log").read_text().splitlines(),
+            ["first.png first", "second.png second", "third.png third"],
+        )
+
+
+class TestWatchRebuild(unittest.TestCase):
+    """Test rebuilds in the watch mode with the GRASS GIS stand-in"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = Path(self.directory.name)
+        self.activities = root / "activities"
+        self.activities.mkdir()
+        (self.activities / "tiles.py").write_text(TILES_ACTIVITY)
+        self.helper = self.activities / "tiles_helper.py"
+        self.helper.write_text("FACTOR = 2\n")
+        self.config = ActivityConfig(
+            self.activities / "tiles.json",
+            content={
+                "tasks": [
+                    task(
+                        "Tiles", "tiles.py", "elev_lid792_1m", [["d.rast", "map=tiles"]]
+                    )
+                ]
+            },
+        ).check()
+        for name in ["build", "watch"]:
+            subprocess.run(
+                [FAKE_GRASS, "-c", str(root / "location" / name), "-e"], check=True
+            )
+            (root / f"{name}_html").mkdir()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self):
+        """Build the activity as without watching and return its image"""
+        root = Path(self.directory.name)
+        with working_directory(root / "build_html"):
+            asyncio.run(
+                process_activities(
+                    process_args(root / "location" / "build"), [self.config]
+                )
+            )
+        return (root / "build_html" / "tiles.png").read_bytes()
+
+    def test_affected_configs(self):
+        """Check that a changed helper module affects activities next to it"""
+        self.assertEqual(affected_configs([self.config], {self.helper}), [self.config])
+        other = Path(self.directory.name) / "other.py"
+        self.assertEqual(affected_configs([self.config], {other}), [])
+
+    def test_rebuild_as_build(self):
+        """Check that rebuilds in a warm worker render the same as a build"""
+        root = Path(self.directory.name)
+        mapset = root / "location" / "watch"
+        page = IndexPage(title="Index", filename=root / "watch_html" / "index.html")
+        page.finish()
+        entries = {}
+
+        with WorkerPool(FAKE_GRASS, mapset, python="python") as pool:
+
+            async def rebuild(changed):
+                runner = AsyncGrassRunner(
+                    executable=FAKE_GRASS, mapset=mapset, pool=pool
+                )
+                await rebuild_activities(
+                    runner,
+                    [self.config],
+                    changed,
+                    entries,
+                    page,
+                    individual_pages=False,
+                )
+
+            with working_directory(root / "watch_html"):
+                asyncio.run(rebuild({self.config.path}))
+                first = Path("tiles.png").read_bytes()
+                self.assertEqual(first, self.build())
+                # The helper imported by the previous job is imported again.
+                self.helper.write_text("FACTOR = 100\n")
+                asyncio.run(rebuild({self.helper}))
+                second = Path("tiles.png").read_bytes()
+        self.assertNotEqual(second, first)
+        self.assertEqual(second, self.build())
+
+    def test_fused_mapcalc(self):
+        """Check that fused expressions render the same without intermediates"""
+        root = Path(self.directory.name)
+        (self.activities / "fused.py").write_text(FUSED_ACTIVITY)
+        config = ActivityConfig(
+            self.activities / "fused.json",
+            content={
+                "tasks": [
+                    task(
+                        "Fused", "fused.py", "elev_lid792_1m", [["d.rast", "map=shown"]]
+                    )
+                ]
+            },
+        ).check()
+        images = {}
+        for name, fused_mapcalc, pool in [
+            ("build", False, False),
+            ("script", True, False),
+            ("worker", True, True),
+        ]:
+            mapset = root / "location" / name
+            if not mapset.exists():
+                subprocess.run([FAKE_GRASS, "-c", str(mapset), "-e"], check=True)
+                (root / f"{name}_html").mkdir()
+            args = process_args(mapset)
+            args.fused_mapcalc = fused_mapcalc
+
+            async def build():
+                if not pool:
+                    return await process_activities(args, [config])
+                with WorkerPool(FAKE_GRASS, mapset, python="python") as workers:
+                    runner = AsyncGrassRunner(
+                        executable=FAKE_GRASS, mapset=mapset, pool=workers
+                    )
+                    return await process_activity(
+                        runner,
+                        config,
+                        individual_pages=False,
+                        scratch_mapset=False,
+                        fused_mapcalc=True,
+                    )
+
+            with working_directory(root / f"{name}_html"):
+                asyncio.run(build())
+            images[name] = (root / f"{name}_html" / "fused.png").read_bytes()
+            rasters = {path.name for path in (mapset / "cellhd").iterdir()}
+            # The intermediate map is written only without fusing.
+            self.assertEqual("double" in rasters, not fused_mapcalc, msg=name)
+            self.assertIn("shown", rasters, msg=name)
+        self.assertEqual(images["script"], images["build"])
+        self.assertEqual(images["worker"], images["build"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Test for memory and I/O accounting of tools
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from resource_usage import ActivityAccounting, UsageRecorder, install  # noqa: E402
+
+# Allocates and touches about 100 MB
+ALLOCATE = "data = bytearray(100 * 1024 * 1024)"
+
+
+class TestResourceUsage(unittest.TestCase):
+    """Test recording of processes and maps"""
+
+    def setUp(self):
+        self.module = types.SimpleNamespace(Popen=subprocess.Popen)
+        install(self.module)
+
+    def run_python(self, code):
+        process = self.module.Popen([sys.executable, "-c", code])
+        process.wait()
+        return process.returncode
+
+    def test_peak_memory(self):
+        """Check that peak memory of a process is recorded"""
+        with UsageRecorder() as outer:
+            with UsageRecorder() as inner:
+                self.assertEqual(self.run_python(ALLOCATE), 0)
+            self.assertEqual(self.run_python("import sys; sys.exit(3)"), 3)
+        self.assertEqual(len(inner.processes), 1)
+        self.assertEqual(len(outer.processes), 2)
+        self.assertGreater(inner.peak_rss_kb, 100 * 1024)
+        self.assertEqual(inner.processes[0].tool, Path(sys.executable).name)
+        # Nothing is recorded outside of a recorder.
+        self.assertEqual(self.run_python("pass"), 0)
+        self.assertEqual(len(outer.processes), 2)
+
+    def test_poll_and_timeout(self):
+        """Check that processes reaped by poll() or wait(timeout) are recorded"""
+        with UsageRecorder() as recorder:
+            process = self.module.Popen([sys.executable, "-c", ALLOCATE])
+            while process.poll() is None:
+                time.sleep(0.01)
+            self.assertEqual(process.returncode, 0)
+            process = self.module.Popen(
+                [sys.executable, "-c", "import sys; sys.exit(2)"]
+            )
+            self.assertEqual(process.wait(timeout=30), 2)
+            process = self.module.Popen(["sleep", "10"])
+            with self.assertRaises(subprocess.TimeoutExpired):
+                process.wait(timeout=0.05)
+            process.kill()
+            self.assertEqual(process.wait(), -signal.SIGKILL)
+        self.assertEqual(len(recorder.processes), 3)
+        self.assertGreater(recorder.processes[0].peak_rss_kb, 100 * 1024)
+
+    def test_function_maps(self):
+        """Check that maps created by a run_ function are recorded"""
+        with tempfile.TemporaryDirectory() as directory:
+            mapset = Path(directory)
+            accounting = ActivityAccounting(mapset)
+
+            def run_slope(scanned_elev, env, **kwargs):
+                (mapset / "fcell").mkdir(exist_ok=True)
+                (mapset / "fcell" / "slope").write_bytes(b"0" * 1000)
+                self.run_python(ALLOCATE)
+
+            activity = types.SimpleNamespace(run_slope=run_slope)
+            accounting.trace_module(activity)
+            activity.run_slope(scanned_elev="scan", env={})
+            report = accounting.report()
+        call = report["calls"][0]
+        self.assertEqual(call["name"], "run_slope")
+        self.assertEqual(
+            call["maps"], [{"kind": "raster", "name": "slope", "bytes": 1000}]
+        )
+        self.assertGreater(report["peak_rss_kb"], 100 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Test for the cache of outputs of run_ functions
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from result_cache import ResultCache  # noqa: E402
+
+
+def write_raster(mapset, name, content):
+    """Create files of a fake raster map"""
+    for element in ["fcell", "cellhd"]:
+        (mapset / element).mkdir(parents=True, exist_ok=True)
+        (mapset / element / name).write_text(f"{element} {content}")
+
+
+class TestResultCache(unittest.TestCase):
+    """Test caching with a mapset-like directory structure"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = Path(self.directory.name)
+        self.mapset = root / "location" / "mapset"
+        self.mapset.mkdir(parents=True)
+        (self.mapset / "WIND").write_text("rows: 10\ncols: 10\n")
+        gisrc = root / "gisrc"
+        gisrc.write_text(f"GISDBASE: {root}\nLOCATION_NAME: location\nMAPSET: mapset\n")
+        self.env = {"GISRC": str(gisrc)}
+        self.cache = ResultCache(root / "cache")
+        self.calls = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_slope(self, scanned_elev, env, **kwargs):
+        """Function writing an output depending on the scan"""
+        self.calls.append(kwargs)
+        content = (self.mapset / "fcell" / scanned_elev).read_text()
+        write_raster(self.mapset, "slope", f"slope of {content} {kwargs}")
+
+    def test_hit_restores_outputs(self):
+        """Check that unchanged scan restores outputs without a call"""
+        write_raster(self.mapset, "scan", "1")
+        self.assertFalse(self.cache.run(self.run_slope, "scan", self.env))
+        expected = (self.mapset / "fcell" / "slope").read_text()
+        (self.mapset / "fcell" / "slope").unlink()
+        self.assertTrue(self.cache.run(self.run_slope, "scan", self.env))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((self.mapset / "fcell" / "slope").read_text(), expected)
+        self.assertEqual(self.cache.hit_rate(), 0.5)
+
+    def test_changes_are_misses(self):
+        """Check that changed scan, region, or parameters are not hits"""
+        write_raster(self.mapset, "scan", "1")
+        self.cache.run(self.run_slope, "scan", self.env, current_hour=10)
+        write_raster(self.mapset, "scan", "2")
+        self.cache.run(self.run_slope, "scan", self.env, current_hour=10)
+        self.cache.run(self.run_slope, "scan", self.env, current_hour=11)
+        (self.mapset / "WIND").write_text("rows: 20\ncols: 20\n")
+        self.cache.run(self.run_slope, "scan", self.env, current_hour=11)
+        self.assertEqual(len(self.calls), 4)
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_eviction(self):
+        """Check that least recently used archives are removed over the limit"""
+        write_raster(self.mapset, "scan", "0")
+        self.cache.run(self.run_slope, "scan", self.env)
+        size = self.cache.statistics()["bytes"]
+        self.cache.max_bytes = 2 * size
+        for value in range(1, 4):
+            write_raster(self.mapset, "scan", str(value))
+            self.cache.run(self.run_slope, "scan", self.env)
+        self.assertLessEqual(self.cache.statistics()["bytes"], 2 * size)
+        self.assertGreater(self.cache.evictions, 0)
+
+    def test_history_not_in_key(self):
+        """Check that a scan written again with the same values is a hit"""
+        write_raster(self.mapset, "scan", "1")
+        (self.mapset / "hist").mkdir()
+        (self.mapset / "hist" / "scan").write_text("written at 10:00 by user")
+        self.cache.run(self.run_slope, "scan", self.env)
+        (self.mapset / "hist" / "scan").write_text("written at 10:01 by user")
+        self.assertTrue(self.cache.run(self.run_slope, "scan", self.env))
+        write_raster(self.mapset, "scan", "2")
+        self.assertFalse(self.cache.run(self.run_slope, "scan", self.env))
+
+    def test_vector_with_attributes_not_cached(self):
+        """Check that outputs with an attribute table are not stored"""
+
+        def run_points(scanned_elev, env):
+            directory = self.mapset / "vector" / "points"
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / "coor").write_text("points")
+            (directory / "dbln").write_text(
+                "1 points $GISDBASE/$LOCATION_NAME/$MAPSET/sqlite/sqlite.db cat sqlite"
+            )
+
+        write_raster(self.mapset, "scan", "1")
+        self.assertFalse(self.cache.run(run_points, "scan", self.env))
+        self.assertFalse(self.cache.run(run_points, "scan", self.env))
+        self.assertEqual(self.cache.uncacheable, 2)
+        self.assertEqual(self.cache.statistics()["bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
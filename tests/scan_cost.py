@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Test for static estimation of time needed for each scan
+"""
+
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from scan_cost import (  # noqa: E402
+    analyze_file,
+    estimate_file,
+    load_costs,
+    over_budget,
+)
+
+
+class TestScanCost(unittest.TestCase):
+    """Test detection of tool calls and their counts in run_ functions"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def calls(self, code):
+        """Return (tool, count, known_count) of calls in run_ functions of code"""
+        path = Path(self.directory.name) / "activity.py"
+        path.write_text("import grass.script as gs\n\n\n" + textwrap.dedent(code))
+        return {
+            name: [(call.tool, call.count, call.known_count) for call in calls]
+            for name, calls in analyze_file(path).items()
+        }
+
+    def test_tool_functions(self):
+        """Check that tools are found in calls and in arguments of calls"""
+        result = self.calls("""
+            def run_views(scanned_elev, env, **kwargs):
+                gs.run_command("r.slope.aspect", elevation=scanned_elev, env=env)
+                gs.mapcalc("diff = a - b", env=env)
+                info = gs.parse_command("r.univar", map="diff", flags="g", env=env)
+                print(gs.read_command("r.what", map="diff", env=env))
+                return info
+
+            def not_run():
+                gs.run_command("r.sun", elevation="elev")
+            """)
+        self.assertEqual(
+            result,
+            {
+                "run_views": [
+                    ("r.slope.aspect", 1, True),
+                    ("r.mapcalc", 1, True),
+                    ("r.univar", 1, True),
+                    ("r.what", 1, True),
+                ]
+            },
+        )
+
+    def test_helper_function(self):
+        """Check that calls in helper functions are counted for each use"""
+        result = self.calls("""
+            def colorize(name, env):
+                gs.run_command("r.colors", map=name, color="viridis", env=env)
+
+            def run_two(env, **kwargs):
+                colorize("a", env)
+                colorize("b", env)
+            """)
+        self.assertEqual(result["run_two"], [("r.colors", 1, True)] * 2)
+
+    def test_range_loop(self):
+        """Check that loops over range multiply the count"""
+        result = self.calls("""
+            def run_loops(env, **kwargs):
+                steps = 4
+                for unused in range(3):
+                    gs.mapcalc("a = b + 1", env=env)
+                for unused in range(steps):
+                    gs.mapcalc("a = b + 1", env=env)
+                for unused in range(1, 10, 2):
+                    gs.mapcalc("a = b + 1", env=env)
+            """)
+        self.assertEqual(
+            result["run_loops"],
+            [("r.mapcalc", 3, True), ("r.mapcalc", 4, True), ("r.mapcalc", 5, True)],
+        )
+
+    def test_map_list_loop(self):
+        """Check that loops over lists of maps call tools for each map"""
+        result = self.calls("""
+            def run_maps(env, **kwargs):
+                maps = ["slope", "aspect", "flow"]
+                for name in maps:
+                    gs.run_command("r.colors", map=name, color="viridis", env=env)
+                for index in range(len(maps)):
+                    gs.run_command("r.null", map=maps[index], setnull=0, env=env)
+                for index, name in enumerate(["a", "b"]):
+                    gs.run_command("r.info", map=name, env=env)
+            """)
+        self.assertEqual(
+            result["run_maps"],
+            [("r.colors", 3, True), ("r.null", 3, True), ("r.info", 2, True)],
+        )
+
+    def test_loop_iterable(self):
+        """Check that a tool providing the iterable runs once, the body per item"""
+        result = self.calls("""
+            def run_listed(env, **kwargs):
+                for name in gs.read_command("g.list", type="raster").split():
+                    gs.run_command("r.colors", map=name, color="grey", env=env)
+            """)
+        self.assertEqual(
+            result["run_listed"], [("g.list", 1, True), ("r.colors", 1, False)]
+        )
+
+    def test_unknown_loops(self):
+        """Check that loops with unknown counts are marked"""
+        result = self.calls("""
+            def run_unknown(maps, env, **kwargs):
+                for name in maps:
+                    gs.run_command("r.colors", map=name, color="grey", env=env)
+                while gs.read_command("r.info", map="a", env=env):
+                    gs.mapcalc("a = a - 1", env=env)
+                [gs.run_command("r.info", map=name, env=env) for name in maps]
+            """)
+        self.assertEqual(
+            result["run_unknown"],
+            [
+                ("r.colors", 1, False),
+                ("r.info", 1, False),
+                ("r.mapcalc", 1, False),
+                ("r.info", 1, False),
+            ],
+        )
+
+    def test_comprehension(self):
+        """Check that comprehensions over known lists multiply the count"""
+        result = self.calls("""
+            def run_comprehension(env, **kwargs):
+                return [
+                    gs.raster_info(name, env=env)
+                    for name in ("a", "b")
+                    if gs.run_command("r.info", map=name, env=env)
+                ]
+            """)
+        # raster_info is not a tool call (it is not in the wrappers).
+        self.assertEqual(result["run_comprehension"], [("r.info", 2, True)])
+
+    def test_estimate(self):
+        """Check that the estimate scales with the number of cells"""
+        path = Path(self.directory.name) / "activity.py"
+        path.write_text(
+            "import grass.script as gs\n\n\n"
+            "def run_slope(env, **kwargs):\n"
+            "    for unused in range(2):\n"
+            '        gs.run_command("r.slope.aspect", elevation="a", env=env)\n'
+        )
+        costs = {"r.slope.aspect": (0.1, 1.0)}
+        report = estimate_file(path, cells=2e6, costs=costs)
+        self.assertAlmostEqual(report["seconds"], 2 * (0.1 + 2))
+        self.assertEqual(report["functions"]["run_slope"]["unknown_tools"], [])
+        self.assertFalse(report["functions"]["run_slope"]["unknown_loops"])
+
+    def test_relative_estimate(self):
+        """Check that the relative estimate does not depend on the machine speed"""
+        path = Path(self.directory.name) / "activity.py"
+        path.write_text(
+            "import grass.script as gs\n\n\n"
+            "def run_slope(env, **kwargs):\n"
+            '    gs.run_command("r.slope.aspect", elevation="a", env=env)\n'
+        )
+        costs = {"r.slope.aspect": (0.1, 1.0), "r.mapcalc": (0.05, 0.5)}
+        slower = {tool: (2 * a, 2 * b) for tool, (a, b) in costs.items()}
+        report = estimate_file(path, cells=1e6, costs=costs)
+        self.assertAlmostEqual(report["relative"], 1.1 / 0.55)
+        self.assertAlmostEqual(
+            estimate_file(path, cells=1e6, costs=slower)["relative"],
+            report["relative"],
+        )
+        self.assertTrue(over_budget(report, 1.5, relative=True))
+        self.assertFalse(over_budget(report, 1.5))
+
+    def test_change_detection(self):
+        """Check that change detection of Tangible Landscape has a cost"""
+        result = self.calls("""
+            def run_markers(scanned_elev, env, **kwargs):
+                import analyses
+
+                analyses.change_detection("scan_saved", scanned_elev, "points", env=env)
+            """)
+        self.assertEqual(
+            result["run_markers"], [("analyses.change_detection", 1, True)]
+        )
+        self.assertIn("analyses.change_detection", load_costs(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+Test for recording and reading of scan sessions
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "tools"))
+sys.path.insert(0, str(ROOT / "tools" / "fake_grass" / "etc" / "python"))
+
+import grass.script as gs  # noqa: E402
+from grass.fake.location import create_mapset, write_gisrc  # noqa: E402
+from grass.script import array as garray  # noqa: E402
+from scan_recording import (  # noqa: E402
+    DELTA,
+    KEYFRAME,
+    SessionFileError,
+    SessionReader,
+    SessionRecorder,
+)
+
+REGION = {"n": 40, "s": 0, "e": 30, "w": 0, "rows": 40, "cols": 30}
+
+
+def session_frames(count, seed=0):
+    """Return frames with small local changes and some nulls"""
+    generator = np.random.default_rng(seed)
+    frame = generator.uniform(100, 130, (40, 30))
+    frames = []
+    for number in range(count):
+        frame = frame.copy()
+        row, col = generator.integers(0, 35, 2)
+        frame[row : row + 5, col : col + 5] += generator.uniform(-2, 2)
+        frame[number % 40, 0] = np.nan
+        frames.append(frame)
+    return frames
+
+
+class TestScanRecording(unittest.TestCase):
+    """Test keyframes, deltas, random access, and the index"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "session.tlscan")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, frames, **kwargs):
+        """Record frames into the session file"""
+        with SessionRecorder(self.path, REGION, **kwargs) as recorder:
+            for number, frame in enumerate(frames):
+                recorder.add(frame, timestamp=1000 + number)
+
+    def test_frames(self):
+        """Check that frames are restored up to the quantum"""
+        frames = session_frames(25)
+        self.record(frames, quantum=0.01, keyframe_interval=10)
+        with SessionReader(self.path) as reader:
+            self.assertEqual(len(reader), 25)
+            self.assertEqual(reader.timestamps[:2], [1000, 1001])
+            kinds = reader.index["kinds"]
+            self.assertEqual(kinds[:2], [KEYFRAME, DELTA])
+            self.assertEqual(kinds[10], KEYFRAME)
+            # Random order, including going back before the last frame read
+            for number in [17, 3, 24, 0, 18, 9]:
+                frame = reader.frame(number)
+                expected = frames[number]
+                self.assertTrue(
+                    np.array_equal(np.isnan(frame), np.isnan(expected)), number
+                )
+                self.assertLessEqual(np.nanmax(np.abs(frame - expected)), 0.0051)
+            restored = list(reader)
+            self.assertEqual(len(restored), 25)
+            with self.assertRaises(IndexError):
+                reader.frame(25)
+
+    def test_threshold(self):
+        """Check that noise under the threshold is not recorded"""
+        generator = np.random.default_rng(1)
+        base = generator.uniform(100, 130, (40, 30))
+        frames = [base + generator.uniform(-0.01, 0.01, base.shape) for i in range(5)]
+        self.record(frames, quantum=0.001, threshold=0.05)
+        size = os.path.getsize(self.path)
+        with SessionReader(self.path) as reader:
+            for number, frame in enumerate(frames):
+                self.assertLessEqual(
+                    np.max(np.abs(reader.frame(number) - frame)), 0.0505
+                )
+        # Deltas without changes take almost nothing compared to the keyframe.
+        self.record(frames[:1], quantum=0.001, threshold=0.05)
+        self.assertLess(size - os.path.getsize(self.path), 200)
+
+    def test_missing_index(self):
+        """Check reading of a file which was not closed"""
+        frames = session_frames(6)
+        self.record(frames)
+        with open(self.path, "rb") as file:
+            data = file.read()
+        with open(self.path, "wb") as file:
+            file.write(data[: data.rindex(b'{"offsets"')])
+        with SessionReader(self.path) as reader:
+            self.assertEqual(len(reader), 6)
+            self.assertLessEqual(np.nanmax(np.abs(reader.frame(5) - frames[5])), 0.001)
+
+    def test_restore_without_extent(self):
+        """Check that a recording with only rows and cols uses the current region"""
+        root = Path(self.directory.name)
+        create_mapset(root / "location" / "test")
+        write_gisrc(root / "gisrc", root / "location" / "test")
+        env = os.environ.copy()
+        env["GISRC"] = str(root / "gisrc")
+        frames = session_frames(2)
+        with SessionRecorder(self.path, {"rows": 40, "cols": 30}) as recorder:
+            for frame in frames:
+                recorder.add(frame)
+        with SessionReader(self.path) as reader:
+            gs.run_command("g.region", n=40, s=0, e=30, w=0, res=1, env=env)
+            reader.restore(1, "scan", env=env)
+            scan = garray.array(env=env)
+            scan.read("scan")
+            self.assertLessEqual(np.nanmax(np.abs(scan - frames[1])), 0.001)
+            gs.run_command("g.region", n=40, s=0, e=60, w=0, res=1, env=env)
+            with self.assertRaises(ValueError):
+                reader.restore(1, "scan", env=env)
+
+    def test_not_session(self):
+        """Check that other files are refused"""
+        with open(self.path, "wb") as file:
+            file.write(b"something else")
+        with self.assertRaises(SessionFileError):
+            SessionReader(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
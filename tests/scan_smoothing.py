@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Test for smoothing of scans
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "tools"))
+sys.path.insert(0, str(ROOT / "tools" / "fake_grass" / "etc" / "python"))
+
+import grass.script as gs  # noqa: E402
+from grass.fake.location import create_mapset, write_gisrc  # noqa: E402
+from grass.script import array as garray  # noqa: E402
+from scan_smoothing import ScanSmoother, SmoothingStage  # noqa: E402
+
+
+def box_average(values, radius):
+    """Average of valid values in a window for each valid cell (slow reference)"""
+    valid = np.isfinite(values)
+    filled = np.where(valid, values, 0)
+    result = np.full(values.shape, np.nan)
+    rows, cols = values.shape
+    for row in range(rows):
+        for col in range(cols):
+            if valid[row, col]:
+                window = np.s_[
+                    max(row - radius, 0) : row + radius + 1,
+                    max(col - radius, 0) : col + radius + 1,
+                ]
+                result[row, col] = filled[window].sum() / valid[window].sum()
+    return result
+
+
+class TestScanSmoothing(unittest.TestCase):
+    """Test temporal and spatial smoothing and hole interpolation"""
+
+    def test_temporal_average(self):
+        """Check that only the last scans are averaged and nulls are ignored"""
+        smoother = ScanSmoother(numscans=3)
+        for value in range(5):
+            result = smoother.add(np.full((4, 4), float(value)))
+        np.testing.assert_array_equal(result, 3)
+        smoother = ScanSmoother(numscans=2)
+        first = smoother.add(np.array([[np.nan, 1.0]]))
+        self.assertTrue(np.isnan(first[0, 0]))
+        np.testing.assert_array_equal(smoother.add(np.array([[2.0, 3.0]])), [[2, 2]])
+
+    def test_spatial_smoothing(self):
+        """Check smoothing against a direct computation"""
+        scan = np.random.default_rng(1).normal(size=(20, 30))
+        scan[5:9, 5:9] = np.nan
+        result = ScanSmoother(smooth=2).add(scan)
+        np.testing.assert_allclose(result, box_average(scan, 2), atol=1e-5)
+
+    def test_interpolation(self):
+        """Check that holes are filled and valid cells stay"""
+        scan = np.ones((30, 30))
+        scan[10:20, 10:20] = np.nan
+        result = ScanSmoother(interpolate=True).add(scan)
+        np.testing.assert_allclose(result, 1)
+        empty = ScanSmoother(interpolate=True).add(np.full((3, 3), np.nan))
+        self.assertTrue(np.isnan(empty).all())
+
+    def test_buffers_reused(self):
+        """Check that the buffers are allocated only for the first scan"""
+        smoother = ScanSmoother(numscans=2, smooth=1, interpolate=True)
+        output = smoother.add(np.zeros((10, 10)))
+        buffer = smoother._buffer
+        self.assertIs(smoother.add(np.ones((10, 10))), output)
+        self.assertIs(smoother._buffer, buffer)
+        smoother.add(np.ones((5, 5)))
+        self.assertEqual(smoother._buffer.shape, (2, 5, 5))
+
+    def test_stage_array_reused(self):
+        """Check that the stage allocates the raster array once per region"""
+        with tempfile.TemporaryDirectory() as directory:
+            root = Path(directory)
+            create_mapset(root / "location" / "test")
+            write_gisrc(root / "gisrc", root / "location" / "test")
+            env = os.environ.copy()
+            env["GISRC"] = str(root / "gisrc")
+            env["GRASS_OVERWRITE"] = "1"
+            stage = SmoothingStage({"numscans": 2})
+            with mock.patch.object(garray, "array", wraps=garray.array) as array:
+                for size in [10, 10, 10, 5]:
+                    gs.run_command("g.region", n=size, s=0, e=size, w=0, res=1, env=env)
+                    gs.mapcalc("scan = row()", env=env)
+                    stage("scan", env=env)
+            self.assertEqual(array.call_count, 2)
+            scan = garray.array(env=env)
+            scan.read("scan")
+            # The smoother starts again with scans in the new region.
+            np.testing.assert_allclose(scan[:, 0], np.arange(1, 6))
+
+
+if __name__ == "__main__":
+    unittest.main()
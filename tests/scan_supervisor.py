@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""
+Test for running activity functions for each scan within a time limit
+"""
+
+import os
+import subprocess
+import sys
+import time
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from scan_supervisor import DeadlineExceeded, ScanSupervisor  # noqa: E402
+
+
+def tool_module():
+    """Return module with Popen standing for grass.script.core"""
+    module = types.ModuleType("core")
+    module.Popen = subprocess.Popen
+    return module
+
+
+class TestScanSupervisor(unittest.TestCase):
+    """Test deadlines, skipping, and recovery of supervised functions"""
+
+    def setUp(self):
+        self.module = tool_module()
+        self.duration = 0
+
+    def run_function(self, **kwargs):
+        """Function standing for a run_ function taking self.duration seconds"""
+        time.sleep(self.duration)
+
+    def statuses(self, supervisor, scans):
+        """Run the function for a number of scans and return their statuses"""
+        return [supervisor.run(self.run_function).status for unused in range(scans)]
+
+    def test_skipping_after_miss(self):
+        """Check that a function missing the deadline runs every 2nd, 4th scan"""
+        supervisor = ScanSupervisor(deadline=0.05, max_interval=4, module=self.module)
+        self.duration = 0.07
+        self.assertEqual(
+            self.statuses(supervisor, 8),
+            [
+                "missed",
+                "skipped",
+                "missed",
+                "skipped",
+                "skipped",
+                "skipped",
+                "missed",
+                "skipped",
+            ],
+        )
+        statistics = next(iter(supervisor.statistics().values()))
+        self.assertEqual(statistics["interval"], 4)
+        self.assertEqual(statistics["misses"], 3)
+        self.assertEqual(statistics["skips"], 5)
+
+    def test_minimum_interval(self):
+        """Check that a fast function runs for every scan"""
+        supervisor = ScanSupervisor(deadline=1, recovery_runs=1, module=self.module)
+        self.assertEqual(self.statuses(supervisor, 4), ["ok"] * 4)
+        statistics = next(iter(supervisor.statistics().values()))
+        self.assertEqual(statistics["interval"], 1)
+        self.assertEqual(statistics["skips"], 0)
+
+    def test_recovery_after_timeout(self):
+        """Check that the interval is halved after runs fitting into the deadline"""
+        supervisor = ScanSupervisor(
+            deadline=0.05, recovery_runs=2, headroom=0.5, module=self.module
+        )
+        self.duration = 0.07
+        self.assertEqual(
+            self.statuses(supervisor, 4), ["missed", "skipped", "missed", "skipped"]
+        )
+        self.duration = 0
+        # Interval 4: two fitting runs halve it to 2, two more to 1.
+        self.assertEqual(
+            self.statuses(supervisor, 11),
+            ["skipped", "skipped", "ok"]
+            + ["skipped", "skipped", "skipped", "ok"]
+            + ["skipped", "ok", "skipped", "ok"],
+        )
+        self.assertEqual(self.statuses(supervisor, 3), ["ok"] * 3)
+
+    def test_tool_killed(self):
+        """Check that a running tool is killed at the deadline"""
+        supervisor = ScanSupervisor(deadline=0.2, module=self.module)
+        started = []
+
+        def run_slow_tool():
+            self.module.Popen(["true"]).wait()
+            process = self.module.Popen(["sleep", "10"])
+            started.append(process)
+            process.wait()
+            self.module.Popen(["true"]).wait()
+
+        start = time.perf_counter()
+        record = supervisor.run(run_slow_tool)
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(record.status, "missed")
+        self.assertFalse(record.updated)
+        # The first tool finished before the deadline.
+        self.assertTrue(record.partial)
+        self.assertIsInstance(record.error, DeadlineExceeded)
+        self.assertEqual(started[0].returncode, -9)
+
+    def test_error(self):
+        """Check that an exception is recorded and does not stop the scans"""
+        supervisor = ScanSupervisor(deadline=1, module=self.module)
+
+        def run_failing():
+            raise ValueError("Failure")
+
+        record = supervisor.run(run_failing)
+        self.assertEqual(record.status, "error")
+        self.assertIsInstance(record.error, ValueError)
+        self.assertFalse(record.partial)
+        self.assertEqual(supervisor.run(run_failing).status, "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
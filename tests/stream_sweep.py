@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+Test for stream extraction with many thresholds
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from incremental_hydrology import IncrementalHydrology  # noqa: E402
+from stream_sweep import StreamSweep, receivers_from_drainage  # noqa: E402
+from synthetic_terrain import generate  # noqa: E402
+
+
+def cell(row, col):
+    """Return flat index of a cell in the 7x7 test grid"""
+    return row * 7 + col
+
+
+def valley_receivers():
+    """Return receivers of two side valleys joining the main one going south
+
+    Main valley is in column 3, side valleys in rows 1 and 3 come from east
+    and west.
+    """
+    receiver = np.full(49, -1)
+    for row in range(6):
+        receiver[cell(row, 3)] = cell(row + 1, 3)
+    for col in range(4, 7):
+        receiver[cell(1, col)] = cell(1, col - 1)
+    for col in range(3):
+        receiver[cell(3, col)] = cell(3, col + 1)
+    return receiver
+
+
+def upstream_counts(receiver):
+    """Return number of cells draining through each cell"""
+    counts = np.zeros(len(receiver))
+    for start in range(len(receiver)):
+        current = start
+        while current >= 0:
+            counts[current] += 1
+            current = receiver[current]
+    return counts
+
+
+class TestStreamSweep(unittest.TestCase):
+    """Test thresholds, levels, and segments"""
+
+    def setUp(self):
+        receiver = valley_receivers()
+        accumulation = upstream_counts(receiver)
+        # Cells outside the valleys are null.
+        valleys = (receiver >= 0) | (
+            np.bincount(receiver[receiver >= 0], minlength=49) > 0
+        )
+        accumulation[~valleys] = np.nan
+        accumulation = accumulation.reshape(7, 7)
+        self.sweep = StreamSweep(accumulation, receiver)
+
+    def test_streams(self):
+        """Check that thresholds match accumulation and levels"""
+        elevation = generate(80, seed=2)
+        hydrology = IncrementalHydrology(stream_threshold=20)
+        hydrology.compute(elevation)
+        sweep = StreamSweep.from_hydrology(hydrology)
+        self.assertTrue(np.array_equal(sweep.streams(20).ravel(), hydrology.streams))
+        levels = sweep.levels([50, 5, 20])
+        for level, threshold in enumerate([5, 20, 50], start=1):
+            self.assertTrue(np.array_equal(levels >= level, sweep.streams(threshold)))
+
+    def test_segments(self):
+        """Check lines from heads to junctions and to the outlet"""
+        lines = sorted(line.tolist() for line in self.sweep.segments(1))
+        self.assertEqual(
+            lines,
+            [
+                [cell(0, 3), cell(1, 3)],
+                [cell(1, 3), cell(2, 3), cell(3, 3)],
+                [cell(1, 6), cell(1, 5), cell(1, 4), cell(1, 3)],
+                [cell(3, 0), cell(3, 1), cell(3, 2), cell(3, 3)],
+                [cell(3, 3), cell(4, 3), cell(5, 3), cell(6, 3)],
+            ],
+        )
+        # Cells of lines (without shared ends) are all stream cells.
+        streams = np.flatnonzero(self.sweep.streams(1))
+        self.assertEqual(
+            sorted({item for line in lines for item in line}), streams.tolist()
+        )
+        # Without heads of the side valleys, the east one continues the main one.
+        lines = sorted(line.tolist() for line in self.sweep.segments(2))
+        self.assertEqual(
+            lines,
+            [
+                [cell(1, 5), cell(1, 4), cell(1, 3), cell(2, 3), cell(3, 3)],
+                [cell(3, 1), cell(3, 2), cell(3, 3)],
+                [cell(3, 3), cell(4, 3), cell(5, 3), cell(6, 3)],
+            ],
+        )
+
+    def test_segments_follow_directions(self):
+        """Check that lines follow directions when accumulation does not grow"""
+        # Multiple flow directions split the flow, so accumulation can drop
+        # and tie downstream along the direction of the (dominant) flow.
+        accumulation = np.array([[5.0, 4.0, 4.0, 2.5, 3.0]])
+        receiver = np.array([1, 2, 3, 4, -1])
+        lines = StreamSweep(accumulation, receiver).segments(1)
+        self.assertEqual([line.tolist() for line in lines], [[0, 1, 2, 3, 4]])
+
+    def test_drainage(self):
+        """Check conversion of r.watershed drainage to receivers"""
+        hydrology = IncrementalHydrology()
+        hydrology.compute(generate(30, seed=4))
+        drainage = hydrology.drainage().astype(float)
+        self.assertTrue(
+            np.array_equal(receivers_from_drainage(drainage), hydrology.receiver)
+        )
+        drainage[0, 0] = -2
+        drainage[0, 1] = np.nan
+        # North of the first row is outside
+        drainage[0, 2] = 2
+        receiver = receivers_from_drainage(drainage)
+        self.assertEqual(receiver[:3].tolist(), [-1, -1, -1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Test for synthetic terrain
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from synthetic_terrain import diffuse, generate, upsample  # noqa: E402
+
+
+class TestSyntheticTerrain(unittest.TestCase):
+    """Test determinism, shape, and features of generated surfaces"""
+
+    def test_deterministic(self):
+        """Check that the seed gives the same surface"""
+        first = generate(120, 90, seed=3)
+        self.assertEqual(first.shape, (120, 90))
+        self.assertEqual(first.dtype, np.float32)
+        self.assertTrue(np.array_equal(first, generate(120, 90, seed=3)))
+        self.assertFalse(np.array_equal(first, generate(120, 90, seed=4)))
+
+    def test_values(self):
+        """Check range, flat floor, and roughness"""
+        surface = generate(200, seed=1, flat=0.2, minimum=50, relief=10)
+        self.assertTrue(np.isfinite(surface).all())
+        self.assertAlmostEqual(float(surface.min()), 50, places=4)
+        self.assertAlmostEqual(float(surface.max()), 60, places=4)
+        # Diffusion changes the floor a little, but a flat area stays.
+        floor = np.mean(surface < 50 + 0.05)
+        self.assertGreater(floor, 0.1)
+        # Neighboring cells are similar (surface is not noise).
+        steps = np.abs(np.diff(surface, axis=1)).mean()
+        self.assertLess(steps, 0.5)
+
+    def test_small(self):
+        """Check tiny surfaces"""
+        for rows, cols in [(1, 1), (2, 3), (5, 1)]:
+            surface = generate(rows, cols, seed=0)
+            self.assertEqual(surface.shape, (rows, cols))
+            self.assertTrue(np.isfinite(surface).all())
+
+    def test_upsample(self):
+        """Check that grid values are kept at corners and planes stay planes"""
+        grid = np.array([[0, 1], [2, 3]], dtype=np.float32)
+        result = upsample(grid, 5, 7)
+        self.assertEqual(result.shape, (5, 7))
+        self.assertEqual(
+            [result[0, 0], result[0, -1], result[-1, 0], result[-1, -1]], [0, 1, 2, 3]
+        )
+        self.assertTrue(np.all(np.diff(result, axis=0) >= 0))
+
+    def test_diffuse(self):
+        """Check that diffusion keeps edges and lowers peaks"""
+        surface = np.zeros((5, 5), dtype=np.float32)
+        surface[2, 2] = 1
+        surface[0, 0] = 1
+        diffuse(surface, 1)
+        self.assertAlmostEqual(float(surface[2, 2]), 0.2)
+        self.assertAlmostEqual(float(surface[1, 2]), 0.2)
+        self.assertEqual(surface[0, 0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
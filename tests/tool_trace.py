@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Test for tracing of tool calls
+"""
+
+import csv
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from tool_trace import Tracer  # noqa: E402
+
+
+def fake_grass_script():
+    """Return module with the traced functions doing nothing"""
+    module = types.SimpleNamespace()
+    module.run_command = lambda *args, **kwargs: 0
+    module.read_command = lambda *args, **kwargs: "north=10\nsouth=0\n"
+    module.write_command = lambda *args, **kwargs: 0
+    module.parse_command = lambda *args, **kwargs: {"north": "10"}
+    module.mapcalc = lambda *args, **kwargs: None
+    module.raster_what = lambda *args, **kwargs: [{}]
+    return module
+
+
+class TestToolTrace(unittest.TestCase):
+    """Test recording of calls under functions and scans"""
+
+    def setUp(self):
+        self.gs = fake_grass_script()
+        gs = self.gs
+
+        def run_ponds(scanned_elev, env, **kwargs):
+            gs.mapcalc(f"ponds = {scanned_elev} > 1", env=env)
+            gs.write_command("r.colors", map="ponds", rules="-", stdin="0% aqua")
+
+        def run_info(scanned_elev, env, **kwargs):
+            gs.read_command("r.info", map=scanned_elev, flags="g", env=env)
+
+        self.activity = types.SimpleNamespace(run_ponds=run_ponds, run_info=run_info)
+        self.tracer = Tracer()
+        self.tracer.install(self.gs)
+        self.tracer.trace_module(self.activity)
+
+    def run_scans(self, scans):
+        for unused in range(scans):
+            self.tracer.next_scan()
+            self.gs.run_command("g.region", raster="elevation", env={})
+            self.activity.run_ponds(scanned_elev="scan", env={})
+            self.activity.run_info(scanned_elev="scan", env={})
+
+    def test_calls(self):
+        """Check that calls have tools, parameters, functions, and sizes"""
+        self.run_scans(2)
+        calls = self.tracer.calls
+        self.assertEqual(len(calls), 8)
+        self.assertEqual(
+            [(call.tool, call.function, call.scan) for call in calls[:4]],
+            [
+                ("g.region", None, 0),
+                ("r.mapcalc", "run_ponds", 0),
+                ("r.colors", "run_ponds", 0),
+                ("r.info", "run_info", 0),
+            ],
+        )
+        self.assertEqual(calls[1].parameters, {"expression": "ponds = scan > 1"})
+        self.assertEqual(calls[2].input_size, len("0% aqua"))
+        self.assertEqual(calls[3].output_size, len("north=10\nsouth=0\n"))
+        self.assertEqual(calls[3].parameters, {"map": "scan", "flags": "g"})
+        self.tracer.uninstall()
+        self.gs.run_command("g.region")
+        self.assertEqual(len(self.tracer.calls), 8)
+
+    def test_outputs(self):
+        """Check Chrome trace events and CSV summary"""
+        self.run_scans(2)
+        trace = self.tracer.chrome_trace()
+        categories = [event["cat"] for event in trace["traceEvents"]]
+        self.assertEqual(categories.count("scan"), 2)
+        self.assertEqual(categories.count("function"), 4)
+        self.assertEqual(categories.count("tool"), 8)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = Path(directory) / "summary.csv"
+            self.tracer.write_csv(filename)
+            with open(filename) as file:
+                rows = list(csv.DictReader(file))
+            json.dumps(trace)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row["calls"] for row in rows}, {"2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
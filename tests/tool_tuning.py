@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+Test for tuning of tool resource parameters
+"""
+
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+import tool_tuning  # noqa: E402
+from tool_tuning import Tuner, region_cells, tune  # noqa: E402
+
+WATERSHED = {"memory", "m", "elevation", "accumulation"}
+SUN = {"nprocs", "elevation", "glob_rad"}
+
+
+class TestToolTuning(unittest.TestCase):
+    """Test choice of parameters and injection into calls"""
+
+    def test_region_cells(self):
+        """Check cells from region file and GRASS_REGION"""
+        self.assertEqual(region_cells("north: 10\nrows: 20\ncols: 30\n"), 600)
+        self.assertEqual(region_cells("north:10;rows:20;cols:30;"), 600)
+        self.assertIsNone(region_cells(""))
+
+    def test_memory(self):
+        """Check memory for small and large regions and the segmented mode"""
+        small, flags = tune("r.watershed", {}, "a", 1000, 8000, 4, WATERSHED)
+        self.assertEqual((small, flags), ({"memory": 300}, "a"))
+        large, flags = tune("r.watershed", {}, "", 10**8, 16000, 4, WATERSHED)
+        # 32 bytes per cell with 20 % extra
+        self.assertEqual(large["memory"], 3662)
+        self.assertEqual(flags, "")
+        huge, flags = tune("r.watershed", {}, "", 10**9, 16000, 4, WATERSHED)
+        self.assertEqual(huge["memory"], 8000)
+        self.assertEqual(flags, "m")
+        # Values set by the activity stay.
+        kept, flags = tune("r.watershed", {"memory": 50}, "", 10**9, 16000, 4, {})
+        self.assertEqual(kept, {"memory": 50})
+
+    def test_nprocs(self):
+        """Check cores by region size and unsupported parameters"""
+        small, unused = tune("r.sun", {}, "", 10_000, 8000, 8, SUN)
+        self.assertEqual(small["nprocs"], 1)
+        large, unused = tune("r.sun", {}, "", 4_000_000, 8000, 8, SUN)
+        self.assertEqual(large["nprocs"], 8)
+        old, unused = tune("r.sun", {}, "", 4_000_000, 8000, 8, {"elevation"})
+        self.assertNotIn("nprocs", old)
+        other, unused = tune("r.mapcalc", {"expression": "a=1"}, "", 10**6, 1, 1, SUN)
+        self.assertEqual(other, {"expression": "a=1"})
+
+    def test_install(self):
+        """Check that calls through start_command are tuned"""
+        calls = []
+        module = types.SimpleNamespace(
+            start_command=lambda prog, flags="", **kwargs: calls.append(
+                (prog, flags, kwargs)
+            )
+        )
+        tool_tuning._supported["r.sun"] = SUN
+        tuner = Tuner(memory=8000, cpus=8)
+        tuner.region_cells = lambda env: 4_000_000
+        tuner.install(module)
+        tuner.install(module)
+        module.start_command("r.sun", elevation="dem", env={})
+        module.start_command("g.region", flags="p")
+        self.assertEqual(
+            calls[0], ("r.sun", "", {"elevation": "dem", "env": {}, "nprocs": 8})
+        )
+        self.assertEqual(calls[1], ("g.region", "p", {}))
+        self.assertEqual(tuner.tuned, [("r.sun", {"nprocs": 8})])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+"""Catalog of activities shared by the tests and the renderer
+
+The activities directory is scanned once and each JSON configuration is
+parsed and validated once. Parsed files are cached in memory with their
+modification time and size, so asking for the catalog again only reads
+files which changed since the last time.
+"""
+
+import json
+import os
+from pathlib import Path
+
+# Items which need to be non-empty strings in each task.
+TEXT_ITEMS = ["title", "analyses", "author", "instructions"]
+
+
+class ActivityConfigError(ValueError):
+    """Raised when an invalid configuration is used"""
+
+
+class Task:
+    """One task from an activity configuration
+
+    The *python_file* is the path to the analyses file resolved relative
+    to the configuration file. The original dictionary is in *data*.
+    """
+
+    def __init__(self, config_file, index, data):
+        self.config_file = Path(config_file)
+        self.index = index
+        self.data = data
+        self.title = data["title"]
+        self.author = data["author"]
+        self.instructions = data["instructions"]
+        self.analyses = data["analyses"]
+        self.python_file = resolve_path(self.analyses, self.config_file)
+        self.layers = data["layers"]
+        self.base = data.get("base")
+        self.scanning_params = data.get("scanning_params", {})
+        self.calibrate = data.get("calibrate", False)
+
+    @property
+    def name(self):
+        """Name of the task (file name without extension and task number if needed)"""
+        if self.index:
+            return f"{self.config_file.stem}_{self.index}"
+        return self.config_file.stem
+
+    def __repr__(self):
+        return f"Task({str(self.config_file)!r}, {self.index})"
+
+
+class ActivityConfig:
+    """One JSON configuration file with its tasks or problems found in it"""
+
+    def __init__(self, path, content=None, parse_error=None):
+        self.path = Path(path)
+        self.content = content
+        self.parse_error = parse_error
+        if parse_error:
+            self.errors = [
+                f"File {self.path} is not properly formatted JSON: {parse_error}"
+            ]
+        else:
+            self.errors = validate(content, self.path)
+        self.tasks = []
+        if not self.errors:
+            self.tasks = [
+                Task(self.path, index, task)
+                for index, task in enumerate(content["tasks"])
+            ]
+
+    @property
+    def is_main_config(self):
+        """True for the main configuration which includes other files"""
+        return isinstance(self.content, dict) and "includeTasks" in self.content
+
+    def check(self):
+        """Raise ActivityConfigError if the configuration is not valid"""
+        if self.errors:
+            raise ActivityConfigError("\n".join(self.errors))
+        return self
+
+
+def resolve_path(path, root_file):
+    """Creates an absolute path from a path relative to root_file.
+
+    Returns path as is if the input path is absolute.
+    """
+    path = Path(path)
+    if path.is_absolute():
+        return path
+    base = Path(root_file).parent
+    path = base / path
+    return path.resolve()
+
+
+def validate(content, path):
+    """Return list of problems in the content of a configuration file"""
+    # The checks follow the order in which a contributor would fix them,
+    # so we stop at problems which make further checks impossible.
+    filename = Path(path).name
+    if not isinstance(content, dict) or "tasks" not in content:
+        return [f"tasks key not in {path} file"]
+    tasks = content["tasks"]
+    if not isinstance(tasks, list):
+        return [f"tasks must be a list (of tasks), not {type(tasks)}"]
+    if not tasks:
+        return ["tasks list must contain at least one item (task)"]
+    errors = []
+    for task in tasks:
+        if not isinstance(task, dict):
+            errors.append(f"task must be a dictionary, not {type(task)}")
+            continue
+        if not task:
+            errors.append("task must be a non-empty dictionary")
+            continue
+        if "layers" not in task:
+            errors.append(f"layers key not in a task in {path} file")
+        for item_key in TEXT_ITEMS:
+            if item_key not in task:
+                errors.append(f"task needs to have {item_key} (fix {filename})")
+                continue
+            item = task[item_key]
+            if not isinstance(item, str):
+                errors.append(
+                    f"{item_key} must be str (string of characters), "
+                    f"not {type(item)} (fix {filename})"
+                )
+            elif not item:
+                errors.append(f"{item_key} must not be empty (fix {filename})")
+        layers = task.get("layers", [])
+        if not isinstance(layers, list):
+            errors.append(f"layers must be a list (of layers), not {type(layers)}")
+            continue
+        if "layers" in task and not layers:
+            errors.append("layers list must contain at least one item (layer)")
+        for layer in layers:
+            if not isinstance(layer, list):
+                errors.append(f"layer must be a list (a command), not {type(layer)}")
+            elif not layer:
+                errors.append("layer must contain at least one item (module name)")
+    return errors
+
+
+class Catalog:
+    """Configurations and Python files in an activities directory"""
+
+    def __init__(self, directory, configs, python_files):
+        self.directory = Path(directory)
+        self.configs = configs
+        self.python_files = python_files
+
+    def config(self, filename):
+        """Return configuration by its file name"""
+        for config in self.configs:
+            if config.path.name == filename:
+                return config
+        raise KeyError(filename)
+
+    def activity_configs(self):
+        """Return configurations except the main one"""
+        return [config for config in self.configs if not config.is_main_config]
+
+    def tasks(self):
+        """Return tasks from all valid activity configurations"""
+        return [task for config in self.activity_configs() for task in config.tasks]
+
+    def referenced_python_files(self):
+        """Return names of analyses files referenced by any configuration"""
+        names = set()
+        for config in self.configs:
+            for task in config.tasks:
+                names.add(task.analyses)
+        return names
+
+
+# Parsed files by path with (modification time, size) when they were parsed.
+_file_cache = {}
+# Last catalog for each directory with stamps of all the files in it.
+_catalog_cache = {}
+
+
+def _stamp(entry):
+    stat = entry.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_config(path, stamp):
+    cached = _file_cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path) as file:
+            config = ActivityConfig(path, content=json.load(file))
+    except json.JSONDecodeError as error:
+        config = ActivityConfig(path, parse_error=error)
+    _file_cache[path] = (stamp, config)
+    return config
+
+
+def load_catalog(directory):
+    """Return Catalog for a directory (re-reading only changed files)"""
+    directory = Path(directory).resolve()
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file()),
+        key=lambda entry: entry.name,
+    )
+    stamps = tuple((entry.name, _stamp(entry)) for entry in entries)
+    cached = _catalog_cache.get(directory)
+    if cached and cached[0] == stamps:
+        return cached[1]
+    configs = []
+    python_files = []
+    for entry, (unused, stamp) in zip(entries, stamps):
+        if entry.name.endswith(".json"):
+            configs.append(_load_config(Path(entry.path), stamp))
+        elif entry.name.endswith(".py"):
+            python_files.append(entry.name)
+    catalog = Catalog(directory, configs, python_files)
+    _catalog_cache[directory] = (stamps, catalog)
+    return catalog
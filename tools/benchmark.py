@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+"""Benchmark run_ functions of activities and detect regressions
+
+Each activity runs in its own process in the current GRASS session: its
+main() function is called several times (the first *warmup* runs are not
+measured) and the time of each run_ function in each run is recorded.
+For each function and for the whole scan (all run_ functions of one run),
+the times are summarized by median, mean, standard deviation, minimum,
+and median absolute deviation.
+
+The results are stored in a baseline JSON file. On later runs, the medians
+are compared with the baseline and a function is a regression when its median
+is slower by more than the largest of:
+
+- a relative threshold (share of the baseline median),
+- a multiple of the noise (robust standard deviation from the median absolute
+  deviation of the baseline and current times),
+- an absolute threshold (seconds).
+
+Create the baseline and check against it later in a GRASS session with the NC
+sample data:
+
+    grass nc_spm_08_grass7/user1 --exec python3 tools/benchmark.py --update
+    grass nc_spm_08_grass7/user1 --exec python3 tools/benchmark.py
+
+The baseline is only meaningful on the machine where it was created, so
+the machine is recorded in the file and a warning is printed when it differs.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from tool_trace import load_activity
+
+# Version of the baseline file format
+BASELINE_VERSION = 1
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+DEFAULT_ACTIVITIES = os.path.join(os.path.dirname(__file__), "..", "activities")
+
+# Name of the entry for all run_ functions of one run of main()
+SCAN = "(scan)"
+# Scale of median absolute deviation to standard deviation for normal data
+MAD_SCALE = 1.4826
+
+
+class BaselineError(Exception):
+    """Raised when the baseline file cannot be used"""
+
+
+def summarize(samples):
+    """Return statistical summary of times (seconds)"""
+    median = statistics.median(samples)
+    return {
+        "samples": list(samples),
+        "median": median,
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "mad": statistics.median(abs(sample - median) for sample in samples),
+    }
+
+
+def noise(summary):
+    """Return robust estimate of standard deviation of times"""
+    return summary["mad"] * MAD_SCALE
+
+
+def measure_module(module, warmup=1, repeats=5):
+    """Run main() of an activity module and return times of its run_ functions
+
+    Returns dictionary with a list of times for each function (one for each
+    measured run, zero when it was not called in that run) including
+    the total of all functions in the SCAN entry.
+    """
+    current = {}
+
+    def timed(name, function):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                current[name] = current.get(name, 0) + time.perf_counter() - start
+
+        return wrapper
+
+    names = []
+    for name in dir(module):
+        function = getattr(module, name)
+        if name.startswith("run_") and callable(function):
+            setattr(module, name, timed(name, function))
+            names.append(name)
+
+    times = {name: [] for name in names + [SCAN]}
+    for run in range(warmup + repeats):
+        current.clear()
+        module.main()
+        if run < warmup:
+            continue
+        for name in names:
+            times[name].append(current.get(name, 0))
+        times[SCAN].append(sum(current.values()))
+    return times
+
+
+def measure_file(path, warmup, repeats):
+    """Measure an activity in a separate process and return function summaries"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "times.json")
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--measure",
+                path,
+                "--output",
+                output,
+                "--warmup",
+                str(warmup),
+                "--repeats",
+                str(repeats),
+            ],
+            check=True,
+        )
+        with open(output) as file:
+            times = json.load(file)
+    return {name: summarize(samples) for name, samples in times.items()}
+
+
+def machine():
+    """Return description of this machine for the baseline"""
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def run_benchmarks(files, warmup, repeats):
+    """Measure activity files and return results in the baseline format
+
+    Files which fail are recorded with their error and without functions.
+    """
+    activities = {}
+    for path in files:
+        name = os.path.basename(path)
+        print(f"Benchmarking {name}", file=sys.stderr)
+        try:
+            activities[name] = {"functions": measure_file(path, warmup, repeats)}
+        except (OSError, subprocess.CalledProcessError, ValueError) as error:
+            activities[name] = {"functions": {}, "error": str(error)}
+    return {
+        "version": BASELINE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine(),
+        "settings": {"warmup": warmup, "repeats": repeats},
+        "activities": activities,
+    }
+
+
+def load_baseline(path):
+    """Read baseline file and check its version"""
+    try:
+        with open(path) as file:
+            baseline = json.load(file)
+    except (OSError, ValueError) as error:
+        raise BaselineError(f"Cannot read baseline {path}: {error}") from error
+    if baseline.get("version") != BASELINE_VERSION:
+        raise BaselineError(
+            f"Baseline {path} has version {baseline.get('version')}, "
+            f"but version {BASELINE_VERSION} is needed (create it again with --update)"
+        )
+    return baseline
+
+
+def save_baseline(path, results):
+    """Write results as the baseline"""
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+class Comparison:
+    """Change of one function against the baseline"""
+
+    def __init__(self, activity, function, baseline, current, threshold):
+        self.activity = activity
+        self.function = function
+        self.baseline = baseline["median"]
+        self.current = current["median"]
+        self.threshold = threshold
+
+    @property
+    def change(self):
+        """Difference of medians (seconds, positive when slower)"""
+        return self.current - self.baseline
+
+    @property
+    def ratio(self):
+        """Current median relative to the baseline one"""
+        return self.current / self.baseline if self.baseline else float("inf")
+
+    @property
+    def regression(self):
+        """True when slower by more than the threshold"""
+        return self.change > self.threshold
+
+
+def compare(
+    baseline, results, relative=0.2, noise_factor=3.0, minimum=0.01, machine_check=True
+):
+    """Compare results with baseline and return comparisons and notes
+
+    The notes describe what could not be compared (new or missing activities
+    and functions, failed activities, different machine).
+    """
+    comparisons = []
+    notes = []
+    if machine_check and baseline.get("machine") != results.get("machine"):
+        notes.append("Baseline was created on a different machine")
+    old_activities = baseline["activities"]
+    new_activities = results["activities"]
+    for activity, new in new_activities.items():
+        if new.get("error"):
+            notes.append(f"{activity}: failed ({new['error']})")
+            continue
+        if activity not in old_activities:
+            notes.append(f"{activity}: not in baseline")
+            continue
+        old_functions = old_activities[activity]["functions"]
+        for function, current in new["functions"].items():
+            if function not in old_functions:
+                notes.append(f"{activity}: {function} not in baseline")
+                continue
+            old = old_functions[function]
+            threshold = max(
+                relative * old["median"],
+                noise_factor * (noise(old) ** 2 + noise(current) ** 2) ** 0.5,
+                minimum,
+            )
+            comparisons.append(Comparison(activity, function, old, current, threshold))
+        for function in old_functions:
+            if function not in new["functions"]:
+                notes.append(f"{activity}: {function} not measured")
+    for activity in old_activities:
+        if activity not in new_activities:
+            notes.append(f"{activity}: not measured")
+    return comparisons, notes
+
+
+def format_comparisons(comparisons):
+    """Return table of comparisons with regressions marked"""
+    lines = [
+        f"{'activity':<24} {'function':<30} {'baseline [s]':>12} "
+        f"{'current [s]':>11} {'ratio':>6} {'limit [s]':>9}"
+    ]
+    for item in comparisons:
+        mark = "  REGRESSION" if item.regression else ""
+        lines.append(
+            f"{item.activity:<24} {item.function:<30} {item.baseline:>12.3f} "
+            f"{item.current:>11.3f} {item.ratio:>6.2f} {item.threshold:>9.3f}{mark}"
+        )
+    return "\n".join(lines)
+
+
+def activity_files(paths):
+    """Return activity files from given files and directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith(".py")
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    """Run benchmarks and compare them with the baseline or update it"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[DEFAULT_ACTIVITIES],
+        help="activity files or directories (default: all activities)",
+    )
+    parser.add_argument("--warmup", type=int, default=1, help="runs not measured")
+    parser.add_argument("--repeats", type=int, default=5, help="measured runs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file")
+    parser.add_argument(
+        "--update", action="store_true", help="write results as the baseline"
+    )
+    parser.add_argument(
+        "--relative",
+        type=float,
+        default=0.2,
+        help="slowdown allowed as a share of the baseline median",
+    )
+    parser.add_argument(
+        "--noise-factor",
+        type=float,
+        default=3.0,
+        help="slowdown allowed in multiples of the noise",
+    )
+    parser.add_argument(
+        "--minimum", type=float, default=0.01, help="slowdown always allowed (s)"
+    )
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        times = measure_module(load_activity(args.measure), args.warmup, args.repeats)
+        with open(args.output, "w") as file:
+            json.dump(times, file)
+        return 0
+
+    if args.repeats < 2:
+        parser.error("--repeats needs to be at least 2 for the noise estimate")
+    baseline = None
+    if not args.update:
+        try:
+            baseline = load_baseline(args.baseline)
+        except BaselineError as error:
+            print(f"{error} (use --update to create it)", file=sys.stderr)
+            return 1
+    results = run_benchmarks(
+        activity_files(args.paths), warmup=args.warmup, repeats=args.repeats
+    )
+    if args.json:
+        save_baseline(args.json, results)
+    failed = [name for name, item in results["activities"].items() if "error" in item]
+    if args.update:
+        save_baseline(args.baseline, results)
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 1 if failed else 0
+
+    comparisons, notes = compare(
+        baseline,
+        results,
+        relative=args.relative,
+        noise_factor=args.noise_factor,
+        minimum=args.minimum,
+    )
+    print(format_comparisons(comparisons))
+    for note in notes:
+        print(f"Note: {note}", file=sys.stderr)
+    regressions = [item for item in comparisons if item.regression]
+    for item in regressions:
+        print(
+            f"Regression: {item.activity} {item.function} takes {item.ratio:.2f} "
+            f"times as long as in the baseline "
+            f"({item.baseline:.3f} s -> {item.current:.3f} s)",
+            file=sys.stderr,
+        )
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Detect markers placed on the sand by comparing scans as arrays
+
+This does what analyses.change_detection from Tangible Landscape does
+(r.mapcalc, r.clump, r.stats, and writing a vector map), but with NumPy
+and without any tool:
+
+1. cells where the new scan is higher than the saved one by more than
+   the lower and less than the upper height threshold are selected,
+2. connected groups of the selected cells are labeled,
+3. groups with more cells than the lower and less than the upper cells
+   threshold are kept, the largest ones first, at most *max_detected*,
+4. centroids of the groups are returned as an (n, 2) array of x, y
+   coordinates.
+
+Writing the points into a vector map is optional.
+"""
+
+import numpy as np
+
+
+def label_components(mask, diagonal=False):
+    """Label connected groups of True cells
+
+    Returns array of labels (0 for False cells, 1 to n for groups)
+    and the number of groups. Cells are connected by edges (as in r.clump)
+    or also by corners with *diagonal*.
+    """
+    rows, cols = mask.shape
+    index = np.arange(mask.size).reshape(rows, cols)
+    first = []
+    second = []
+
+    def add_pairs(one, other, one_mask, other_mask):
+        both = one_mask & other_mask
+        first.append(one[both])
+        second.append(other[both])
+
+    add_pairs(index[:, :-1], index[:, 1:], mask[:, :-1], mask[:, 1:])
+    add_pairs(index[:-1, :], index[1:, :], mask[:-1, :], mask[1:, :])
+    if diagonal:
+        add_pairs(index[:-1, :-1], index[1:, 1:], mask[:-1, :-1], mask[1:, 1:])
+        add_pairs(index[:-1, 1:], index[1:, :-1], mask[:-1, 1:], mask[1:, :-1])
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+
+    # Union-find with all pairs at once: hook the larger root to the smaller
+    # one, then compress paths until each cell points to its root.
+    parent = np.arange(mask.size)
+    while True:
+        first_root = parent[first]
+        second_root = parent[second]
+        different = first_root != second_root
+        if not different.any():
+            break
+        low = np.minimum(first_root[different], second_root[different])
+        high = np.maximum(first_root[different], second_root[different])
+        np.minimum.at(parent, high, low)
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    labels = np.zeros(mask.size, dtype=np.int64)
+    flat_mask = mask.ravel()
+    roots, inverse = np.unique(parent[flat_mask], return_inverse=True)
+    labels[flat_mask] = inverse.ravel() + 1
+    return labels.reshape(rows, cols), len(roots)
+
+
+def detect_changes(
+    before, after, height_threshold, cells_threshold, max_detected, diagonal=False
+):
+    """Return centroids (rows and columns) and sizes of changed areas
+
+    Centroids are in cell coordinates (0.5 is the center of the first cell).
+    Nulls (NaN) in either scan are never a change.
+    """
+    low, high = height_threshold
+    with np.errstate(invalid="ignore"):
+        difference = after - before
+        mask = (difference > low) & (difference < high)
+    labels, count = label_components(mask, diagonal=diagonal)
+    flat = labels.ravel()
+    sizes = np.bincount(flat, minlength=count + 1)
+    rows, cols = np.indices(labels.shape)
+    row_sums = np.bincount(flat, weights=rows.ravel(), minlength=count + 1)
+    col_sums = np.bincount(flat, weights=cols.ravel(), minlength=count + 1)
+
+    min_cells, max_cells = cells_threshold
+    candidates = np.flatnonzero((sizes > min_cells) & (sizes < max_cells))
+    candidates = candidates[candidates != 0]
+    # Largest first (stable, so ties keep the label order).
+    order = np.argsort(-sizes[candidates], kind="stable")
+    selected = candidates[order][:max_detected]
+    centroids = np.column_stack(
+        [
+            row_sums[selected] / sizes[selected] + 0.5,
+            col_sums[selected] / sizes[selected] + 0.5,
+        ]
+    )
+    return centroids, sizes[selected]
+
+
+def to_map_coordinates(centroids, region):
+    """Convert cell coordinates (rows, columns) to x, y in a region"""
+    ns_res = (region["n"] - region["s"]) / region["rows"]
+    ew_res = (region["e"] - region["w"]) / region["cols"]
+    points = np.empty(centroids.shape, dtype=np.float64)
+    points[:, 0] = region["w"] + centroids[:, 1] * ew_res
+    points[:, 1] = region["n"] - centroids[:, 0] * ns_res
+    return points
+
+
+def write_points(points, name, env, add=False):
+    """Write points into a vector map (adding to its points with *add*)"""
+    import grass.script as gs
+
+    lines = [f"{x},{y}" for x, y in points]
+    if add and gs.find_file(name, element="vector", env=env)["name"]:
+        existing = gs.read_command(
+            "v.out.ascii",
+            input=name,
+            type="point",
+            format="point",
+            separator="comma",
+            env=env,
+        )
+        lines = [
+            ",".join(line.split(",")[:2]) for line in existing.strip().splitlines()
+        ] + lines
+    gs.write_command(
+        "v.in.ascii",
+        input="-",
+        output=name,
+        separator="comma",
+        stdin="\n".join(lines),
+        overwrite=True,
+        env=env,
+    )
+
+
+def change_detection(
+    before,
+    after,
+    change=None,
+    height_threshold=(10, 100),
+    cells_threshold=(5, 50),
+    max_detected=5,
+    add=False,
+    env=None,
+    **kwargs,
+):
+    """Return x, y of markers placed on the scan as an (n, 2) array
+
+    Takes the parameters of analyses.change_detection. The rasters *before*
+    and *after* are read in the current region. With *change*, the points are
+    also written into a vector map of that name. Other parameters (like debug)
+    are ignored.
+    """
+    import grass.script as gs
+    from grass.script import array as garray
+
+    scans = []
+    for name in (before, after):
+        data = garray.array(dtype=np.float64, env=env)
+        data.read(name, null="nan")
+        scans.append(np.asarray(data))
+    centroids, unused = detect_changes(
+        scans[0], scans[1], height_threshold, cells_threshold, max_detected
+    )
+    points = to_map_coordinates(centroids, gs.region(env=env))
+    if change:
+        write_points(points, change, env=env, add=add)
+    return points
@@ -0,0 +1 @@
+"""Stand-in for the GRASS GIS Python package (see grass.fake)"""
@@ -0,0 +1,15 @@
+"""Exceptions raised by the stand-in of grass.script"""
+
+
+class CalledModuleError(Exception):
+    """Raised when a tool fails (same attributes as in GRASS GIS)"""
+
+    def __init__(self, module, code, returncode, errors=None):
+        self.module = module
+        self.code = code
+        self.returncode = returncode
+        self.errors = errors
+        message = f"Module run `{code}` ended with an error"
+        if errors:
+            message += f":\n{errors}"
+        super().__init__(message)
@@ -0,0 +1,11 @@
+"""Stand-in for GRASS GIS tools working with NumPy arrays stored in files
+
+The tools are implemented in tools.py, mapcalc.py, and display.py, registered
+in registry.py, and run within a mapset given by the environment (Session).
+The stand-in does not use code from the tools and website directories of
+this repository, so that it can be used to test that code.
+"""
+
+from . import display, tools  # noqa: F401
+from .registry import TOOLS, call_tool, parse_arguments  # noqa: F401
+from .session import Session, ToolError  # noqa: F401
@@ -0,0 +1,212 @@
+"""Color names, named color tables, and color rules written as color files
+
+Only the tables used by the activities (and a few common ones) are known.
+The colors of the tables are close to the GRASS GIS ones, not the same.
+"""
+
+import numpy as np
+
+from .session import ToolError
+
+COLOR_NAMES = {
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "red": (255, 0, 0),
+    "green": (0, 255, 0),
+    "blue": (0, 0, 255),
+    "yellow": (255, 255, 0),
+    "magenta": (255, 0, 255),
+    "cyan": (0, 255, 255),
+    "aqua": (100, 128, 255),
+    "grey": (128, 128, 128),
+    "gray": (128, 128, 128),
+    "orange": (255, 128, 0),
+    "brown": (180, 77, 25),
+    "purple": (128, 0, 255),
+    "violet": (128, 0, 255),
+    "indigo": (0, 128, 255),
+}
+
+# Colors of named tables at shares of the range of values
+COLOR_TABLES = {
+    "viridis": [
+        (0, (68, 1, 84)),
+        (0.25, (59, 82, 139)),
+        (0.5, (33, 145, 140)),
+        (0.75, (94, 201, 98)),
+        (1, (253, 231, 37)),
+    ],
+    "blues": [(0, (247, 251, 255)), (0.5, (107, 174, 214)), (1, (8, 48, 107))],
+    "bgyr": [
+        (0, (0, 0, 255)),
+        (1 / 3, (0, 255, 0)),
+        (2 / 3, (255, 255, 0)),
+        (1, (255, 0, 0)),
+    ],
+    "sepia": [
+        (0, (0, 0, 0)),
+        (1 / 3, (108, 72, 44)),
+        (2 / 3, (200, 165, 120)),
+        (1, (255, 255, 255)),
+    ],
+    "grey": [(0, (0, 0, 0)), (1, (255, 255, 255))],
+    "elevation": [
+        (0, (0, 191, 191)),
+        (0.2, (0, 255, 0)),
+        (0.4, (255, 255, 0)),
+        (0.6, (255, 127, 0)),
+        (0.8, (191, 127, 63)),
+        (1, (200, 200, 200)),
+    ],
+    "rainbow": [
+        (0, (255, 255, 0)),
+        (0.2, (0, 255, 0)),
+        (0.4, (0, 255, 255)),
+        (0.6, (0, 0, 255)),
+        (0.8, (255, 0, 255)),
+        (1, (255, 0, 0)),
+    ],
+    "water": [(0, (240, 255, 255)), (0.5, (0, 150, 255)), (1, (0, 40, 120))],
+    "differences": [
+        (0, (0, 0, 255)),
+        (0.5, (255, 255, 255)),
+        (1, (255, 0, 0)),
+    ],
+}
+COLOR_TABLES["gray"] = COLOR_TABLES["grey"]
+
+DEFAULT_TABLE = "viridis"
+
+
+def parse_color(text):
+    """Return RGB tuple from a color name, r:g:b, or #rrggbb (None for none)"""
+    text = text.strip().lower()
+    if text == "none":
+        return None
+    if text in COLOR_NAMES:
+        return COLOR_NAMES[text]
+    try:
+        if text.startswith("#") and len(text) == 7:
+            return tuple(int(text[i : i + 2], 16) for i in (1, 3, 5))
+        parts = [int(part) for part in text.split(":")]
+    except ValueError:
+        parts = []
+    if len(parts) == 1:
+        return tuple(parts * 3)
+    if len(parts) == 3:
+        return tuple(parts)
+    raise ToolError(f"Unknown color <{text}>")
+
+
+def value_range(values):
+    """Return minimum and maximum of finite values (0, 0 without any)"""
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return 0.0, 0.0
+    return float(finite.min()), float(finite.max())
+
+
+def table_stops(name, minimum, maximum, invert=False):
+    """Return (value, color) stops of a named table spread over a range"""
+    if name not in COLOR_TABLES:
+        raise ToolError(f"Color table <{name}> is not known to the stand-in")
+    stops = COLOR_TABLES[name]
+    if invert:
+        stops = [(1 - share, color) for share, color in reversed(stops)]
+    return [(minimum + share * (maximum - minimum), color) for share, color in stops]
+
+
+def rules_stops(text, minimum, maximum, invert=False):
+    """Return stops and the null color from r.colors rules
+
+    Values are numbers or percents of the range, colors are anything
+    parse_color() accepts.
+    """
+    stops = []
+    null_color = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line == "end":
+            break
+        value, unused, color = line.partition(" ")
+        color = parse_color(color)
+        if value == "nv":
+            null_color = color
+        elif value == "default":
+            continue
+        elif value.endswith("%"):
+            share = float(value[:-1]) / 100
+            stops.append((minimum + share * (maximum - minimum), color))
+        else:
+            stops.append((float(value), color))
+    if not stops:
+        raise ToolError("No color rules given")
+    stops.sort(key=lambda stop: stop[0])
+    if invert:
+        colors = [color for unused, color in reversed(stops)]
+        stops = [(value, color) for (value, unused), color in zip(stops, colors)]
+    return stops, null_color
+
+
+def color_file(stops, null_color=None):
+    """Return content of a color file (colr element) for stops"""
+
+    def point(value, color):
+        return f"{value:.10g}:{color[0]}:{color[1]}:{color[2]}"
+
+    lines = [f"% {stops[0][0]:.10g} {stops[-1][0]:.10g}"]
+    if len(stops) == 1:
+        lines.append(point(*stops[0]))
+    for first, second in zip(stops, stops[1:]):
+        lines.append(f"{point(*first)} {point(*second)}")
+    null_color = null_color or (255, 255, 255)
+    lines.append("nv:{}:{}:{}".format(*null_color))
+    lines.append("*:255:255:255")
+    return "\n".join(lines) + "\n"
+
+
+def parse_color_file(text):
+    """Return stops, null color, and default color from a color file
+
+    Only color files as written by color_file() are supported.
+    """
+    stops = []
+    null_color = default_color = (255, 255, 255)
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("%"):
+            continue
+        if line.startswith(("nv:", "*:")):
+            color = tuple(int(part) for part in line.split(":")[1:])
+            if line.startswith("nv:"):
+                null_color = color
+            else:
+                default_color = color
+            continue
+        for point in line.split():
+            value, *color = point.split(":")
+            if len(color) == 1:
+                color *= 3
+            stops.append((float(value), tuple(int(part) for part in color)))
+    return stops, null_color, default_color
+
+
+def colorize(values, stops, default_color=(255, 255, 255)):
+    """Return RGB colors (0-255 floats) of values interpolated between stops
+
+    Values outside of the stops (and nulls) get the default color.
+    """
+    colors = np.empty(values.shape + (3,))
+    colors[...] = default_color
+    if not stops:
+        return colors
+    stops = sorted(stops, key=lambda stop: stop[0])
+    points = np.array([value for value, unused in stops])
+    with np.errstate(invalid="ignore"):
+        inside = (values >= points[0]) & (values <= points[-1])
+    for channel in range(3):
+        channel_points = [color[channel] for unused, color in stops]
+        colors[inside, channel] = np.interp(values[inside], points, channel_points)
+    return colors
@@ -0,0 +1,340 @@
+"""Display tools of the stand-in drawing into an image file
+
+As with the cairo driver of GRASS GIS, the tools draw into GRASS_RENDER_FILE
+(BMP or PNG) of GRASS_RENDER_WIDTH x GRASS_RENDER_HEIGHT pixels, over the
+existing image with GRASS_RENDER_FILE_READ=TRUE, and on a transparent
+background with GRASS_RENDER_TRANSPARENT=TRUE. The current region is fitted
+into the image keeping its aspect ratio as d.rast does it, each pixel
+shows the cell under its center.
+"""
+
+import struct
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from .colors import (
+    DEFAULT_TABLE,
+    color_file,
+    colorize,
+    parse_color,
+    parse_color_file,
+    table_stops,
+    value_range,
+)
+from .registry import tool
+from .session import ToolError
+
+# Display tools have all parameters of the tools they stand in for.
+# pylint: disable=too-many-arguments,unused-argument
+
+
+def read_bmp(path):
+    """Read 32-bit BMP written by write_bmp() into RGBA float array"""
+    data = Path(path).read_bytes()
+    (offset,) = struct.unpack_from("<I", data, 10)
+    width, height = struct.unpack_from("<ii", data, 18)
+    pixels = np.frombuffer(data[offset:], dtype=np.uint8)
+    pixels = pixels[: abs(height) * width * 4].reshape(abs(height), width, 4)
+    if height > 0:
+        pixels = pixels[::-1]
+    return pixels[:, :, [2, 1, 0, 3]] / np.float32(255)
+
+
+def write_bmp(path, image):
+    """Write premultiplied RGBA float array as 32-bit BMP with rows from the top"""
+    height, width = image.shape[:2]
+    pixels = np.clip(np.rint(image[:, :, [2, 1, 0, 3]] * 255), 0, 255)
+    data = pixels.astype(np.uint8).tobytes()
+    header = struct.pack(
+        "<2sIHHIIiiHHIIiiII",
+        b"BM",
+        54 + len(data),
+        0,
+        0,
+        54,
+        40,
+        width,
+        -height,
+        1,
+        32,
+        0,
+        len(data),
+        0,
+        0,
+        0,
+        0,
+    )
+    Path(path).write_bytes(header + data)
+
+
+def write_png(path, image):
+    """Write premultiplied RGBA float array over white as RGB PNG"""
+    height, width = image.shape[:2]
+    rgb = image[:, :, :3] + (1 - image[:, :, 3:4])
+    rgb = np.clip(np.rint(rgb * 255), 0, 255).astype(np.uint8)
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(kind, content):
+        checksum = zlib.crc32(kind + content) & 0xFFFFFFFF
+        return (
+            struct.pack(">I", len(content))
+            + kind
+            + content
+            + struct.pack(">I", checksum)
+        )
+
+    Path(path).write_bytes(
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows.tobytes()))
+        + chunk(b"IEND", b"")
+    )
+
+
+def read_png(path):
+    """Read PNG written by write_png() into RGBA float array"""
+    data = Path(path).read_bytes()
+    position = 8
+    size = None
+    compressed = b""
+    while position < len(data):
+        (length,) = struct.unpack_from(">I", data, position)
+        kind = data[position + 4 : position + 8]
+        content = data[position + 8 : position + 8 + length]
+        position += 12 + length
+        if kind == b"IHDR":
+            size = struct.unpack_from(">IIBB", content)
+        elif kind == b"IDAT":
+            compressed += content
+    width, height, depth, color_type = size
+    raw = np.frombuffer(zlib.decompress(compressed), dtype=np.uint8)
+    raw = raw.reshape(height, width * 3 + 1)
+    if depth != 8 or color_type != 2 or raw[:, 0].any():
+        raise ToolError(f"Cannot draw over {path} (only plain RGB PNG is supported)")
+    image = np.ones((height, width, 4), dtype=np.float32)
+    image[:, :, :3] = raw[:, 1:].reshape(height, width, 3) / 255
+    return image
+
+
+class Canvas:
+    """Image file given by the rendering environment variables"""
+
+    def __init__(self, env):
+        if not env.get("GRASS_RENDER_FILE"):
+            raise ToolError("No display (GRASS_RENDER_FILE is not set)")
+        self.path = Path(env["GRASS_RENDER_FILE"])
+        self.width = int(env.get("GRASS_RENDER_WIDTH", 640))
+        self.height = int(env.get("GRASS_RENDER_HEIGHT", 480))
+        self.transparent = env.get("GRASS_RENDER_TRANSPARENT") == "TRUE"
+        self.read_file = env.get("GRASS_RENDER_FILE_READ") == "TRUE"
+
+    def background(self, color=(255, 255, 255)):
+        """Return empty image (premultiplied RGBA)"""
+        image = np.zeros((self.height, self.width, 4), dtype=np.float32)
+        if not self.transparent and color:
+            image[:, :, :3] = np.asarray(color) / 255
+            image[:, :, 3] = 1
+        return image
+
+    def read(self):
+        """Return the current image"""
+        if self.read_file and self.path.is_file():
+            if self.path.suffix.lower() == ".bmp":
+                return read_bmp(self.path)
+            return read_png(self.path)
+        return self.background()
+
+    def write(self, image):
+        """Write image to the file"""
+        if self.path.suffix.lower() == ".bmp":
+            write_bmp(self.path, image)
+        else:
+            write_png(self.path, image)
+
+    def draw(self, layer):
+        """Draw premultiplied RGBA layer over the current image"""
+        image = self.read()
+        image = layer + image * (1 - layer[:, :, 3:4])
+        self.write(image)
+
+
+def layout(region, width, height):
+    """Return scale (pixels per map unit) and offsets of the region in an image"""
+    ew_extent = region["e"] - region["w"]
+    ns_extent = region["n"] - region["s"]
+    scale = min(width / ew_extent, height / ns_extent)
+    return scale, (width - ew_extent * scale) / 2, (height - ns_extent * scale) / 2
+
+
+def to_pixels(region, width, height, coordinates):
+    """Return pixel columns and rows (float) of x, y coordinates"""
+    scale, left, top = layout(region, width, height)
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    return (
+        left + (coordinates[:, 0] - region["w"]) * scale,
+        top + (region["n"] - coordinates[:, 1]) * scale,
+    )
+
+
+def sample_cells(values, cells_region, region, width, height):
+    """Return values of cells under the centers of pixels (NaN outside)"""
+    scale, left, top = layout(region, width, height)
+    x = region["w"] + (np.arange(width) + 0.5 - left) / scale
+    y = region["n"] - (np.arange(height) + 0.5 - top) / scale
+    cols = np.floor((x - cells_region["w"]) / cells_region["ewres"]).astype(np.int64)
+    rows = np.floor((cells_region["n"] - y) / cells_region["nsres"]).astype(np.int64)
+    col_inside = (cols >= 0) & (cols < values.shape[1])
+    row_inside = (rows >= 0) & (rows < values.shape[0])
+    # Pixels outside of the region itself are not drawn.
+    col_inside &= (x >= region["w"]) & (x <= region["e"])
+    row_inside &= (y >= region["s"]) & (y <= region["n"])
+    result = np.full((height, width), np.nan)
+    result[np.ix_(row_inside, col_inside)] = values[
+        np.ix_(rows[row_inside], cols[col_inside])
+    ]
+    return result
+
+
+def outline_cells(labels):
+    """Return cells with the east or south neighbor in another area
+
+    Nulls are an area of their own.
+    """
+    labels = np.where(np.isnan(labels), np.inf, labels)
+    outline = np.zeros(labels.shape, dtype=bool)
+    outline[:, :-1] |= labels[:, :-1] != labels[:, 1:]
+    outline[:-1, :] |= labels[:-1, :] != labels[1:, :]
+    return outline
+
+
+def paint(layer, mask, color):
+    """Set opaque color to pixels of a layer"""
+    if color is not None:
+        layer[mask, :3] = np.asarray(color) / 255
+        layer[mask, 3] = 1
+
+
+def line_mask(columns, rows, width, height, line_width=1):
+    """Return pixels on a polyline given by pixel coordinates"""
+    mask = np.zeros((height, width), dtype=bool)
+    radius = max(int(line_width) - 1, 0) // 2
+    for start in range(len(columns) - 1):
+        length = np.hypot(
+            columns[start + 1] - columns[start], rows[start + 1] - rows[start]
+        )
+        steps = np.linspace(0, 1, int(np.ceil(length * 2)) + 2)
+        xs = np.floor(columns[start] + steps * (columns[start + 1] - columns[start]))
+        ys = np.floor(rows[start] + steps * (rows[start + 1] - rows[start]))
+        for row_offset in range(-radius, radius + 1):
+            for col_offset in range(-radius, radius + 1):
+                xi = xs.astype(np.int64) + col_offset
+                yi = ys.astype(np.int64) + row_offset
+                inside = (xi >= 0) & (xi < width) & (yi >= 0) & (yi < height)
+                mask[yi[inside], xi[inside]] = True
+    return mask
+
+
+@tool("d.erase")
+def d_erase(session, bgcolor="white", flags=""):
+    """Fill the image with the background color"""
+    canvas = Canvas(session.env)
+    canvas.write(canvas.background(parse_color(bgcolor)))
+
+
+@tool("d.rast")
+def d_rast(session, map, values=None, bgcolor="white", flags=""):
+    """Draw a raster with its color table (nulls are transparent without -n)"""
+    # pylint: disable=redefined-builtin
+    if values:
+        raise ToolError("Option values is not supported by the stand-in")
+    canvas = Canvas(session.env)
+    region = session.region()
+    data = session.read_raster(map)
+    text = session.read_colors(map)
+    if text is None:
+        text = color_file(table_stops(DEFAULT_TABLE, *value_range(data)))
+    stops, null_color, default_color = parse_color_file(text)
+    values = sample_cells(data, region, region, canvas.width, canvas.height)
+    image = np.zeros((canvas.height, canvas.width, 4), dtype=np.float32)
+    finite = np.isfinite(values)
+    image[finite, :3] = colorize(values[finite], stops, default_color) / 255
+    image[finite, 3] = 1
+    if "n" in flags:
+        # Nulls inside of the region only
+        scale, left, top = layout(region, canvas.width, canvas.height)
+        inside = np.zeros(values.shape, dtype=bool)
+        inside[
+            int(round(top)) : int(round(canvas.height - top)),
+            int(round(left)) : int(round(canvas.width - left)),
+        ] = True
+        paint(image, inside & ~finite, null_color)
+    canvas.draw(image)
+
+
+@tool("d.vect")
+def d_vect(
+    session,
+    map,
+    type="point,line,boundary,area,centroid",
+    color="black",
+    fill_color="200:200:200",
+    width="0",
+    icon="basic/x",
+    size="5",
+    layer="1",
+    cats=None,
+    where=None,
+    flags="",
+):
+    """Draw points, lines, and areas of a vector map"""
+    # pylint: disable=redefined-builtin,too-many-locals
+    canvas = Canvas(session.env)
+    region = session.region()
+    geometry = session.read_vector(map)
+    line_color = parse_color(color)
+    fill = parse_color(fill_color)
+    size_pixels = float(size)
+    layer_image = np.zeros((canvas.height, canvas.width, 4), dtype=np.float32)
+    cells = geometry["cells"]
+    if cells:
+        values = cells["values"]
+        if cells["kind"] == "areas":
+            labels = sample_cells(
+                values, cells["region"], region, canvas.width, canvas.height
+            )
+            paint(layer_image, np.isfinite(labels), fill)
+            outlines = np.where(outline_cells(values), 1.0, np.nan)
+            values = np.where(np.isfinite(values), outlines, np.nan)
+        drawn = sample_cells(
+            values, cells["region"], region, canvas.width, canvas.height
+        )
+        paint(layer_image, np.isfinite(drawn), line_color)
+    for line in geometry["lines"]:
+        columns, rows = to_pixels(
+            region, canvas.width, canvas.height, line["coordinates"]
+        )
+        mask = line_mask(columns, rows, canvas.width, canvas.height, int(width) or 1)
+        paint(layer_image, mask, line_color)
+    if geometry["points"]:
+        columns, rows = to_pixels(
+            region,
+            canvas.width,
+            canvas.height,
+            [point[:2] for point in geometry["points"]],
+        )
+        radius = size_pixels / 2
+        for column, row in zip(columns, rows):
+            # Pixels around the point only
+            top = int(np.clip(row - radius - 1, 0, canvas.height))
+            bottom = int(np.clip(row + radius + 2, 0, canvas.height))
+            left = int(np.clip(column - radius - 1, 0, canvas.width))
+            right = int(np.clip(column + radius + 2, 0, canvas.width))
+            y, x = np.mgrid[top:bottom, left:right] + 0.5
+            distance = np.hypot(x - column, y - row)
+            window = layer_image[top:bottom, left:right]
+            paint(window, distance <= radius, line_color)
+            paint(window, distance <= radius - 1, fill)
+    canvas.draw(layer_image)
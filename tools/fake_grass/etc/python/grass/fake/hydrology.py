@@ -0,0 +1,100 @@
+"""Flow directions, accumulation, and stream lines of the stand-in
+
+Water goes to the steepest lower of the 8 neighbors (D8). Directions are
+stored with the r.watershed drainage codes, cells are addressed by their
+flat index and receivers are flat indices of the downstream cells
+(-1 for cells without a lower neighbor, nulls, and flow out of the region).
+"""
+
+import math
+
+import numpy as np
+
+# Row and column offsets of r.watershed drainage codes
+# (1 is north-east, counterclockwise to 8 which is east)
+DIRECTIONS = {
+    1: (-1, 1),
+    2: (-1, 0),
+    3: (-1, -1),
+    4: (0, -1),
+    5: (1, -1),
+    6: (1, 0),
+    7: (1, 1),
+    8: (0, 1),
+}
+
+
+def drainage_directions(elevation):
+    """Return drainage code of the steepest lower neighbor (0 for none)"""
+    rows, cols = elevation.shape
+    padded = np.pad(elevation, 1, constant_values=np.nan)
+    steepest = np.zeros(elevation.shape)
+    codes = np.zeros(elevation.shape, dtype=np.int32)
+    with np.errstate(invalid="ignore"):
+        for code, (row, col) in DIRECTIONS.items():
+            near = padded[1 + row : 1 + row + rows, 1 + col : 1 + col + cols]
+            drop = (elevation - near) / math.hypot(row, col)
+            steeper = drop > steepest
+            steepest[steeper] = drop[steeper]
+            codes[steeper] = code
+    return codes
+
+
+def receivers(drainage):
+    """Return flat index of the downstream cell of each cell from drainage codes
+
+    Negative codes (flow out of the region), zero, and nulls give -1.
+    """
+    rows, cols = drainage.shape
+    codes = np.nan_to_num(drainage, nan=0).astype(np.int64)
+    row, col = np.indices(drainage.shape)
+    result = np.full(drainage.shape, -1, dtype=np.int64)
+    for code, (row_offset, col_offset) in DIRECTIONS.items():
+        near_row = row + row_offset
+        near_col = col + col_offset
+        flows = codes == code
+        flows &= (near_row >= 0) & (near_row < rows)
+        flows &= (near_col >= 0) & (near_col < cols)
+        result[flows] = near_row[flows] * cols + near_col[flows]
+    return result.ravel()
+
+
+def accumulate(receiver):
+    """Return number of cells draining through each cell given receivers"""
+    values = np.ones(receiver.size)
+    pending = np.bincount(receiver[receiver >= 0], minlength=receiver.size)
+    frontier = np.flatnonzero(pending == 0)
+    while frontier.size:
+        frontier = frontier[receiver[frontier] >= 0]
+        following = receiver[frontier]
+        np.add.at(values, following, values[frontier])
+        np.subtract.at(pending, following, 1)
+        frontier = np.unique(following[pending[following] == 0])
+    return values
+
+
+def stream_lines(accumulation, receiver, threshold):
+    """Return stream lines as arrays of flat cell indices from upstream
+
+    Streams are cells with accumulation of at least threshold. A line starts
+    at a head or at a junction (a cell with more than one stream flowing in)
+    and ends at the next junction (which is its last cell) or at an outlet.
+    """
+    with np.errstate(invalid="ignore"):
+        streams = (accumulation >= threshold).ravel()
+    cells = np.flatnonzero(streams)
+    targets = receiver[cells]
+    targets = targets[targets >= 0]
+    donors = np.bincount(targets[streams[targets]], minlength=streams.size)
+    lines = []
+    for start in cells[donors[cells] != 1]:
+        line = [start]
+        cell = receiver[start]
+        # The length limit stops at cycles in directions read from a raster.
+        while cell >= 0 and streams[cell] and len(line) <= cells.size:
+            line.append(cell)
+            if donors[cell] != 1:
+                break
+            cell = receiver[cell]
+        lines.append(np.array(line, dtype=np.int64))
+    return lines
@@ -0,0 +1,95 @@
+"""Locations and mapsets of the stand-in
+
+A new location gets the PERMANENT mapset with a synthetic terrain (random
+hills and hollows on a slope) named as
+the elevation raster of the North Carolina sample data set (elev_lid792_1m)
+with the same extent and resolution, so that activities run unchanged.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .session import Session, complete_region
+
+DEMO_ELEVATION = "elev_lid792_1m"
+DEMO_REGION = complete_region(
+    {
+        "n": 220750.0,
+        "s": 220000.0,
+        "e": 639000.0,
+        "w": 638300.0,
+        "rows": 750,
+        "cols": 700,
+    }
+)
+
+
+def terrain(rows, cols, seed, minimum, relief, bumps=40):
+    """Return terrain from minimum to minimum + relief as float32 array"""
+    generator = np.random.default_rng(seed)
+    y, x = np.mgrid[0 : 1 : rows * 1j, 0 : 1 : cols * 1j]
+    surface = (x + y) / 2
+    for unused in range(bumps):
+        center_x, center_y = generator.random(2)
+        width = generator.uniform(0.03, 0.15)
+        height = generator.uniform(-0.15, 0.15)
+        distance = (x - center_x) ** 2 + (y - center_y) ** 2
+        surface += height * np.exp(-distance / (2 * width**2))
+    surface -= surface.min()
+    surface /= surface.max()
+    return (minimum + relief * surface).astype(np.float32)
+
+
+def create_location(path):
+    """Create a location with the demo data in PERMANENT
+
+    The location is built next to its final path and renamed, so concurrent
+    calls (e.g., from workers creating their mapsets) see either no location
+    or a complete one.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = Path(tempfile.mkdtemp(prefix=f".{path.name}_", dir=path.parent))
+    try:
+        permanent = temporary / "PERMANENT"
+        permanent.mkdir()
+        session = Session(env={}, mapset=permanent)
+        session.write_region(DEMO_REGION)
+        shutil.copyfile(permanent / "WIND", permanent / "DEFAULT_WIND")
+        elevation = terrain(
+            DEMO_REGION["rows"], DEMO_REGION["cols"], seed=792, minimum=103, relief=32
+        )
+        session.write_raster(DEMO_ELEVATION, elevation, datatype="FCELL")
+        try:
+            os.rename(temporary, path)
+        except OSError:
+            # Created by someone else in the meantime
+            if not (path / "PERMANENT").is_dir():
+                raise
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+
+
+def create_mapset(path):
+    """Create a mapset (and its location if it does not exist)"""
+    path = Path(path)
+    location = path.parent
+    if not (location / "PERMANENT").is_dir():
+        create_location(location)
+    path.mkdir(exist_ok=True)
+    shutil.copyfile(location / "PERMANENT" / "DEFAULT_WIND", path / "WIND")
+
+
+def write_gisrc(path, mapset):
+    """Write GISRC file for a session in a mapset"""
+    mapset = Path(mapset).resolve()
+    Path(path).write_text(
+        f"GISDBASE: {mapset.parent.parent}\n"
+        f"LOCATION_NAME: {mapset.parent.name}\n"
+        f"MAPSET: {mapset.name}\n"
+        "GUI: text\n"
+    )
@@ -0,0 +1,383 @@
+"""Raster map algebra of the stand-in (a subset of r.mapcalc)
+
+Each statement is rewritten into a Python expression (map and function
+names become placeholders, && and || become and and or, ! becomes ~,
+^ becomes **, and the conditional operator becomes a call of if) which is
+parsed with the ast module and evaluated with NumPy arrays using NaN
+for nulls. Values are pairs of the array and whether it is integer.
+"""
+
+import ast
+import re
+
+import numpy as np
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+        |(?P<name>[A-Za-z_][A-Za-z0-9_.]*(?:@[A-Za-z0-9_.]+)?|"[^"]+")
+        |(?P<operator>&&|\|\||==|!=|>=|<=|[-+*/%^<>!?:(),])
+    )""",
+    re.VERBOSE,
+)
+_OPERATORS = {"&&": " and ", "||": " or ", "!": "~", "^": "**"}
+
+
+class MapcalcError(ValueError):
+    """Raised for expressions outside of the supported subset"""
+
+
+def tokens_of(text):
+    """Return expression as a list of tokens in Python syntax and its map names
+
+    The conditional operator and the commas and parentheses are kept.
+    """
+    tokens = []
+    maps = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match:
+            raise MapcalcError(f"Cannot parse '{text[position:]}'")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            integer = re.fullmatch(r"\d+", value)
+            tokens.append(str(int(value)) if integer else repr(float(value)))
+        elif kind == "name" and text[position:].lstrip().startswith("("):
+            if value not in FUNCTIONS:
+                raise MapcalcError(f"Function '{value}' is not supported")
+            tokens.append(f"f_{value}")
+        elif kind == "name":
+            value = value.strip('"')
+            if value not in maps:
+                maps.append(value)
+            tokens.append(f"m_{maps.index(value)}")
+        else:
+            tokens.append(_OPERATORS.get(value, value))
+    return tokens, maps
+
+
+def _closing(tokens, start):
+    """Return index of the parenthesis closing the one at start"""
+    depth = 0
+    for index in range(start, len(tokens)):
+        depth += {"(": 1, ")": -1}.get(tokens[index], 0)
+        if not depth:
+            return index
+    raise MapcalcError("Missing ')'")
+
+
+def python_source(tokens):
+    """Return Python source for tokens with conditional operators as calls"""
+    index = 0
+    while index < len(tokens):
+        if tokens[index] == "(":
+            index = _closing(tokens, index)
+        elif tokens[index] == "?":
+            # The matching colon skips colons of nested conditionals.
+            nested = 0
+            for end in range(index + 1, len(tokens)):
+                if tokens[end] == "(":
+                    end = _closing(tokens, end)
+                elif tokens[end] == "?":
+                    nested += 1
+                elif tokens[end] == ":" and nested:
+                    nested -= 1
+                elif tokens[end] == ":":
+                    break
+            else:
+                raise MapcalcError("Missing ':' of a conditional")
+            return "f_if({}, {}, {})".format(
+                python_source(tokens[:index]),
+                python_source(tokens[index + 1 : end]),
+                python_source(tokens[end + 1 :]),
+            )
+        index += 1
+    parts = []
+    index = 0
+    while index < len(tokens):
+        if tokens[index] != "(":
+            parts.append(tokens[index])
+            index += 1
+            continue
+        end = _closing(tokens, index)
+        arguments = [[]]
+        depth = 0
+        for token in tokens[index + 1 : end]:
+            depth += {"(": 1, ")": -1}.get(token, 0)
+            if token == "," and not depth:
+                arguments.append([])
+            else:
+                arguments[-1].append(token)
+        if arguments == [[]]:
+            arguments = []
+        parts.append(
+            "(" + ", ".join(python_source(argument) for argument in arguments) + ")"
+        )
+        index = end + 1
+    return " ".join(parts)
+
+
+def _null_where(result, *values):
+    """Return float result with NaN where any of the values is null"""
+    result = np.asarray(result, dtype=np.float64)
+    for value in values:
+        result = np.where(np.isnan(value), np.nan, result)
+    return result
+
+
+def _true(value):
+    with np.errstate(invalid="ignore"):
+        return np.nan_to_num(value, nan=0) != 0
+
+
+def _if(condition, *values):
+    """if(x), if(x, a), if(x, a, b), and if(x, a, b, c) of r.mapcalc"""
+    test = condition[0]
+    if not values:
+        return _null_where(_true(test), test), True
+    if len(values) == 1:
+        result = np.where(_true(test), values[0][0], 0.0)
+    elif len(values) == 2:
+        result = np.where(_true(test), values[0][0], values[1][0])
+    else:
+        with np.errstate(invalid="ignore"):
+            result = np.where(
+                test > 0,
+                values[0][0],
+                np.where(test == 0, values[1][0], values[2][0]),
+            )
+    return _null_where(result, test), all(value[1] for value in values)
+
+
+def _numbers(function, integer=None):
+    """Return r.mapcalc function computing function of the plain values
+
+    The result is integer if *integer* is True or if it is None and all
+    arguments are integer.
+    """
+
+    def wrapped(*arguments):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = function(*[value for value, unused in arguments])
+        if integer is None:
+            return result, all(item[1] for item in arguments)
+        return result, integer
+
+    return wrapped
+
+
+def _extreme(function, skip_nulls):
+    """Return min or max function (nmin or nmax with *skip_nulls*)"""
+
+    def wrapped(*arguments):
+        values = np.broadcast_arrays(
+            *[np.asarray(value) for value, unused in arguments]
+        )
+        stack = np.stack(values).astype(np.float64)
+        with np.errstate(invalid="ignore"):
+            if skip_nulls:
+                nulls = np.isnan(stack).all(axis=0)
+                fill = np.inf if function is np.min else -np.inf
+                result = function(np.where(np.isnan(stack), fill, stack), axis=0)
+                result = np.where(nulls, np.nan, result)
+            else:
+                result = function(stack, axis=0)
+        return result, all(item[1] for item in arguments)
+
+    return wrapped
+
+
+FUNCTIONS = {
+    "if": _if,
+    "isnull": lambda value: (np.isnan(value[0]).astype(np.float64), True),
+    "null": lambda: (np.nan, True),
+    "abs": _numbers(np.abs),
+    "sqrt": _numbers(np.sqrt, integer=False),
+    "exp": _numbers(
+        lambda x, y=None: np.exp(x) if y is None else np.power(x, y),
+        integer=False,
+    ),
+    "log": _numbers(
+        lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+        integer=False,
+    ),
+    "sin": _numbers(lambda x: np.sin(np.radians(x)), integer=False),
+    "cos": _numbers(lambda x: np.cos(np.radians(x)), integer=False),
+    "tan": _numbers(lambda x: np.tan(np.radians(x)), integer=False),
+    "atan": _numbers(
+        lambda x, y=None: np.degrees(np.arctan(x) if y is None else np.arctan2(y, x))
+        % 360,
+        integer=False,
+    ),
+    "min": _extreme(np.min, skip_nulls=False),
+    "max": _extreme(np.max, skip_nulls=False),
+    "nmin": _extreme(np.min, skip_nulls=True),
+    "nmax": _extreme(np.max, skip_nulls=True),
+    "int": _numbers(np.trunc, integer=True),
+    # r.mapcalc rounds halves away from zero.
+    "round": _numbers(lambda x: np.copysign(np.floor(np.abs(x) + 0.5), x), True),
+    "float": _numbers(lambda x: x, integer=False),
+    "double": _numbers(lambda x: x, integer=False),
+}
+# Functions of the current cell (computed by the evaluator)
+FUNCTIONS.update({name: None for name in ("row", "col", "x", "y")})
+
+
+class Evaluator(ast.NodeVisitor):
+    """Computes value of a parsed expression in a region
+
+    Maps are read by *read* which returns (array, is_integer).
+    """
+
+    comparisons = {
+        ast.Eq: np.equal,
+        ast.NotEq: np.not_equal,
+        ast.Gt: np.greater,
+        ast.GtE: np.greater_equal,
+        ast.Lt: np.less,
+        ast.LtE: np.less_equal,
+    }
+
+    def __init__(self, maps, read, region):
+        self.maps = maps
+        self.read = read
+        self.region = region
+
+    def generic_visit(self, node):
+        raise MapcalcError(f"Unsupported expression: {ast.dump(node)}")
+
+    def visit_Expression(self, node):
+        return self.visit(node.body)
+
+    def visit_Constant(self, node):
+        if not isinstance(node.value, (int, float)):
+            raise MapcalcError(f"Unsupported constant {node.value!r}")
+        return float(node.value), isinstance(node.value, int)
+
+    def visit_Name(self, node):
+        return self.read(self.maps[int(node.id[2:])])
+
+    def visit_Call(self, node):
+        name = node.func.id[2:]
+        if name in ("row", "col", "x", "y"):
+            return self.position(name)
+        arguments = [self.visit(argument) for argument in node.args]
+        try:
+            return FUNCTIONS[name](*arguments)
+        except TypeError:
+            raise MapcalcError(f"Wrong number of arguments for {name}()")
+
+    def position(self, name):
+        """Return row, col (from 1) or cell center coordinates of all cells"""
+        rows, cols = self.region["rows"], self.region["cols"]
+        if name in ("row", "y"):
+            values = np.arange(rows, dtype=np.float64)[:, np.newaxis]
+        else:
+            values = np.arange(cols, dtype=np.float64)[np.newaxis, :]
+        if name == "y":
+            return self.region["n"] - (values + 0.5) * self.region["nsres"], False
+        if name == "x":
+            return self.region["w"] + (values + 0.5) * self.region["ewres"], False
+        return values + 1, True
+
+    def visit_UnaryOp(self, node):
+        value, integer = self.visit(node.operand)
+        if isinstance(node.op, ast.USub):
+            return np.negative(value), integer
+        if isinstance(node.op, ast.UAdd):
+            return value, integer
+        # ~ stands for !
+        return _null_where(~_true(value), value), True
+
+    def visit_BinOp(self, node):
+        (left, left_int), (right, right_int) = self.visit(node.left), self.visit(
+            node.right
+        )
+        integer = left_int and right_int
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if isinstance(node.op, ast.Add):
+                return np.add(left, right), integer
+            if isinstance(node.op, ast.Sub):
+                return np.subtract(left, right), integer
+            if isinstance(node.op, ast.Mult):
+                return np.multiply(left, right), integer
+            if isinstance(node.op, ast.Pow):
+                return np.power(left, right), integer
+            if isinstance(node.op, ast.Div):
+                result = np.divide(left, right)
+                if integer:
+                    result = np.trunc(result)
+            elif isinstance(node.op, ast.Mod):
+                result = np.fmod(left, right)
+            else:
+                raise MapcalcError("Unsupported operator")
+        # Division by zero is null.
+        return np.where(np.equal(right, 0), np.nan, result), integer
+
+    def visit_Compare(self, node):
+        # a < b == c is (a < b) == c in r.mapcalc
+        left = self.visit(node.left)[0]
+        for operator, comparator in zip(node.ops, node.comparators):
+            right = self.visit(comparator)[0]
+            with np.errstate(invalid="ignore"):
+                result = self.comparisons[type(operator)](left, right)
+            left = _null_where(result, left, right)
+        return left, True
+
+    def visit_BoolOp(self, node):
+        values = [self.visit(item)[0] for item in node.values]
+        truth = [_true(value) for value in values]
+        if isinstance(node.op, ast.And):
+            result = np.logical_and.reduce(truth)
+        else:
+            result = np.logical_or.reduce(truth)
+        return _null_where(result, *values), True
+
+
+def statements(text):
+    """Return (output, Python source, map names) for each statement
+
+    Statements are on separate lines or separated by semicolons.
+    """
+    result = []
+    for statement in re.split(r"[;\n]", text):
+        if not statement.strip():
+            continue
+        name, equals, expression = statement.partition("=")
+        name = name.strip().strip('"')
+        if (
+            not equals
+            or expression.startswith("=")
+            or not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_.]*", name)
+        ):
+            raise MapcalcError(f"Expected 'name = expression', got '{statement}'")
+        tokens, maps = tokens_of(expression)
+        result.append((name, python_source(tokens), maps))
+    return result
+
+
+def run_mapcalc(session, text):
+    """Evaluate statements and write their results in the session"""
+    region = session.region()
+
+    def read(name):
+        integer = session.raster_datatype(name) == "CELL"
+        return session.read_raster(name), integer
+
+    for name, source, maps in statements(text):
+        try:
+            tree = ast.parse(source, mode="eval")
+        except SyntaxError:
+            raise MapcalcError(f"Cannot parse the expression for {name}")
+        value, integer = Evaluator(maps, read, region).visit(tree)
+        values = np.broadcast_to(
+            np.asarray(value, dtype=np.float64), (region["rows"], region["cols"])
+        )
+        if integer:
+            with np.errstate(invalid="ignore"):
+                values = np.trunc(values)
+        session.write_raster(name, values.copy(), "CELL" if integer else "DCELL")
@@ -0,0 +1,75 @@
+"""Registry of stand-in tools and parsing of their parameters
+
+A tool is a function with the session as the first parameter followed by
+the options of the tool (and *flags* if it has any). Options are strings as
+on the command line and, as in GRASS GIS, they can be abbreviated to
+a unique prefix (e.g., co for color).
+"""
+
+import inspect
+
+from .session import Session, ToolError
+
+TOOLS = {}
+
+
+def tool(name):
+    """Register a function as a tool"""
+
+    def register(function):
+        TOOLS[name] = function
+        return function
+
+    return register
+
+
+def parse_arguments(args):
+    """Return options, flags, and long flags from command line arguments"""
+    options = {}
+    flags = ""
+    long_flags = set()
+    for arg in args:
+        key, separator, value = arg.partition("=")
+        if separator:
+            options[key] = value
+        elif arg.startswith("--"):
+            long_flags.add(arg[2:])
+        elif arg.startswith("-") and len(arg) > 1:
+            flags += arg[1:]
+        else:
+            # Value of the first option given without its name
+            options[""] = arg
+    return options, flags, long_flags
+
+
+def call_tool(name, options, flags="", overwrite=False, env=None, stdin=None):
+    """Run a tool and return its standard output (raises ToolError)
+
+    Raises KeyError for tools which are not implemented.
+    """
+    function = TOOLS[name]
+    parameters = list(inspect.signature(function).parameters.values())[1:]
+    names = [parameter.name for parameter in parameters if parameter.name != "flags"]
+    kwargs = {}
+    for key, value in options.items():
+        if not key and names:
+            key = names[0]
+        matches = [item for item in names if item == key]
+        matches = matches or [item for item in names if key and item.startswith(key)]
+        if len(matches) != 1:
+            raise ToolError(f"{name}: Sorry, <{key}> is not a valid parameter")
+        kwargs[matches[0]] = str(value)
+    for parameter in parameters:
+        if parameter.default is inspect.Parameter.empty:
+            if parameter.name not in kwargs:
+                raise ToolError(
+                    f"{name}: Required parameter <{parameter.name}> not set"
+                )
+    if flags:
+        if "flags" not in [parameter.name for parameter in parameters]:
+            raise ToolError(f"{name}: Sorry, flags -{flags} are not valid")
+        kwargs["flags"] = flags
+    session = Session(env, overwrite=overwrite)
+    session.stdin = stdin
+    function(session, **kwargs)
+    return "".join(session.output)
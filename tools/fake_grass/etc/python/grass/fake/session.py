@@ -0,0 +1,338 @@
+"""Mapsets, regions, rasters, and vector maps of the stand-in stored as files
+
+The layout follows GRASS GIS closely enough for the code in this repository
+which reads mapset files directly (result_cache.py, layer_cache.py, and
+raster_renderer.py):
+
+- the region is in WIND (or windows/name) in the GRASS text format,
+- raster headers are in cellhd/name, values of floating point maps
+  in fcell/name and of integer maps in cell/name (as NumPy .npy data),
+- color tables are in colr/name in the GRASS format,
+- vector maps are directories vector/name with geometry.json
+  (and cells.npy for maps kept as cells, see write_vector()).
+"""
+
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+# Value of nulls in integer (CELL) rasters
+INT_NULL = np.iinfo(np.int32).min
+GEOMETRY = "geometry.json"
+CELLS = "cells.npy"
+DATATYPES = {"CELL": np.int32, "FCELL": np.float32, "DCELL": np.float64}
+# Directories with a file for each raster
+RASTER_ELEMENTS = ["cell", "fcell", "cellhd", "colr", "cats", "hist"]
+
+
+class ToolError(Exception):
+    """Raised when a tool fails (the message is what GRASS GIS would report)"""
+
+
+def mapset_path(env):
+    """Return path to the mapset given by the GISRC file"""
+    values = {}
+    for line in Path(env["GISRC"]).read_text().splitlines():
+        key, separator, value = line.partition(":")
+        if separator:
+            values[key.strip()] = value.strip()
+    return Path(values["GISDBASE"], values["LOCATION_NAME"], values["MAPSET"])
+
+
+def parse_region(text):
+    """Return region from WIND file or GRASS_REGION text as dictionary"""
+    values = {}
+    for line in re.split(r"[;\n]", text):
+        key, separator, value = line.partition(":")
+        if separator:
+            values[key.strip()] = value.strip()
+    region = {
+        "n": float(values["north"]),
+        "s": float(values["south"]),
+        "e": float(values["east"]),
+        "w": float(values["west"]),
+        "rows": int(values["rows"]),
+        "cols": int(values["cols"]),
+    }
+    return complete_region(region)
+
+
+def complete_region(region):
+    """Add resolution to a region with extent, rows, and columns"""
+    region["nsres"] = (region["n"] - region["s"]) / region["rows"]
+    region["ewres"] = (region["e"] - region["w"]) / region["cols"]
+    return region
+
+
+def format_region(region, separator="\n"):
+    """Return region in the WIND file format (GRASS_REGION with ';')"""
+    items = [
+        ("proj", 99),
+        ("zone", 0),
+        ("north", region["n"]),
+        ("south", region["s"]),
+        ("east", region["e"]),
+        ("west", region["w"]),
+        ("cols", region["cols"]),
+        ("rows", region["rows"]),
+        ("e-w resol", region["ewres"]),
+        ("n-s resol", region["nsres"]),
+    ]
+    lines = [f"{key + ':':<12}{value:.15g}" for key, value in items]
+    return separator.join(lines) + separator
+
+
+def sample(values, source, region):
+    """Return values of a grid with source region at cell centers of a region
+
+    Cells outside of the source are NaN (like nulls).
+    """
+    if all(source[key] == region[key] for key in ("n", "s", "e", "w", "rows", "cols")):
+        return values.copy()
+    y = region["n"] - (np.arange(region["rows"]) + 0.5) * region["nsres"]
+    x = region["w"] + (np.arange(region["cols"]) + 0.5) * region["ewres"]
+    rows = np.floor((source["n"] - y) / source["nsres"]).astype(np.int64)
+    cols = np.floor((x - source["w"]) / source["ewres"]).astype(np.int64)
+    row_inside = (rows >= 0) & (rows < source["rows"])
+    col_inside = (cols >= 0) & (cols < source["cols"])
+    result = np.full((region["rows"], region["cols"]), np.nan)
+    result[np.ix_(row_inside, col_inside)] = values[
+        np.ix_(rows[row_inside], cols[col_inside])
+    ]
+    return result
+
+
+class Session:
+    """Current mapset and region given by the environment (GISRC)
+
+    Tools write their standard output with print() into *output*.
+    """
+
+    def __init__(self, env=None, overwrite=False, mapset=None):
+        self.env = os.environ if env is None else env
+        self.mapset = Path(mapset) if mapset else mapset_path(self.env)
+        self.location = self.mapset.parent
+        self.overwrite = overwrite or self.env.get("GRASS_OVERWRITE") == "1"
+        self.stdin = None
+        self.output = []
+        self._written = set()
+
+    def print(self, *lines):
+        """Write lines to the standard output of the tool"""
+        self.output.extend(f"{line}\n" for line in lines)
+
+    # Region
+
+    def region_path(self, name=None):
+        """Return path of a saved region (current region without a name)"""
+        name = name or self.env.get("WIND_OVERRIDE")
+        return self.mapset / "windows" / name if name else self.mapset / "WIND"
+
+    def region(self):
+        """Return the current region"""
+        if self.env.get("GRASS_REGION"):
+            return parse_region(self.env["GRASS_REGION"])
+        return parse_region(self.region_path().read_text())
+
+    def saved_region(self, name):
+        """Return a region saved by g.region save"""
+        name, unused, mapset = name.partition("@")
+        for directory in self._mapsets(mapset):
+            path = directory / "windows" / name
+            if path.is_file():
+                return parse_region(path.read_text())
+        raise ToolError(f"Region <{name}> not found")
+
+    def write_region(self, region, name=None):
+        """Write the current region (or a saved region with a name)"""
+        path = self.region_path(name)
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(format_region(region))
+
+    # Maps
+
+    def _mapsets(self, mapset=""):
+        if mapset:
+            return [self.location / mapset]
+        return list(dict.fromkeys([self.mapset, self.location / "PERMANENT"]))
+
+    def find(self, name, element):
+        """Return name without mapset and mapset path of an existing map
+
+        The *element* is raster or vector.
+        """
+        base, unused, mapset = name.partition("@")
+        for directory in self._mapsets(mapset):
+            if element == "raster":
+                path = directory / "cellhd" / base
+            else:
+                path = directory / "vector" / base / GEOMETRY
+            if path.is_file():
+                return base, directory
+        raise ToolError(f"{element.capitalize()} map <{name}> not found")
+
+    def exists(self, name, element, current_only=False):
+        """Return True if a map exists (in the current mapset only if requested)"""
+        try:
+            unused, mapset = self.find(name, element)
+        except ToolError:
+            return False
+        return mapset == self.mapset or not current_only
+
+    def list_maps(self, element, mapset=None):
+        """Return names of maps in a mapset (the current one by default)"""
+        directory = self.location / mapset if mapset else self.mapset
+        if element == "raster":
+            directory = directory / "cellhd"
+            names = [path.name for path in directory.glob("*") if path.is_file()]
+        else:
+            directory = directory / "vector"
+            names = [path.parent.name for path in directory.glob(f"*/{GEOMETRY}")]
+        return sorted(names)
+
+    def check_output(self, name, element):
+        """Raise ToolError if an output map exists and cannot be overwritten"""
+        if "@" in name:
+            raise ToolError(f"<{name}> is not a valid output name")
+        written = (element, name) in self._written
+        if not self.overwrite and not written and self.exists(name, element, True):
+            raise ToolError(
+                f"option <output>: <{name}> exists. "
+                "To overwrite, use the --overwrite flag"
+            )
+        self._written.add((element, name))
+
+    def remove(self, name, element):
+        """Remove a map from the current mapset"""
+        if element == "raster":
+            for directory in RASTER_ELEMENTS:
+                (self.mapset / directory / name).unlink(missing_ok=True)
+            shutil.rmtree(self.mapset / "cell_misc" / name, ignore_errors=True)
+        else:
+            shutil.rmtree(self.mapset / "vector" / name, ignore_errors=True)
+
+    # Rasters
+
+    def read_native(self, name):
+        """Return values (NaN for nulls), region, and datatype of a raster"""
+        name, mapset = self.find(name, "raster")
+        region = parse_region((mapset / "cellhd" / name).read_text())
+        path = mapset / "fcell" / name
+        if not path.is_file():
+            path = mapset / "cell" / name
+        data = np.load(path)
+        values = data.astype(np.float64)
+        if data.dtype == np.int32:
+            values[data == INT_NULL] = np.nan
+            return values, region, "CELL"
+        return values, region, "FCELL" if data.dtype == np.float32 else "DCELL"
+
+    def read_raster(self, name, region=None):
+        """Return raster in a region (the current one by default) with NaN nulls"""
+        values, source, unused = self.read_native(name)
+        return sample(values, source, region or self.region())
+
+    def raster_datatype(self, name):
+        """Return CELL, FCELL, or DCELL"""
+        return self.read_native(name)[2]
+
+    def write_raster(self, name, values, datatype="DCELL", colors=None):
+        """Write values (NaN for nulls) as a raster in the current region
+
+        The *colors* is content of a color file, by default the values get
+        the default color table.
+        """
+        from .colors import DEFAULT_TABLE, color_file, table_stops, value_range
+
+        self.check_output(name, "raster")
+        region = self.region()
+        values = np.broadcast_to(
+            np.asarray(values, dtype=np.float64), (region["rows"], region["cols"])
+        )
+        if datatype == "CELL":
+            data = np.where(np.isfinite(values), np.rint(values), INT_NULL)
+            element = "cell"
+        else:
+            data = values
+            element = "fcell"
+        data = data.astype(DATATYPES[datatype])
+        self.remove(name, "raster")
+        for directory in ("cellhd", "cell", "fcell", "colr"):
+            (self.mapset / directory).mkdir(exist_ok=True)
+        header = (
+            format_region(region) + f"format:     {3 if element == 'cell' else -1}\n"
+        )
+        (self.mapset / "cellhd" / name).write_text(header)
+        with open(self.mapset / element / name, "wb") as file:
+            np.save(file, data)
+        if element == "fcell":
+            # GRASS GIS has an empty cell file for floating point maps, too.
+            (self.mapset / "cell" / name).write_bytes(b"")
+        if colors is None:
+            colors = color_file(table_stops(DEFAULT_TABLE, *value_range(values)))
+        self.write_colors(name, colors)
+
+    def write_colors(self, name, text):
+        """Write color file of a raster (which can be in another mapset)"""
+        base, mapset = self.find(name, "raster")
+        if mapset == self.mapset:
+            path = self.mapset / "colr" / base
+        else:
+            path = self.mapset / "colr2" / mapset.name / base
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    def read_colors(self, name):
+        """Return content of the color file of a raster (None if there is none)"""
+        base, mapset = self.find(name, "raster")
+        for path in (
+            self.mapset / "colr2" / mapset.name / base,
+            mapset / "colr" / base,
+        ):
+            if path.is_file():
+                return path.read_text()
+        return None
+
+    # Vectors
+
+    # pylint: disable=too-many-arguments
+    def write_vector(
+        self, name, points=(), lines=(), cells=None, cells_kind="areas", region=None
+    ):
+        """Write vector map with points and lines
+
+        Points are (x, y, category), lines are (category, coordinates).
+        Areas (from rasters) and lines with many vertices (like contours)
+        can be kept as *cells*, a 2D array in the current region or in
+        *region* (area labels, or values on lines and NaN elsewhere).
+        """
+        self.check_output(name, "vector")
+        self.remove(name, "vector")
+        directory = self.mapset / "vector" / name
+        directory.mkdir(parents=True)
+        geometry = {
+            "points": [[float(x), float(y), int(cat)] for x, y, cat in points],
+            "lines": [
+                {"category": int(cat), "coordinates": np.asarray(line).tolist()}
+                for cat, line in lines
+            ],
+            "cells": None,
+        }
+        if cells is not None:
+            geometry["cells"] = {"kind": cells_kind, "region": region or self.region()}
+            with open(directory / CELLS, "wb") as file:
+                np.save(file, np.asarray(cells, dtype=np.float64))
+        (directory / GEOMETRY).write_text(json.dumps(geometry))
+
+    def read_vector(self, name):
+        """Return geometry of a vector map (cells values are under values)"""
+        name, mapset = self.find(name, "vector")
+        directory = mapset / "vector" / name
+        geometry = json.loads((directory / GEOMETRY).read_text())
+        if geometry["cells"]:
+            geometry["cells"]["values"] = np.load(directory / CELLS)
+        return geometry
@@ -0,0 +1,1078 @@
+"""General, raster, and vector tools of the stand-in computed with NumPy
+
+The tools take the options of the GRASS GIS tools they stand in for (those
+used by the activities and by the code in this repository) and create
+outputs of the same kind, computed in simpler ways:
+
+- depressions are filled by the Planchon-Darboux method and flow goes to
+  the steepest lower neighbor (D8, see hydrology.py), so flow
+  accumulation, streams, and basins are similar to r.watershed, not the same,
+- r.sun computes clear-sky irradiance at latitude LATITUDE without cast
+  shadows,
+- contours and areas from rasters are kept as cells (see Session.write_vector)
+  and v.generalize copies its input.
+"""
+
+import fnmatch
+import math
+from pathlib import Path
+
+import numpy as np
+
+from .colors import color_file, rules_stops, table_stops, value_range
+from .hydrology import (
+    accumulate,
+    drainage_directions,
+    receivers,
+    stream_lines,
+)
+from .mapcalc import MapcalcError, run_mapcalc
+from .registry import tool
+from .session import ToolError, complete_region, format_region, parse_region
+
+# Slope added across filled depressions so that water flows out of them
+EPSILON = 1e-5
+# Latitude used by r.sun (the stand-in locations have no projection)
+LATITUDE = 35.7
+SOLAR_CONSTANT = 1367.0
+# Tools have all parameters of the tools they stand in for.
+# pylint: disable=too-many-arguments,unused-argument
+
+SEPARATORS = {"pipe": "|", "comma": ",", "space": " ", "tab": "\t", "newline": "\n"}
+ELEMENTS = {"raster": "raster", "rast": "raster", "cell": "raster", "vector": "vector"}
+
+
+def _numbers(text):
+    return [float(item) for item in text.split(",") if item.strip()]
+
+
+def _names(text):
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def _separator(text):
+    return SEPARATORS.get(text, text)
+
+
+def _shifted(values, outside):
+    """Yield values of each of the 8 neighbors (outside value at edges)"""
+    rows, cols = values.shape
+    padded = np.pad(values, 1, constant_values=outside)
+    for row in range(3):
+        for col in range(3):
+            if row != 1 or col != 1:
+                yield padded[row : row + rows, col : col + cols]
+
+
+def fill_depressions(elevation, epsilon=0.0):
+    """Return elevation with depressions filled up to their spill points
+
+    Water leaves at the edges of the region and of nulls. With *epsilon*,
+    filled areas slope slightly towards the spill point, so that every cell
+    has a lower neighbor.
+    """
+    valid = np.isfinite(elevation)
+    drains = np.zeros(elevation.shape, dtype=bool)
+    for near in _shifted(~valid, outside=True):
+        drains |= near
+    drains &= valid
+    interior = valid & ~drains
+    water = np.where(drains, elevation, np.inf)
+    while True:
+        lowest = np.full(elevation.shape, np.inf)
+        for near in _shifted(water, outside=np.inf):
+            np.minimum(lowest, near, out=lowest)
+        lowest += epsilon
+        new = np.where(
+            interior, np.minimum(water, np.maximum(elevation, lowest)), water
+        )
+        if np.array_equal(new, water):
+            break
+        water = new
+    return np.where(valid, water, np.nan)
+
+
+def flow(elevation, filled=True):
+    """Return drainage directions, receivers, and accumulation for elevation
+
+    Depressions are filled unless *filled* is False. Directions and
+    accumulation are null where the elevation is null.
+    """
+    if filled:
+        elevation = fill_depressions(elevation, EPSILON)
+    drainage = drainage_directions(elevation)
+    receiver = receivers(drainage)
+    cells = accumulate(receiver).reshape(elevation.shape)
+    nulls = np.isnan(elevation)
+    cells[nulls] = np.nan
+    drainage = drainage.astype(np.float64)
+    drainage[nulls] = np.nan
+    return drainage, receiver, cells
+
+
+def label_components(mask):
+    """Label groups of True cells connected by edges or corners
+
+    Returns array of labels (0 for False cells) with the same label for
+    each group (not numbered from 1).
+    """
+    rows, cols = mask.shape
+    outside = mask.size
+    labels = np.where(mask, np.arange(mask.size).reshape(rows, cols), outside)
+    while True:
+        # Lowest label around each cell, then labels of the cells it points to
+        lowest = labels.copy()
+        for near in _shifted(labels, outside=outside):
+            np.minimum(lowest, near, out=lowest)
+        lowest = np.where(mask, lowest, outside)
+        flat = np.append(lowest.ravel(), outside)
+        while True:
+            jumped = flat[flat]
+            if np.array_equal(jumped, flat):
+                break
+            flat = jumped
+        lowest = flat[:-1].reshape(rows, cols)
+        if np.array_equal(lowest, labels):
+            break
+        labels = lowest
+    return np.where(mask, labels + 1, 0)
+
+
+def cell_centers(rows, cols, region):
+    """Return x, y coordinates of centers of cells given by rows and columns"""
+    return np.column_stack(
+        [
+            region["w"] + (np.asarray(cols) + 0.5) * region["ewres"],
+            region["n"] - (np.asarray(rows) + 0.5) * region["nsres"],
+        ]
+    )
+
+
+def contour_levels(values, step, minimum):
+    """Return levels of contours on cells (NaN where no contour passes)
+
+    A contour is on a cell which has a 4-neighbor in a lower band
+    of the contour step, its level is the bottom of the band of the cell.
+    """
+    with np.errstate(invalid="ignore"):
+        band = np.floor((values - minimum) / step)
+    lowest = np.full(values.shape, np.inf)
+    padded = np.pad(band, 1, constant_values=np.nan)
+    rows, cols = values.shape
+    for row, col in ((0, 1), (2, 1), (1, 0), (1, 2)):
+        np.fmin(lowest, padded[row : row + rows, col : col + cols], out=lowest)
+    with np.errstate(invalid="ignore"):
+        return np.where(lowest < band, minimum + band * step, np.nan)
+
+
+def stream_segments(accumulation, receiver, threshold):
+    """Return stream segment of each cell (0 outside streams) and the segments"""
+    segments = stream_lines(accumulation, receiver, threshold)
+    labels = np.zeros(accumulation.size, dtype=np.int64)
+    for number, line in enumerate(segments, start=1):
+        labels[line] = number
+    # A junction belongs to the segment which starts there.
+    for number, line in enumerate(segments, start=1):
+        labels[line[0]] = number
+    return labels, segments
+
+
+def subbasins(receiver, segment_labels):
+    """Return basin of each cell as the stream segment its water reaches
+
+    Water which reaches no stream gets a basin of its outlet.
+    """
+    cells = np.arange(receiver.size)
+    following = np.where((receiver >= 0) & (segment_labels == 0), receiver, cells)
+    while True:
+        jumped = following[following]
+        if np.array_equal(jumped, following):
+            break
+        following = jumped
+    labels = segment_labels[following]
+    outlets = labels == 0
+    unused, outlet_labels = np.unique(following[outlets], return_inverse=True)
+    labels[outlets] = segment_labels.max() + 1 + outlet_labels
+    return labels
+
+
+def segment_lines(segments, shape, region):
+    """Return stream segments as (category, coordinates) lines"""
+    lines = []
+    for category, line in enumerate(segments, start=1):
+        if len(line) < 2:
+            continue
+        rows, cols = np.divmod(line, shape[1])
+        lines.append((category, cell_centers(rows, cols, region)))
+    return lines
+
+
+def gradient(elevation, region, edges=False):
+    """Return west-east and south-north slopes by the Horn method
+
+    Edge cells are NaN unless *edges* is set (then they use the nearest cells).
+    """
+    padded = np.pad(elevation, 1, mode="edge" if edges else "constant")
+    if not edges:
+        padded[0, :] = padded[-1, :] = padded[:, 0] = padded[:, -1] = np.nan
+    rows, cols = elevation.shape
+
+    def cell(row, col):
+        return padded[row : row + rows, col : col + cols]
+
+    west = cell(0, 0) + 2 * cell(1, 0) + cell(2, 0)
+    east = cell(0, 2) + 2 * cell(1, 2) + cell(2, 2)
+    north = cell(0, 0) + 2 * cell(0, 1) + cell(0, 2)
+    south = cell(2, 0) + 2 * cell(2, 1) + cell(2, 2)
+    return (east - west) / (8 * region["ewres"]), (north - south) / (
+        8 * region["nsres"]
+    )
+
+
+def slope_aspect(elevation, region, edges=False):
+    """Return slope (degrees) and aspect (degrees counterclockwise from east)"""
+    dx, dy = gradient(elevation, region, edges)
+    slope = np.degrees(np.arctan(np.hypot(dx, dy)))
+    # Aspect is the direction of the steepest descent.
+    aspect = np.degrees(np.arctan2(-dy, -dx)) % 360
+    # East is 360 as in GRASS GIS, 0 is for flat cells.
+    aspect[aspect == 0] = 360
+    aspect[(dx == 0) & (dy == 0)] = 0
+    aspect[np.isnan(slope)] = np.nan
+    return slope, aspect
+
+
+def cell_index(region, x, y):
+    """Return row and column of the cell with coordinates (None if outside)"""
+    row = int(math.floor((region["n"] - y) / region["nsres"]))
+    col = int(math.floor((x - region["w"]) / region["ewres"]))
+    if 0 <= row < region["rows"] and 0 <= col < region["cols"]:
+        return row, col
+    return None
+
+
+def read_input(session, name):
+    """Return text from a file or standard input (for -)"""
+    if name == "-":
+        return session.stdin or ""
+    return Path(name).read_text()
+
+
+def write_output(session, name, text):
+    """Write text to a file or standard output (for -)"""
+    if name == "-":
+        session.output.append(text)
+    else:
+        Path(name).write_text(text)
+
+
+# General tools
+
+
+@tool("g.version")
+def g_version(session, flags=""):
+    """Print version"""
+    if "g" in flags:
+        session.print("version=8.3.0", "build_off_t_size=8")
+    else:
+        session.print("GRASS 8.3.0 (stand-in)")
+
+
+def set_region(session, options, flags=""):
+    """Return region given by g.region options based on the current region"""
+    region = dict(session.region())
+    if "d" in flags:
+        path = session.location / "PERMANENT" / "DEFAULT_WIND"
+        region = parse_region(path.read_text())
+    if options.get("region"):
+        region = session.saved_region(options["region"])
+    nsres, ewres = region["nsres"], region["ewres"]
+    if options.get("raster"):
+        regions = [session.read_native(name)[1] for name in _names(options["raster"])]
+        region["n"] = max(item["n"] for item in regions)
+        region["s"] = min(item["s"] for item in regions)
+        region["e"] = max(item["e"] for item in regions)
+        region["w"] = min(item["w"] for item in regions)
+        nsres, ewres = regions[0]["nsres"], regions[0]["ewres"]
+    for key in ("n", "s", "e", "w"):
+        if options.get(key):
+            region[key] = float(options[key])
+    if options.get("res"):
+        nsres = ewres = float(options["res"])
+    if options.get("nsres"):
+        nsres = float(options["nsres"])
+    if options.get("ewres"):
+        ewres = float(options["ewres"])
+    if options.get("rows"):
+        nsres = (region["n"] - region["s"]) / int(options["rows"])
+    if options.get("cols"):
+        ewres = (region["e"] - region["w"]) / int(options["cols"])
+    if "a" in flags:
+        # Align the extent to the resolution.
+        region["n"] = math.ceil(region["n"] / nsres - 1e-9) * nsres
+        region["s"] = math.floor(region["s"] / nsres + 1e-9) * nsres
+        region["e"] = math.ceil(region["e"] / ewres - 1e-9) * ewres
+        region["w"] = math.floor(region["w"] / ewres + 1e-9) * ewres
+    region["rows"] = max(round((region["n"] - region["s"]) / nsres), 1)
+    region["cols"] = max(round((region["e"] - region["w"]) / ewres), 1)
+    return complete_region(region)
+
+
+@tool("g.region")
+def g_region(
+    session,
+    region=None,
+    raster=None,
+    n=None,
+    s=None,
+    e=None,
+    w=None,
+    res=None,
+    nsres=None,
+    ewres=None,
+    rows=None,
+    cols=None,
+    save=None,
+    flags="",
+):
+    """Set, save, or print the current region"""
+    options = {key: value for key, value in locals().items() if key != "session"}
+    new = set_region(session, options, flags)
+    if "u" not in flags:
+        session.write_region(new)
+    if save:
+        if session.region_path(save).is_file() and not session.overwrite:
+            raise ToolError(
+                f"<{save}> already exists. To overwrite, use the --overwrite flag"
+            )
+        session.write_region(new, name=save)
+    if "g" in flags:
+        session.print(
+            "projection=99",
+            "zone=0",
+            *[f"{key}={new[key]:.15g}" for key in ("n", "s", "w", "e")],
+            f"nsres={new['nsres']:.15g}",
+            f"ewres={new['ewres']:.15g}",
+            f"rows={new['rows']}",
+            f"cols={new['cols']}",
+            f"cells={new['rows'] * new['cols']}",
+        )
+    elif "p" in flags:
+        session.print(format_region(new).rstrip("\n"))
+
+
+@tool("g.remove")
+def g_remove(session, type, name=None, pattern=None, exclude=None, flags=""):
+    """Remove maps from the current mapset (only lists them without -f)"""
+    # pylint: disable=redefined-builtin
+    for kind in _names(type):
+        element = ELEMENTS.get(kind)
+        if not element:
+            continue
+        existing = session.list_maps(element)
+        names = _names(name) if name else []
+        if pattern:
+            names += [item for item in existing if fnmatch.fnmatch(item, pattern)]
+        if exclude:
+            names = [item for item in names if not fnmatch.fnmatch(item, exclude)]
+        for item in names:
+            if item not in existing:
+                continue
+            if "f" in flags:
+                session.remove(item, element)
+            else:
+                session.print(f"{element}/{item}@{session.mapset.name}")
+
+
+@tool("g.list")
+def g_list(session, type, pattern=None, mapset=None, separator="newline", flags=""):
+    """Print names of maps"""
+    # pylint: disable=redefined-builtin
+    names = []
+    for kind in _names(type):
+        element = ELEMENTS.get(kind)
+        if element:
+            names += session.list_maps(element, mapset)
+    if pattern:
+        names = [item for item in names if fnmatch.fnmatch(item, pattern)]
+    if names:
+        session.print(_separator(separator).join(names))
+
+
+@tool("g.findfile")
+def g_findfile(session, element, file, mapset=None, flags=""):
+    """Print name, mapset, and path of a map (empty if not found)"""
+    # pylint: disable=redefined-builtin
+    kind = ELEMENTS.get(element, "raster" if element == "cellhd" else element)
+    name = f"{file}@{mapset}" if mapset and "@" not in file else file
+    found = ("", "", "", "")
+    try:
+        if kind == "windows":
+            base, unused, other = name.partition("@")
+            path = session.location / (other or session.mapset.name) / "windows" / base
+            if not path.is_file():
+                raise ToolError(f"Region <{name}> not found")
+            found = (base, path.parent.parent.name, path)
+        else:
+            base, directory = session.find(name, kind)
+            found = (base, directory.name, directory / element / base)
+        found = found[:2] + (f"{found[0]}@{found[1]}",) + found[2:]
+    except ToolError:
+        if "n" not in flags:
+            raise
+    for key, value in zip(("name", "mapset", "fullname", "file"), found):
+        session.print(f"{key}={value}")
+
+
+# Raster tools
+
+
+@tool("r.info")
+def r_info(session, map, flags=""):
+    """Print region, data type, and range of a raster"""
+    # pylint: disable=redefined-builtin
+    values, region, datatype = session.read_native(map)
+    minimum, maximum = value_range(values)
+    if "g" in flags or not flags:
+        session.print(
+            *[
+                f"{key}={region[short]:.15g}"
+                for key, short in (
+                    ("north", "n"),
+                    ("south", "s"),
+                    ("east", "e"),
+                    ("west", "w"),
+                    ("nsres", "nsres"),
+                    ("ewres", "ewres"),
+                )
+            ],
+            f"rows={region['rows']}",
+            f"cols={region['cols']}",
+            f"cells={region['rows'] * region['cols']}",
+            f"datatype={datatype}",
+            "ncats=0",
+        )
+    if "r" in flags or not flags:
+        session.print(f"min={minimum:.15g}", f"max={maximum:.15g}")
+    if "e" in flags:
+        name, mapset = session.find(map, "raster")
+        session.print(f"map={name}", f"mapset={mapset.name}", "title=")
+
+
+@tool("r.what")
+def r_what(session, map, coordinates, null_value="*", separator="pipe", flags=""):
+    """Print values of rasters at coordinates"""
+    # pylint: disable=redefined-builtin
+    region = session.region()
+    rasters = [session.read_raster(name) for name in _names(map)]
+    numbers = _numbers(coordinates)
+    separator = _separator(separator)
+    for x, y in zip(numbers[::2], numbers[1::2]):
+        cell = cell_index(region, x, y)
+        values = []
+        for raster in rasters:
+            value = raster[cell] if cell else np.nan
+            values.append(f"{value:.15g}" if np.isfinite(value) else null_value)
+        session.print(separator.join([f"{x:.15g}", f"{y:.15g}", ""] + values))
+
+
+@tool("r.out.bin")
+def r_out_bin(session, input, output, null="0", bytes=None, order="native", flags=""):
+    """Export raster in the current region as a binary array"""
+    # pylint: disable=redefined-builtin
+    values = session.read_raster(input)
+    null_value = np.nan if null == "nan" else float(null)
+    values = np.where(np.isfinite(values), values, null_value)
+    if "f" in flags or session.raster_datatype(input) != "CELL":
+        dtype = np.float64 if bytes == "8" else np.float32
+    else:
+        dtype = {"1": np.int8, "2": np.int16, "8": np.int64}.get(bytes, np.int32)
+    data = values.astype(dtype)
+    if order in ("big", "swap") and data.dtype.byteorder != ">":
+        data = data.byteswap()
+    data.tofile(output)
+
+
+@tool("r.resamp.stats")
+def r_resamp_stats(session, input, output, method="average", quantile=None, flags=""):
+    """Aggregate raster values into cells of the current region"""
+    # pylint: disable=redefined-builtin
+    values, source, unused = session.read_native(input)
+    region = session.region()
+    y = source["n"] - (np.arange(source["rows"]) + 0.5) * source["nsres"]
+    x = source["w"] + (np.arange(source["cols"]) + 0.5) * source["ewres"]
+    rows = np.floor((region["n"] - y) / region["nsres"]).astype(np.int64)
+    cols = np.floor((x - region["w"]) / region["ewres"]).astype(np.int64)
+    inside = np.logical_and.outer(
+        (rows >= 0) & (rows < region["rows"]), (cols >= 0) & (cols < region["cols"])
+    )
+    inside &= np.isfinite(values)
+    index = np.add.outer(rows * region["cols"], cols)[inside]
+    values = values[inside]
+    size = region["rows"] * region["cols"]
+    counts = np.bincount(index, minlength=size).astype(np.float64)
+    if method == "average":
+        result = np.bincount(index, weights=values, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result /= counts
+    elif method == "sum":
+        result = np.bincount(index, weights=values, minlength=size)
+    elif method == "count":
+        result = counts
+    elif method in ("minimum", "maximum"):
+        initial = np.inf if method == "minimum" else -np.inf
+        result = np.full(size, initial)
+        function = np.minimum if method == "minimum" else np.maximum
+        function.at(result, index, values)
+    else:
+        raise ToolError(f"Method <{method}> is not supported by the stand-in")
+    if method != "count":
+        result[counts == 0] = np.nan
+    session.write_raster(output, result.reshape(region["rows"], region["cols"]))
+
+
+@tool("r.mapcalc")
+def r_mapcalc(session, expression=None, file=None, seed=None, flags=""):
+    """Evaluate raster map algebra (the subset supported by mapcalc.py)"""
+    # pylint: disable=redefined-builtin
+    text = expression if expression is not None else read_input(session, file or "-")
+    try:
+        run_mapcalc(session, text)
+    except MapcalcError as error:
+        raise ToolError(f"Expression not supported by the stand-in: {error}")
+
+
+@tool("r.colors")
+def r_colors(session, map=None, color=None, raster=None, rules=None, flags=""):
+    """Set color table of rasters"""
+    # pylint: disable=redefined-builtin
+    if not map:
+        raise ToolError("r.colors: Required parameter <map> not set")
+    for name in _names(map):
+        values = session.read_native(name)[0]
+        minimum, maximum = value_range(values)
+        null_color = None
+        if rules:
+            text = read_input(session, rules)
+            stops, null_color = rules_stops(text, minimum, maximum, "n" in flags)
+        elif raster:
+            session.write_colors(name, session.read_colors(raster))
+            continue
+        elif color:
+            stops = table_stops(color, minimum, maximum, "n" in flags)
+        elif "r" in flags:
+            stops = table_stops("viridis", minimum, maximum)
+        else:
+            raise ToolError("One of options color, raster, or rules is required")
+        session.write_colors(name, color_file(stops, null_color))
+
+
+@tool("r.slope.aspect")
+def r_slope_aspect(
+    session,
+    elevation,
+    slope=None,
+    aspect=None,
+    format="degrees",
+    precision="FCELL",
+    zscale="1.0",
+    min_slope="0.0",
+    nprocs=None,
+    memory=None,
+    flags="",
+):
+    """Compute slope and aspect (Horn method, edges are null without -e)"""
+    # pylint: disable=redefined-builtin
+    values = session.read_raster(elevation) * float(zscale)
+    slope_values, aspect_values = slope_aspect(
+        values, session.region(), edges="e" in flags
+    )
+    if slope:
+        if format == "percent":
+            slope_values = 100 * np.tan(np.radians(slope_values))
+        session.write_raster(slope, slope_values, precision)
+    if aspect:
+        aspect_values[slope_values <= float(min_slope)] = np.nan
+        if "n" in flags:
+            # Compass orientation (clockwise from north)
+            aspect_values = (450 - aspect_values) % 360
+        session.write_raster(aspect, aspect_values, precision)
+
+
+@tool("r.fill.dir")
+def r_fill_dir(session, input, output, direction, areas=None, format="grass", flags=""):
+    """Fill depressions and compute flow directions (r.watershed codes)"""
+    # pylint: disable=redefined-builtin
+    values = session.read_raster(input)
+    filled = fill_depressions(values)
+    session.write_raster(output, filled)
+    drainage = drainage_directions(filled).astype(np.float64)
+    drainage[np.isnan(values)] = np.nan
+    session.write_raster(direction, drainage, "CELL")
+    if areas:
+        # Cells in depressions which were filled
+        session.write_raster(areas, np.where(filled > values, 1, np.nan), "CELL")
+
+
+@tool("r.watershed")
+def r_watershed(
+    session,
+    elevation,
+    threshold=None,
+    accumulation=None,
+    drainage=None,
+    basin=None,
+    stream=None,
+    memory=None,
+    convergence=None,
+    flags="",
+):
+    """Compute flow accumulation, drainage directions, basins, and streams"""
+    values = session.read_raster(elevation)
+    directions, receiver, cells = flow(values)
+    nulls = np.isnan(values)
+    if accumulation:
+        session.write_raster(accumulation, cells)
+    if drainage:
+        session.write_raster(drainage, directions, "CELL")
+    if basin or stream:
+        if not threshold:
+            raise ToolError("Option threshold is required for basin and stream")
+        labels, unused = stream_segments(cells, receiver, float(threshold))
+        if stream:
+            segments = np.where(labels > 0, labels, np.nan).reshape(values.shape)
+            session.write_raster(stream, segments, "CELL")
+        if basin:
+            basins = subbasins(receiver, labels).astype(np.float64)
+            basins = basins.reshape(values.shape)
+            basins[nulls] = np.nan
+            session.write_raster(basin, basins, "CELL")
+
+
+@tool("r.stream.extract")
+def r_stream_extract(
+    session,
+    elevation,
+    threshold,
+    accumulation=None,
+    depression=None,
+    stream_length=None,
+    d8cut=None,
+    mexp=None,
+    memory=None,
+    stream_raster=None,
+    stream_vector=None,
+    direction=None,
+    flags="",
+):
+    """Extract streams with accumulation over a threshold"""
+    values = session.read_raster(elevation)
+    region = session.region()
+    directions, receiver, cells = flow(values)
+    if accumulation:
+        cells = np.abs(session.read_raster(accumulation))
+    labels, segments = stream_segments(cells, receiver, float(threshold))
+    if stream_raster:
+        streams = np.where(labels > 0, labels, np.nan).reshape(values.shape)
+        session.write_raster(stream_raster, streams, "CELL")
+    if stream_vector:
+        lines = segment_lines(segments, values.shape, region)
+        session.write_vector(stream_vector, lines=lines)
+    if direction:
+        session.write_raster(direction, directions, "CELL")
+
+
+@tool("r.accumulate")
+def r_accumulate(
+    session,
+    direction,
+    format="auto",
+    accumulation=None,
+    threshold=None,
+    stream=None,
+    flags="",
+):
+    """Compute flow accumulation and streams from flow directions"""
+    # pylint: disable=redefined-builtin
+    if format not in ("auto", "degree45"):
+        raise ToolError(f"Format <{format}> is not supported by the stand-in")
+    directions = session.read_raster(direction)
+    receiver = receivers(np.abs(directions))
+    cells = accumulate(receiver).reshape(directions.shape)
+    cells[np.isnan(directions)] = np.nan
+    if accumulation:
+        session.write_raster(accumulation, cells)
+    if stream:
+        if not threshold:
+            raise ToolError("Option threshold is required for stream")
+        unused, segments = stream_segments(cells, receiver, float(threshold))
+        lines = segment_lines(segments, directions.shape, session.region())
+        session.write_vector(stream, lines=lines)
+
+
+@tool("r.flow")
+def r_flow(
+    session,
+    elevation,
+    aspect=None,
+    barrier=None,
+    skip=None,
+    bound=None,
+    offset=None,
+    flowline=None,
+    flowlength=None,
+    flowaccumulation=None,
+    flags="",
+):
+    """Compute flow accumulation (without filling depressions)"""
+    values = session.read_raster(elevation)
+    if flowaccumulation:
+        cells = flow(values, filled=False)[2]
+        session.write_raster(flowaccumulation, cells, "FCELL")
+    if flowline or flowlength:
+        raise ToolError("Flow lines and lengths are not supported by the stand-in")
+
+
+@tool("r.topidx")
+def r_topidx(session, input, output):
+    """Compute topographic index ln(a / tan(beta))"""
+    # pylint: disable=redefined-builtin
+    values = session.read_raster(input)
+    region = session.region()
+    area = flow(values)[2] * region["ewres"]
+    slope = np.radians(slope_aspect(values, region, edges=True)[0])
+    tangent = np.maximum(np.tan(slope), 1e-4)
+    index = np.log(area / tangent)
+    index[np.isnan(values)] = np.nan
+    session.write_raster(output, index)
+
+
+@tool("r.contour")
+def r_contour(
+    session,
+    input,
+    output,
+    step=None,
+    levels=None,
+    minlevel=None,
+    maxlevel=None,
+    cut="0",
+    flags="",
+):
+    """Create contours (kept as cells) of a raster"""
+    # pylint: disable=redefined-builtin
+    if not step or levels:
+        raise ToolError("Only contours with a step are supported by the stand-in")
+    values = session.read_raster(input)
+    contours = contour_levels(values, float(step), float(minlevel or 0))
+    with np.errstate(invalid="ignore"):
+        if minlevel:
+            contours[contours < float(minlevel)] = np.nan
+        if maxlevel:
+            contours[contours > float(maxlevel)] = np.nan
+    session.write_vector(output, cells=contours, cells_kind="lines")
+
+
+@tool("r.lake")
+def r_lake(
+    session, elevation, water_level, lake, coordinates=None, seed=None, flags=""
+):
+    """Fill a lake to a water level from a seed (depth of water)"""
+    values = session.read_raster(elevation)
+    region = session.region()
+    level = float(water_level)
+    with np.errstate(invalid="ignore"):
+        flooded = values < level
+    seeds = np.zeros(values.shape, dtype=bool)
+    if coordinates:
+        numbers = _numbers(coordinates)
+        for x, y in zip(numbers[::2], numbers[1::2]):
+            cell = cell_index(region, x, y)
+            if cell:
+                seeds[cell] = True
+    elif seed:
+        seeds = np.isfinite(session.read_raster(seed))
+    else:
+        raise ToolError("Option coordinates or seed is required")
+    labels = label_components(flooded)
+    lake_labels = np.unique(labels[seeds & flooded])
+    water = np.isin(labels, lake_labels[lake_labels > 0])
+    depth = np.where(water, level - values, np.nan)
+    stops = table_stops("water", *value_range(depth))
+    session.write_raster(lake, depth, "FCELL", colors=color_file(stops))
+
+
+@tool("r.stats.zonal")
+def r_stats_zonal(session, base, cover, method, output, flags=""):
+    """Compute statistics of cover values in zones of base"""
+    zones = session.read_raster(base)
+    values = session.read_raster(cover)
+    valid = np.isfinite(zones) & np.isfinite(values)
+    labels, inverse = np.unique(zones[valid], return_inverse=True)
+    counts = np.bincount(inverse, minlength=labels.size).astype(np.float64)
+    if method in ("average", "sum"):
+        result = np.bincount(inverse, weights=values[valid], minlength=labels.size)
+        if method == "average":
+            result /= counts
+    elif method == "count":
+        result = counts
+    elif method in ("min", "max"):
+        function = np.minimum if method == "min" else np.maximum
+        result = np.full(labels.size, np.inf if method == "min" else -np.inf)
+        function.at(result, inverse, values[valid])
+    else:
+        raise ToolError(f"Method <{method}> is not supported by the stand-in")
+    output_values = np.full(zones.shape, np.nan)
+    zone_valid = np.isfinite(zones)
+    positions = np.searchsorted(labels, zones[zone_valid])
+    known = positions < labels.size
+    known[known] = labels[positions[known]] == zones[zone_valid][known]
+    zone_values = np.full(positions.size, np.nan)
+    zone_values[known] = result[positions[known]]
+    output_values[zone_valid] = zone_values
+    session.write_raster(output, output_values)
+
+
+def sun_position(day, hour, latitude=LATITUDE):
+    """Return unit vector (east, north, up) towards the sun"""
+    declination = math.radians(23.45 * math.sin(2 * math.pi * (284 + day) / 365))
+    angle = math.radians(15 * (hour - 12))
+    latitude = math.radians(latitude)
+    east = -math.cos(declination) * math.sin(angle)
+    north = math.sin(declination) * math.cos(latitude) - math.cos(
+        declination
+    ) * math.sin(latitude) * math.cos(angle)
+    up = math.sin(latitude) * math.sin(declination) + math.cos(latitude) * math.cos(
+        declination
+    ) * math.cos(angle)
+    return east, north, up
+
+
+def irradiance(normal, sun, linke, albedo):
+    """Return beam, diffuse, and reflected irradiance (W/m2) for a clear sky
+
+    The beam irradiance follows the ESRA model used by r.sun.
+    """
+    east, north, up = sun
+    if up <= 0:
+        zeros = np.zeros(normal[0].shape)
+        return zeros, zeros, zeros
+    mass = 1 / max(up, 0.01)
+    thickness = 1 / (
+        6.6296 + 1.7513 * mass - 0.1202 * mass**2 + 0.0065 * mass**3 - 0.00013 * mass**4
+    )
+    incidence = np.maximum(normal[0] * east + normal[1] * north + normal[2] * up, 0)
+    beam_normal = SOLAR_CONSTANT * math.exp(-0.8662 * linke * mass * thickness)
+    beam = beam_normal * incidence
+    horizontal_diffuse = SOLAR_CONSTANT * max(
+        0.0065 + (-0.045 + 0.0646 * linke) * up + (0.014 - 0.0327 * linke) * up**2,
+        0,
+    )
+    diffuse = horizontal_diffuse * (1 + normal[2]) / 2
+    reflected = albedo * (beam_normal * up + horizontal_diffuse) * (1 - normal[2]) / 2
+    return beam, diffuse, reflected
+
+
+@tool("r.sun")
+def r_sun(
+    session,
+    elevation,
+    day,
+    time=None,
+    step="0.5",
+    linke_value="3.0",
+    albedo_value="0.2",
+    glob_rad=None,
+    beam_rad=None,
+    diff_rad=None,
+    refl_rad=None,
+    incidout=None,
+    nprocs=None,
+    memory=None,
+    flags="",
+):
+    """Compute clear-sky irradiance (with time) or irradiation for a day"""
+    values = session.read_raster(elevation)
+    dx, dy = gradient(values, session.region(), edges=True)
+    length = np.sqrt(dx**2 + dy**2 + 1)
+    normal = (-dx / length, -dy / length, 1 / length)
+    linke = float(linke_value)
+    albedo = float(albedo_value)
+    if time is not None:
+        hours = [float(time)]
+        duration = 1.0
+    else:
+        if incidout:
+            raise ToolError("Option incidout needs time")
+        duration = float(step)
+        hours = np.arange(0, 24, duration) + duration / 2
+    totals = [np.zeros(values.shape) for unused in range(3)]
+    for hour in hours:
+        parts = irradiance(normal, sun_position(int(day), hour), linke, albedo)
+        for total, part in zip(totals, parts):
+            total += part * duration
+    nulls = np.isnan(values)
+    outputs = {
+        glob_rad: sum(totals),
+        beam_rad: totals[0],
+        diff_rad: totals[1],
+        refl_rad: totals[2],
+    }
+    if incidout:
+        sun = sun_position(int(day), hours[0])
+        cosine = normal[0] * sun[0] + normal[1] * sun[1] + normal[2] * sun[2]
+        outputs[incidout] = np.where(
+            cosine > 0, np.degrees(np.arcsin(np.clip(cosine, 0, 1))), np.nan
+        )
+    for name, result in outputs.items():
+        if name:
+            result[nulls] = np.nan
+            session.write_raster(name, result, "FCELL")
+
+
+@tool("r.to.vect")
+def r_to_vect(session, input, output, type, column=None, flags=""):
+    """Convert raster to areas or lines (kept as cells) or points"""
+    # pylint: disable=redefined-builtin
+    values = session.read_raster(input)
+    if type == "point":
+        rows, cols = np.nonzero(np.isfinite(values))
+        coordinates = cell_centers(rows, cols, session.region())
+        categories = values[rows, cols]
+        if "v" not in flags:
+            categories = np.arange(1, len(rows) + 1)
+        points = [(x, y, cat) for (x, y), cat in zip(coordinates, categories)]
+        session.write_vector(output, points=points)
+    elif type == "area":
+        session.write_vector(output, cells=values, cells_kind="areas")
+    elif type == "line":
+        lines = np.where(np.isfinite(values), 1.0, np.nan)
+        session.write_vector(output, cells=lines, cells_kind="lines")
+    else:
+        raise ToolError(f"Type <{type}> is not supported")
+
+
+# Vector tools
+
+
+def parse_standard(text, header=True):
+    """Return points and lines from the standard vector ASCII format"""
+    lines = iter(text.splitlines())
+    if header:
+        for line in lines:
+            if line.startswith("VERTI:"):
+                break
+    points = []
+    features = []
+    for line in lines:
+        parts = line.split()
+        if not parts:
+            continue
+        kind = parts[0].upper()
+        count = int(parts[1])
+        categories = int(parts[2]) if len(parts) > 2 else 0
+        coordinates = [
+            [float(value) for value in next(lines).split()[:2]]
+            for unused in range(count)
+        ]
+        category = 0
+        for unused in range(categories):
+            category = int(next(lines).split()[1])
+        if kind in ("P", "C"):
+            points.extend((x, y, category) for x, y in coordinates)
+        elif kind in ("L", "B"):
+            features.append((category, coordinates))
+    return points, features
+
+
+@tool("v.in.ascii")
+def v_in_ascii(
+    session,
+    input,
+    output,
+    format="point",
+    separator="pipe",
+    x="1",
+    y="2",
+    cat="0",
+    skip="0",
+    columns=None,
+    flags="",
+):
+    """Import points (or points and lines in the standard format) from text"""
+    # pylint: disable=redefined-builtin
+    text = read_input(session, input)
+    if format == "standard":
+        points, lines = parse_standard(text, header="n" not in flags)
+        session.write_vector(output, points=points, lines=lines)
+        return
+    separator = _separator(separator)
+    points = []
+    for number, line in enumerate(text.splitlines()[int(skip) :], start=1):
+        if not line.strip() or line.startswith("#"):
+            continue
+        parts = line.split() if separator == " " else line.split(separator)
+        category = int(parts[int(cat) - 1]) if int(cat) else number
+        points.append((float(parts[int(x) - 1]), float(parts[int(y) - 1]), category))
+    session.write_vector(output, points=points)
+
+
+@tool("v.out.ascii")
+def v_out_ascii(
+    session,
+    input,
+    output="-",
+    layer="1",
+    type="point,line,boundary,centroid,area,face,kernel",
+    format="point",
+    separator="pipe",
+    precision="8",
+    columns=None,
+    flags="",
+):
+    """Export points (or points and lines in the standard format) as text"""
+    # pylint: disable=redefined-builtin
+    geometry = session.read_vector(input)
+    types = _names(type)
+    digits = int(precision)
+    records = []
+    if format == "standard":
+        if "point" in types:
+            for x, y, category in geometry["points"]:
+                records += [
+                    "P 1 1",
+                    f" {x:.{digits}f} {y:.{digits}f}",
+                    f" 1 {category}",
+                ]
+        if "line" in types:
+            for line in geometry["lines"]:
+                records.append(f"L {len(line['coordinates'])} 1")
+                records += [
+                    f" {x:.{digits}f} {y:.{digits}f}" for x, y in line["coordinates"]
+                ]
+                records.append(f" 1 {line['category']}")
+    elif "point" in types:
+        separator = _separator(separator)
+        for x, y, category in geometry["points"]:
+            records.append(
+                separator.join([f"{x:.{digits}f}", f"{y:.{digits}f}", str(category)])
+            )
+    write_output(session, output, "".join(f"{record}\n" for record in records))
+
+
+@tool("v.generalize")
+def v_generalize(
+    session, input, output, type=None, method=None, threshold=None, flags=""
+):
+    """Copy a vector map (the stand-in does not simplify lines)"""
+    # pylint: disable=redefined-builtin
+    geometry = session.read_vector(input)
+    cells = geometry["cells"]
+    session.write_vector(
+        output,
+        points=geometry["points"],
+        lines=[(line["category"], line["coordinates"]) for line in geometry["lines"]],
+        cells=cells["values"] if cells else None,
+        cells_kind=cells["kind"] if cells else "areas",
+        region=cells["region"] if cells else None,
+    )
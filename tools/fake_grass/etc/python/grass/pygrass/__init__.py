@@ -0,0 +1 @@
+"""Stand-in for the parts of grass.pygrass used by the activities"""
@@ -0,0 +1,90 @@
+"""Stand-in for vector maps of grass.pygrass (points and lines only)"""
+
+import sys
+
+from grass.fake import Session, ToolError
+
+from .geometry import Line, Point
+
+
+class VectorTopo:
+    """Vector map in the current mapset which is written as a whole on close"""
+
+    def __init__(self, name, mapset="", *args, **kwargs):
+        # pylint: disable=keyword-arg-before-vararg,unused-argument
+        self.name = name
+        self.mapset = mapset
+        self.mode = None
+        self._features = []
+        self._overwrite = None
+
+    def exist(self):
+        """Return True if the map exists"""
+        name = f"{self.name}@{self.mapset}" if self.mapset else self.name
+        return Session().exists(name, "vector")
+
+    def is_open(self):
+        """Return True if the map is open"""
+        return self.mode is not None
+
+    def open(self, mode="r", overwrite=None, **kwargs):
+        """Open the map for reading (r) or writing (w)"""
+        # pylint: disable=unused-argument
+        if mode == "r":
+            geometry = Session().read_vector(self.name)
+            self._features = [Point(x, y) for x, y, unused in geometry["points"]]
+            self._features += [Line(line["coordinates"]) for line in geometry["lines"]]
+        elif mode == "w":
+            if overwrite is None and self.exist():
+                print(
+                    f"WARNING: Vector map <{self.name}> already exists"
+                    " and will be overwritten",
+                    file=sys.stderr,
+                )
+            self._overwrite = overwrite is None or overwrite
+            self._features = []
+        else:
+            raise ValueError(f"Mode {mode} is not supported")
+        self.mode = mode
+
+    def write(self, geo_obj, cat=None, attrs=None):
+        """Add a feature (written when the map is closed)"""
+        # pylint: disable=unused-argument
+        if self.mode != "w":
+            raise ValueError("The map is not open for writing")
+        geo_obj.cat = cat if cat is not None else len(self._features) + 1
+        self._features.append(geo_obj)
+
+    def close(self, build=True):
+        """Close the map (writing it if open for writing)"""
+        # pylint: disable=unused-argument
+        if self.mode == "w":
+            points = [
+                (feature.x, feature.y, feature.cat)
+                for feature in self._features
+                if isinstance(feature, Point)
+            ]
+            lines = [
+                (feature.cat, feature.to_list())
+                for feature in self._features
+                if isinstance(feature, Line)
+            ]
+            session = Session(overwrite=self._overwrite)
+            try:
+                session.write_vector(self.name, points=points, lines=lines)
+            except ToolError as error:
+                raise OSError(str(error)) from error
+        self.mode = None
+
+    def __iter__(self):
+        return iter(self._features)
+
+    def __len__(self):
+        return len(self._features)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.is_open():
+            self.close()
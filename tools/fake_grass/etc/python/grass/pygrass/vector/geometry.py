@@ -0,0 +1,34 @@
+"""Stand-in for geometry features of grass.pygrass.vector"""
+
+
+class Point:
+    """Point with x and y coordinates"""
+
+    def __init__(self, x=0, y=0, z=None):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = z
+        self.cat = None
+
+    def coords(self):
+        """Return coordinates as a tuple"""
+        return (self.x, self.y)
+
+
+class Line:
+    """Line with a list of points"""
+
+    def __init__(self, points=None):
+        self.points = [
+            point if isinstance(point, Point) else Point(*point)
+            for point in points or []
+        ]
+        self.cat = None
+
+    def append(self, point):
+        """Add a point at the end of the line"""
+        self.points.append(point if isinstance(point, Point) else Point(*point))
+
+    def to_list(self):
+        """Return coordinates of points as a list of tuples"""
+        return [point.coords() for point in self.points]
@@ -0,0 +1,4 @@
+"""Stand-in for grass.script (see grass.fake)"""
+
+from .core import *  # noqa: F401,F403
+from .raster import mapcalc, raster_info, raster_what  # noqa: F401
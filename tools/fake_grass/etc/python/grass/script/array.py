@@ -0,0 +1,51 @@
+"""Stand-in for grass.script.array reading and writing rasters as arrays"""
+
+import numpy as np
+
+from grass.exceptions import CalledModuleError
+from grass.fake import Session, ToolError
+
+
+class array(np.ndarray):  # pylint: disable=invalid-name
+    """NumPy array with the shape of the current region"""
+
+    def __new__(cls, mapname=None, null=None, dtype=np.double, env=None):
+        region = Session(env).region()
+        self = np.ndarray.__new__(
+            cls, shape=(region["rows"], region["cols"]), dtype=dtype
+        )
+        self.env = env
+        if mapname:
+            self.read(mapname, null)
+        return self
+
+    def __array_finalize__(self, obj):
+        self.env = getattr(obj, "env", None)
+
+    def read(self, mapname, null=None):
+        """Read raster into the array (nulls become *null*, NaN or 0 by default)"""
+        try:
+            values = Session(self.env).read_raster(mapname)
+        except ToolError as error:
+            raise CalledModuleError("r.out.bin", "r.out.bin", 1, str(error)) from error
+        if null is None:
+            null = np.nan if self.dtype.kind == "f" else 0
+        self[...] = np.where(np.isnan(values), float(null), values)
+
+    def write(self, mapname, title=None, null=None, overwrite=None, quiet=None):
+        """Write the array as a raster (cells equal to *null* become nulls)"""
+        # pylint: disable=unused-argument,too-many-arguments
+        values = np.asarray(self, dtype=np.float64)
+        if null is not None:
+            values = np.where(values == float(null), np.nan, values)
+        if self.dtype.kind in "iub":
+            datatype = "CELL"
+        elif self.dtype == np.float32:
+            datatype = "FCELL"
+        else:
+            datatype = "DCELL"
+        session = Session(self.env, overwrite=bool(overwrite))
+        try:
+            session.write_raster(mapname, values, datatype)
+        except ToolError as error:
+            raise CalledModuleError("r.in.bin", "r.in.bin", 1, str(error)) from error
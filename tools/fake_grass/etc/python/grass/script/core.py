@@ -0,0 +1,326 @@
+"""Stand-in for grass.script.core running the stand-in tools in-process
+
+Tools which are not implemented by the stand-in are started as processes
+through Popen as GRASS GIS does it (which fails when there is no such
+executable).
+"""
+
+import os
+import sys
+from subprocess import PIPE, Popen  # noqa: F401
+
+from grass.exceptions import CalledModuleError
+from grass.fake import TOOLS, Session, ToolError, call_tool
+from grass.fake.session import format_region
+from grass.fake.tools import set_region
+
+# Parameters of start_command which are passed to Popen, not to the tool
+POPEN_PARAMETERS = {
+    "bufsize",
+    "executable",
+    "stdin",
+    "stdout",
+    "stderr",
+    "preexec_fn",
+    "close_fds",
+    "cwd",
+    "env",
+    "universal_newlines",
+    "text",
+    "startupinfo",
+    "creationflags",
+}
+# Verbosity parameters which the stand-in tools ignore
+VERBOSITY_PARAMETERS = {"quiet", "verbose", "superquiet"}
+
+
+def _option_value(value):
+    """Return option value as text (lists are joined by commas)"""
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(item) for item in value)
+    return str(value)
+
+
+def make_options(kwargs):
+    """Return tool options from keyword arguments (without None values)
+
+    A trailing underscore is removed to allow for options which are Python
+    keywords (e.g., lambda_).
+    """
+    options = {}
+    for key, value in kwargs.items():
+        if value is None or key in POPEN_PARAMETERS | VERBOSITY_PARAMETERS:
+            continue
+        options[key.rstrip("_").lstrip("_")] = _option_value(value)
+    return options
+
+
+def make_command(prog, flags="", overwrite=False, **kwargs):
+    """Return command line of a tool call as a list"""
+    args = [prog]
+    if overwrite:
+        args.append("--overwrite")
+    if flags:
+        args.append(f"-{flags}")
+    args.extend(f"{key}={value}" for key, value in make_options(kwargs).items())
+    return args
+
+
+class StandardInput:
+    """Writable standard input of a tool running in-process"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        """Add text (or bytes) to the input"""
+        if isinstance(data, bytes):
+            data = data.decode()
+        self._parts.append(data)
+
+    def flush(self):
+        """Do nothing (input is kept in memory)"""
+
+    def close(self):
+        """Do nothing (input is used when the tool runs)"""
+
+    def getvalue(self):
+        """Return the whole input"""
+        return "".join(self._parts)
+
+
+class ToolProcess:
+    """Popen-like object running a stand-in tool when waited for"""
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+    def __init__(self, prog, flags, overwrite, options, env, stdin, stdout, stderr):
+        self.args = make_command(prog, flags, overwrite, **options)
+        self.pid = os.getpid()
+        self.returncode = None
+        self.stdin = StandardInput() if stdin == PIPE else None
+        self._call = (prog, options, flags, overwrite, env)
+        self._capture = (stdout == PIPE, stderr == PIPE)
+        self._output = ("", "")
+
+    def _run(self, text=None):
+        if self.returncode is not None:
+            return
+        if text is None and self.stdin is not None:
+            text = self.stdin.getvalue()
+        if isinstance(text, bytes):
+            text = text.decode()
+        prog, options, flags, overwrite, env = self._call
+        try:
+            output = call_tool(prog, options, flags, overwrite, env=env, stdin=text)
+            errors = ""
+            self.returncode = 0
+        except ToolError as error:
+            output = ""
+            errors = f"ERROR: {error}\n"
+            self.returncode = 1
+        if not self._capture[0]:
+            sys.stdout.write(output)
+        if not self._capture[1]:
+            sys.stderr.write(errors)
+        self._output = (output, errors)
+
+    def poll(self):
+        """Run the tool (if not done yet) and return its return code"""
+        return self.wait()
+
+    def wait(self, timeout=None):
+        """Run the tool (if not done yet) and return its return code"""
+        # pylint: disable=unused-argument
+        self._run()
+        return self.returncode
+
+    def communicate(self, input=None, timeout=None):
+        """Run the tool with input and return captured output and errors"""
+        # pylint: disable=redefined-builtin,unused-argument
+        self._run(input)
+        output, errors = self._output
+        return (
+            output if self._capture[0] else None,
+            errors if self._capture[1] else None,
+        )
+
+
+def start_command(prog, flags="", overwrite=False, quiet=False, **kwargs):
+    """Start a tool and return a Popen-like object"""
+    # pylint: disable=unused-argument
+    options = {key: value for key, value in kwargs.items() if key in POPEN_PARAMETERS}
+    tool_options = make_options(kwargs)
+    if prog in TOOLS:
+        return ToolProcess(
+            prog,
+            flags,
+            overwrite,
+            tool_options,
+            options.get("env"),
+            options.get("stdin"),
+            options.get("stdout"),
+            options.get("stderr"),
+        )
+    return Popen(make_command(prog, flags, overwrite, **tool_options), **options)
+
+
+def _check(process, prog, errors=None):
+    if process.returncode:
+        raise CalledModuleError(
+            prog, " ".join(process.args), process.returncode, errors
+        )
+
+
+def run_command(*args, **kwargs):
+    """Run a tool and raise CalledModuleError if it fails"""
+    process = start_command(*args, **kwargs)
+    process.wait()
+    _check(process, args[0])
+    return 0
+
+
+def pipe_command(*args, **kwargs):
+    """Start a tool with its standard output captured"""
+    kwargs["stdout"] = PIPE
+    return start_command(*args, **kwargs)
+
+
+def feed_command(*args, **kwargs):
+    """Start a tool reading its standard input from the caller"""
+    kwargs["stdin"] = PIPE
+    return start_command(*args, **kwargs)
+
+
+def read_command(*args, **kwargs):
+    """Run a tool and return its standard output as text"""
+    kwargs["stderr"] = PIPE
+    process = pipe_command(*args, **kwargs)
+    output, errors = process.communicate()
+    _check(process, args[0], errors)
+    if isinstance(output, bytes):
+        output = output.decode()
+    return output
+
+
+def write_command(*args, **kwargs):
+    """Run a tool with text given as stdin on its standard input"""
+    stdin = kwargs.pop("stdin")
+    kwargs["stderr"] = PIPE
+    process = feed_command(*args, **kwargs)
+    unused, errors = process.communicate(stdin)
+    _check(process, args[0], errors)
+    return 0
+
+
+class KeyValue(dict):
+    """Dictionary with keys accessible also as attributes"""
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError as error:
+            raise AttributeError(key) from error
+
+
+def parse_key_val(s, sep="=", dflt=None, val_type=None, vsep=None):
+    """Return dictionary from lines with keys and values"""
+    # pylint: disable=invalid-name
+    result = KeyValue()
+    if not s:
+        return result
+    for line in s.splitlines() if vsep is None else s.split(vsep):
+        if not line.strip():
+            continue
+        key, separator, value = line.partition(sep)
+        value = value.strip() if separator else dflt
+        if val_type and value is not None:
+            value = val_type(value)
+        result[key.strip()] = value
+    return result
+
+
+def parse_command(*args, **kwargs):
+    """Run a tool and return its key-value output as dictionary"""
+    parse = kwargs.pop("parse", None)
+    delimiter = kwargs.pop("delimiter", None)
+    output = read_command(*args, **kwargs)
+    if parse:
+        function, parse_kwargs = parse
+        return function(output, **parse_kwargs)
+    return parse_key_val(output, sep=delimiter or "=")
+
+
+def region(region3d=False, complete=False, env=None):
+    """Return the current region as dictionary with numbers"""
+    # pylint: disable=unused-argument
+    values = parse_command("g.region", flags="g", env=env)
+    result = KeyValue()
+    for key, value in values.items():
+        if key in ("projection", "zone", "rows", "cols", "cells"):
+            result[key] = int(value)
+        else:
+            result[key] = float(value)
+    return result
+
+
+def region_env(region3d=False, flags=None, env=None, **kwargs):
+    """Return region given by g.region options as text for GRASS_REGION"""
+    # pylint: disable=unused-argument
+    session = Session(env)
+    try:
+        new = set_region(session, make_options(kwargs), flags or "")
+    except ToolError as error:
+        raise CalledModuleError("g.region", "g.region", 1, str(error)) from error
+    return format_region(new, separator=";")
+
+
+def find_file(name, element="cell", mapset=None, env=None):
+    """Return name, mapset, fullname, and file of a map (empty if not found)"""
+    output = read_command(
+        "g.findfile", flags="n", element=element, file=name, mapset=mapset, env=env
+    )
+    return parse_key_val(output)
+
+
+def gisenv(env=None):
+    """Return variables of the GISRC file"""
+    env = os.environ if env is None else env
+    with open(env["GISRC"]) as file:
+        return parse_key_val(file.read(), sep=":")
+
+
+def message(msg, flag=None, env=None):
+    """Print a message to standard error"""
+    # pylint: disable=unused-argument
+    print(msg, file=sys.stderr)
+
+
+def info(msg, env=None):
+    """Print an informative message"""
+    message(msg, env=env)
+
+
+def verbose(msg, env=None):
+    """Print a verbose message"""
+    message(msg, env=env)
+
+
+def debug(msg, debug=1, env=None):
+    """Ignore a debug message"""
+    # pylint: disable=redefined-outer-name,unused-argument
+
+
+def warning(msg, env=None):
+    """Print a warning"""
+    message(f"WARNING: {msg}", env=env)
+
+
+def error(msg, env=None):
+    """Print an error"""
+    message(f"ERROR: {msg}", env=env)
+
+
+def fatal(msg, env=None):
+    """Print an error and exit"""
+    error(msg, env=env)
+    sys.exit(1)
@@ -0,0 +1,68 @@
+"""Stand-in for raster functions of grass.script"""
+
+import string
+
+from .core import parse_command, read_command, write_command
+
+
+def mapcalc(
+    exp,
+    quiet=False,
+    superquiet=False,
+    verbose=False,
+    overwrite=False,
+    seed=None,
+    env=None,
+    **kwargs
+):
+    """Evaluate a map algebra expression with $name substituted from kwargs"""
+    # pylint: disable=too-many-arguments,unused-argument
+    expression = string.Template(exp).substitute(**kwargs)
+    write_command(
+        "r.mapcalc",
+        file="-",
+        stdin=expression,
+        seed=seed,
+        overwrite=overwrite,
+        env=env,
+    )
+
+
+def raster_info(map, env=None):
+    """Return region, data type, range, and metadata of a raster"""
+    # pylint: disable=redefined-builtin
+    values = parse_command("r.info", flags="gre", map=map, env=env)
+    result = {}
+    for key, value in values.items():
+        if key in ("rows", "cols", "cells", "ncats"):
+            result[key] = int(value)
+        elif key in ("north", "south", "east", "west", "nsres", "ewres"):
+            result[key] = float(value)
+        elif key in ("min", "max"):
+            result[key] = None if value == "NULL" else float(value)
+        else:
+            result[key] = value
+    return result
+
+
+def raster_what(map, coord, env=None, localized=False):
+    """Return values of rasters at coordinates as list of dictionaries"""
+    # pylint: disable=redefined-builtin,unused-argument
+    names = [map] if isinstance(map, str) else list(map)
+    if coord and not isinstance(coord[0], (list, tuple)):
+        # A single pair of coordinates
+        coord = [coord]
+    numbers = [str(number) for point in coord for number in point]
+    output = read_command(
+        "r.what",
+        map=",".join(names),
+        coordinates=",".join(numbers),
+        null_value="*",
+        separator="pipe",
+        env=env,
+    )
+    result = []
+    for line in output.splitlines():
+        values = line.split("|")[3:]
+        result.append({name: {"value": value} for name, value in zip(names, values)})
+    return result
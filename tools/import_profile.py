@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+"""Profile imports and first calls of activity modules
+
+Each activity file is imported in a new Python process with -X importtime.
+The import tree of the activity is reconstructed from the output and
+heavy imports which are used only inside functions (and thus could be
+imported later or not at all) are flagged.
+
+With a mapset provided, the process runs in a GRASS session and the main()
+function of the activity is called twice with all run_ functions timed, so
+the overhead of the first call (lazy imports, caches, first tool runs)
+can be separated from the time of a repeated call.
+
+The report is written as JSON and printed as a table sorted by the total
+import time.
+"""
+
+# Only modules loaded at the interpreter startup are imported at module level,
+# so that the child process has none of the other modules imported before
+# the activity (modules needed only in the parent are imported in functions).
+import os
+import sys
+
+START_MARKER = "tl-import-profile: start"
+END_MARKER = "tl-import-profile: end"
+RESULT_MARKER = "tl-import-profile: result "
+
+# Code run by the child process (with the file and --call as arguments)
+CHILD_CODE = (
+    "import sys; sys.path.insert(0, {directory!r}); "
+    "from import_profile import child_main; "
+    "sys.exit(child_main(sys.argv[1], call='--call' in sys.argv[2:]))"
+)
+
+
+class ImportNode:
+    """One import with its own and cumulative time in microseconds"""
+
+    def __init__(self, name, self_us, cumulative_us, children=None):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.children = children or []
+
+    def to_dict(self):
+        """Return the (sub)tree as a dictionary"""
+        return {
+            "name": self.name,
+            "self_us": self.self_us,
+            "cumulative_us": self.cumulative_us,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+def parse_importtime(text):
+    """Parse -X importtime output into a list of top-level ImportNode objects
+
+    Python reports a module after all modules it imports (one line each)
+    with two spaces of indentation per nesting level.
+    """
+    pending = {}
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            # header line
+            continue
+        name_part = parts[2][1:]
+        level = (len(name_part) - len(name_part.lstrip(" "))) // 2
+        node = ImportNode(
+            name=name_part.strip(),
+            self_us=int(parts[0]),
+            cumulative_us=int(parts[1]),
+            children=pending.pop(level + 1, []),
+        )
+        pending.setdefault(level, []).append(node)
+    if not pending:
+        return []
+    return pending[min(pending)]
+
+
+def import_usage(path):
+    """Return imported names with functions using them
+
+    Result maps module name to a dictionary with the local *names* bound by
+    the import, the *functions* where any of them is used, and whether they are
+    used at *module_level* (outside of functions).
+    """
+    import ast
+
+    with open(path) as file:
+        tree = ast.parse(file.read(), filename=str(path))
+    imports = {}
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                local = alias.asname or alias.name.split(".")[0]
+                imports.setdefault(alias.name, set()).add(local)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            for alias in node.names:
+                imports.setdefault(node.module, set()).add(alias.asname or alias.name)
+
+    def used_names(node):
+        return {
+            item.id
+            for item in ast.walk(node)
+            if isinstance(item, ast.Name) and isinstance(item.ctx, ast.Load)
+        }
+
+    module_level = set()
+    functions = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions[node.name] = used_names(node)
+        elif not isinstance(node, (ast.Import, ast.ImportFrom)):
+            module_level |= used_names(node)
+    usage = {}
+    for module, names in imports.items():
+        usage[module] = {
+            "names": sorted(names),
+            "functions": sorted(
+                name for name, used in functions.items() if names & used
+            ),
+            "module_level": bool(names & module_level),
+        }
+    return usage
+
+
+def deferrable_imports(tree, usage, threshold_us):
+    """Return heavy imports not needed at module level
+
+    *tree* is a list of top-level ImportNode objects of the activity.
+    Only imports from the activity itself with cumulative time of at least
+    *threshold_us* are considered.
+    """
+    times = {node.name: node.cumulative_us for node in tree}
+    result = []
+    for module, info in usage.items():
+        # With a from-import of a submodule, the time is reported for the package.
+        cumulative = times.get(module)
+        if cumulative is None:
+            cumulative = times.get(module.split(".")[0], 0)
+        if info["module_level"] or cumulative < threshold_us:
+            continue
+        result.append(
+            {
+                "module": module,
+                "cumulative_us": cumulative,
+                "used_in": info["functions"],
+            }
+        )
+    return sorted(result, key=lambda item: -item["cumulative_us"])
+
+
+def child_main(path, call):
+    """Import the activity (and optionally run main() twice) in this process
+
+    Imports reported between the start and end markers are those
+    of the activity.
+    Returns 1 when the activity cannot be imported (the error is reported
+    in the result), 0 otherwise.
+    """
+    import importlib.util
+    import time
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    print(START_MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location("activity", path)
+    module = importlib.util.module_from_spec(spec)
+    failure = None
+    try:
+        spec.loader.exec_module(module)
+    except Exception as error:  # pylint: disable=broad-except
+        failure = error
+    result = {"import_s": time.perf_counter() - start, "calls": {}}
+    print(END_MARKER, file=sys.stderr, flush=True)
+    import json
+
+    if failure:
+        result["error"] = f"{type(failure).__name__}: {failure}"
+        if isinstance(failure, ImportError) and failure.name:
+            result["failed_import"] = failure.name
+        print(RESULT_MARKER + json.dumps(result), file=sys.stderr, flush=True)
+        return 1
+
+    if call:
+        calls = result["calls"]
+
+        def timed(name, function):
+            def wrapper(*args, **kwargs):
+                call_start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    calls.setdefault(name, []).append(time.perf_counter() - call_start)
+
+            return wrapper
+
+        for name in dir(module):
+            if name.startswith("run_") and callable(getattr(module, name)):
+                setattr(module, name, timed(name, getattr(module, name)))
+        for unused in range(2):
+            module.main()
+    print(RESULT_MARKER + json.dumps(result), file=sys.stderr, flush=True)
+    return 0
+
+
+def profile_file(path, python, grass=None, mapset=None, threshold_us=5000):
+    """Profile one activity file in a separate process and return the report"""
+    import json
+    import subprocess
+
+    code = CHILD_CODE.format(directory=os.path.dirname(os.path.abspath(__file__)))
+    command = [python, "-X", "importtime", "-c", code, str(path)]
+    if mapset:
+        command = [grass, mapset, "--exec"] + command + ["--call"]
+    process = subprocess.run(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=False,
+    )
+    stderr = process.stderr
+    report = {"file": str(path), "returncode": process.returncode}
+    if START_MARKER in stderr:
+        stderr = stderr.split(START_MARKER, 1)[1]
+    tree = parse_importtime(stderr.split(END_MARKER, 1)[0])
+    report["imports"] = [node.to_dict() for node in tree]
+    report["import_total_us"] = sum(node.cumulative_us for node in tree)
+    report["heaviest_imports"] = [
+        {"module": node.name, "cumulative_us": node.cumulative_us}
+        for node in sorted(tree, key=lambda node: -node.cumulative_us)[:5]
+    ]
+    report["deferrable"] = deferrable_imports(tree, import_usage(path), threshold_us)
+    report["failed_imports"] = []
+    for line in stderr.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER) :])
+            report["module_exec_s"] = result["import_s"]
+            if "failed_import" in result:
+                report["failed_imports"].append(result["failed_import"])
+            if "error" in result:
+                report["error"] = [result["error"]]
+            report["functions"] = {
+                name: {
+                    "first_call_s": times[0],
+                    "repeated_call_s": times[-1],
+                    "first_call_overhead_s": times[0] - times[-1],
+                }
+                for name, times in result["calls"].items()
+            }
+    if process.returncode and "error" not in report:
+        report["error"] = stderr.strip().splitlines()[-1:] or ["unknown error"]
+    return report
+
+
+def format_table(reports):
+    """Return reports as a text table sorted by total import time
+
+    Files which failed (e.g., because an import failed) are marked by ERROR
+    with the failed imports or the error in the last column, because their
+    import times cover only what was imported before the failure.
+    """
+    lines = [
+        f"{'file':<24} {'imports ms':>10} {'heaviest import':<28} "
+        f"{'first call overhead':<30} deferrable or error"
+    ]
+    for report in sorted(reports, key=lambda item: -item["import_total_us"]):
+        heaviest = ""
+        if report["heaviest_imports"]:
+            top = report["heaviest_imports"][0]
+            heaviest = f"{top['module']} ({top['cumulative_us'] / 1000:.1f} ms)"
+        overhead = ", ".join(
+            f"{name} {info['first_call_overhead_s'] * 1000:.0f} ms"
+            for name, info in report.get("functions", {}).items()
+        )
+        deferrable = ", ".join(item["module"] for item in report["deferrable"])
+        if report.get("failed_imports"):
+            deferrable = "ERROR: failed import of " + ", ".join(
+                report["failed_imports"]
+            )
+        elif report.get("error"):
+            deferrable = "ERROR: " + " ".join(report["error"])
+        lines.append(
+            f"{os.path.basename(report['file']):<24} "
+            f"{report['import_total_us'] / 1000:>10.1f} {heaviest:<28} "
+            f"{overhead:<30} {deferrable}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Profile activities given on the command line or all in activities/"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="files to profile")
+    parser.add_argument(
+        "--mapset", help="run in a GRASS session in this mapset and time run_ calls"
+    )
+    parser.add_argument("--grass", default="grass", help="GRASS GIS executable")
+    parser.add_argument("--python", default="python3", help="Python executable")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=5,
+        help="import time in ms from which an import is considered heavy",
+    )
+    args = parser.parse_args()
+
+    files = args.files
+    if not files:
+        directory = os.path.normpath(
+            os.path.join(os.path.dirname(__file__), "..", "activities")
+        )
+        files = sorted(
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.endswith(".py")
+        )
+    reports = [
+        profile_file(
+            path,
+            python=args.python,
+            grass=args.grass,
+            mapset=args.mapset,
+            threshold_us=args.threshold * 1000,
+        )
+        for path in files
+    ]
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(reports, file, indent=2)
+    print(format_table(reports))
+    return 1 if any(report["returncode"] for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
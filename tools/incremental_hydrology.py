@@ -0,0 +1,287 @@
+"""Update flow directions, accumulation, basins, and streams after a scan
+
+Hydrology activities run r.watershed or similar tools on the whole region
+for each scan even when only a small part of the sand changed. The engine
+here keeps the results of the previous scan and updates only what the
+change can affect:
+
+1. directions (D8, steepest descent) are computed again only for changed
+   cells and their neighbors,
+2. accumulation (number of upstream cells) is computed again only for
+   cells downstream of cells with a new direction (along both the old
+   and the new path), using unchanged accumulation of their other donors,
+3. basins (labeled by their outlet cell) are assigned again only for cells
+   upstream of cells with a new direction,
+4. streams (accumulation over a threshold) follow the accumulation.
+
+So the cost depends on the size of the changed catchment, not of the region
+(except for finding the changed cells which is one comparison of the scans).
+
+Unlike r.watershed, depressions are not filled or routed: a cell without
+a lower neighbor is an outlet with its own basin. Null cells (NaN) are
+outlets which receive no flow.
+"""
+
+import numpy as np
+
+# Row and column offsets of neighbors with r.watershed drainage directions
+# (1 is north-east, counterclockwise to 8 which is east)
+NEIGHBORS = [
+    (-1, 1, 1),
+    (-1, 0, 2),
+    (-1, -1, 3),
+    (0, -1, 4),
+    (1, -1, 5),
+    (1, 0, 6),
+    (1, 1, 7),
+    (0, 1, 8),
+]
+
+
+class IncrementalHydrology:
+    """Flow directions, accumulation, basins, and streams updated by changes
+
+    Call compute() with the first elevation and update() with the next ones.
+    The results are in *receiver* (flat index of the downstream cell,
+    -1 for outlets), *accumulation* (cells), *basins* (flat index of the outlet
+    plus one), and *streams* (cells with accumulation of at least
+    *stream_threshold*) as flat arrays, use raster() to get them as 2D arrays.
+    """
+
+    def __init__(self, stream_threshold=None, tolerance=0.0):
+        self.stream_threshold = stream_threshold
+        self.tolerance = tolerance
+        self.shape = None
+        self.last_update = {}
+
+    def compute(self, elevation):
+        """Compute everything for a new elevation"""
+        rows, cols = elevation.shape
+        self.shape = (rows, cols)
+        size = rows * cols
+        self.elevation = np.array(elevation, dtype=np.float64).ravel()
+        self.receiver = np.full(size, -1, dtype=np.int64)
+        self.accumulation = np.zeros(size, dtype=np.float64)
+        self.basins = np.zeros(size, dtype=np.int64)
+        self.streams = np.zeros(size, dtype=bool)
+        # Scratch arrays for marking cells and mapping them to local indices
+        self._mark = np.zeros(size, dtype=bool)
+        self._local = np.full(size, -1, dtype=np.int64)
+        cells = np.arange(size)
+        self.receiver[:] = self._receivers(cells)
+        self._accumulate(cells)
+        self._label_basins(cells)
+        self._update_streams(cells)
+        self.last_update = {"changed": size, "downstream": size, "upstream": size}
+
+    def update(self, elevation):
+        """Update results for a new elevation and return numbers of updated cells"""
+        if self.shape != elevation.shape:
+            self.compute(elevation)
+            return self.last_update
+        new = np.asarray(elevation, dtype=np.float64).ravel()
+        with np.errstate(invalid="ignore"):
+            changed = np.abs(new - self.elevation) > self.tolerance
+        changed |= np.isnan(new) != np.isnan(self.elevation)
+        changed = np.flatnonzero(changed)
+        self.elevation[changed] = new[changed]
+        # Directions of neighbors of changed cells can change, too.
+        around = self._with_neighbors(changed)
+        receivers = self._receivers(around)
+        redirected = around[receivers != self.receiver[around]]
+        old_receivers = self.receiver[redirected]
+        self.receiver[around] = receivers
+
+        starts = np.concatenate([redirected, old_receivers, self.receiver[redirected]])
+        downstream = self._downstream(starts[starts >= 0])
+        self._accumulate(downstream)
+        self._update_streams(downstream)
+        upstream = self._upstream(redirected)
+        self._label_basins(upstream)
+        self.last_update = {
+            "changed": len(changed),
+            "downstream": len(downstream),
+            "upstream": len(upstream),
+        }
+        return self.last_update
+
+    def raster(self, values):
+        """Return flat results as a 2D array"""
+        return values.reshape(self.shape)
+
+    def drainage(self):
+        """Return directions as r.watershed drainage (0 for outlets)"""
+        rows, cols = self.shape
+        drainage = np.zeros(rows * cols, dtype=np.int32)
+        cells = np.flatnonzero(self.receiver >= 0)
+        offset = self.receiver[cells] - cells
+        for row_offset, col_offset, code in NEIGHBORS:
+            drainage[cells[offset == row_offset * cols + col_offset]] = code
+        return drainage.reshape(self.shape)
+
+    def _neighbors(self, cells):
+        """Yield neighbor indices (-1 outside) and distances for each direction"""
+        rows, cols = self.shape
+        row, col = np.divmod(cells, cols)
+        for row_offset, col_offset, unused in NEIGHBORS:
+            near_row = row + row_offset
+            near_col = col + col_offset
+            inside = (near_row >= 0) & (near_row < rows)
+            inside &= (near_col >= 0) & (near_col < cols)
+            yield (
+                np.where(inside, near_row * cols + near_col, -1),
+                np.hypot(row_offset, col_offset),
+            )
+
+    def _with_neighbors(self, cells):
+        """Return cells and their neighbors (unique)"""
+        parts = [cells] + [near[near >= 0] for near, unused in self._neighbors(cells)]
+        return np.unique(np.concatenate(parts))
+
+    def _receivers(self, cells):
+        """Return the steepest lower neighbor of each cell (-1 if none)"""
+        height = self.elevation[cells]
+        best_slope = np.zeros(len(cells))
+        best = np.full(len(cells), -1, dtype=np.int64)
+        with np.errstate(invalid="ignore"):
+            for near, distance in self._neighbors(cells):
+                slope = (height - self.elevation[near]) / distance
+                steeper = (near >= 0) & (slope > best_slope)
+                best_slope[steeper] = slope[steeper]
+                best[steeper] = near[steeper]
+        return best
+
+    def _donors(self, cells):
+        """Return pairs of donors and the cells they drain into"""
+        donors = []
+        targets = []
+        for near, unused in self._neighbors(cells):
+            inside = near >= 0
+            flows = np.zeros(len(cells), dtype=bool)
+            flows[inside] = self.receiver[near[inside]] == cells[inside]
+            donors.append(near[flows])
+            targets.append(cells[flows])
+        return np.concatenate(donors), np.concatenate(targets)
+
+    def _downstream(self, cells):
+        """Return cells and all cells downstream of them"""
+        return self._closure(cells, lambda frontier: self.receiver[frontier])
+
+    def _upstream(self, cells):
+        """Return cells and all cells upstream of them"""
+        return self._closure(cells, lambda frontier: self._donors(frontier)[0])
+
+    def _closure(self, cells, step):
+        """Return cells and cells reached from them by repeated steps"""
+        mark = self._mark
+        frontier = np.unique(cells)
+        found = []
+        while frontier.size:
+            mark[frontier] = True
+            found.append(frontier)
+            following = step(frontier)
+            following = following[following >= 0]
+            frontier = np.unique(following[~mark[following]])
+        result = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+        mark[result] = False
+        return result
+
+    def _accumulate(self, cells):
+        """Compute accumulation of cells from their donors
+
+        Accumulation of donors which are not in cells is used as it is.
+        """
+        local = self._local
+        local[cells] = np.arange(len(cells))
+        values = np.ones(len(cells))
+        donors, targets = self._donors(cells)
+        outside = local[donors] < 0
+        np.add.at(values, local[targets[outside]], self.accumulation[donors[outside]])
+        # Receivers within cells in local indices (-1 when outside or outlet)
+        receivers = self.receiver[cells]
+        downstream = np.where(receivers >= 0, local[receivers], -1)
+        pending = np.bincount(downstream[downstream >= 0], minlength=len(cells))
+        # Go from cells without donors downstream as donors are finished.
+        frontier = np.flatnonzero(pending == 0)
+        while frontier.size:
+            following = downstream[frontier]
+            inside = following >= 0
+            frontier = frontier[inside]
+            following = following[inside]
+            np.add.at(values, following, values[frontier])
+            np.subtract.at(pending, following, 1)
+            frontier = np.unique(following[pending[following] == 0])
+        self.accumulation[cells] = values
+        local[cells] = -1
+
+    def _label_basins(self, cells):
+        """Label cells by the outlet they drain to"""
+        local = self._local
+        local[cells] = np.arange(len(cells))
+        receivers = self.receiver[cells]
+        following = np.where(receivers >= 0, local[receivers], -1)
+        # Last cell within cells on the path of each cell (by pointer jumping)
+        last = np.where(following >= 0, following, np.arange(len(cells)))
+        while True:
+            jumped = last[last]
+            if np.array_equal(jumped, last):
+                break
+            last = jumped
+        ends = cells[last]
+        end_receivers = self.receiver[ends]
+        self.basins[cells] = np.where(
+            end_receivers >= 0, self.basins[end_receivers], ends + 1
+        )
+        local[cells] = -1
+
+    def _update_streams(self, cells):
+        if self.stream_threshold is not None:
+            self.streams[cells] = self.accumulation[cells] >= self.stream_threshold
+
+
+class HydrologyStage:
+    """Updates hydrology rasters from the scan in a GRASS session
+
+    Call it with the scan name and environment for each scan. The first call
+    computes everything, later calls update only what changed. Only rasters
+    with a name are written.
+    """
+
+    def __init__(
+        self,
+        accumulation="flow_accumulation",
+        drainage=None,
+        basins=None,
+        streams=None,
+        stream_threshold=None,
+        tolerance=0.0,
+    ):
+        self.names = {
+            "accumulation": accumulation,
+            "drainage": drainage,
+            "basins": basins,
+            "streams": streams,
+        }
+        if streams and stream_threshold is None:
+            raise ValueError("stream_threshold is needed for streams")
+        self.hydrology = IncrementalHydrology(stream_threshold, tolerance)
+
+    def __call__(self, scanned_elev, env):
+        from grass.script import array as garray
+
+        scan = garray.array(dtype=np.float64, env=env)
+        scan.read(scanned_elev, null="nan")
+        self.hydrology.update(scan)
+        hydrology = self.hydrology
+        results = {
+            "accumulation": lambda: hydrology.raster(hydrology.accumulation),
+            "drainage": hydrology.drainage,
+            "basins": lambda: hydrology.raster(hydrology.basins),
+            "streams": lambda: np.where(hydrology.raster(hydrology.streams), 1, np.nan),
+        }
+        for key, name in self.names.items():
+            if name:
+                output = garray.array(dtype=np.float64, env=env)
+                output[...] = results[key]()
+                output.write(name, overwrite=True)
+        return hydrology.last_update
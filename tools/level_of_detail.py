@@ -0,0 +1,249 @@
+"""Vectorize basins and contours only with the detail the display can show
+
+Activities vectorize rasters (r.to.vect for basins, r.contour for contours)
+in the full resolution of the scan, while the result is shown on a display
+of a few hundred pixels (500x500 in render_activities.py, the projector
+resolution on the table). The stage here makes vectors with the level of
+detail of the display:
+
+- the raster is vectorized in a region with the resolution of the display
+  (times *pixels*), so the vectors are made from fewer cells and their
+  topology is correct by construction,
+- the lines and boundaries are simplified by v.generalize (Douglas-Peucker)
+  with the tolerance of *pixels* display pixels, which keeps the topology
+  (v.generalize does not simplify a boundary when that would break it).
+
+When the layer is only displayed, the vectors can be skipped altogether:
+the outlines of basins or the contour lines are then written as a raster
+(computed with NumPy) in the color of the lines. d.vect cannot show
+a raster, so the layers showing the outputs need to be changed to d.rast
+using display_layers().
+"""
+
+import numpy as np
+
+# Display size used by render_activities.py
+DISPLAY_WIDTH = 500
+DISPLAY_HEIGHT = 500
+
+
+def display_resolution(region, width=DISPLAY_WIDTH, height=DISPLAY_HEIGHT):
+    """Return size of a display pixel in map units for a region
+
+    The region is fitted into the display keeping its aspect ratio.
+    """
+    return max(
+        (region["e"] - region["w"]) / width, (region["n"] - region["s"]) / height
+    )
+
+
+def outline_cells(labels):
+    """Return cells at the edge of areas with different labels
+
+    Each boundary is marked on the cell with the lower label, so outlines
+    are one cell wide. NaN is a label of its own.
+    """
+    labels = np.nan_to_num(labels, nan=-np.inf)
+    outline = np.zeros(labels.shape, dtype=bool)
+    for first, second in (
+        (np.s_[:, :-1], np.s_[:, 1:]),
+        (np.s_[:-1, :], np.s_[1:, :]),
+    ):
+        one = labels[first]
+        other = labels[second]
+        different = one != other
+        outline[first] |= different & (one < other)
+        outline[second] |= different & (other < one)
+    return outline
+
+
+def contour_cells(elevation, step, minimum=None):
+    """Return contour levels on cells where a contour passes (NaN elsewhere)
+
+    A contour passes between two neighboring cells on different sides of
+    a level, it is marked on the higher cell with the value of the level.
+    """
+    if minimum is None:
+        minimum = np.nanmin(elevation)
+    with np.errstate(invalid="ignore"):
+        band = np.floor((elevation - minimum) / step)
+    contours = np.full(elevation.shape, np.nan)
+    for first, second in (
+        (np.s_[:, :-1], np.s_[:, 1:]),
+        (np.s_[:-1, :], np.s_[1:, :]),
+    ):
+        one = band[first]
+        other = band[second]
+        with np.errstate(invalid="ignore"):
+            higher_one = one > other
+            higher_other = other > one
+        contours[first] = np.where(higher_one, minimum + one * step, contours[first])
+        contours[second] = np.where(
+            higher_other, minimum + other * step, contours[second]
+        )
+    return contours
+
+
+def layer_map(layer):
+    """Return name of the map shown by a display layer (None if there is none)"""
+    for item in layer[1:]:
+        key, separator, value = item.partition("=")
+        if separator and key == "map":
+            return value
+        if not separator and not item.startswith("-"):
+            return item
+    return None
+
+
+class VectorizationStage:
+    """Vectorizes basins and contours with the level of detail of a display
+
+    With *display_only*, raster outlines (for d.rast) are written instead
+    of vectors under the same name and their names are kept in *rasters*.
+    """
+
+    def __init__(
+        self,
+        width=DISPLAY_WIDTH,
+        height=DISPLAY_HEIGHT,
+        pixels=1.0,
+        display_only=False,
+    ):
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+        self.display_only = display_only
+        self.rasters = set()
+
+    def display_layers(self, layers):
+        """Return layers with outputs written as rasters shown by d.rast
+
+        Layers of other maps are returned unchanged. Options of d.vect do not
+        apply to d.rast, so only the map is kept (the raster has the color
+        given when it was written).
+        """
+        result = []
+        for layer in layers:
+            name = layer_map(layer)
+            if layer[0] == "d.vect" and name in self.rasters:
+                layer = ["d.rast", f"map={name}"]
+            result.append(list(layer))
+        return result
+
+    def _write_lines(self, values, output, color, env):
+        """Write raster with lines in one color (nulls elsewhere)"""
+        import grass.script as gs
+        from grass.script import array as garray
+
+        raster = garray.array(dtype=np.float32, env=env)
+        raster[...] = values
+        raster.write(output, overwrite=True)
+        gs.write_command(
+            "r.colors",
+            map=output,
+            rules="-",
+            stdin=f"0% {color}\n100% {color}\n",
+            quiet=True,
+            env=env,
+        )
+        self.rasters.add(output)
+
+    def tolerance(self, env):
+        """Return simplification tolerance in map units for the current region"""
+        import grass.script as gs
+
+        region = gs.region(env=env)
+        return display_resolution(region, self.width, self.height) * self.pixels
+
+    def display_env(self, env):
+        """Return environment with region in the display resolution
+
+        The region is not changed when it is already coarser.
+        """
+        import grass.script as gs
+
+        region = gs.region(env=env)
+        resolution = self.tolerance(env)
+        if resolution <= max(region["nsres"], region["ewres"]):
+            return env
+        env = dict(env)
+        env["GRASS_REGION"] = gs.region_env(
+            n=region["n"],
+            s=region["s"],
+            e=region["e"],
+            w=region["w"],
+            res=resolution,
+            env=env,
+        )
+        return env
+
+    def _generalize(self, vector, output, types, env):
+        import grass.script as gs
+
+        gs.run_command(
+            "v.generalize",
+            input=vector,
+            output=output,
+            type=types,
+            method="douglas",
+            threshold=self.tolerance(env),
+            overwrite=True,
+            env=env,
+        )
+        gs.run_command(
+            "g.remove", type="vector", name=vector, flags="f", quiet=True, env=env
+        )
+
+    def areas(self, raster, output, env, color="black"):
+        """Vectorize areas of a raster (like basins) into output
+
+        The *color* is used for the outlines written with *display_only*.
+        """
+        from grass.script import array as garray
+
+        if self.display_only:
+            labels = garray.array(dtype=np.float64, env=env)
+            labels.read(raster, null="nan")
+            outlines = np.where(outline_cells(np.asarray(labels)), 1, np.nan)
+            self._write_lines(outlines, output, color, env)
+            return
+        import grass.script as gs
+
+        self.rasters.discard(output)
+        detailed = f"{output}_detailed"
+        gs.run_command(
+            "r.to.vect",
+            input=raster,
+            output=detailed,
+            type="area",
+            overwrite=True,
+            env=self.display_env(env),
+        )
+        self._generalize(detailed, output, "boundary,area", env)
+
+    def contours(self, elevation, output, step, env, color="black"):
+        """Create contours of elevation with a step into output
+
+        The *color* is used for the contours written with *display_only*.
+        """
+        from grass.script import array as garray
+
+        if self.display_only:
+            values = garray.array(dtype=np.float64, env=env)
+            values.read(elevation, null="nan")
+            contours = contour_cells(np.asarray(values), step, minimum=0)
+            self._write_lines(contours, output, color, env)
+            return
+        import grass.script as gs
+
+        self.rasters.discard(output)
+        detailed = f"{output}_detailed"
+        gs.run_command(
+            "r.contour",
+            input=elevation,
+            output=detailed,
+            step=step,
+            overwrite=True,
+            env=self.display_env(env),
+        )
+        self._generalize(detailed, output, "line", env)
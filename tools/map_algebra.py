@@ -0,0 +1,728 @@
+"""Evaluate chained r.mapcalc expressions in one vectorized pass
+
+Activities often call gs.mapcalc several times in one run_ function and
+each call is a full pass over the raster with its own read and write.
+Here, the expressions are parsed and collected instead, building a graph
+of which map is computed from which. When the results are needed, all
+inputs are read once, the graph is evaluated with NumPy, and only the maps
+which are displayed or used later are written.
+
+Only a subset of r.mapcalc is supported (arithmetic, comparisons, logical
+operators, the conditional operator, and common functions). Expressions
+outside of the subset are passed to r.mapcalc unchanged.
+
+A script runs with its gs.mapcalc calls evaluated together when started
+through this file in a GRASS session (only the maps to keep are written):
+
+    grass .../nc_spm/user --exec python3 tools/map_algebra.py \\
+        --keep ponds,elev_diff activities/ponds.py
+"""
+
+import argparse
+import os
+import re
+import runpy
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+
+# Value used to represent null in integer (CELL) rasters when writing them.
+INT_NULL = -2147483648
+
+_TOKEN_RE = re.compile(
+    r"""
+    \s*(?:
+        (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?)
+        |(?P<name>[A-Za-z_][A-Za-z0-9_.]*(?:@[A-Za-z0-9_.]+)?)
+        |(?P<quoted>"[^"]+")
+        |(?P<op>&&|\|\||==|!=|>=|<=|[-+*/%^<>!?:(),=])
+    )""",
+    re.VERBOSE,
+)
+
+
+# Map name, possibly with a mapset, as it appears in parameters and expressions
+_NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_.]*(?:@[A-Za-z0-9_.]+)?")
+
+
+class UnsupportedExpression(ValueError):
+    """Raised when an expression is outside of the supported subset"""
+
+
+def tokenize(text):
+    """Split an r.mapcalc expression into (kind, value) tokens"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match or match.end() == position:
+            raise UnsupportedExpression(
+                f"Cannot parse '{text[position:]}' in expression '{text}'"
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "quoted":
+            kind = "name"
+            value = value[1:-1]
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class Node:
+    """Node of an expression tree
+
+    *kind* is one of number, map, unary, binary, and call.
+    """
+
+    def __init__(self, kind, value, children=()):
+        self.kind = kind
+        self.value = value
+        self.children = list(children)
+
+    def maps(self):
+        """Return names of all maps referenced in the (sub)tree"""
+        if self.kind == "map":
+            return {self.value}
+        names = set()
+        for child in self.children:
+            names |= child.maps()
+        return names
+
+    def __repr__(self):
+        if self.children:
+            return f"Node({self.kind}, {self.value}, {self.children})"
+        return f"Node({self.kind}, {self.value})"
+
+
+class _Parser:
+    """Recursive descent parser following the r.mapcalc operator precedence"""
+
+    # Binary operators from the lowest to the highest precedence.
+    binary_levels = [
+        ("||",),
+        ("&&",),
+        ("==", "!="),
+        (">", ">=", "<", "<="),
+        ("+", "-"),
+        ("*", "/", "%"),
+    ]
+
+    def __init__(self, tokens, text):
+        self.tokens = tokens
+        self.text = text
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token[0] is None or (expected and token[1] != expected):
+            raise UnsupportedExpression(
+                f"Expected '{expected or 'more input'}' in expression '{self.text}'"
+            )
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.conditional()
+        if self.position != len(self.tokens):
+            raise UnsupportedExpression(
+                f"Unexpected '{self.peek()[1]}' in expression '{self.text}'"
+            )
+        return node
+
+    def conditional(self):
+        node = self.binary(0)
+        if self.peek() == ("op", "?"):
+            self.take("?")
+            then = self.conditional()
+            self.take(":")
+            otherwise = self.conditional()
+            node = Node("call", "if", [node, then, otherwise])
+        return node
+
+    def binary(self, level):
+        if level == len(self.binary_levels):
+            return self.unary()
+        node = self.binary(level + 1)
+        while self.peek()[0] == "op" and self.peek()[1] in self.binary_levels[level]:
+            operator = self.take()[1]
+            node = Node("binary", operator, [node, self.binary(level + 1)])
+        return node
+
+    def unary(self):
+        if self.peek() in (("op", "-"), ("op", "!")):
+            operator = self.take()[1]
+            return Node("unary", operator, [self.unary()])
+        if self.peek() == ("op", "+"):
+            self.take()
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        node = self.atom()
+        if self.peek() == ("op", "^"):
+            self.take()
+            # Exponentiation is right associative.
+            node = Node("binary", "^", [node, self.unary()])
+        return node
+
+    def atom(self):
+        kind, value = self.take()
+        if kind == "number":
+            return Node("number", value)
+        if kind == "name":
+            if self.peek() == ("op", "("):
+                self.take("(")
+                arguments = []
+                if self.peek() != ("op", ")"):
+                    arguments.append(self.conditional())
+                    while self.peek() == ("op", ","):
+                        self.take(",")
+                        arguments.append(self.conditional())
+                self.take(")")
+                if value not in _FUNCTIONS:
+                    raise UnsupportedExpression(
+                        f"Function '{value}' is not supported (in '{self.text}')"
+                    )
+                return Node("call", value, arguments)
+            return Node("map", value)
+        if (kind, value) == ("op", "("):
+            node = self.conditional()
+            self.take(")")
+            return node
+        raise UnsupportedExpression(f"Unexpected '{value}' in expression '{self.text}'")
+
+
+class Assignment:
+    """One r.mapcalc statement in the form name = expression"""
+
+    def __init__(self, name, expression, text):
+        self.name = name
+        self.expression = expression
+        self.text = text
+
+    def inputs(self):
+        """Return names of maps read by the statement"""
+        return self.expression.maps()
+
+    def __repr__(self):
+        return f"Assignment({self.name!r}, {self.expression!r})"
+
+
+def parse(text):
+    """Parse one or more r.mapcalc statements into a list of Assignment objects
+
+    Statements are separated by newlines or semicolons
+    (as with the file and expression inputs of r.mapcalc).
+    """
+    assignments = []
+    for statement in re.split(r"[;\n]", text):
+        if not statement.strip():
+            continue
+        tokens = tokenize(statement)
+        if len(tokens) < 3 or tokens[0][0] != "name" or tokens[1] != ("op", "="):
+            raise UnsupportedExpression(
+                f"Expected 'name = expression', got '{statement.strip()}'"
+            )
+        expression = _Parser(tokens[2:], statement).parse()
+        assignments.append(Assignment(tokens[0][1], expression, statement.strip()))
+    return assignments
+
+
+# Evaluation
+#
+# Values are pairs (array or scalar, is_integer). Null is represented by NaN
+# and propagates through operators the same way as in r.mapcalc.
+
+
+def _nulls(*values):
+    mask = False
+    for value in values:
+        mask = mask | np.isnan(value)
+    return mask
+
+
+def _with_nulls(result, *values):
+    return np.where(_nulls(*values), np.nan, result)
+
+
+def _as_bool(value):
+    return np.where(np.isnan(value), False, value != 0)
+
+
+def _divide(left, right, integer):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if integer:
+            result = np.trunc(np.divide(left, right))
+        else:
+            result = np.divide(left, right)
+    return np.where(right == 0, np.nan, result)
+
+
+def _modulus(left, right):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(right == 0, np.nan, np.fmod(left, right))
+
+
+def _condition(arguments):
+    values = [value for value, unused in arguments]
+    condition = values[0]
+    if len(values) == 1:
+        return _with_nulls(np.where(_as_bool(condition), 1.0, 0.0), condition), True
+    if len(values) == 2:
+        # if(x, a): a if x is not zero, 0 otherwise
+        result = np.where(_as_bool(condition), values[1], 0.0)
+        return _with_nulls(result, condition), arguments[1][1]
+    if len(values) == 3:
+        result = np.where(_as_bool(condition), values[1], values[2])
+        return _with_nulls(result, condition), arguments[1][1] and arguments[2][1]
+    # if(x, a, b, c): a if x > 0, b if x is zero, c if x < 0
+    result = np.where(
+        condition > 0, values[1], np.where(condition == 0, values[2], values[3])
+    )
+    integer = all(item[1] for item in arguments[1:])
+    return _with_nulls(result, condition), integer
+
+
+def _float_result(function):
+    def wrapped(arguments):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return function(*[value for value, unused in arguments]), False
+
+    return wrapped
+
+
+def _same_type(function):
+    def wrapped(arguments):
+        integer = all(item[1] for item in arguments)
+        return function(*[value for value, unused in arguments]), integer
+
+    return wrapped
+
+
+def _reduce(function, ignore_nulls):
+    def wrapped(arguments):
+        values = np.broadcast_arrays(*[value for value, unused in arguments])
+        stack = np.stack([np.asarray(value, dtype=np.float64) for value in values])
+        if ignore_nulls:
+            with np.errstate(invalid="ignore"):
+                all_null = np.all(np.isnan(stack), axis=0)
+                filled = np.where(np.isnan(stack), function.identity, stack)
+                result = function.reduce(filled, axis=0)
+            result = np.where(all_null, np.nan, result)
+        else:
+            result = function.reduce(stack, axis=0)
+        return result, all(item[1] for item in arguments)
+
+    return wrapped
+
+
+def _exp(*values):
+    if len(values) == 2:
+        return np.power(values[0], values[1])
+    return np.exp(values[0])
+
+
+def _log(*values):
+    if len(values) == 2:
+        return np.log(values[0]) / np.log(values[1])
+    return np.log(values[0])
+
+
+_FUNCTIONS = {
+    "if": _condition,
+    "isnull": lambda arguments: (np.where(np.isnan(arguments[0][0]), 1, 0), True),
+    "null": lambda arguments: (np.nan, True),
+    "abs": _same_type(np.abs),
+    "sqrt": _float_result(np.sqrt),
+    "exp": _float_result(_exp),
+    "log": _float_result(_log),
+    "sin": _float_result(lambda value: np.sin(np.radians(value))),
+    "cos": _float_result(lambda value: np.cos(np.radians(value))),
+    "tan": _float_result(lambda value: np.tan(np.radians(value))),
+    "min": _reduce(np.minimum, ignore_nulls=False),
+    "max": _reduce(np.maximum, ignore_nulls=False),
+    "nmin": _reduce(np.fmin, ignore_nulls=True),
+    "nmax": _reduce(np.fmax, ignore_nulls=True),
+    "int": lambda arguments: (np.trunc(arguments[0][0]), True),
+    "round": lambda arguments: (
+        np.sign(arguments[0][0]) * np.floor(np.abs(arguments[0][0]) + 0.5),
+        True,
+    ),
+    "float": lambda arguments: (arguments[0][0], False),
+    "double": lambda arguments: (arguments[0][0], False),
+}
+
+_COMPARISONS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def evaluate(node, lookup):
+    """Evaluate expression tree with *lookup* providing (array, is_integer) for maps"""
+    if node.kind == "number":
+        integer = re.fullmatch(r"\d+", node.value) is not None
+        return float(node.value), integer
+    if node.kind == "map":
+        return lookup(node.value)
+    arguments = [evaluate(child, lookup) for child in node.children]
+    if node.kind == "call":
+        return _FUNCTIONS[node.value](arguments)
+    if node.kind == "unary":
+        value, integer = arguments[0]
+        if node.value == "-":
+            return np.negative(value), integer
+        return _with_nulls(np.where(_as_bool(value), 0.0, 1.0), value), True
+    (left, left_int), (right, right_int) = arguments
+    integer = left_int and right_int
+    operator = node.value
+    if operator == "+":
+        return np.add(left, right), integer
+    if operator == "-":
+        return np.subtract(left, right), integer
+    if operator == "*":
+        return np.multiply(left, right), integer
+    if operator == "/":
+        return _divide(left, right, integer), integer
+    if operator == "%":
+        return _modulus(left, right), integer
+    if operator == "^":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.power(left, right), integer
+    if operator in _COMPARISONS:
+        with np.errstate(invalid="ignore"):
+            result = np.where(_COMPARISONS[operator](left, right), 1.0, 0.0)
+        return _with_nulls(result, left, right), True
+    if operator == "&&":
+        result = np.where(_as_bool(left) & _as_bool(right), 1.0, 0.0)
+        return _with_nulls(result, left, right), True
+    if operator == "||":
+        result = np.where(_as_bool(left) | _as_bool(right), 1.0, 0.0)
+        return _with_nulls(result, left, right), True
+    raise UnsupportedExpression(f"Operator '{operator}' is not supported")
+
+
+class GrassArrayStore:
+    """Reads and writes rasters as NumPy arrays in the current region"""
+
+    def __init__(self, env=None):
+        self.env = env
+
+    def shape(self):
+        """Return number of rows and columns in the current region"""
+        import grass.script as gs
+
+        region = gs.region(env=self.env)
+        return region["rows"], region["cols"]
+
+    def read(self, name):
+        """Return raster as (array, is_integer) with NaN for nulls"""
+        import grass.script as gs
+        from grass.script import array as garray
+
+        integer = gs.raster_info(name, env=self.env)["datatype"] == "CELL"
+        if integer:
+            data = garray.array(dtype=np.int32, env=self.env)
+            data.read(name, null=INT_NULL)
+            values = np.where(data == INT_NULL, np.nan, data).astype(np.float64)
+        else:
+            data = garray.array(dtype=np.float64, env=self.env)
+            data.read(name, null="nan")
+            values = np.array(data)
+        return values, integer
+
+    def write(self, name, values, integer):
+        """Write array to a raster (NaN is written as null)"""
+        from grass.script import array as garray
+
+        if integer:
+            data = garray.array(dtype=np.int32, env=self.env)
+            data[...] = np.where(np.isnan(values), INT_NULL, values)
+            data.write(name, null=INT_NULL, overwrite=True)
+        else:
+            data = garray.array(dtype=np.float64, env=self.env)
+            data[...] = values
+            data.write(name, overwrite=True)
+
+
+class MapcalcBatch:
+    """Collects r.mapcalc statements and evaluates them together
+
+    Statements are kept in the order they were added, so a later statement
+    can use result of an earlier one and the same name can be reassigned.
+    With *keep* provided, only the maps named there are written
+    (maps which are not kept are computed only when needed for kept ones).
+    With *keep* unset, last values of all assigned names are written.
+    The *store* provides read(name) and write(name, values, integer)
+    and defaults to GRASS rasters read and written as arrays.
+    Values of maps which were not written by flush() are retained,
+    so statements added later can still use them.
+    """
+
+    def __init__(self, env=None, keep=None, store=None):
+        self.env = env
+        self.keep = set(keep) if keep is not None else None
+        self.store = store or GrassArrayStore(env=env)
+        self._statements = []
+        self._retained = {}
+
+    def __len__(self):
+        return len(self._statements)
+
+    def add(self, expression):
+        """Parse and record expression (raises UnsupportedExpression)"""
+        self._statements.extend(parse(expression))
+
+    def names(self):
+        """Return all map names the pending statements read or write"""
+        names = set()
+        for statement in self._statements:
+            names.add(statement.name)
+            names |= statement.inputs()
+        return names
+
+    def assigned(self):
+        """Return map names assigned by pending statements or retained"""
+        names = {statement.name for statement in self._statements}
+        return names | set(self._retained)
+
+    def use_env(self, env):
+        """Set environment for the batch and its store"""
+        self.env = env
+        if hasattr(self.store, "env"):
+            self.store.env = env
+
+    def mentioned(self, values, names=None):
+        """Return map names from values used by pending statements
+
+        Values are tool parameters or expressions, so strings and lists
+        of strings are searched for names and other values are skipped.
+        Only *names* are searched for when provided.
+        """
+        if not self._statements and not self._retained:
+            return set()
+        if names is None:
+            names = self.names() | set(self._retained)
+        found = set()
+        for value in values:
+            if isinstance(value, (list, tuple)):
+                value = ",".join(str(item) for item in value)
+            elif not isinstance(value, str):
+                continue
+            for item in _NAME_RE.findall(value):
+                name = item.split("@")[0]
+                if name in names:
+                    found.add(name)
+        return found
+
+    def outputs(self):
+        """Return names which will be written by flush()"""
+        assigned = []
+        for statement in self._statements:
+            if statement.name not in assigned:
+                assigned.append(statement.name)
+        if self.keep is None:
+            return assigned
+        return [name for name in assigned if name in self.keep]
+
+    def flush(self, also=(), retain=True):
+        """Evaluate pending statements and write the outputs
+
+        Maps in *also* are written in addition to the outputs
+        when they are assigned by the pending statements or retained
+        (used when a tool needs an intermediate map).
+        With *retain*, values of the assigned maps which are not written
+        are kept for statements added later.
+        Returns dictionary of the written arrays.
+        """
+        statements = self._statements
+        outputs = self.outputs()
+        self._statements = []
+        written = {}
+        for name in also:
+            if name in self._retained:
+                values, integer = self._retained.pop(name)
+                self.store.write(name, values, integer)
+                written[name] = values
+        if not statements:
+            return written
+        # Index of the last assignment for each name and, for each statement,
+        # which statement defines each of its inputs (None means existing map).
+        last = {}
+        sources = []
+        for index, statement in enumerate(statements):
+            sources.append({name: last.get(name) for name in statement.inputs()})
+            last[statement.name] = index
+        outputs += [name for name in last if name in also and name not in outputs]
+
+        computed = {}
+        inputs = {}
+
+        def compute(index):
+            if index in computed:
+                return computed[index]
+            statement = statements[index]
+
+            def lookup(name):
+                source = sources[index][name]
+                if source is not None:
+                    return compute(source)
+                if name in self._retained:
+                    return self._retained[name]
+                if name not in inputs:
+                    inputs[name] = self.store.read(name)
+                return inputs[name]
+
+            value, integer = evaluate(statement.expression, lookup)
+            computed[index] = (np.asarray(value, dtype=np.float64), integer)
+            return computed[index]
+
+        def expanded(name):
+            values, integer = compute(last[name])
+            if values.ndim == 0:
+                # Constant expression, expand it to the full region.
+                shape = next(iter(inputs.values()))[0].shape if inputs else None
+                if shape is None:
+                    shape = self.store.shape()
+                values = np.full(shape, values)
+            return values, integer
+
+        for name in outputs:
+            values, integer = expanded(name)
+            self.store.write(name, values, integer)
+            written[name] = values
+            self._retained.pop(name, None)
+        if retain:
+            for name in last:
+                if name not in written:
+                    self._retained[name] = expanded(name)
+        return written
+
+
+def displayed_maps(layers):
+    """Return names of maps used in display commands (layers of a task)"""
+    names = set()
+    for layer in layers:
+        for item in layer[1:]:
+            key, unused, value = item.partition("=")
+            if key in ("map", "raster", "red", "green", "blue", "shade", "color"):
+                names.update(value.split(","))
+    return names
+
+
+_GRASS_FUNCTIONS = [
+    "run_command",
+    "read_command",
+    "write_command",
+    "parse_command",
+    "start_command",
+    "pipe_command",
+    "feed_command",
+    "raster_what",
+    "raster_info",
+]
+
+
+@contextmanager
+def fused(env=None, keep=None, store=None):
+    """Make gs.mapcalc calls in the block lazy and evaluate them together
+
+    Within the block, expressions given to grass.script.mapcalc are only
+    recorded. The recorded expressions are evaluated when another tool is
+    called with any of the maps they assign, when another tool writes
+    (as output) a map they read, when an expression outside of
+    the supported subset is used, and at the end of the block.
+    The run_ functions do not need to be changed:
+
+        with fused(env=env, keep=displayed_maps(task["layers"])):
+            run_fill(scanned_elev=scan, env=env)
+    """
+    import grass.script as gs
+
+    batch = MapcalcBatch(env=env, keep=keep, store=store)
+    original_mapcalc = gs.mapcalc
+    originals = {name: getattr(gs, name) for name in _GRASS_FUNCTIONS}
+
+    def mapcalc(exp, *args, **kwargs):
+        call_env = kwargs.get("env", env)
+        if not len(batch):
+            batch.use_env(call_env)
+        if not args and not kwargs.get("seed") and call_env is batch.env:
+            try:
+                batch.add(exp)
+                return None
+            except UnsupportedExpression:
+                pass
+        # Pending maps the expression reads must exist for r.mapcalc.
+        batch.flush(also=batch.mentioned([exp] + list(kwargs.values())))
+        return original_mapcalc(exp, *args, **kwargs)
+
+    def wrap(function):
+        def wrapped(*args, **kwargs):
+            if args and args[0] == "g.region":
+                # Values are arrays in the current region, so all maps
+                # are written before the region changes.
+                batch.flush(also=batch.assigned())
+                return function(*args, **kwargs)
+            # Tools only reading inputs of the statements do not need them
+            # evaluated, but tools reading their results or replacing
+            # their inputs do.
+            names = batch.mentioned(
+                list(args) + list(kwargs.values()), names=batch.assigned()
+            )
+            outputs = [
+                value for key, value in kwargs.items() if key.startswith("output")
+            ]
+            if names or batch.mentioned(outputs):
+                batch.flush(also=names)
+            return function(*args, **kwargs)
+
+        return wrapped
+
+    gs.mapcalc = mapcalc
+    for name, function in originals.items():
+        setattr(gs, name, wrap(function))
+    try:
+        yield batch
+        batch.flush(retain=False)
+    finally:
+        gs.mapcalc = original_mapcalc
+        for name, function in originals.items():
+            setattr(gs, name, function)
+
+
+def main():
+    """Process command line and run a script with fused gs.mapcalc calls"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--keep",
+        help="comma-separated maps to write (all assigned maps when not provided)",
+    )
+    parser.add_argument("script", help="Python script to run")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help="its arguments")
+    args = parser.parse_args()
+
+    keep = None
+    if args.keep is not None:
+        keep = {name for name in args.keep.split(",") if name}
+    # The script runs as if started directly.
+    sys.argv = [args.script] + args.arguments
+    sys.path[0] = os.path.dirname(os.path.abspath(args.script))
+    with fused(keep=keep):
+        runpy.run_path(args.script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+"""Account memory and I/O of tools run by activities
+
+Tools started through grass.script are reaped with wait4 instead of waitpid,
+so their resource usage is recorded: peak resident set size (including the
+processes the tool started itself), CPU time, and bytes read and written
+to storage. For each run_ function, the maps it created or changed in the
+current mapset are recorded with their size.
+
+The report for an activity is created by running its main() function
+in a GRASS session:
+
+    grass .../nc_spm/user --exec python3 tools/resource_usage.py activities/owen.py \\
+        --json owen_usage.json --budget 1024
+
+Only processes waited for by Popen.wait() or Popen.poll() (which is what
+run_command, read_command, and similar functions use) are accounted.
+"""
+
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from result_cache import changed_maps, map_files, mapset_path, snapshot
+from tool_trace import load_activity
+
+# Size of a block in rusage block counts
+BLOCK_SIZE = 512
+
+
+class ProcessUsage:
+    """Resources used by one finished tool process"""
+
+    def __init__(self, args, usage):
+        if isinstance(args, (list, tuple)):
+            self.tool = Path(str(args[0])).name if args else ""
+        else:
+            self.tool = str(args).split(" ", 1)[0]
+        # kilobytes on Linux
+        self.peak_rss_kb = usage.ru_maxrss
+        self.user_s = usage.ru_utime
+        self.system_s = usage.ru_stime
+        self.read_bytes = usage.ru_inblock * BLOCK_SIZE
+        self.written_bytes = usage.ru_oublock * BLOCK_SIZE
+
+    def to_dict(self):
+        """Return usage as a dictionary"""
+        return dict(vars(self))
+
+
+_current = threading.local()
+
+
+def exit_code(status):
+    """Return return code as in Popen from a status returned by wait4
+
+    Processes ended by a signal have the negative signal number.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _record(args, usage):
+    for recorder in getattr(_current, "recorders", []):
+        recorder.processes.append(ProcessUsage(args, usage))
+
+
+def install(module):
+    """Make Popen in a module (grass.script.core) record usage of processes
+
+    The replacement behaves as the original one when nothing is recorded.
+    """
+    original = module.Popen
+    if getattr(original, "accounted", False):
+        return
+
+    class AccountedPopen(original):
+        """Popen which reaps the process with wait4 to get its usage"""
+
+        accounted = True
+
+        def _reap(self, blocking):
+            """Reap the process with wait4 if it finished and record its usage"""
+            if self.returncode is not None:
+                return
+            try:
+                pid, status, usage = os.wait4(self.pid, 0 if blocking else os.WNOHANG)
+            except ChildProcessError:
+                # Reaped by someone else, Popen handles that.
+                return
+            if pid == self.pid:
+                self.returncode = exit_code(status)
+                _record(self.args, usage)
+
+        def poll(self):
+            self._reap(blocking=False)
+            return super().poll()
+
+        def wait(self, timeout=None):
+            if timeout is None:
+                self._reap(blocking=True)
+                return super().wait()
+            end = time.monotonic() + timeout
+            delay = 0.0005
+            while self.poll() is None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(self.args, timeout)
+                delay = min(delay * 2, remaining, 0.05)
+                time.sleep(delay)
+            return self.returncode
+
+    module.Popen = AccountedPopen
+
+
+class UsageRecorder:
+    """Collects usage of processes finished while recording in this thread
+
+    Recorders can be nested, e.g., for a job and each function in it.
+    """
+
+    def __init__(self):
+        self.processes = []
+
+    def __enter__(self):
+        if not hasattr(_current, "recorders"):
+            _current.recorders = []
+        _current.recorders.append(self)
+        return self
+
+    def __exit__(self, *args):
+        _current.recorders.remove(self)
+
+    @property
+    def peak_rss_kb(self):
+        """Largest peak resident set size of a recorded process"""
+        return max((process.peak_rss_kb for process in self.processes), default=0)
+
+    @property
+    def read_bytes(self):
+        """Bytes read from storage by all recorded processes"""
+        return sum(process.read_bytes for process in self.processes)
+
+    @property
+    def written_bytes(self):
+        """Bytes written to storage by all recorded processes"""
+        return sum(process.written_bytes for process in self.processes)
+
+
+class FunctionUsage:
+    """Resources used by one call of a run_ function"""
+
+    def __init__(self, name, scan):
+        self.name = name
+        self.scan = scan
+        self.duration = 0
+        self.processes = []
+        self.maps = []
+        self.error = None
+
+    @property
+    def peak_rss_kb(self):
+        """Largest peak resident set size of a tool in this call"""
+        return max((process.peak_rss_kb for process in self.processes), default=0)
+
+    def to_dict(self):
+        """Return usage as a dictionary"""
+        return {
+            "name": self.name,
+            "scan": self.scan,
+            "duration": self.duration,
+            "error": self.error,
+            "peak_rss_kb": self.peak_rss_kb,
+            "read_bytes": sum(process.read_bytes for process in self.processes),
+            "written_bytes": sum(process.written_bytes for process in self.processes),
+            "maps_created": len(self.maps),
+            "maps_bytes": sum(item["bytes"] for item in self.maps),
+            "maps": self.maps,
+            "processes": [process.to_dict() for process in self.processes],
+        }
+
+
+def map_changes(mapset, before, after):
+    """Return created or changed maps between snapshots with their size"""
+    return [
+        {
+            "kind": kind,
+            "name": name,
+            "bytes": sum(path.stat().st_size for path in map_files(mapset, name)),
+        }
+        for kind, name in changed_maps(before, after)
+    ]
+
+
+class ActivityAccounting:
+    """Records usage of run_ functions of an activity module"""
+
+    def __init__(self, mapset):
+        self.mapset = Path(mapset)
+        self.calls = []
+        self.scan = 0
+
+    def trace_module(self, module):
+        """Record calls of run_ functions in an activity module"""
+        for name in dir(module):
+            function = getattr(module, name)
+            if name.startswith("run_") and callable(function):
+                setattr(module, name, self.account_function(function))
+
+    def account_function(self, function):
+        """Return wrapper which records usage of a run_ function"""
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            usage = FunctionUsage(function.__name__, self.scan)
+            self.calls.append(usage)
+            before = snapshot(self.mapset)
+            start = time.perf_counter()
+            try:
+                with UsageRecorder() as recorder:
+                    return function(*args, **kwargs)
+            except Exception as error:
+                usage.error = repr(error)
+                raise
+            finally:
+                usage.duration = time.perf_counter() - start
+                usage.processes = recorder.processes
+                usage.maps = map_changes(self.mapset, before, snapshot(self.mapset))
+
+        return wrapper
+
+    def report(self):
+        """Return report with all calls and the peak for the activity"""
+        return {
+            "peak_rss_kb": max((call.peak_rss_kb for call in self.calls), default=0),
+            "calls": [call.to_dict() for call in self.calls],
+        }
+
+
+def account_activity(path, scans=1):
+    """Run main() of an activity in a GRASS session and return usage report"""
+    import grass.script.core as core
+
+    install(core)
+    accounting = ActivityAccounting(mapset_path(os.environ))
+    activity = load_activity(path)
+    accounting.trace_module(activity)
+    for scan in range(scans):
+        accounting.scan = scan
+        activity.main()
+    report = accounting.report()
+    report["file"] = str(path)
+    return report
+
+
+def format_report(report):
+    """Return report as a table with one line for each call"""
+    lines = [
+        f"{'function':<24} {'scan':>4} {'time [s]':>9} {'peak [MB]':>10} "
+        f"{'read [MB]':>10} {'written [MB]':>13} {'maps':>5} {'maps [MB]':>10}"
+    ]
+    megabyte = 1024 * 1024
+    for call in report["calls"]:
+        lines.append(
+            f"{call['name']:<24} {call['scan']:>4} {call['duration']:>9.2f} "
+            f"{call['peak_rss_kb'] / 1024:>10.1f} "
+            f"{call['read_bytes'] / megabyte:>10.1f} "
+            f"{call['written_bytes'] / megabyte:>13.1f} "
+            f"{call['maps_created']:>5} {call['maps_bytes'] / megabyte:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Process command line and report usage of an activity"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="activity file (with main function)")
+    parser.add_argument("--scans", type=int, default=1, help="number of scans")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    parser.add_argument(
+        "--budget", type=float, help="fail when a tool needs more memory (MB)"
+    )
+    args = parser.parse_args()
+
+    report = account_activity(args.file, scans=args.scans)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    print(format_report(report))
+    peak_mb = report["peak_rss_kb"] / 1024
+    if args.budget and peak_mb > args.budget:
+        print(
+            f"Peak memory {peak_mb:.1f} MB is over the budget of {args.budget} MB",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""Cache outputs of run_ functions by content of the scan
+
+When the sand does not change between scans, the activities compute the
+same outputs again. Here, the key for a call is a hash of the scanned raster
+files, the computational region, the function (including its source code),
+and the other parameters (with content of maps they name). On a miss, the
+function runs and the raster and vector maps it creates or changes in the
+current mapset are stored in a compressed archive. On a hit, the maps are
+restored from the archive without running any tool.
+
+Only files with the data, header, and nulls of the maps are part of the key
+(not, e.g., the history with the date of writing), so a scan which is written
+again with the same values gives the same key. Attribute tables are stored
+in a database outside of the map files, so their content is not part of
+the key and outputs which include a vector map with an attribute table
+are not cached (the function runs each time).
+
+Archives are removed in the least recently used order when the cache
+exceeds its size limit. Maps read by the function which are not passed as
+parameters (e.g., a saved scan) need to be listed in *inputs*.
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import shutil
+import zipfile
+from pathlib import Path
+
+# Raster elements stored as element/name.
+RASTER_ELEMENTS = ["cell", "fcell", "cellhd", "colr", "cats", "hist"]
+# Directories with one subdirectory per map.
+MAP_DIRECTORIES = {"cell_misc": "raster", "vector": "vector"}
+# Raster elements and files in map directories which define content of a map.
+CONTENT_ELEMENTS = {"cell", "fcell", "cellhd"}
+CONTENT_FILES = {"null", "nullcmpr", "f_format", "f_quant", "coor"}
+
+
+def read_gisrc(env):
+    """Return variables from the GISRC file given by the environment"""
+    variables = {}
+    with open(env["GISRC"]) as file:
+        for line in file:
+            key, separator, value = line.partition(":")
+            if separator:
+                variables[key.strip()] = value.strip()
+    return variables
+
+
+def mapset_path(env):
+    """Return path to the current mapset"""
+    variables = read_gisrc(env)
+    return Path(variables["GISDBASE"], variables["LOCATION_NAME"], variables["MAPSET"])
+
+
+def map_files(mapset, name):
+    """Return existing files of a raster or vector map in a mapset"""
+    files = []
+    for element in RASTER_ELEMENTS:
+        path = mapset / element / name
+        if path.is_file():
+            files.append(path)
+    for element in MAP_DIRECTORIES:
+        directory = mapset / element / name
+        if directory.is_dir():
+            files.extend(sorted(path for path in directory.iterdir() if path.is_file()))
+    return files
+
+
+def find_map(mapset, name):
+    """Return files of a map given by name or name@mapset (empty if not found)"""
+    name, unused, other = name.partition("@")
+    if other:
+        mapset = mapset.parent / other
+    files = map_files(mapset, name)
+    if not files and not other:
+        files = map_files(mapset.parent / "PERMANENT", name)
+    return files
+
+
+def content_files(mapset, name):
+    """Return files which define content of a map (for the key)"""
+    base = name.partition("@")[0]
+    return [
+        path
+        for path in find_map(mapset, name)
+        if (path.name == base and path.parent.name in CONTENT_ELEMENTS)
+        or (path.parent.name == base and path.name in CONTENT_FILES)
+    ]
+
+
+def has_attributes(mapset, name):
+    """Return True if a vector map is connected to an attribute table"""
+    path = mapset / "vector" / name / "dbln"
+    return path.is_file() and bool(path.read_text().strip())
+
+
+def region_text(env, mapset):
+    """Return definition of the current region as text"""
+    if env.get("GRASS_REGION"):
+        return env["GRASS_REGION"]
+    if env.get("WIND_OVERRIDE"):
+        path = mapset / "windows" / env["WIND_OVERRIDE"]
+    else:
+        path = mapset / "WIND"
+    return path.read_text() if path.is_file() else ""
+
+
+def snapshot(mapset):
+    """Return modification time and size for all map files in a mapset"""
+    result = {}
+    for element in RASTER_ELEMENTS:
+        directory = mapset / element
+        if directory.is_dir():
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    stat = entry.stat()
+                    result[(element, entry.name, "")] = (stat.st_mtime_ns, stat.st_size)
+    for element in MAP_DIRECTORIES:
+        directory = mapset / element
+        if not directory.is_dir():
+            continue
+        for map_entry in os.scandir(directory):
+            if not map_entry.is_dir():
+                continue
+            for entry in os.scandir(map_entry.path):
+                if entry.is_file():
+                    stat = entry.stat()
+                    key = (element, map_entry.name, entry.name)
+                    result[key] = (stat.st_mtime_ns, stat.st_size)
+    return result
+
+
+def changed_maps(before, after):
+    """Return names of raster and vector maps which changed between snapshots"""
+    names = set()
+    for key, stamp in after.items():
+        if before.get(key) != stamp:
+            element, name, unused = key
+            kind = MAP_DIRECTORIES.get(element, "raster")
+            names.add((kind, name))
+    return sorted(names)
+
+
+class ResultCache:
+    """Least recently used cache of maps created by run_ functions
+
+    Archives are stored in *directory* and the total size is kept under
+    *max_bytes*. Statistics are available as *hits*, *misses*, *evictions*,
+    *uncacheable* (misses with outputs which cannot be stored),
+    and hit_rate().
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+    def hit_rate(self):
+        """Return share of calls served from the cache"""
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0
+
+    def statistics(self):
+        """Return statistics as a dictionary"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "uncacheable": self.uncacheable,
+            "hit_rate": self.hit_rate(),
+            "bytes": sum(path.stat().st_size for path in self._archives()),
+        }
+
+    def key(self, function, scanned_elev, env, inputs=(), **kwargs):
+        """Return cache key for a call"""
+        mapset = mapset_path(env)
+        digest = hashlib.blake2b(digest_size=20)
+
+        def add(*items):
+            for item in items:
+                digest.update(str(item).encode())
+                digest.update(b"\0")
+
+        try:
+            source = inspect.getsource(function)
+        except (OSError, TypeError):
+            source = function.__code__.co_code
+        add(function.__module__, function.__qualname__, source)
+        add(region_text(env, mapset))
+        for name in [scanned_elev] + list(inputs):
+            add(name)
+            for path in content_files(mapset, name):
+                add(path.name)
+                digest.update(path.read_bytes())
+        for name, value in sorted(kwargs.items()):
+            add(name, repr(value))
+            if isinstance(value, str):
+                # Parameters can be names of maps, so include their content.
+                for path in content_files(mapset, value):
+                    add(path.name)
+                    digest.update(path.read_bytes())
+        return digest.hexdigest()
+
+    def run(self, function, scanned_elev, env, inputs=(), **kwargs):
+        """Call function or restore its outputs from the cache
+
+        Returns True if the outputs were restored from the cache.
+        """
+        key = self.key(function, scanned_elev, env, inputs=inputs, **kwargs)
+        archive = self.directory / f"{key}.zip"
+        mapset = mapset_path(env)
+        if archive.is_file():
+            self._restore(archive, mapset)
+            # Mark as recently used.
+            os.utime(archive)
+            self.hits += 1
+            return True
+        self.misses += 1
+        before = snapshot(mapset)
+        function(scanned_elev=scanned_elev, env=env, **kwargs)
+        outputs = [
+            item
+            for item in changed_maps(before, snapshot(mapset))
+            if item[1] != scanned_elev
+        ]
+        if any(
+            kind == "vector" and has_attributes(mapset, name) for kind, name in outputs
+        ):
+            self.uncacheable += 1
+            return False
+        self._store(archive, mapset, outputs)
+        self._evict()
+        return False
+
+    def _store(self, archive, mapset, outputs):
+        temporary = archive.with_suffix(".tmp")
+        with zipfile.ZipFile(temporary, "w", zipfile.ZIP_DEFLATED) as file:
+            for unused, name in outputs:
+                for path in map_files(mapset, name):
+                    file.write(path, path.relative_to(mapset).as_posix())
+        # Rename so that other processes never see a partial archive.
+        temporary.replace(archive)
+
+    def _restore(self, archive, mapset):
+        with zipfile.ZipFile(archive) as file:
+            names = {Path(member).parts[1] for member in file.namelist()}
+            for name in names:
+                # Remove files from the current version of the map
+                # so that no file from a different map type is left behind.
+                for path in map_files(mapset, name):
+                    path.unlink()
+                for element in MAP_DIRECTORIES:
+                    shutil.rmtree(mapset / element / name, ignore_errors=True)
+            file.extractall(mapset)
+
+    def _archives(self):
+        return list(self.directory.glob("*.zip"))
+
+    def _evict(self):
+        archives = [(path.stat(), path) for path in self._archives()]
+        total = sum(stat.st_size for stat, unused in archives)
+        for stat, path in sorted(archives, key=lambda item: item[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            path.unlink()
+            total -= stat.st_size
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all archives"""
+        for path in self._archives():
+            path.unlink()
+
+
+def cached(cache, inputs=()):
+    """Decorator for run_ functions to use a ResultCache"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(scanned_elev, env, **kwargs):
+            cache.run(function, scanned_elev, env, inputs=inputs, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+
+"""Estimate time needed for each scan by activities without running them
+
+The run_ functions are analyzed statically: calls of tools through
+grass.script (run_command, mapcalc, write_command, and similar) are collected
+including calls in local helper functions and in loops with a known number
+of iterations. Each tool has a cost made of a fixed overhead (starting
+the process) and time per million cells, so the latency of one scan can be
+predicted for a region of a given size.
+
+The default costs are rough estimates. For a given machine, calibrate them
+by running the included benchmark in a GRASS session with the NC sample data:
+
+    grass nc_spm_08_grass7/user1 --exec python3 tools/scan_cost.py --calibrate
+
+which writes tools/tool_costs.json used from then on.
+
+Because the costs depend on the machine, a budget can also be given relative
+to one pass of r.mapcalc over the region (the reference tool), e.g., with
+--relative-budget 80, the run_ functions may take as long as 80 r.mapcalc
+calls on any machine the costs were calibrated on.
+"""
+
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+
+# Tool: (fixed overhead in seconds, seconds per million cells)
+DEFAULT_COSTS = {
+    # r.mapcalc, r.clump, r.stats, and v.in.ascii run by Tangible Landscape
+    "analyses.change_detection": (0.2, 1.5),
+    "g.region": (0.03, 0.0),
+    "r.accumulate": (0.05, 1.5),
+    "r.colors": (0.05, 0.0),
+    "r.contour": (0.05, 1.0),
+    "r.fill.dir": (0.05, 3.0),
+    "r.flow": (0.05, 5.0),
+    "r.lake": (0.05, 0.5),
+    "r.mapcalc": (0.05, 0.3),
+    "r.resamp.stats": (0.05, 0.3),
+    "r.slope.aspect": (0.05, 0.5),
+    "r.stats.zonal": (0.05, 0.5),
+    "r.stream.extract": (0.05, 4.0),
+    "r.sun": (0.05, 20.0),
+    "r.to.vect": (0.05, 4.0),
+    "r.topidx": (0.05, 2.0),
+    "r.watershed": (0.05, 6.0),
+    "r.what": (0.05, 0.0),
+    "v.in.ascii": (0.05, 0.0),
+    "v.out.ascii": (0.05, 0.0),
+}
+# Cost used for tools which are not in the table.
+UNKNOWN_COST = (0.1, 1.0)
+# Tool with one call as the unit of relative budgets
+REFERENCE_TOOL = "r.mapcalc"
+
+DEFAULT_COSTS_FILE = os.path.join(os.path.dirname(__file__), "tool_costs.json")
+
+# Functions of grass.script with tool name as the first parameter.
+TOOL_FUNCTIONS = {
+    "run_command",
+    "read_command",
+    "write_command",
+    "parse_command",
+    "start_command",
+    "pipe_command",
+    "feed_command",
+}
+# Functions of grass.script which run a specific tool.
+WRAPPER_FUNCTIONS = {
+    "mapcalc": "r.mapcalc",
+    "mapcalc_start": "r.mapcalc",
+    "raster_what": "r.what",
+    "region": "g.region",
+    # analyses module of Tangible Landscape
+    "change_detection": "analyses.change_detection",
+}
+
+
+class ToolCall:
+    """Tool call found in the code with how many times it runs per scan"""
+
+    def __init__(self, tool, line, count=1, known_count=True):
+        self.tool = tool
+        self.line = line
+        self.count = count
+        self.known_count = known_count
+
+    def to_dict(self):
+        """Return call as a dictionary"""
+        return {
+            "tool": self.tool,
+            "line": self.line,
+            "count": self.count,
+            "known_count": self.known_count,
+        }
+
+
+class _FunctionAnalyzer:
+    """Collects tool calls in a function following local helper functions
+
+    Loops (for, while, and comprehensions) multiply the number of calls in
+    them by the number of iterations when it is known from the code, i.e.,
+    for literal lists and tuples, names assigned such literals or integer
+    constants in the function, and range(), len(), enumerate(), and zip()
+    applied to those.
+    """
+
+    def __init__(self, functions):
+        self.functions = functions
+
+    def analyze(self, name, stack=()):
+        if name in stack:
+            # recursion, count the calls only once
+            return []
+        node = self.functions[name]
+        constants = {}
+        for statement in ast.walk(node):
+            if (
+                isinstance(statement, ast.Assign)
+                and len(statement.targets) == 1
+                and isinstance(statement.targets[0], ast.Name)
+                and isinstance(statement.value, (ast.Constant, ast.List, ast.Tuple))
+            ):
+                constants[statement.targets[0].id] = statement.value
+        calls = []
+        for statement in node.body:
+            calls.extend(self._visit(statement, 1, True, constants, stack + (name,)))
+        return calls
+
+    def _integer(self, node, constants):
+        """Return value of an integer expression or None if unknown"""
+        if isinstance(node, ast.Name) and node.id in constants:
+            node = constants[node.id]
+        if isinstance(node, ast.Constant) and isinstance(node.value, int):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            value = self._integer(node.operand, constants)
+            return None if value is None else -value
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id == "len"
+            and len(node.args) == 1
+        ):
+            return self._iterations(node.args[0], constants)
+        return None
+
+    def _iterations(self, iterable, constants):
+        """Return number of items of an iterable expression or None if unknown"""
+        if isinstance(iterable, ast.Name) and iterable.id in constants:
+            iterable = constants[iterable.id]
+        if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)):
+            return len(iterable.elts)
+        if not isinstance(iterable, ast.Call) or not isinstance(
+            iterable.func, ast.Name
+        ):
+            return None
+        function = iterable.func.id
+        arguments = iterable.args
+        if function == "range" and 1 <= len(arguments) <= 3:
+            values = [self._integer(argument, constants) for argument in arguments]
+            if None in values or values[2:] == [0]:
+                return None
+            return len(range(*values))
+        if function in ("enumerate", "reversed", "sorted", "list", "tuple"):
+            if len(arguments) == 1:
+                return self._iterations(arguments[0], constants)
+        if function == "zip" and arguments:
+            counts = [self._iterations(argument, constants) for argument in arguments]
+            if None not in counts:
+                return min(counts)
+        return None
+
+    def _visit_all(self, nodes, count, known, constants, stack):
+        calls = []
+        for node in nodes:
+            calls.extend(self._visit(node, count, known, constants, stack))
+        return calls
+
+    def _visit(self, node, count, known, constants, stack):
+        # pylint: disable=too-many-arguments
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            return []
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            if isinstance(node, ast.While):
+                # The condition is evaluated at least once, likely more times.
+                iterations = None
+                calls = self._visit(node.test, count, False, constants, stack)
+            else:
+                # The iterable is evaluated once.
+                iterations = self._iterations(node.iter, constants)
+                calls = self._visit(node.iter, count, known, constants, stack)
+            loop_known = known
+            if iterations is None:
+                # Count one iteration, but mark the count as unknown.
+                iterations, loop_known = 1, False
+            calls.extend(
+                self._visit_all(
+                    node.body, count * iterations, loop_known, constants, stack
+                )
+            )
+            calls.extend(self._visit_all(node.orelse, count, known, constants, stack))
+            return calls
+        if isinstance(
+            node, (ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)
+        ):
+            calls = []
+            for generator in node.generators:
+                calls.extend(
+                    self._visit(generator.iter, count, known, constants, stack)
+                )
+                iterations = self._iterations(generator.iter, constants)
+                if iterations is None:
+                    iterations, known = 1, False
+                count *= iterations
+                calls.extend(
+                    self._visit_all(generator.ifs, count, known, constants, stack)
+                )
+            if isinstance(node, ast.DictComp):
+                elements = [node.key, node.value]
+            else:
+                elements = [node.elt]
+            calls.extend(self._visit_all(elements, count, known, constants, stack))
+            return calls
+        calls = []
+        if isinstance(node, ast.Call):
+            tool = call_tool(node)
+            if tool:
+                calls.append(ToolCall(tool, node.lineno, count, known))
+            elif isinstance(node.func, ast.Name) and node.func.id in self.functions:
+                for call in self.analyze(node.func.id, stack):
+                    calls.append(
+                        ToolCall(
+                            call.tool,
+                            call.line,
+                            call.count * count,
+                            call.known_count and known,
+                        )
+                    )
+        calls.extend(
+            self._visit_all(ast.iter_child_nodes(node), count, known, constants, stack)
+        )
+        return calls
+
+
+def call_tool(node):
+    """Return name of the tool a call runs or None if it is not a tool call"""
+    func = node.func
+    name = func.attr if isinstance(func, ast.Attribute) else None
+    if name in TOOL_FUNCTIONS:
+        if node.args and isinstance(node.args[0], ast.Constant):
+            return str(node.args[0].value)
+        return "unknown"
+    if name in WRAPPER_FUNCTIONS:
+        return WRAPPER_FUNCTIONS[name]
+    return None
+
+
+def analyze_file(path):
+    """Return tool calls of each run_ function in a file"""
+    with open(path) as file:
+        tree = ast.parse(file.read(), filename=str(path))
+    functions = {
+        node.name: node
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    analyzer = _FunctionAnalyzer(functions)
+    return {
+        name: analyzer.analyze(name) for name in functions if name.startswith("run_")
+    }
+
+
+def load_costs(path=DEFAULT_COSTS_FILE):
+    """Return cost table with calibrated values (if available) over the defaults"""
+    costs = dict(DEFAULT_COSTS)
+    if path and os.path.isfile(path):
+        with open(path) as file:
+            costs.update({tool: tuple(cost) for tool, cost in json.load(file).items()})
+    return costs
+
+
+def call_cost(call, cells, costs):
+    """Return time in seconds for a call in a region with the number of cells"""
+    overhead, per_million = costs.get(call.tool, UNKNOWN_COST)
+    return call.count * (overhead + per_million * cells / 1e6)
+
+
+def reference_cost(cells, costs):
+    """Return time in seconds of one call of the reference tool"""
+    return call_cost(ToolCall(REFERENCE_TOOL, line=0), cells, costs)
+
+
+def estimate_file(path, cells, costs=None):
+    """Return report with predicted time per run_ function and per scan"""
+    if costs is None:
+        costs = load_costs()
+    functions = {}
+    for name, calls in analyze_file(path).items():
+        functions[name] = {
+            "seconds": sum(call_cost(call, cells, costs) for call in calls),
+            "calls": [
+                dict(call.to_dict(), seconds=call_cost(call, cells, costs))
+                for call in calls
+            ],
+            "unknown_tools": sorted(
+                {call.tool for call in calls if call.tool not in costs}
+            ),
+            "unknown_loops": any(not call.known_count for call in calls),
+        }
+    # All run_ functions run for each scan.
+    seconds = sum(function["seconds"] for function in functions.values())
+    return {
+        "file": str(path),
+        "cells": cells,
+        "seconds": seconds,
+        "relative": seconds / reference_cost(cells, costs),
+        "functions": functions,
+    }
+
+
+# Calibration benchmark
+
+BENCHMARK_ELEVATION = "elev_lid792_1m"
+
+
+def benchmark_commands(elevation):
+    """Return list of (tool, parameters) to time, later ones may use earlier outputs"""
+    return [
+        ("r.mapcalc", {"expression": f"tl_bench_calc = {elevation} * 2"}),
+        ("r.slope.aspect", {"elevation": elevation, "slope": "tl_bench_slope"}),
+        ("r.colors", {"map": "tl_bench_slope", "color": "viridis"}),
+        ("r.contour", {"input": elevation, "output": "tl_bench_contours", "step": 5}),
+        (
+            "r.fill.dir",
+            {
+                "input": elevation,
+                "output": "tl_bench_fill",
+                "direction": "tl_bench_dir",
+            },
+        ),
+        (
+            "r.watershed",
+            {
+                "elevation": elevation,
+                "accumulation": "tl_bench_accum",
+                "basin": "tl_bench_basins",
+                "threshold": 1000,
+            },
+        ),
+        (
+            "r.to.vect",
+            {"input": "tl_bench_basins", "output": "tl_bench_basins", "type": "area"},
+        ),
+        (
+            "r.stream.extract",
+            {"elevation": elevation, "threshold": 100, "stream_raster": "tl_bench_st"},
+        ),
+        ("r.flow", {"elevation": elevation, "flowaccumulation": "tl_bench_flow"}),
+        ("r.topidx", {"input": elevation, "output": "tl_bench_twi"}),
+        (
+            "r.stats.zonal",
+            {
+                "base": "tl_bench_basins",
+                "cover": "tl_bench_slope",
+                "method": "average",
+                "output": "tl_bench_zonal",
+            },
+        ),
+        ("r.sun", {"elevation": elevation, "glob_rad": "tl_bench_sun", "day": 172}),
+    ]
+
+
+def calibrate(sizes=(200, 800), elevation=BENCHMARK_ELEVATION):
+    """Time benchmark commands for regions of two sizes and fit the costs
+
+    Needs to run in a GRASS session. Returns the cost table.
+    """
+    import grass.script as gs
+
+    env = os.environ.copy()
+    env["GRASS_OVERWRITE"] = "1"
+    env["GRASS_VERBOSE"] = "-1"
+    timings = {}
+    for size in sizes:
+        gs.run_command(
+            "g.region", raster=elevation, rows=size, cols=size, flags="a", env=env
+        )
+        for tool, parameters in benchmark_commands(elevation):
+            start = time.perf_counter()
+            gs.run_command(tool, env=env, **parameters)
+            timings.setdefault(tool, []).append(
+                (size * size, time.perf_counter() - start)
+            )
+    gs.run_command(
+        "g.remove", type="raster,vector", pattern="tl_bench_*", flags="f", env=env
+    )
+    costs = {}
+    for tool, ((cells_1, time_1), (cells_2, time_2)) in timings.items():
+        per_cell = max((time_2 - time_1) / (cells_2 - cells_1), 0)
+        overhead = max(time_1 - per_cell * cells_1, 0)
+        costs[tool] = (overhead, per_cell * 1e6)
+    return costs
+
+
+def over_budget(report, budget, relative=False):
+    """Return True if the report is over the budget (seconds or relative)"""
+    if relative:
+        return report["relative"] > budget
+    return report["seconds"] > budget
+
+
+def format_report(report, budget, relative=False):
+    """Return report for one file as text
+
+    With *relative*, the budget is in calls of the reference tool.
+    """
+    name = os.path.basename(report["file"])
+    status = "OVER BUDGET" if over_budget(report, budget, relative) else "OK"
+    lines = [
+        f"{name}: {report['seconds']:.2f} s per scan"
+        f" ({report['relative']:.1f}x {REFERENCE_TOOL}, {status})"
+    ]
+    for function, info in report["functions"].items():
+        lines.append(f"  {function}: {info['seconds']:.2f} s")
+        for call in info["calls"]:
+            count = f"{call['count']}x" if call["known_count"] else f"{call['count']}+x"
+            lines.append(
+                f"    line {call['line']:>4} {call['tool']:<18} {count:>4} "
+                f"{call['seconds']:.2f} s"
+            )
+        if info["unknown_tools"]:
+            lines.append(f"    no cost known for: {', '.join(info['unknown_tools'])}")
+    return "\n".join(lines)
+
+
+def main():
+    """Estimate per-scan time of activities and check it against a budget"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="activity files to analyze")
+    parser.add_argument(
+        "--rows", type=int, default=500, help="number of rows in the region"
+    )
+    parser.add_argument(
+        "--cols", type=int, default=500, help="number of columns in the region"
+    )
+    parser.add_argument(
+        "--budget", type=float, default=10, help="maximum time per scan in seconds"
+    )
+    parser.add_argument(
+        "--relative-budget",
+        type=float,
+        help=f"maximum time per scan in {REFERENCE_TOOL} calls (instead of --budget)",
+    )
+    parser.add_argument(
+        "--costs", default=DEFAULT_COSTS_FILE, help="JSON file with tool costs"
+    )
+    parser.add_argument("--json", help="write the report to this JSON file")
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="run the benchmark (in a GRASS session) and write the costs file",
+    )
+    args = parser.parse_args()
+
+    if args.calibrate:
+        costs = calibrate()
+        with open(args.costs, "w") as file:
+            json.dump(costs, file, indent=2, sort_keys=True)
+        print(f"Costs written to {args.costs}")
+        return 0
+
+    files = args.files
+    if not files:
+        directory = os.path.normpath(
+            os.path.join(os.path.dirname(__file__), "..", "activities")
+        )
+        files = sorted(
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.endswith(".py")
+        )
+    costs = load_costs(args.costs)
+    reports = [estimate_file(path, args.rows * args.cols, costs) for path in files]
+    relative = args.relative_budget is not None
+    budget = args.relative_budget if relative else args.budget
+    for report in reports:
+        print(format_report(report, budget, relative=relative))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(reports, file, indent=2)
+    return 1 if any(over_budget(report, budget, relative) for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
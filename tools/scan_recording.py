@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+
+"""Record sequences of scans into compact session files and read them back
+
+A session file has a header with the region, then one record for each
+scan (frame) with its timestamp:
+
+- a keyframe stores the whole scan,
+- a delta stores only the cells which changed since the previous frame
+  (a bit mask of changed cells and differences of their values).
+
+Values are quantized to multiples of *quantum* (map units) and stored as
+integers, so frames are restored exactly as recorded (up to the quantum)
+without drift. Changes smaller than *threshold* are not recorded, which
+removes scanner noise (restored values then differ from the scans by at most
+*threshold* and half of *quantum*). All records are compressed by zlib.
+A keyframe is written every *keyframe_interval* frames and when most cells
+changed.
+
+An index of records is written at the end when the recording is closed.
+Reading a frame decodes only the keyframe before it and the deltas after
+that keyframe. (When the index is missing, e.g., after a crash, the reader
+finds the records by going through the file.)
+
+With a 500x500 scan each second, 1 mm quantum, 2 mm threshold, and most
+of the sand still, one hour takes about 10 megabytes.
+
+To see a summary of a session file or restore one frame as a raster in
+a GRASS session, use:
+
+    python3 tools/scan_recording.py info session.tlscan
+    grass .../nc_spm/user --exec python3 tools/scan_recording.py \\
+        restore session.tlscan 120 scan_120
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+MAGIC = b"TLSCAN1\n"
+INDEX_MAGIC = b"TLINDEX\n"
+# Kind, timestamp, and payload size of a record
+RECORD = struct.Struct("<BdI")
+# Size of the header and offset of the index
+SIZE = struct.Struct("<Q")
+KEYFRAME = 0
+DELTA = 1
+# Quantized value of nulls
+NULL = np.iinfo(np.int32).min
+# Share of changed cells from which a keyframe is smaller than a delta
+KEYFRAME_SHARE = 0.5
+
+
+class SessionFileError(Exception):
+    """Raised when a session file cannot be read"""
+
+
+def quantize(frame, quantum):
+    """Return frame as integer multiples of quantum (NULL for NaN)"""
+    frame = np.asarray(frame, dtype=np.float64)
+    valid = np.isfinite(frame)
+    values = np.full(frame.shape, NULL, dtype=np.int32)
+    values[valid] = np.round(frame[valid] / quantum)
+    return values
+
+
+def dequantize(values, quantum):
+    """Return quantized values as float32 frame with NaN for nulls"""
+    frame = values.astype(np.float32) * np.float32(quantum)
+    frame[values == NULL] = np.nan
+    return frame
+
+
+def encode_keyframe(values):
+    """Return compressed whole frame (differences of neighboring cells)"""
+    flat = values.ravel().astype(np.int64)
+    return zlib.compress(np.diff(flat, prepend=0).astype(np.int32).tobytes())
+
+
+def decode_keyframe(payload, shape):
+    """Return quantized values from a keyframe"""
+    differences = np.frombuffer(zlib.decompress(payload), dtype=np.int32)
+    return np.cumsum(differences, dtype=np.int64).astype(np.int32).reshape(shape)
+
+
+def encode_delta(changed, differences):
+    """Return compressed mask of changed cells and their differences"""
+    mask = np.packbits(changed.ravel())
+    return zlib.compress(
+        SIZE.pack(len(mask)) + mask.tobytes() + differences.astype(np.int32).tobytes()
+    )
+
+
+def apply_delta(values, payload):
+    """Apply delta to quantized values in place"""
+    data = zlib.decompress(payload)
+    (mask_size,) = SIZE.unpack_from(data)
+    start = SIZE.size
+    mask = np.frombuffer(data, dtype=np.uint8, count=mask_size, offset=start)
+    changed = np.unpackbits(mask, count=values.size).astype(bool)
+    differences = np.frombuffer(data, dtype=np.int32, offset=start + mask_size)
+    flat = values.reshape(-1)
+    flat[changed] = (flat[changed].astype(np.int64) + differences).astype(np.int32)
+
+
+class SessionRecorder:
+    """Writes frames (2D arrays with NaN for nulls) into a session file
+
+    The *region* is a dictionary with at least rows and cols (like from
+    grass.script.region) stored in the header.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self, path, region, quantum=0.001, threshold=0.0, keyframe_interval=100
+    ):
+        self.shape = (int(region["rows"]), int(region["cols"]))
+        self.quantum = quantum
+        self.threshold_quanta = int(np.ceil(threshold / quantum)) if threshold else 0
+        self.keyframe_interval = keyframe_interval
+        self._file = open(path, "wb")
+        header = json.dumps(
+            {
+                "region": dict(region),
+                "quantum": quantum,
+                "threshold": threshold,
+                "keyframe_interval": keyframe_interval,
+            }
+        ).encode()
+        self._file.write(MAGIC + SIZE.pack(len(header)) + header)
+        self._previous = None
+        self._since_keyframe = 0
+        self.index = {"offsets": [], "kinds": [], "timestamps": []}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, frame, timestamp=None):
+        """Record a frame"""
+        if timestamp is None:
+            timestamp = time.time()
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} is not {self.shape}")
+        values = quantize(frame, self.quantum)
+        kind = KEYFRAME
+        if (
+            self._previous is not None
+            and self._since_keyframe + 1 < self.keyframe_interval
+        ):
+            previous = self._previous
+            difference = values.astype(np.int64) - previous
+            nulls = (values == NULL) | (previous == NULL)
+            changed = (np.abs(difference) > self.threshold_quanta) & ~nulls
+            changed |= (values == NULL) != (previous == NULL)
+            if np.count_nonzero(changed) < KEYFRAME_SHARE * values.size:
+                kind = DELTA
+                payload = encode_delta(changed, difference[changed])
+                previous[changed] = values[changed]
+                self._since_keyframe += 1
+        if kind == KEYFRAME:
+            payload = encode_keyframe(values)
+            self._previous = values
+            self._since_keyframe = 0
+        self.index["offsets"].append(self._file.tell())
+        self.index["kinds"].append(kind)
+        self.index["timestamps"].append(timestamp)
+        self._file.write(RECORD.pack(kind, timestamp, len(payload)) + payload)
+
+    def record(self, scanned_elev, env):
+        """Record scan raster from a GRASS session"""
+        from grass.script import array as garray
+
+        scan = garray.array(dtype=np.float32, env=env)
+        scan.read(scanned_elev, null="nan")
+        self.add(np.asarray(scan))
+
+    def close(self):
+        """Write index and close the file"""
+        if self._file.closed:
+            return
+        offset = self._file.tell()
+        self._file.write(json.dumps(self.index).encode())
+        self._file.write(SIZE.pack(offset) + INDEX_MAGIC)
+        self._file.close()
+
+
+class SessionReader:
+    """Reads frames from a session file by index or in order"""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise SessionFileError(f"{path} is not a session file")
+        (size,) = SIZE.unpack(self._file.read(SIZE.size))
+        header = json.loads(self._file.read(size))
+        self.region = header["region"]
+        self.quantum = header["quantum"]
+        self.shape = (int(self.region["rows"]), int(self.region["cols"]))
+        self._records_start = self._file.tell()
+        self.index = self._read_index() or self._scan_records()
+        self._current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.index["offsets"])
+
+    @property
+    def timestamps(self):
+        """Timestamps of frames"""
+        return self.index["timestamps"]
+
+    def _read_index(self):
+        file = self._file
+        file.seek(0, 2)
+        end = file.tell()
+        tail = SIZE.size + len(INDEX_MAGIC)
+        if end - self._records_start < tail:
+            return None
+        file.seek(end - tail)
+        (offset,) = SIZE.unpack(file.read(SIZE.size))
+        if file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            return None
+        file.seek(offset)
+        return json.loads(file.read(end - tail - offset))
+
+    def _scan_records(self):
+        """Find records by going through the file (without the index)"""
+        index = {"offsets": [], "kinds": [], "timestamps": []}
+        file = self._file
+        file.seek(self._records_start)
+        while True:
+            offset = file.tell()
+            header = file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            kind, timestamp, size = RECORD.unpack(header)
+            payload = file.read(size)
+            if kind not in (KEYFRAME, DELTA) or len(payload) < size:
+                break
+            index["offsets"].append(offset)
+            index["kinds"].append(kind)
+            index["timestamps"].append(timestamp)
+        return index
+
+    def _payload(self, number):
+        self._file.seek(self.index["offsets"][number])
+        kind, unused, size = RECORD.unpack(self._file.read(RECORD.size))
+        return kind, self._file.read(size)
+
+    def values(self, number):
+        """Return quantized values of a frame
+
+        Decodes from the last keyframe before the frame, or continues from
+        the frame read last when that is closer.
+        """
+        if not 0 <= number < len(self):
+            raise IndexError(f"Frame {number} not in 0 to {len(self) - 1}")
+        kinds = self.index["kinds"]
+        start = number
+        while kinds[start] != KEYFRAME:
+            start -= 1
+        if self._current and start <= self._current[0] <= number:
+            current, values = self._current
+            values = values.copy()
+        else:
+            current = start
+            values = decode_keyframe(self._payload(start)[1], self.shape)
+        for following in range(current + 1, number + 1):
+            kind, payload = self._payload(following)
+            if kind == KEYFRAME:
+                values = decode_keyframe(payload, self.shape)
+            else:
+                apply_delta(values, payload)
+        self._current = (number, values)
+        return values.copy()
+
+    def frame(self, number):
+        """Return frame as float32 array with NaN for nulls"""
+        return dequantize(self.values(number), self.quantum)
+
+    def __iter__(self):
+        """Yield frames in order"""
+        for number in range(len(self)):
+            yield self.frame(number)
+
+    def restore(self, number, name, env=None):
+        """Write a frame as a raster in the region of the recording
+
+        When the recording has only the number of rows and columns,
+        the frame is written in the current region which needs to have
+        the same number of rows and columns.
+        """
+        import os
+
+        import grass.script as gs
+        from grass.script import array as garray
+
+        region = self.region
+        env = dict(env or os.environ)
+        if all(key in region for key in ("n", "s", "e", "w")):
+            env["GRASS_REGION"] = gs.region_env(
+                n=region["n"],
+                s=region["s"],
+                e=region["e"],
+                w=region["w"],
+                rows=region["rows"],
+                cols=region["cols"],
+                env=env,
+            )
+        else:
+            current = gs.region(env=env)
+            shape = (int(current["rows"]), int(current["cols"]))
+            if shape != self.shape:
+                raise ValueError(
+                    f"Recording has no extent and its {self.shape[0]}x{self.shape[1]}"
+                    f" cells do not match the current region ({shape[0]}x{shape[1]})"
+                )
+        scan = garray.array(dtype=np.float32, env=env)
+        scan[...] = self.frame(number)
+        scan.write(name, overwrite=True)
+
+    def close(self):
+        """Close the file"""
+        self._file.close()
+
+
+def main():
+    """Show information about a session file or restore a frame"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    info = subparsers.add_parser("info", help="show frames and size")
+    info.add_argument("file")
+    restore = subparsers.add_parser("restore", help="write frame as a raster")
+    restore.add_argument("file")
+    restore.add_argument("frame", type=int)
+    restore.add_argument("name")
+    args = parser.parse_args()
+
+    with SessionReader(args.file) as reader:
+        if args.command == "info":
+            timestamps = reader.timestamps
+            duration = timestamps[-1] - timestamps[0] if timestamps else 0
+            keyframes = reader.index["kinds"].count(KEYFRAME)
+            print(f"region: {reader.region['rows']}x{reader.region['cols']} cells")
+            print(f"frames: {len(reader)} ({keyframes} keyframes)")
+            print(f"duration: {duration:.1f} s")
+        else:
+            reader.restore(args.frame, args.name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
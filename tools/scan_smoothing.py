@@ -0,0 +1,206 @@
+"""Denoise scans before the activities use them
+
+The task configurations have scanning_params (smooth, numscans,
+interpolate). The smoother keeps the last *numscans* scans in a ring buffer
+and for each new scan computes:
+
+1. the temporal average of the scans in the buffer (ignoring nulls),
+2. the spatial average over a square window with radius *smooth* cells
+   (ignoring nulls),
+3. values for cells which are still null (holes) from the average of the
+   nearest valid cells, if *interpolate* is true.
+
+The buffer and all work arrays are allocated when the first scan comes
+(or the size of the region changes) and reused afterwards. The running sum
+of the buffer is updated by the new scan and the oldest one, so the cost
+does not depend on *numscans*, and the spatial average uses an integral
+image, so the cost does not depend on *smooth*.
+
+In Tangible Landscape, smooth is used by the scanner in the units of the
+physical model. Here it is applied as a number of cells of the scan.
+"""
+
+import numpy as np
+from result_cache import mapset_path, region_text
+
+# Number of scans after which the running sum is computed again from the buffer
+# (so that rounding errors do not accumulate)
+RESUM_INTERVAL = 1000
+
+
+class ScanSmoother:
+    """Temporal and spatial smoothing with hole interpolation for scans
+
+    Null cells are NaN in both the input and output arrays.
+    """
+
+    def __init__(self, numscans=1, smooth=0, interpolate=False):
+        self.numscans = max(int(numscans), 1)
+        self.smooth = max(int(smooth), 0)
+        self.interpolate = interpolate
+        self.shape = None
+        self.scans = 0
+
+    @classmethod
+    def from_scanning_params(cls, params):
+        """Create smoother from scanning_params of a task"""
+        return cls(
+            numscans=params.get("numscans", 1),
+            smooth=params.get("smooth", 0),
+            interpolate=params.get("interpolate", False),
+        )
+
+    def reset(self, shape):
+        """Allocate buffers for scans of a given shape"""
+        rows, cols = shape
+        self.shape = tuple(shape)
+        self.scans = 0
+        self._slot = 0
+        self._buffer = np.zeros((self.numscans, rows, cols), dtype=np.float32)
+        self._valid_buffer = np.zeros((self.numscans, rows, cols), dtype=bool)
+        self._sum = np.zeros(shape, dtype=np.float64)
+        self._count = np.zeros(shape, dtype=np.float64)
+        self._values = np.zeros(shape, dtype=np.float64)
+        self._weights = np.zeros(shape, dtype=np.float64)
+        self._box_values = np.zeros(shape, dtype=np.float64)
+        self._box_weights = np.zeros(shape, dtype=np.float64)
+        self._work = np.zeros(shape, dtype=np.float64)
+        self._box_work = np.zeros(shape, dtype=np.float64)
+        self._valid = np.zeros(shape, dtype=bool)
+        self._invalid = np.zeros(shape, dtype=bool)
+        self._known = np.zeros(shape, dtype=bool)
+        self._box_valid = np.zeros(shape, dtype=bool)
+        self._integral = np.zeros((rows + 1, cols + 1), dtype=np.float64)
+        self._integral_rows = np.zeros((rows, cols + 1), dtype=np.float64)
+        self._windows = {}
+        self.output = np.zeros(shape, dtype=np.float32)
+
+    def add(self, scan):
+        """Add scan and return the denoised scan
+
+        The returned array is reused for the next scan, so copy it if needed.
+        """
+        if self.shape != scan.shape:
+            self.reset(scan.shape)
+        self._add_to_buffer(scan)
+        # Temporal average
+        np.greater(self._count, 0, out=self._valid)
+        self._values.fill(0)
+        np.divide(self._sum, self._count, out=self._values, where=self._valid)
+        np.copyto(self._weights, self._valid)
+        if self.smooth:
+            self._box_average(self.smooth)
+            np.copyto(self._values, self._work, where=self._valid)
+        if self.interpolate:
+            self._fill_holes()
+        np.copyto(self.output, self._values)
+        np.logical_not(self._valid, out=self._invalid)
+        np.copyto(self.output, np.nan, where=self._invalid)
+        return self.output
+
+    def _add_to_buffer(self, scan):
+        slot = self._slot
+        values = self._buffer[slot]
+        valid = self._valid_buffer[slot]
+        # Remove the oldest scan from the running sum.
+        self._sum -= values
+        self._count -= valid
+        np.isfinite(scan, out=valid)
+        np.copyto(values, scan)
+        np.logical_not(valid, out=self._invalid)
+        np.copyto(values, 0, where=self._invalid)
+        self._sum += values
+        self._count += valid
+        self._slot = (slot + 1) % self.numscans
+        self.scans += 1
+        if self.scans % RESUM_INTERVAL == 0:
+            np.sum(self._buffer, axis=0, out=self._sum)
+
+    def _box_average(self, radius):
+        """Average values with non-zero weights in windows
+
+        The result is in _work and _box_valid tells where it is defined.
+        """
+        np.multiply(self._values, self._weights, out=self._work)
+        self._box_sum(self._work, radius, out=self._box_values)
+        self._box_sum(self._weights, radius, out=self._box_weights)
+        # Rounding in the integral image can leave tiny non-zero weights.
+        np.greater(self._box_weights, 0.5, out=self._box_valid)
+        np.divide(
+            self._box_values, self._box_weights, out=self._work, where=self._box_valid
+        )
+
+    def _fill_holes(self):
+        """Fill nulls from averages of valid cells in growing windows around them"""
+        np.copyto(self._known, self._valid)
+        if not self._known.any():
+            return
+        np.copyto(self._weights, self._known)
+        radius = max(self.smooth, 1)
+        while not self._valid.all():
+            self._box_average(radius)
+            # Holes which have valid cells in the window
+            np.logical_not(self._valid, out=self._invalid)
+            np.logical_and(self._invalid, self._box_valid, out=self._invalid)
+            np.copyto(self._values, self._work, where=self._invalid)
+            np.logical_or(self._valid, self._invalid, out=self._valid)
+            radius *= 2
+
+    def _window(self, radius):
+        """Return cached integral image indices for windows of a radius"""
+        if radius not in self._windows:
+            rows, cols = self.shape
+            row = np.arange(rows)
+            col = np.arange(cols)
+            self._windows[radius] = (
+                np.clip(row - radius, 0, rows),
+                np.clip(row + radius + 1, 0, rows),
+                np.clip(col - radius, 0, cols),
+                np.clip(col + radius + 1, 0, cols),
+            )
+        return self._windows[radius]
+
+    def _box_sum(self, values, radius, out):
+        """Sum values in square windows using an integral image"""
+        integral = self._integral
+        inner = integral[1:, 1:]
+        np.cumsum(values, axis=0, out=inner)
+        np.cumsum(inner, axis=1, out=inner)
+        low_rows, high_rows, low_cols, high_cols = self._window(radius)
+        work = self._box_work
+        # The indices are within bounds, clip mode avoids a temporary copy.
+        np.take(integral, high_rows, axis=0, out=self._integral_rows, mode="clip")
+        np.take(self._integral_rows, high_cols, axis=1, out=out, mode="clip")
+        np.take(self._integral_rows, low_cols, axis=1, out=work, mode="clip")
+        out -= work
+        np.take(integral, low_rows, axis=0, out=self._integral_rows, mode="clip")
+        np.take(self._integral_rows, high_cols, axis=1, out=work, mode="clip")
+        out -= work
+        np.take(self._integral_rows, low_cols, axis=1, out=work, mode="clip")
+        out += work
+
+
+class SmoothingStage:
+    """Replaces the scanned raster by its denoised version in a GRASS session
+
+    Call it with the scan name and environment before the run_ functions.
+    The array for reading and writing the raster comes from grass.script.array
+    and it is reused as long as the region stays the same.
+    """
+
+    def __init__(self, scanning_params):
+        self.smoother = ScanSmoother.from_scanning_params(scanning_params)
+        self._region = None
+        self._scan = None
+
+    def __call__(self, scanned_elev, env):
+        from grass.script import array as garray
+
+        region = region_text(env, mapset_path(env))
+        if self._scan is None or region != self._region:
+            self._scan = garray.array(dtype=np.float32, env=env)
+            self._region = region
+        scan = self._scan
+        scan.read(scanned_elev, null="nan")
+        scan[...] = self.smoother.add(scan)
+        scan.write(scanned_elev, overwrite=True)
@@ -0,0 +1,268 @@
+"""Run activity functions for each scan within a time limit
+
+A run_ function which takes too long stalls the whole interactive loop.
+The supervisor runs each function with a deadline. Tools started through
+grass.script during the call are tracked and when the deadline is missed,
+they are killed (including their subprocesses) so that the function ends
+with an error soon after. Outputs which the function did not write yet are
+left as they are, so the display keeps showing them.
+
+The outputs of one call are not replaced all at once: the run_ functions
+write directly into the displayed maps, so when a tool is killed, maps
+written by the tools which finished before it are already new while
+the other ones are from the previous scan (e.g., a new raster still
+without its color table). Such runs are marked as partial, so that the
+caller can, e.g., run the function again or hide its layers. Running into
+temporary names and renaming them would need changes in the activities.
+
+Functions which miss their deadline run less often (every 2nd scan,
+every 4th scan, ...) and go back to running more often after they fit
+into the deadline again with enough headroom several times in a row.
+
+Only tools started through grass.script are tracked (not, e.g., pygrass
+modules or subprocess used directly).
+"""
+
+import collections
+import os
+import signal
+import threading
+import time
+
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a tool is about to start after the deadline passed"""
+
+
+class _Call:
+    """Processes started during one supervised call"""
+
+    def __init__(self):
+        self.processes = []
+        self.expired = False
+        self.partial = False
+        self.lock = threading.Lock()
+
+    def add(self, process):
+        with self.lock:
+            if self.expired:
+                kill_process(process)
+            self.processes.append(process)
+
+    def expire(self):
+        with self.lock:
+            self.expired = True
+            for process in self.processes:
+                if process.poll() == 0:
+                    # The tool finished, so its outputs are already replaced.
+                    self.partial = True
+                kill_process(process)
+
+
+def kill_process(process):
+    """Kill process and its process group if it is still running"""
+    if process.poll() is not None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+_current = threading.local()
+
+
+def install(module):
+    """Make Popen in a module (grass.script.core) track supervised processes
+
+    The replacement behaves as the original one outside of supervised calls.
+    """
+    original = module.Popen
+    if getattr(original, "supervised", False):
+        return
+
+    class TrackedPopen(original):
+        """Popen which registers the process with the current supervised call"""
+
+        supervised = True
+
+        def __init__(self, args, **kwargs):
+            call = getattr(_current, "call", None)
+            if call is not None:
+                if call.expired:
+                    raise DeadlineExceeded(f"Deadline passed before running {args}")
+                # Own process group, so that subprocesses of the tool can be killed.
+                kwargs.setdefault("start_new_session", True)
+            super().__init__(args, **kwargs)
+            if call is not None:
+                call.add(self)
+
+    module.Popen = TrackedPopen
+
+
+class RunRecord:
+    """Result of one supervised call
+
+    The *status* is ok, missed (deadline), skipped (not this scan),
+    or error (the function failed before the deadline).
+    With *partial*, the call missed the deadline after some of its tools
+    finished, so some of its outputs are new and some are from before.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, name, scan, status, duration=0, error=None, partial=False):
+        self.name = name
+        self.scan = scan
+        self.status = status
+        self.duration = duration
+        self.error = error
+        self.partial = partial
+
+    @property
+    def updated(self):
+        """True if the function produced new outputs"""
+        return self.status == "ok"
+
+    def __repr__(self):
+        return f"RunRecord({self.name!r}, {self.scan}, {self.status!r})"
+
+
+class FunctionState:
+    """Statistics and current interval of one supervised function"""
+
+    def __init__(self):
+        self.scans = 0
+        self.runs = 0
+        self.misses = 0
+        self.skips = 0
+        self.errors = 0
+        self.interval = 1
+        self.since_run = 0
+        self.fitting_runs = 0
+        self.last_duration = None
+
+    def to_dict(self):
+        """Return statistics as a dictionary"""
+        return {
+            "scans": self.scans,
+            "runs": self.runs,
+            "misses": self.misses,
+            "skips": self.skips,
+            "errors": self.errors,
+            "interval": self.interval,
+            "last_duration": self.last_duration,
+        }
+
+
+class ScanSupervisor:
+    """Runs functions for each scan with a deadline and adapts their frequency
+
+    The *deadline* in seconds applies to all functions unless a different
+    one is set in *deadlines* (by function name). After a missed deadline,
+    the interval between runs doubles up to *max_interval* scans.
+    After *recovery_runs* runs in a row which take less than *headroom*
+    times the deadline, the interval is halved.
+    The *module* is where Popen is replaced (grass.script.core by default).
+    """
+
+    def __init__(
+        self,
+        deadline,
+        deadlines=None,
+        max_interval=8,
+        recovery_runs=3,
+        headroom=0.5,
+        module=None,
+    ):
+        self.deadline = deadline
+        self.deadlines = deadlines or {}
+        self.max_interval = max_interval
+        self.recovery_runs = recovery_runs
+        self.headroom = headroom
+        if module is None:
+            import grass.script.core as module
+        install(module)
+        self.states = {}
+        # recent deadline misses
+        self.misses = collections.deque(maxlen=100)
+
+    def state(self, name):
+        """Return state of a function"""
+        return self.states.setdefault(name, FunctionState())
+
+    def run(self, function, *args, **kwargs):
+        """Run function for the current scan if it is its turn
+
+        Returns RunRecord. Exceptions from the function are not raised,
+        but recorded with the error status.
+        """
+        name = getattr(function, "__qualname__", repr(function))
+        module = getattr(function, "__module__", None)
+        if module:
+            name = f"{module}.{name}"
+        state = self.state(name)
+        scan = state.scans
+        state.scans += 1
+        if state.runs and state.since_run + 1 < state.interval:
+            state.since_run += 1
+            state.skips += 1
+            return RunRecord(name, scan, "skipped")
+        state.since_run = 0
+
+        deadline = self.deadlines.get(name, self.deadlines.get(function.__name__))
+        if deadline is None:
+            deadline = self.deadline
+        call = _Call()
+        timer = threading.Timer(deadline, call.expire)
+        _current.call = call
+        start = time.perf_counter()
+        timer.start()
+        error = None
+        try:
+            function(*args, **kwargs)
+        except Exception as exception:  # pylint: disable=broad-except
+            error = exception
+        finally:
+            timer.cancel()
+            _current.call = None
+        duration = time.perf_counter() - start
+        state.runs += 1
+        state.last_duration = duration
+
+        if call.expired or duration > deadline:
+            state.misses += 1
+            state.fitting_runs = 0
+            state.interval = min(state.interval * 2, self.max_interval)
+            record = RunRecord(
+                name, scan, "missed", duration, error, partial=call.partial
+            )
+            self.misses.append(record)
+            return record
+        if error is not None:
+            state.errors += 1
+            return RunRecord(name, scan, "error", duration, error)
+        if duration < deadline * self.headroom:
+            state.fitting_runs += 1
+            if state.fitting_runs >= self.recovery_runs and state.interval > 1:
+                state.interval //= 2
+                state.fitting_runs = 0
+        else:
+            state.fitting_runs = 0
+        return RunRecord(name, scan, "ok", duration)
+
+    def run_all(self, functions, *args, preprocess=None, **kwargs):
+        """Run all functions for one scan and return their records
+
+        The *preprocess* function (e.g., SmoothingStage from scan_smoothing.py)
+        is called with the same parameters before the functions.
+        """
+        if preprocess:
+            preprocess(*args, **kwargs)
+        return [self.run(function, *args, **kwargs) for function in functions]
+
+    def statistics(self):
+        """Return statistics for all functions"""
+        return {name: state.to_dict() for name, state in self.states.items()}
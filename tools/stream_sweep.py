@@ -0,0 +1,178 @@
+"""Extract streams for many thresholds from one accumulation
+
+Activities compute flow accumulation only to keep cells over one
+threshold as streams. Here the accumulation and flow directions are
+computed once for a scan (by IncrementalHydrology or read from outputs of
+r.watershed) and streams for any threshold are a comparison:
+
+    sweep = StreamSweep.from_hydrology(hydrology)
+    for threshold in [32, 100, 1000]:
+        streams = sweep.streams(threshold)
+
+levels() gives one raster for a list of thresholds (the number of thresholds
+each cell reaches), segments() gives stream lines between heads, junctions,
+and outlets which can be written as a vector map.
+"""
+
+import numpy as np
+
+from change_detection import to_map_coordinates
+from incremental_hydrology import NEIGHBORS
+
+
+def receivers_from_drainage(drainage):
+    """Return flat indices of downstream cells from r.watershed drainage
+
+    Outlets, nulls, and cells draining out of the region (negative
+    directions) get -1.
+    """
+    rows, cols = drainage.shape
+    codes = np.nan_to_num(drainage, nan=0).astype(np.int64).ravel()
+    cells = np.arange(codes.size)
+    row, col = np.divmod(cells, cols)
+    receiver = np.full(codes.size, -1, dtype=np.int64)
+    for row_offset, col_offset, code in NEIGHBORS:
+        near_row = row + row_offset
+        near_col = col + col_offset
+        flows = codes == code
+        flows &= (near_row >= 0) & (near_row < rows)
+        flows &= (near_col >= 0) & (near_col < cols)
+        receiver[flows] = near_row[flows] * cols + near_col[flows]
+    return receiver
+
+
+class StreamSweep:
+    """Streams for any threshold from accumulation and flow directions
+
+    The *accumulation* is a 2D array (cells), *receiver* are flat indices
+    of downstream cells (-1 for outlets) which are needed only for segments.
+    """
+
+    def __init__(self, accumulation, receiver=None):
+        self.accumulation = np.asarray(accumulation, dtype=np.float64)
+        self.receiver = receiver
+
+    @classmethod
+    def from_hydrology(cls, hydrology):
+        """Create sweep from IncrementalHydrology"""
+        return cls(hydrology.raster(hydrology.accumulation), hydrology.receiver)
+
+    @classmethod
+    def from_rasters(cls, accumulation, drainage=None, env=None):
+        """Create sweep from accumulation and drainage rasters of r.watershed
+
+        Accumulation is taken as absolute value (r.watershed makes it
+        negative where it may be underestimated). With multiple flow
+        directions (the default of r.watershed), accumulation is fractional
+        and does not need to grow along the drainage directions, so
+        segments follow the drainage directions, not the accumulation.
+        """
+        from grass.script import array as garray
+
+        values = garray.array(dtype=np.float64, env=env)
+        values.read(accumulation, null="nan")
+        receiver = None
+        if drainage:
+            directions = garray.array(dtype=np.float64, env=env)
+            directions.read(drainage, null="nan")
+            receiver = receivers_from_drainage(np.asarray(directions))
+        return cls(np.abs(values), receiver)
+
+    def streams(self, threshold):
+        """Return cells with accumulation of at least threshold"""
+        with np.errstate(invalid="ignore"):
+            return self.accumulation >= threshold
+
+    def levels(self, thresholds):
+        """Return number of thresholds each cell reaches (0 is not a stream)
+
+        With thresholds sorted from the lowest, cells with level k are streams
+        for the first k thresholds.
+        """
+        thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+        values = np.nan_to_num(self.accumulation, nan=-np.inf)
+        return np.searchsorted(thresholds, values, side="right")
+
+    def segments(self, threshold):
+        """Return stream lines as arrays of flat cell indices from upstream
+
+        A line goes from a head or a junction to the next junction or outlet,
+        so lines meeting at a junction share its cell.
+        """
+        if self.receiver is None:
+            raise ValueError("Flow directions are needed for stream segments")
+        streams = self.streams(threshold).ravel()
+        cells = np.flatnonzero(streams)
+        if not cells.size:
+            return []
+        receiver = self.receiver[cells]
+        flows = receiver >= 0
+        flows[flows] = streams[receiver[flows]]
+        donors = np.bincount(receiver[flows], minlength=streams.size)
+        local = np.full(streams.size, -1, dtype=np.int64)
+        local[cells] = np.arange(cells.size)
+        # Next cell of the same line (the cell itself at the end of a line)
+        following = np.arange(cells.size)
+        continues = flows.copy()
+        continues[flows] = donors[receiver[flows]] == 1
+        following[continues] = local[receiver[continues]]
+        # Last cell of the line of each cell and number of cells to it
+        # by pointer jumping
+        last = following
+        distance = (following != np.arange(cells.size)).astype(np.int64)
+        while True:
+            jumped = last[last]
+            if np.array_equal(jumped, last):
+                break
+            distance += distance[last]
+            last = jumped
+        # Cells farther from the end of the line are upstream.
+        order = np.lexsort((-distance, last))
+        ends = np.flatnonzero(np.diff(last[order])) + 1
+        lines = []
+        for line in np.split(order, ends):
+            end = line[-1]
+            line = cells[line]
+            if flows[end]:
+                line = np.append(line, receiver[end])
+            lines.append(line)
+        return lines
+
+    def write_rasters(self, thresholds, prefix, env):
+        """Write stream raster (1 and null) named prefix_threshold for each one"""
+        from grass.script import array as garray
+
+        names = []
+        for threshold in thresholds:
+            name = f"{prefix}_{threshold}".replace(".", "_")
+            output = garray.array(dtype=np.float32, env=env)
+            output[...] = np.where(self.streams(threshold), 1, np.nan)
+            output.write(name, overwrite=True)
+            names.append(name)
+        return names
+
+    def write_vector(self, threshold, name, env):
+        """Write stream lines for a threshold as a vector map"""
+        import grass.script as gs
+
+        region = gs.region(env=env)
+        cols = self.accumulation.shape[1]
+        records = []
+        for category, line in enumerate(self.segments(threshold), start=1):
+            if len(line) < 2:
+                continue
+            rows, columns = np.divmod(line, cols)
+            points = to_map_coordinates(np.column_stack([rows, columns]) + 0.5, region)
+            records.append(f"L {len(points)} 1")
+            records.extend(f" {x} {y}" for x, y in points)
+            records.append(f" 1 {category}")
+        gs.write_command(
+            "v.in.ascii",
+            input="-",
+            output=name,
+            format="standard",
+            flags="n",
+            stdin="\n".join(records) + "\n",
+            overwrite=True,
+            env=env,
+        )
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+"""Generate synthetic sandbox-like terrain of any size
+
+The activities are tested on elev_lid792_1m resampled to 4 m. To see how
+they scale, this generates deterministic surfaces of a given size
+(from 100x100 to 10000x10000 cells and more) from a seed:
+
+1. fractal noise: octaves of smoothly interpolated random grids, each one
+   twice as fine and with a smaller amplitude given by the roughness,
+2. ridges: sharp crests made from a second fractal as 1 - |noise|,
+3. pits: round depressions at random places,
+4. flat areas: the lowest share of the surface is cut off as a flat floor,
+5. diffusion: a few steps of smoothing similar to sand settling.
+
+Everything is computed with whole-array operations in float32. The octaves
+are interpolated in blocks of rows to limit the memory needed for large
+surfaces. The same seed and size always give the same surface.
+
+To write rasters of several sizes into the current mapset, run in a GRASS
+session:
+
+    grass nc_spm_08_grass7/user1 --exec python3 tools/synthetic_terrain.py \\
+        --sizes 100 1000 4000 --seed 1
+
+which creates rasters synthetic_100, synthetic_1000, and synthetic_4000.
+Use --npy to write NumPy array files instead.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Rows interpolated at once when upsampling an octave
+BLOCK_ROWS = 1024
+# Values used to estimate quantiles of large surfaces
+QUANTILE_SAMPLE = 1_000_000
+
+
+def _smoothstep(values):
+    return values * values * (3 - 2 * values)
+
+
+def _interpolation(count, size):
+    """Return indices and smoothed weights to interpolate a grid axis"""
+    position = np.linspace(0, count - 1, size, dtype=np.float32)
+    low = np.minimum(position.astype(np.int64), count - 2)
+    return low, _smoothstep(position - low)
+
+
+def upsample(grid, rows, cols):
+    """Return grid smoothly interpolated to rows and columns"""
+    row_low, row_weight = _interpolation(grid.shape[0], rows)
+    col_low, col_weight = _interpolation(grid.shape[1], cols)
+    # Interpolate along rows of the (smaller) grid first.
+    left = grid[:, col_low]
+    along = left + (grid[:, col_low + 1] - left) * col_weight
+    result = np.empty((rows, cols), dtype=np.float32)
+    for start in range(0, rows, BLOCK_ROWS):
+        block = slice(start, min(start + BLOCK_ROWS, rows))
+        top = along[row_low[block]]
+        bottom = along[row_low[block] + 1]
+        bottom -= top
+        bottom *= row_weight[block, np.newaxis]
+        np.add(top, bottom, out=result[block])
+    return result
+
+
+def fractal(rows, cols, generator, roughness=0.5, coarsest=4):
+    """Return fractal noise with octaves from *coarsest* cells to single cells
+
+    The octaves are built as a pyramid: each level is the previous one
+    interpolated to twice the size with new noise added, so the cost is
+    close to the cost of one octave at the full size. The amplitude of each
+    octave is *roughness* times the previous one.
+    """
+    shapes = [(rows, cols)]
+    while max(shapes[-1]) > coarsest + 1:
+        level_rows, level_cols = shapes[-1]
+        shapes.append((max((level_rows + 1) // 2, 2), max((level_cols + 1) // 2, 2)))
+    amplitude = 1.0
+    surface = None
+    for shape in reversed(shapes):
+        noise = generator.random(shape, dtype=np.float32)
+        noise -= 0.5
+        noise *= 2 * amplitude
+        if surface is None:
+            surface = noise
+        else:
+            surface = upsample(surface, *shape)
+            surface += noise
+        amplitude *= roughness
+    return surface
+
+
+def normalize(surface):
+    """Scale surface to 0 to 1 in place"""
+    low = surface.min()
+    high = surface.max()
+    surface -= low
+    if high > low:
+        surface /= high - low
+    return surface
+
+
+def quantile(surface, share, generator):
+    """Return quantile of surface (estimated from a sample for large ones)"""
+    values = surface.ravel()
+    if values.size > QUANTILE_SAMPLE:
+        values = values[generator.integers(0, values.size, QUANTILE_SAMPLE)]
+    return np.quantile(values, share)
+
+
+def add_pits(surface, count, depth, generator):
+    """Lower round areas of random size at random places"""
+    rows, cols = surface.shape
+    for unused in range(count):
+        radius = max(int(min(rows, cols) * generator.uniform(0.02, 0.08)), 1)
+        row = int(generator.integers(0, rows))
+        col = int(generator.integers(0, cols))
+        top, bottom = max(row - radius, 0), min(row + radius + 1, rows)
+        left, right = max(col - radius, 0), min(col + radius + 1, cols)
+        y, x = np.ogrid[top - row : bottom - row, left - col : right - col]
+        distance = (y * y + x * x) / float(radius * radius)
+        shape = np.clip(1 - distance, 0, None).astype(np.float32)
+        surface[top:bottom, left:right] -= depth * shape
+
+
+def diffuse(surface, steps, rate=0.2):
+    """Smooth surface by steps of diffusion (edges stay as they are)"""
+    if min(surface.shape) < 3:
+        return surface
+    inner = surface[1:-1, 1:-1]
+    change = np.empty_like(inner)
+    for unused in range(steps):
+        # inner + rate * (sum of 4 neighbors - 4 * inner) without temporary arrays
+        np.add(surface[:-2, 1:-1], surface[2:, 1:-1], out=change)
+        change += surface[1:-1, :-2]
+        change += surface[1:-1, 2:]
+        change *= rate
+        inner *= 1 - 4 * rate
+        inner += change
+    return surface
+
+
+def generate(
+    rows,
+    cols=None,
+    seed=0,
+    roughness=0.5,
+    ridges=0.5,
+    pits=5,
+    flat=0.15,
+    smoothing=4,
+    minimum=100.0,
+    relief=30.0,
+):
+    """Return a synthetic terrain as float32 array
+
+    The *ridges* is the weight of the ridges relative to the base noise,
+    *pits* is the number of pits, *flat* is the share of the area which is
+    flat, *smoothing* is the number of diffusion steps. The values are from
+    *minimum* to *minimum* + *relief*.
+    """
+    cols = cols or rows
+    generator = np.random.default_rng(seed)
+    surface = normalize(fractal(rows, cols, generator, roughness))
+    if ridges:
+        crests = normalize(fractal(rows, cols, generator, roughness))
+        crests -= 0.5
+        np.abs(crests, out=crests)
+        # 1 - |noise| gives sharp crests where the noise crosses its middle.
+        np.subtract(0.5, crests, out=crests)
+        crests *= crests
+        crests *= 4 * ridges
+        surface += crests
+        del crests
+    normalize(surface)
+    add_pits(surface, pits, depth=0.3, generator=generator)
+    if flat:
+        np.maximum(surface, quantile(surface, flat, generator), out=surface)
+    diffuse(surface, smoothing)
+    normalize(surface)
+    surface *= relief
+    surface += minimum
+    return surface
+
+
+def write_raster(surface, name, env=None, resolution=1.0):
+    """Write surface as a raster with its own region (south-west corner at 0, 0)
+
+    The current region of the session is not changed.
+    """
+    import grass.script as gs
+    from grass.script import array as garray
+
+    rows, cols = surface.shape
+    env = dict(env or os.environ)
+    env["GRASS_REGION"] = gs.region_env(
+        n=rows * resolution, s=0, e=cols * resolution, w=0, rows=rows, cols=cols
+    )
+    data = garray.array(dtype=np.float32, env=env)
+    data[...] = surface
+    data.write(name, overwrite=True)
+
+
+def main():
+    """Generate surfaces of given sizes as rasters or array files"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100], help="rows (and columns)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--roughness", type=float, default=0.5)
+    parser.add_argument("--ridges", type=float, default=0.5)
+    parser.add_argument("--pits", type=int, default=5)
+    parser.add_argument("--flat", type=float, default=0.15)
+    parser.add_argument("--smoothing", type=int, default=4)
+    parser.add_argument("--resolution", type=float, default=1.0)
+    parser.add_argument("--prefix", default="synthetic", help="name prefix")
+    parser.add_argument(
+        "--npy", metavar="DIR", help="write .npy files to a directory (no GRASS)"
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        surface = generate(
+            size,
+            seed=args.seed,
+            roughness=args.roughness,
+            ridges=args.ridges,
+            pits=args.pits,
+            flat=args.flat,
+            smoothing=args.smoothing,
+        )
+        name = f"{args.prefix}_{size}"
+        if args.npy:
+            path = os.path.join(args.npy, f"{name}.npy")
+            np.save(path, surface)
+        else:
+            write_raster(surface, name, resolution=args.resolution)
+            path = name
+        print(f"Written {path} ({size}x{size} cells)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
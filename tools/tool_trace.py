@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+
+"""Trace GRASS tool calls made by activities
+
+The tracer replaces run_command, read_command, write_command, parse_command,
+mapcalc, and raster_what in grass.script and the run_ functions of an
+activity module with wrappers which record each call: tool name,
+parameters, wall time, CPU time of the tool processes, and size of the
+output. Tool calls are recorded under the run_ function and the scan
+during which they happened.
+
+The trace can be written in the Chrome trace event format (open in
+chrome://tracing or https://ui.perfetto.dev) and as a CSV summary with one
+line for each tool in each function.
+
+The activity files are not modified. To trace an activity, run its main()
+function for several scans in a GRASS session:
+
+    grass .../nc_spm/user --exec python3 tools/tool_trace.py activities/jenna.py \\
+        --scans 3 --chrome trace.json --csv summary.csv
+"""
+
+import argparse
+import csv
+import functools
+import importlib.util
+import json
+import os
+import resource
+import sys
+import time
+
+TRACED_FUNCTIONS = [
+    "run_command",
+    "read_command",
+    "write_command",
+    "parse_command",
+    "mapcalc",
+    "raster_what",
+]
+# Tools behind functions which do not take the tool name
+IMPLIED_TOOLS = {"mapcalc": "r.mapcalc", "raster_what": "r.what"}
+# Parameters which are not recorded as they are
+HIDDEN_PARAMETERS = {"env", "stdin"}
+
+
+def children_cpu_time():
+    """Return user and system CPU time of finished child processes"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def text_size(value):
+    """Return size of a value passed to or returned from a tool (characters)"""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(str(value))
+
+
+def parameter_text(value):
+    """Return parameter value as text"""
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(item) for item in value)
+    return str(value)
+
+
+class ToolCall:
+    """One recorded call of a tool"""
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, tool, api, parameters, function, scan, depth, start):
+        self.tool = tool
+        self.api = api
+        self.parameters = parameters
+        self.function = function
+        self.scan = scan
+        self.depth = depth
+        self.start = start
+        self.duration = 0
+        self.cpu = 0
+        self.input_size = 0
+        self.output_size = 0
+        self.error = None
+
+    def to_dict(self):
+        """Return call as a dictionary"""
+        return dict(vars(self))
+
+
+class FunctionSpan:
+    """One call of a run_ function"""
+
+    def __init__(self, name, scan, start):
+        self.name = name
+        self.scan = scan
+        self.start = start
+        self.duration = 0
+        self.error = None
+
+
+class Tracer:
+    """Records tool calls and run_ functions
+
+    Use install() for grass.script (or a module with the same functions),
+    trace_module() for the activity, and next_scan() before each scan.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.spans = []
+        self.scans = []
+        self.scan = None
+        self._stack = []
+        self._originals = {}
+        self._origin = time.perf_counter()
+
+    def _now(self):
+        return time.perf_counter() - self._origin
+
+    def next_scan(self):
+        """Start recording a new scan and return its number"""
+        self.scan = 0 if self.scan is None else self.scan + 1
+        self.scans.append((self.scan, self._now()))
+        return self.scan
+
+    def install(self, module):
+        """Replace traced functions in a module by recording wrappers"""
+        for name in TRACED_FUNCTIONS:
+            original = getattr(module, name, None)
+            if original is None or (id(module), name) in self._originals:
+                continue
+            self._originals[(id(module), name)] = (module, original)
+            setattr(module, name, self._wrap_tool(name, original))
+
+    def uninstall(self):
+        """Put the original functions back"""
+        for (unused, name), (module, original) in self._originals.items():
+            setattr(module, name, original)
+        self._originals = {}
+
+    def trace_module(self, module):
+        """Record calls of run_ functions in an activity module"""
+        for name in dir(module):
+            function = getattr(module, name)
+            if name.startswith("run_") and callable(function):
+                setattr(module, name, self.trace_function(function))
+
+    def trace_function(self, function):
+        """Return wrapper which records calls of a run_ function"""
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            span = FunctionSpan(function.__name__, self.scan, self._now())
+            self.spans.append(span)
+            self._stack.append(span.name)
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                span.error = repr(error)
+                raise
+            finally:
+                self._stack.pop()
+                span.duration = self._now() - span.start
+
+        return wrapper
+
+    def _wrap_tool(self, api, original):
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            if api in IMPLIED_TOOLS:
+                tool = IMPLIED_TOOLS[api]
+                parameters = {"expression": parameter_text(args[0])} if args else {}
+            else:
+                tool = args[0] if args else kwargs.get("prog", "")
+                parameters = {}
+            parameters.update(
+                {
+                    key: parameter_text(value)
+                    for key, value in kwargs.items()
+                    if key not in HIDDEN_PARAMETERS
+                }
+            )
+            function = next(
+                (name for name in reversed(self._stack) if name.startswith("run_")),
+                None,
+            )
+            call = ToolCall(
+                tool=tool,
+                api=api,
+                parameters=parameters,
+                function=function,
+                scan=self.scan,
+                depth=len(self._stack),
+                start=self._now(),
+            )
+            call.input_size = text_size(kwargs.get("stdin"))
+            self.calls.append(call)
+            self._stack.append(tool)
+            cpu = children_cpu_time()
+            try:
+                result = original(*args, **kwargs)
+                call.output_size = text_size(result)
+                return result
+            except Exception as error:
+                call.error = repr(error)
+                raise
+            finally:
+                self._stack.pop()
+                call.duration = self._now() - call.start
+                call.cpu = children_cpu_time() - cpu
+
+        return wrapper
+
+    def chrome_trace(self):
+        """Return trace in the Chrome trace event format"""
+        pid = os.getpid()
+        events = []
+
+        def complete(name, category, start, duration, args):
+            events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                    "args": args,
+                }
+            )
+
+        scan_ends = [start for unused, start in self.scans[1:]] + [self._now()]
+        for (scan, start), end in zip(self.scans, scan_ends):
+            complete(f"scan {scan}", "scan", start, end - start, {"scan": scan})
+        for span in self.spans:
+            args = {"scan": span.scan}
+            if span.error:
+                args["error"] = span.error
+            complete(span.name, "function", span.start, span.duration, args)
+        for call in self.calls:
+            args = {
+                "scan": call.scan,
+                "function": call.function,
+                "parameters": call.parameters,
+                "cpu_s": call.cpu,
+                "input_size": call.input_size,
+                "output_size": call.output_size,
+            }
+            if call.error:
+                args["error"] = call.error
+            complete(call.tool, "tool", call.start, call.duration, args)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, filename):
+        """Write Chrome trace JSON file"""
+        with open(filename, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+    def summary(self):
+        """Return one row for each tool in each function sorted by total time"""
+        rows = {}
+        for call in self.calls:
+            key = (call.function or "", call.tool)
+            row = rows.setdefault(
+                key,
+                {
+                    "function": key[0],
+                    "tool": key[1],
+                    "calls": 0,
+                    "total_s": 0,
+                    "max_s": 0,
+                    "cpu_s": 0,
+                    "output_size": 0,
+                    "errors": 0,
+                },
+            )
+            row["calls"] += 1
+            row["total_s"] += call.duration
+            row["max_s"] = max(row["max_s"], call.duration)
+            row["cpu_s"] += call.cpu
+            row["output_size"] += call.output_size
+            row["errors"] += 1 if call.error else 0
+        for row in rows.values():
+            row["mean_s"] = row["total_s"] / row["calls"]
+        return sorted(rows.values(), key=lambda row: row["total_s"], reverse=True)
+
+    def write_csv(self, filename):
+        """Write summary as CSV file"""
+        fields = [
+            "function",
+            "tool",
+            "calls",
+            "total_s",
+            "mean_s",
+            "max_s",
+            "cpu_s",
+            "output_size",
+            "errors",
+        ]
+        with open(filename, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.summary())
+
+
+def load_activity(path):
+    """Import activity file as a module"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    spec = importlib.util.spec_from_file_location("activity", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def trace_activity(path, scans, module=None):
+    """Run main() of an activity for a number of scans and return the Tracer"""
+    if module is None:
+        import grass.script as module
+    tracer = Tracer()
+    # Install before import, so that names imported from grass.script are traced.
+    tracer.install(module)
+    try:
+        activity = load_activity(path)
+        tracer.trace_module(activity)
+        for unused in range(scans):
+            tracer.next_scan()
+            activity.main()
+    finally:
+        tracer.uninstall()
+    return tracer
+
+
+def main():
+    """Process command line and trace an activity"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="activity file (with main function)")
+    parser.add_argument("--scans", type=int, default=2, help="number of scans")
+    parser.add_argument("--chrome", help="write Chrome trace to this JSON file")
+    parser.add_argument("--csv", help="write summary to this CSV file")
+    args = parser.parse_args()
+
+    tracer = trace_activity(args.file, args.scans)
+    if args.chrome:
+        tracer.write_chrome_trace(args.chrome)
+    if args.csv:
+        tracer.write_csv(args.csv)
+    for row in tracer.summary():
+        print(
+            f"{row['function'] or '(main)':<30} {row['tool']:<20} "
+            f"{row['calls']:>5} {row['total_s']:>9.3f} s {row['cpu_s']:>9.3f} s CPU"
+        )
+
+
+if __name__ == "__main__":
+    main()
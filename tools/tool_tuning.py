@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+"""Set resource parameters of heavy tools by region size and machine
+
+Tools like r.watershed or r.sun run with small memory buffers and one core
+unless told otherwise. The tuner knows the resource parameters of the tools
+used by the activities and fills in the ones which are not set in a call:
+
+- memory (MB) is what the tool needs for the current region
+  (estimated from the number of cells) limited by a share of available RAM,
+- the segmented (disk-based) mode flag is added when the tool would not fit
+  into that memory,
+- nprocs is the number of available cores for large regions
+  and 1 for small ones where starting threads costs more than it saves.
+
+Parameters set in the call are never changed. Parameters unknown to the
+installed version of a tool are not added (the interface description
+of each tool is read once).
+
+To use the tuner, install it into grass.script.core before running
+the activity (for workers, set TL_TUNE_TOOLS=1). The benchmark compares
+default and tuned runs on small and large regions in a GRASS session:
+
+    grass nc_spm_08_grass7/user1 --exec python3 tools/tool_tuning.py --benchmark
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from result_cache import mapset_path, region_text
+
+# Default value of memory in tools which have it (MB)
+DEFAULT_MEMORY = 300
+# Share of available memory one tool can use
+MEMORY_SHARE = 0.5
+# Cells per thread under which additional threads do not pay off
+CELLS_PER_THREAD = 250_000
+
+
+class ToolResources:
+    """Resource parameters of a tool
+
+    The *bytes_per_cell* estimate the memory needed for the whole region,
+    *nprocs* tells whether the tool has the nprocs parameter,
+    and *segment_flag* is the flag for the segmented mode (if any)
+    which is needed when the region does not fit into memory.
+    """
+
+    def __init__(self, bytes_per_cell=None, nprocs=False, segment_flag=None):
+        self.bytes_per_cell = bytes_per_cell
+        self.nprocs = nprocs
+        self.segment_flag = segment_flag
+
+
+TOOL_RESOURCES = {
+    "r.watershed": ToolResources(bytes_per_cell=32, segment_flag="m"),
+    "r.stream.extract": ToolResources(bytes_per_cell=32),
+    "r.terraflow": ToolResources(bytes_per_cell=48),
+    "r.viewshed": ToolResources(bytes_per_cell=16),
+    "r.cost": ToolResources(bytes_per_cell=24),
+    "r.walk": ToolResources(bytes_per_cell=32),
+    "r.sun": ToolResources(nprocs=True),
+    "r.horizon": ToolResources(nprocs=True),
+    "r.slope.aspect": ToolResources(bytes_per_cell=8, nprocs=True),
+    "r.neighbors": ToolResources(bytes_per_cell=8, nprocs=True),
+    "r.resamp.filter": ToolResources(bytes_per_cell=8, nprocs=True),
+    "r.resamp.interp": ToolResources(bytes_per_cell=8, nprocs=True),
+}
+
+
+def available_memory():
+    """Return memory available for new processes in MB"""
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (ValueError, OSError, AttributeError):
+        return 2048
+
+
+def available_cpus():
+    """Return number of cores this process can use"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def region_cells(text):
+    """Return number of cells from region definition (WIND or GRASS_REGION)"""
+    rows = re.search(r"rows:\s*(\d+)", text)
+    cols = re.search(r"cols:\s*(\d+)", text)
+    if not rows or not cols:
+        return None
+    return int(rows.group(1)) * int(cols.group(1))
+
+
+def tune(tool, parameters, flags, cells, memory, cpus, supported):
+    """Return parameters and flags with resource settings filled in
+
+    The *memory* (MB) is available for the tool, *cpus* is the number of cores,
+    *supported* are names of parameters and flags the tool has.
+    """
+    resources = TOOL_RESOURCES.get(tool)
+    if resources is None or not cells:
+        return parameters, flags
+    parameters = dict(parameters)
+    if resources.bytes_per_cell and "memory" in supported:
+        needed = cells * resources.bytes_per_cell / 1024**2
+        limit = max(memory * MEMORY_SHARE, DEFAULT_MEMORY)
+        if "memory" not in parameters:
+            parameters["memory"] = int(min(max(needed * 1.2, DEFAULT_MEMORY), limit))
+        flag = resources.segment_flag
+        if flag and flag in supported and flag not in flags and needed > limit:
+            flags += flag
+    if resources.nprocs and "nprocs" in supported and "nprocs" not in parameters:
+        parameters["nprocs"] = max(1, min(cpus, cells // CELLS_PER_THREAD))
+    return parameters, flags
+
+
+_supported = {}
+
+
+def supported_options(tool, env=None):
+    """Return names of parameters and flags of a tool (read once for each tool)"""
+    if tool not in _supported:
+        try:
+            description = subprocess.run(
+                [tool, "--interface-description"],
+                capture_output=True,
+                env=env,
+                check=True,
+            ).stdout
+            root = ET.fromstring(description)
+            _supported[tool] = {
+                element.get("name")
+                for element in root.iter()
+                if element.tag in ("parameter", "flag")
+            }
+        except (OSError, subprocess.CalledProcessError, ET.ParseError):
+            _supported[tool] = set()
+    return _supported[tool]
+
+
+class Tuner:
+    """Fills in resource parameters for calls of tools"""
+
+    def __init__(self, memory=None, cpus=None):
+        self.memory = memory or available_memory()
+        self.cpus = cpus or available_cpus()
+        self.tuned = []
+
+    def region_cells(self, env):
+        """Return number of cells in the current region for an environment"""
+        env = env or os.environ
+        try:
+            return region_cells(region_text(env, mapset_path(env)))
+        except (KeyError, OSError):
+            return None
+
+    def tune_call(self, tool, flags, parameters):
+        """Return tuned flags and parameters for a call"""
+        if tool not in TOOL_RESOURCES:
+            return flags, parameters
+        env = parameters.get("env")
+        tuned, flags = tune(
+            tool,
+            parameters,
+            flags or "",
+            cells=self.region_cells(env),
+            memory=self.memory,
+            cpus=self.cpus,
+            supported=supported_options(tool, env),
+        )
+        added = {key: value for key, value in tuned.items() if key not in parameters}
+        if added:
+            self.tuned.append((tool, added))
+        return flags, tuned
+
+    def install(self, module):
+        """Tune all tools started through start_command of a module
+
+        The run_command, read_command, and other functions of grass.script.core
+        use start_command, so replacing it covers all of them.
+        """
+        original = module.start_command
+        if getattr(original, "tuner", None):
+            return
+
+        def start_command(prog, flags="", **kwargs):
+            flags, kwargs = self.tune_call(prog, flags, kwargs)
+            return original(prog, flags=flags, **kwargs)
+
+        start_command.tuner = self
+        module.start_command = start_command
+
+
+def install(module=None):
+    """Install a Tuner for this machine into grass.script.core and return it"""
+    if module is None:
+        import grass.script.core as module
+    tuner = Tuner()
+    tuner.install(module)
+    return tuner
+
+
+# Calls to compare with and without tuning
+BENCHMARK_CALLS = [
+    (
+        "r.watershed",
+        {
+            "elevation": "tl_tuning_elevation",
+            "accumulation": "tl_tuning_accumulation",
+            "threshold": 1000,
+        },
+    ),
+    (
+        "r.stream.extract",
+        {
+            "elevation": "tl_tuning_elevation",
+            "threshold": 100,
+            "stream_raster": "tl_tuning_streams",
+        },
+    ),
+    (
+        "r.sun",
+        {"elevation": "tl_tuning_elevation", "glob_rad": "tl_tuning_sun", "day": 172},
+    ),
+]
+
+
+def benchmark(sizes=(300, 1500)):
+    """Return times of default and tuned calls for regions of given sizes
+
+    Needs to run in a GRASS session.
+    """
+    import grass.script as gs
+
+    env = os.environ.copy()
+    env["GRASS_OVERWRITE"] = "1"
+    env["GRASS_VERBOSE"] = "-1"
+    tuner = Tuner()
+    results = []
+    for size in sizes:
+        env["GRASS_REGION"] = gs.region_env(
+            n=size, s=0, e=size, w=0, rows=size, cols=size, env=env
+        )
+        gs.run_command("r.surf.fractal", output="tl_tuning_elevation", env=env)
+        for tool, parameters in BENCHMARK_CALLS:
+            times = []
+            for tuned in (False, True):
+                flags = ""
+                call = dict(parameters, env=env)
+                if tuned:
+                    flags, call = tuner.tune_call(tool, flags, call)
+                start = time.perf_counter()
+                gs.run_command(tool, flags=flags, **call)
+                times.append(time.perf_counter() - start)
+            results.append((size * size, tool, times[0], times[1]))
+    gs.run_command("g.remove", type="raster", pattern="tl_tuning_*", flags="f", env=env)
+    return results
+
+
+def main():
+    """Run benchmark or an activity with tuned tools"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", nargs="?", help="activity file to run with tuning")
+    parser.add_argument("--benchmark", action="store_true", help="run benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(f"{'cells':>10} {'tool':<20} {'default [s]':>12} {'tuned [s]':>10}")
+        for cells, tool, default, tuned in benchmark():
+            print(f"{cells:>10} {tool:<20} {default:>12.2f} {tuned:>10.2f}")
+    elif args.file:
+        from tool_trace import load_activity
+
+        tuner = install()
+        load_activity(args.file).main()
+        for tool, added in tuner.tuned:
+            print(f"{tool}: {added}", file=sys.stderr)
+    else:
+        parser.error("provide an activity file or --benchmark")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
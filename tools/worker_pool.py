@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+
+"""Run activity scripts in long-lived Python processes inside a GRASS session
+
+Starting GRASS GIS, Python, and importing grass.script for every activity
+run takes a significant part of the run time. Here, workers are started once
+and each of them waits for jobs. A job is a path to an activity file and
+optionally a name of a function to call instead of main(). Each job gets
+a fresh module namespace, the original environment variables
+(so also GRASS_OVERWRITE), and the computational region the worker started
+with. Modules which the job imported from the directory of the activity
+file are removed from sys.modules afterwards, so the next job imports
+them again (with any changes made in the meantime).
+
+The region a job ends with is its own, unless the job asks to keep it:
+then it becomes the current region of the mapset, as when the activity
+runs in its own GRASS session, so that maps can be rendered after the job
+the same way.
+
+A worker is this file started with --worker in a GRASS session.
+Jobs and results are passed as JSON lines through the original standard
+output of the worker, while all other output (including output of the tools
+called by the activity) goes to standard error.
+"""
+
+import argparse
+import importlib.util
+import inspect
+import itertools
+import json
+import os
+import queue
+import selectors
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import traceback
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import map_algebra
+import resource_usage
+import tool_tuning
+
+WORKER_REGION = "tl_worker_initial"
+
+
+class WorkerError(RuntimeError):
+    """Raised when a job failed in a worker"""
+
+
+class JobResult:
+    """Result of one job executed by a worker"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, path, ok, error=None, duration=None, peak_rss_kb=None):
+        self.path = path
+        self.ok = ok
+        self.error = error
+        self.duration = duration
+        # largest peak memory of a tool started by the job
+        self.peak_rss_kb = peak_rss_kb
+
+    def check(self):
+        """Raise WorkerError if the job failed"""
+        if not self.ok:
+            raise WorkerError(f"Running {self.path} failed:\n{self.error}")
+        return self
+
+
+class Worker:
+    """One worker process in a GRASS session"""
+
+    def __init__(self, executable, mapset, python="python3"):
+        self.executable = executable
+        self.mapset = mapset
+        self.python = python
+        self._process = None
+
+    def start(self):
+        """Start the process and wait for it to be ready"""
+        command = [
+            self.executable,
+            str(self.mapset),
+            "--exec",
+            self.python,
+            "-u",
+            __file__,
+            "--worker",
+        ]
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            start_new_session=True,
+            universal_newlines=True,
+        )
+        message = self._receive(timeout=None)
+        if not message or not message.get("ready"):
+            self.stop()
+            raise WorkerError(f"Worker in {self.mapset} failed to start")
+
+    def stop(self):
+        """Stop the process (killing it if needed)"""
+        if not self._process:
+            return
+        if self._process.poll() is None:
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+        self._process.stdout.close()
+        self._process = None
+
+    def kill(self):
+        """Kill the process including its subprocesses"""
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self._process.wait()
+
+    # pylint: disable=too-many-arguments
+    def run(
+        self,
+        path,
+        function=None,
+        kwargs=None,
+        timeout=None,
+        keep_region=False,
+        keep_maps=None,
+    ):
+        """Run a job and return JobResult
+
+        With *keep_region*, the region of the mapset is set to the region
+        the job ended with. With *keep_maps*, gs.mapcalc calls of the job
+        are evaluated together and only the maps in *keep_maps* are written
+        from them (see tools/map_algebra.py).
+        A worker which timed out or crashed is restarted.
+        """
+        if not self._process or self._process.poll() is not None:
+            self.start()
+        job = {
+            "path": str(path),
+            "function": function,
+            "kwargs": kwargs or {},
+            "keep_region": keep_region,
+            "keep_maps": sorted(keep_maps) if keep_maps is not None else None,
+        }
+        try:
+            self._process.stdin.write(json.dumps(job) + "\n")
+            self._process.stdin.flush()
+            message = self._receive(timeout=timeout)
+        except BrokenPipeError:
+            message = None
+        except TimeoutError:
+            self.kill()
+            self._process = None
+            return JobResult(path, ok=False, error=f"Timeout after {timeout} s")
+        if message is None:
+            self._process.wait()
+            code = self._process.returncode
+            self._process = None
+            return JobResult(path, ok=False, error=f"Worker ended with code {code}")
+        return JobResult(
+            path,
+            ok=message["ok"],
+            error=message.get("error"),
+            duration=message.get("duration"),
+            peak_rss_kb=message.get("peak_rss_kb"),
+        )
+
+    def clean_mapset(self):
+        """Remove all maps from the mapset of the worker"""
+        if not self._process or self._process.poll() is not None:
+            self.start()
+        self._process.stdin.write(json.dumps({"clean": True}) + "\n")
+        self._process.stdin.flush()
+        message = self._receive(timeout=None)
+        if not message or not message["ok"]:
+            raise WorkerError(f"Cleaning mapset {self.mapset} failed")
+
+    def _receive(self, timeout):
+        """Read one message (None if the worker ended)"""
+        stream = self._process.stdout
+        if timeout is not None:
+            with selectors.DefaultSelector() as selector:
+                selector.register(stream, selectors.EVENT_READ)
+                if not selector.select(timeout):
+                    raise TimeoutError
+        line = stream.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+
+class WorkerPool:
+    """Pool of warm workers for running activity scripts
+
+    With *size* 1, the worker uses the provided mapset. With more workers,
+    each worker gets its own new mapset next to the provided one, so that
+    activities writing maps with the same names do not interfere.
+    These mapsets are removed when the pool is closed.
+
+    The run() method can be called from multiple threads at the same time.
+    """
+
+    def __init__(self, executable, mapset, size=1, python="python3"):
+        self.executable = executable
+        self.mapset = Path(mapset)
+        self.size = size
+        self.python = python
+        self._created_mapsets = []
+        self._idle = queue.Queue()
+        self._workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def worker_mapsets(self):
+        """Return paths to mapsets used by the workers"""
+        if self.size == 1:
+            return [self.mapset]
+        return [
+            self.mapset.parent / f"{self.mapset.name}_worker{i}"
+            for i in range(self.size)
+        ]
+
+    def start(self):
+        """Create mapsets if needed and start all workers"""
+        for mapset in self.worker_mapsets():
+            if not mapset.exists():
+                subprocess.check_call([self.executable, "-c", str(mapset), "-e"])
+                self._created_mapsets.append(mapset)
+            worker = Worker(self.executable, mapset, python=self.python)
+            worker.start()
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    # pylint: disable=too-many-arguments
+    def run(
+        self,
+        path,
+        function=None,
+        kwargs=None,
+        timeout=None,
+        keep_region=False,
+        keep_maps=None,
+    ):
+        """Run main() or the given function from a file in the next idle worker
+
+        See Worker.run() for *keep_region* and *keep_maps*.
+        """
+        with self.acquire() as worker:
+            return worker.run(
+                path,
+                function=function,
+                kwargs=kwargs,
+                timeout=timeout,
+                keep_region=keep_region,
+                keep_maps=keep_maps,
+            )
+
+    @contextmanager
+    def acquire(self):
+        """Reserve an idle worker for several jobs which need the same mapset"""
+        worker = self._idle.get()
+        try:
+            yield worker
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        """Stop all workers and remove mapsets created by the pool"""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        self._idle = queue.Queue()
+        for mapset in self._created_mapsets:
+            shutil.rmtree(mapset, ignore_errors=True)
+        self._created_mapsets = []
+
+
+# Worker side
+
+
+_job_counter = itertools.count()
+
+
+def load_module(path):
+    """Load a module from path into a fresh namespace (not in sys.modules)"""
+    spec = importlib.util.spec_from_file_location(
+        f"tl_activity_{next(_job_counter)}", path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def call_function(module, name, kwargs):
+    """Call a function from a module
+
+    If the function has an *env* parameter and it is not provided,
+    a copy of the environment with overwriting enabled is passed
+    (same as what main() functions in activities do).
+    """
+    function = getattr(module, name)
+    parameters = inspect.signature(function).parameters
+    if "env" in parameters and "env" not in kwargs:
+        env = os.environ.copy()
+        env["GRASS_OVERWRITE"] = "1"
+        kwargs = dict(kwargs, env=env)
+    return function(**kwargs)
+
+
+def forget_modules(directory, keep):
+    """Remove modules imported from a directory on sys.path from sys.modules
+
+    Modules with names in *keep* stay.
+    """
+    directory = Path(os.path.realpath(directory))
+    for name, module in list(sys.modules.items()):
+        filename = getattr(module, "__file__", None)
+        if name in keep or not filename:
+            continue
+        try:
+            relative = Path(os.path.realpath(filename)).relative_to(directory)
+        except ValueError:
+            continue
+        # The top-level module or package is in the directory itself
+        # (not, e.g., in a virtual environment inside of it).
+        if relative.parts[0].split(".")[0] == name.split(".")[0]:
+            del sys.modules[name]
+
+
+def run_job(job, gs):
+    """Execute one job with environment, region, and imports reset afterwards"""
+    path = os.path.abspath(job["path"])
+    saved_environ = dict(os.environ)
+    saved_path = list(sys.path)
+    saved_argv = list(sys.argv)
+    saved_modules = set(sys.modules)
+    # The job gets its own copy of the initial region as the current region.
+    gs.run_command(
+        "g.region",
+        region=WORKER_REGION,
+        save=f"{WORKER_REGION}_job",
+        flags="u",
+        overwrite=True,
+    )
+    os.environ["WIND_OVERRIDE"] = f"{WORKER_REGION}_job"
+    sys.path.insert(0, os.path.dirname(path))
+    sys.argv = [path]
+    start = time.perf_counter()
+    recorder = resource_usage.UsageRecorder()
+    if job.get("keep_maps") is not None:
+        fusing = map_algebra.fused(keep=job["keep_maps"])
+    else:
+        fusing = nullcontext()
+    try:
+        with recorder, fusing:
+            module = load_module(path)
+            function = job.get("function") or "main"
+            call_function(module, function, job.get("kwargs") or {})
+        result = {"ok": True}
+    except SystemExit as error:
+        code = error.code
+        result = {"ok": code in (None, 0), "error": f"SystemExit: {code}"}
+    except Exception:  # pylint: disable=broad-except
+        result = {"ok": False, "error": traceback.format_exc()}
+    result["duration"] = time.perf_counter() - start
+    result["peak_rss_kb"] = recorder.peak_rss_kb
+    os.environ.clear()
+    os.environ.update(saved_environ)
+    sys.path[:] = saved_path
+    sys.argv = saved_argv
+    forget_modules(os.path.dirname(path), keep=saved_modules)
+    # Files added or changed since the last import are found.
+    importlib.invalidate_caches()
+    if job.get("keep_region"):
+        gs.run_command("g.region", region=f"{WORKER_REGION}_job")
+    return result
+
+
+def clean_mapset(gs):
+    """Remove all maps from the current mapset"""
+    try:
+        gs.run_command(
+            "g.remove", type="raster,raster_3d,vector", pattern="*", flags="f"
+        )
+    except Exception:  # pylint: disable=broad-except
+        return {"ok": False, "error": traceback.format_exc()}
+    return {"ok": True}
+
+
+def worker_main():
+    """Receive jobs and send results until the input is closed"""
+    # Keep the original stdout for messages and send everything else to stderr.
+    messages = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    import grass.script as gs
+    import grass.script.core
+
+    # Record memory used by the tools started by jobs.
+    resource_usage.install(grass.script.core)
+    if os.environ.get("TL_TUNE_TOOLS") == "1":
+        tool_tuning.install(grass.script.core)
+    gs.run_command("g.region", save=WORKER_REGION, overwrite=True)
+
+    def send(message):
+        messages.write(json.dumps(message) + "\n")
+        messages.flush()
+
+    send({"ready": True})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        if job.get("clean"):
+            send(clean_mapset(gs))
+        else:
+            send(run_job(job, gs))
+
+
+def main():
+    """Run a worker or run files given on command line using a pool"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="activity files to run")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mapset", help="path to the mapset to use")
+    parser.add_argument("--grass", default="grass", help="GRASS GIS executable")
+    parser.add_argument("--size", type=int, default=1, help="number of workers")
+    args = parser.parse_args()
+    if args.worker:
+        worker_main()
+        return 0
+    if not args.mapset:
+        parser.error("--mapset is required to run files")
+    failed = 0
+    with WorkerPool(args.grass, args.mapset, size=args.size) as pool:
+        for path in args.files:
+            result = pool.run(path)
+            if result.ok:
+                print(f"{path}: {result.duration:.2f} s")
+            else:
+                failed += 1
+                print(f"{path}: failed\n{result.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Cache of rendered layers composited in-process
+
+Each layer is rendered into its own transparent image and kept in a cache
+directory under a key made from the layer command, the image size,
+the computational region, and modification stamps of the maps the command
+uses. When only some maps change, only their layers are rendered again.
+The layers are composited with NumPy alpha blending into the final image.
+
+Layers are rendered by the cairo driver as 32-bit BMP files which contain
+the image surface as is, i.e., premultiplied BGRA rows from the top.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+from result_cache import find_map  # noqa: E402
+
+# Layers which depend on the state left by the previous layers.
+STATEFUL_LAYERS = {"d.legend.vect"}
+
+
+def read_bmp(path):
+    """Read 32-bit BMP into premultiplied RGBA float array (values 0-1)"""
+    data = Path(path).read_bytes()
+    (offset,) = struct.unpack_from("<I", data, 10)
+    width, height, unused, bits = struct.unpack_from("<iiHH", data, 18)
+    if bits != 32:
+        raise ValueError(f"Only 32-bit BMP files are supported, not {bits}-bit")
+    pixels = np.frombuffer(
+        data, dtype=np.uint8, count=abs(height) * width * 4, offset=offset
+    )
+    pixels = pixels.reshape(abs(height), width, 4)
+    if height > 0:
+        # bottom-up rows
+        pixels = pixels[::-1]
+    # BGRA to RGBA
+    return pixels[:, :, [2, 1, 0, 3]].astype(np.float32) / 255
+
+
+def write_bmp(path, image):
+    """Write premultiplied RGBA float array as 32-bit BMP in the cairo layout"""
+    height, width, unused = image.shape
+    pixels = np.clip(np.rint(image[:, :, [2, 1, 0, 3]] * 255), 0, 255)
+    data = pixels.astype(np.uint8).tobytes()
+    header = b"BM" + struct.pack("<I4xI", 54 + len(data), 54)
+    # Negative height for rows from the top
+    header += struct.pack(
+        "<IiiHHIIiiII", 40, width, -height, 1, 32, 0, len(data), 0, 0, 0, 0
+    )
+    with open(path, "wb") as file:
+        file.write(header)
+        file.write(data)
+
+
+def write_png(path, rgb):
+    """Write RGB uint8 array as PNG"""
+    height, width, unused = rgb.shape
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    # Filter type 0 (none) for each row.
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(kind, content):
+        body = kind + content
+        return (
+            struct.pack(">I", len(content))
+            + body
+            + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+        )
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        )
+        file.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        file.write(chunk(b"IEND", b""))
+
+
+def composite(layers, background=(1.0, 1.0, 1.0)):
+    """Composite premultiplied RGBA arrays over an opaque background
+
+    Returns RGB uint8 array.
+    """
+    result = None
+    for layer in layers:
+        if result is None:
+            result = np.empty(layer.shape[:2] + (3,), dtype=np.float32)
+            result[...] = background
+        alpha = layer[:, :, 3:4]
+        result = layer[:, :, :3] + result * (1 - alpha)
+    return np.clip(np.rint(result * 255), 0, 255).astype(np.uint8)
+
+
+def is_cacheable(layers):
+    """Return True if layers can be rendered and cached independently"""
+    return not any(layer[0] in STATEFUL_LAYERS for layer in layers)
+
+
+class LayerCache:
+    """Directory with rendered layers
+
+    At most *max_files* layer images are kept (least recently used are removed).
+    """
+
+    def __init__(self, directory, max_files=500):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_files = max_files
+        self.rendered = 0
+        self.reused = 0
+
+    def layer_path(self, layer, mapset, width, height):
+        """Return path of the image for a layer in the current state of the maps"""
+        mapset = Path(mapset)
+        stamps = []
+        for item in layer[1:]:
+            unused, separator, value = item.partition("=")
+            if not separator:
+                continue
+            for name in value.split(","):
+                for path in find_map(mapset, name):
+                    stat = path.stat()
+                    stamps.append([str(path), stat.st_mtime_ns, stat.st_size])
+        wind = mapset / "WIND"
+        region = wind.read_text() if wind.is_file() else ""
+        text = json.dumps([list(layer), width, height, region, stamps])
+        key = hashlib.sha1(text.encode()).hexdigest()
+        return self.directory / f"{key}.bmp"
+
+    def is_cached(self, path):
+        """Return True if the layer image exists (and mark it as used)"""
+        if Path(path).is_file():
+            os.utime(path)
+            self.reused += 1
+            return True
+        self.rendered += 1
+        return False
+
+    def prune(self):
+        """Remove least recently used images over the limit"""
+        files = sorted(
+            self.directory.glob("*.bmp"), key=lambda path: path.stat().st_mtime
+        )
+        for path in files[: max(len(files) - self.max_files, 0)]:
+            path.unlink()
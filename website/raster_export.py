@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+"""Export raster maps as NumPy files in the current region
+
+Runs in a GRASS session, so that all rasters of one image are read in one
+process instead of starting a GRASS session for each of them:
+
+    python raster_export.py directory map1 [map2 ...]
+
+Values of each map are written to directory/index.npy (index of the map
+in the list) as 32-bit floats with NaN for nulls.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+from grass.script import array as garray
+
+
+def main():
+    """Export maps given on the command line"""
+    directory = Path(sys.argv[1])
+    for index, name in enumerate(sys.argv[2:]):
+        values = garray.array(name, null="nan", dtype=np.float32)
+        np.save(directory / f"{index}.npy", np.asarray(values))
+
+
+if __name__ == "__main__":
+    main()
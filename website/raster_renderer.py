@@ -0,0 +1,277 @@
+"""Render d.rast layers using NumPy instead of a display driver
+
+Colors come from the color file of the raster map (colr element) which is
+where r.colors stores any color table, be it a named table (blues, bgyr,
+sepia, ...) or custom rules, with the rules converted to map values.
+The rules are evaluated once for a lookup table over the range of the
+values and the lookup table is then applied to the image.
+
+The values of all raster layers of an image are exported together by one
+Python script (raster_export.py) in one GRASS session, so the number
+of started GRASS sessions does not grow with the number of raster layers
+as with d.rast. The image is laid out the same way d.rast does it, i.e.,
+the computational region is fitted into the image keeping its aspect ratio
+and null cells are transparent.
+
+Layers with options or color files which are not supported raise
+UnsupportedLayer and need to be rendered by d.rast.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+from result_cache import find_map  # noqa: E402
+
+EXPORT_SCRIPT = Path(__file__).resolve().parent / "raster_export.py"
+
+# Largest lookup table for floating point maps
+LOOKUP_SIZE = 4096
+# Largest range of integer values for an exact lookup table
+INTEGER_LOOKUP_SIZE = 65536
+
+
+class UnsupportedLayer(ValueError):
+    """Raised when a layer cannot be rendered without d.rast"""
+
+
+def raster_layer_options(layer):
+    """Return map name and whether nulls are opaque for a supported d.rast layer"""
+    if not layer or layer[0] != "d.rast":
+        raise UnsupportedLayer(f"Not a d.rast layer: {layer}")
+    name = None
+    opaque_nulls = False
+    for item in layer[1:]:
+        key, separator, value = item.partition("=")
+        if item == "-n":
+            opaque_nulls = True
+        elif separator and key == "map":
+            name = value
+        elif not separator and not item.startswith("-") and name is None:
+            name = item
+        else:
+            raise UnsupportedLayer(f"Unsupported d.rast option: {item}")
+    if not name:
+        raise UnsupportedLayer(f"No raster map in layer: {layer}")
+    return name, opaque_nulls
+
+
+def parse_color(text):
+    """Return RGB tuple from r:g:b or grey value"""
+    parts = [int(part) for part in text.split(":")]
+    if len(parts) == 1:
+        return parts * 3
+    if len(parts) == 3:
+        return parts
+    raise UnsupportedLayer(f"Unknown color in color file: {text}")
+
+
+def parse_point(text):
+    """Return value and color from value:r:g:b or value:grey"""
+    value, unused, color = text.partition(":")
+    return float(value), parse_color(color)
+
+
+class ColorTable:
+    """Color rules of a raster map
+
+    Each rule is a pair of (value, color) points with colors interpolated
+    linearly between them. Later rules take precedence.
+    """
+
+    def __init__(
+        self, rules, null_color=(255, 255, 255), default_color=(255, 255, 255)
+    ):
+        self.rules = rules
+        self.null_color = null_color
+        self.default_color = default_color
+
+    def colors(self, values):
+        """Return colors (float array) for an array of values"""
+        result = np.empty(values.shape + (3,), dtype=np.float64)
+        result[...] = self.default_color
+        for (low, low_color), (high, high_color) in self.rules:
+            if low > high:
+                low, high = high, low
+                low_color, high_color = high_color, low_color
+            inside = (values >= low) & (values <= high)
+            if high == low:
+                result[inside] = low_color
+                continue
+            ratio = (values[inside] - low) / (high - low)
+            result[inside] = np.asarray(low_color) + ratio[:, np.newaxis] * (
+                np.asarray(high_color) - np.asarray(low_color)
+            )
+        return result
+
+    def lookup_table(self, minimum, maximum, size):
+        """Return uint8 colors for *size* values spread from minimum to maximum"""
+        values = np.linspace(minimum, maximum, size)
+        return np.clip(np.rint(self.colors(values)), 0, 255).astype(np.uint8)
+
+
+def parse_color_file(text):
+    """Return ColorTable from the content of a color file"""
+    lines = text.splitlines()
+    if not lines or not lines[0].startswith("%"):
+        raise UnsupportedLayer("Color file in the old format")
+    rules = []
+    null_color = (255, 255, 255)
+    default_color = (255, 255, 255)
+    for line in lines[1:]:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("nv:"):
+            null_color = parse_color(line[3:])
+        elif line.startswith("*:"):
+            default_color = parse_color(line[2:])
+        elif line.startswith(("%", "shift", "invert")):
+            # Modular rules, shifted or inverted tables
+            raise UnsupportedLayer(f"Unsupported line in color file: {line}")
+        else:
+            points = [parse_point(item) for item in line.split()]
+            if len(points) == 1:
+                points *= 2
+            rules.append((points[0], points[1]))
+    return ColorTable(rules, null_color=null_color, default_color=default_color)
+
+
+def read_color_table(mapset, name):
+    """Return ColorTable of a raster map as d.rast would use it in a mapset"""
+    mapset = Path(mapset)
+    files = find_map(mapset, name)
+    if not files:
+        raise UnsupportedLayer(f"Raster map <{name}> not found")
+    map_mapset = files[0].parent.parent
+    name = name.partition("@")[0]
+    # Color table of a map from another mapset can be set in the current one.
+    candidates = [mapset / "colr2" / map_mapset.name / name, map_mapset / "colr" / name]
+    for path in candidates:
+        if path.is_file():
+            return parse_color_file(path.read_text())
+    # Default color tables are not reproduced.
+    raise UnsupportedLayer(f"Raster map <{name}> has no color file")
+
+
+def read_region(path):
+    """Return region from a region (WIND) file as dictionary"""
+    region = {}
+    for line in Path(path).read_text().splitlines():
+        key, separator, value = line.partition(":")
+        if separator:
+            region[key.strip()] = value.strip()
+    return {
+        "north": float(region["north"]),
+        "south": float(region["south"]),
+        "east": float(region["east"]),
+        "west": float(region["west"]),
+        "rows": int(region["rows"]),
+        "cols": int(region["cols"]),
+    }
+
+
+def lookup_indices(values, size=LOOKUP_SIZE):
+    """Return lookup table range, size, and indices for finite values"""
+    minimum = float(values.min())
+    maximum = float(values.max())
+    if np.all(values == np.round(values)) and maximum - minimum < INTEGER_LOOKUP_SIZE:
+        # One entry for each integer value, so no rounding happens.
+        size = int(maximum - minimum) + 1
+    if maximum == minimum:
+        return minimum, maximum, 1, np.zeros(values.shape, dtype=np.intp)
+    scale = (size - 1) / (maximum - minimum)
+    indices = np.rint((values - minimum) * scale).astype(np.intp)
+    return minimum, maximum, size, indices
+
+
+def render_raster(values, region, color_table, width, height, opaque_nulls=False):
+    """Return premultiplied RGBA image (float values 0-1) for raster values
+
+    The *values* have the shape of the region with NaN for nulls.
+    """
+    ew_extent = region["east"] - region["west"]
+    ns_extent = region["north"] - region["south"]
+    scale = min(width / ew_extent, height / ns_extent)
+    left = (width - ew_extent * scale) / 2
+    top = (height - ns_extent * scale) / 2
+    # Cell under the center of each pixel
+    cols = np.floor(
+        (np.arange(width) + 0.5 - left) / scale / ew_extent * region["cols"]
+    ).astype(np.intp)
+    rows = np.floor(
+        (np.arange(height) + 0.5 - top) / scale / ns_extent * region["rows"]
+    ).astype(np.intp)
+    x_inside = (cols >= 0) & (cols < region["cols"])
+    y_inside = (rows >= 0) & (rows < region["rows"])
+    sampled = values[np.ix_(rows[y_inside], cols[x_inside])]
+
+    colors = np.zeros(sampled.shape + (3,), dtype=np.float32)
+    alpha = np.zeros(sampled.shape, dtype=np.float32)
+    finite = np.isfinite(sampled)
+    if finite.any():
+        minimum, maximum, size, indices = lookup_indices(sampled[finite])
+        table = color_table.lookup_table(minimum, maximum, size)
+        colors[finite] = table[indices]
+        alpha[finite] = 255
+    if opaque_nulls:
+        colors[~finite] = color_table.null_color
+        alpha[~finite] = 255
+
+    image = np.zeros((height, width, 4), dtype=np.float32)
+    inside = np.ix_(y_inside, x_inside)
+    alpha /= 255
+    image[inside + (slice(0, 3),)] = colors / 255 * alpha[:, :, np.newaxis]
+    image[inside + (3,)] = alpha
+    return image
+
+
+class NumpyRasterRenderer:
+    """Renders supported d.rast layers in the current region of a runner's mapset"""
+
+    async def render(self, runner, layer, width, height):
+        """Return premultiplied RGBA image for a layer
+
+        Raises UnsupportedLayer when the layer needs to be rendered by d.rast.
+        """
+        # Check the layer first to report why it is not supported.
+        name, unused = raster_layer_options(layer)
+        read_color_table(runner.mapset, name)
+        images = await self.render_layers(runner, [layer], width, height)
+        return images[tuple(layer)]
+
+    async def render_layers(self, runner, layers, width, height):
+        """Return images for all supported layers by layer (as a tuple)
+
+        Values of all the rasters are exported by one command.
+        Layers which need to be rendered by d.rast are left out.
+        """
+        mapset = Path(runner.mapset)
+        supported = {}
+        for layer in layers:
+            try:
+                name, opaque_nulls = raster_layer_options(layer)
+                color_table = read_color_table(mapset, name)
+            except UnsupportedLayer:
+                continue
+            supported[tuple(layer)] = (name, opaque_nulls, color_table)
+        if not supported:
+            return {}
+        names = list(dict.fromkeys(item[0] for item in supported.values()))
+        region = read_region(mapset / "WIND")
+        with tempfile.TemporaryDirectory() as directory:
+            await runner.run("python", str(EXPORT_SCRIPT), directory, *names)
+            values = {
+                name: np.load(Path(directory) / f"{index}.npy")
+                for index, name in enumerate(names)
+            }
+        return {
+            layer: render_raster(
+                values[name], region, color_table, width, height, opaque_nulls
+            )
+            for layer, (name, opaque_nulls, color_table) in supported.items()
+        }
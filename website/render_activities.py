@@ -3,15 +3,41 @@
 """Run predefined case for each analysis and render it with its result"""
 
 import argparse
+import asyncio
 import base64
 import fnmatch
+import functools
 import json
+import logging
 import os
+import shutil
+import signal
 import subprocess
+import sys
+import tempfile
 import weakref
 from pathlib import Path
 from xml.dom.minidom import getDOMImplementation
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import map_algebra  # noqa: E402
+from activity_catalog import (  # noqa: E402
+    ActivityConfigError,
+    load_catalog,
+    resolve_path,
+)
+from layer_cache import (  # noqa: E402
+    LayerCache,
+    composite,
+    is_cacheable,
+    read_bmp,
+    write_bmp,
+    write_png,
+)
+from raster_renderer import NumpyRasterRenderer, UnsupportedLayer  # noqa: E402
+from worker_pool import WorkerError, WorkerPool  # noqa: E402
+
 
 def is_python_file(path):
     """Return True if path is a Python file"""
@@ -25,73 +51,279 @@ def is_json_file(path):
     return path.is_file() and path.suffix == ".json"
 
 
-def resolve_path(path, root_file):
-    """Creates an absolute path from a path relative to root_file.
+LOGGER = logging.getLogger(__name__)
 
-    Returns path as is if the input path is absolute.
-    """
-    path = Path(path)
-    if path.is_absolute():
-        return path
-    base = Path(root_file).parent
-    path = base / path
-    return path.resolve()
+
+def rendering_environment(filename, width, height):
+    """Return environment for rendering into a file and path to its legend file"""
+    env = os.environ.copy()
+    env["GRASS_RENDER_FILE"] = filename
+    env["GRASS_RENDER_IMMEDIATE"] = "cairo"
+    env["GRASS_RENDER_FILE_READ"] = "TRUE"
+    legend_file = Path(filename).with_suffix(".grass_vector_legend")
+    env["GRASS_LEGEND_FILE"] = str(legend_file)
+    env["GRASS_RENDER_WIDTH"] = str(width)
+    env["GRASS_RENDER_HEIGHT"] = str(height)
+    return env, legend_file
+
+
+def remove_if_exists(path):
+    """Remove file if it exists"""
+    path.unlink(missing_ok=True)
 
 
-class GrassRenderer:
-    """Interface for rendering into a file using GRASS GIS
+class AsyncGrassRenderer:
+    """Interface for rendering into a file using AsyncGrassRunner
 
-    Assuming that the provided filename is unique to a given instance.
+    The display is erased by calling erase() (not when the object is created).
+
+    With *layer_cache* (LayerCache from layer_cache.py) or *raster_renderer*
+    (NumpyRasterRenderer from raster_renderer.py), each command renders
+    into its own image and the images are composited into the file by finish().
+    Cached images are reused as long as the maps they show did not change.
+    Raster layers supported by *raster_renderer* are rendered without d.rast,
+    all of them together when they are passed to prepare() first.
     """
 
-    def __init__(self, runner, filename, width=250, height=250):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        runner,
+        filename,
+        width=250,
+        height=250,
+        layer_cache=None,
+        raster_renderer=None,
+    ):
         self._runner = runner
-        self._env = os.environ.copy()
-        self._env["GRASS_RENDER_FILE"] = filename
-        self._env["GRASS_RENDER_IMMEDIATE"] = "cairo"
-        self._env["GRASS_RENDER_FILE_READ"] = "TRUE"
-        self._legend_file = Path(filename).with_suffix(".grass_vector_legend")
-        self._env["GRASS_LEGEND_FILE"] = str(self._legend_file)
-        self._env["GRASS_RENDER_WIDTH"] = str(width)
-        self._env["GRASS_RENDER_HEIGHT"] = str(height)
-        self._runner.run_env(self._env, ["d.erase"])
-
-        # Since we asked for a vector legend,
-        # we need to delete the legend file when done.
-        def remove_if_exists(path):
-            path.unlink(missing_ok=True)
-
+        self._filename = filename
+        self._width = width
+        self._height = height
+        self._env, self._legend_file = rendering_environment(filename, width, height)
         self._finalizer = weakref.finalize(self, remove_if_exists, self._legend_file)
+        self._layer_cache = layer_cache
+        self._raster_renderer = raster_renderer
+        self._layers = []
+        self._prepared = None
+
+    @property
+    def _by_layer(self):
+        return bool(self._layer_cache or self._raster_renderer)
+
+    async def erase(self):
+        """Start with an empty image"""
+        if self._by_layer:
+            self._layers = []
+        else:
+            await self._runner.run_env(self._env, ["d.erase"])
+
+    async def prepare(self, layers):
+        """Render raster layers supported by the raster renderer together
+
+        Values of all the rasters which are not in the layer cache are read
+        by one command and run() then uses the images.
+        """
+        if not self._raster_renderer:
+            return
+        pending = [
+            layer
+            for layer in layers
+            if not (
+                self._layer_cache
+                and self._layer_cache.layer_path(
+                    layer, self._runner.mapset, self._width, self._height
+                ).is_file()
+            )
+        ]
+        self._prepared = await self._raster_renderer.render_layers(
+            self._runner, pending, self._width, self._height
+        )
 
-    def run(self, *args):
+    async def run(self, *args):
         """Run a rendering command"""
-        self._runner.run_env(self._env, list(args))
+        if not self._by_layer:
+            await self._runner.run_env(self._env, list(args))
+            return
+        path = None
+        if self._layer_cache:
+            path = self._layer_cache.layer_path(
+                args, self._runner.mapset, self._width, self._height
+            )
+            if self._layer_cache.is_cached(path):
+                self._layers.append(read_bmp(path))
+                return
+        image = None
+        if self._prepared is not None:
+            image = self._prepared.get(tuple(args))
+        elif self._raster_renderer:
+            try:
+                image = await self._raster_renderer.render(
+                    self._runner, args, self._width, self._height
+                )
+            except UnsupportedLayer as error:
+                LOGGER.debug("Rendering by %s: %s", args[0], error)
+        if image is None:
+            image = await self._render_layer(args)
+        if path:
+            # Write and rename so that other renderers never see a partial image.
+            temporary = path.with_name(f"{path.stem}_{os.getpid()}_{id(self)}.bmp")
+            write_bmp(temporary, image)
+            temporary.replace(path)
+        self._layers.append(image)
+
+    async def _render_layer(self, args):
+        """Render one command alone into a transparent image and return it"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "layer.bmp"
+            env = self._env.copy()
+            env["GRASS_RENDER_FILE"] = str(path)
+            env["GRASS_RENDER_FILE_READ"] = "FALSE"
+            env["GRASS_RENDER_TRANSPARENT"] = "TRUE"
+            await self._runner.run_env(env, list(args))
+            return read_bmp(path)
+
+    def finish(self):
+        """Write the composited image (needed only when rendering by layer)"""
+        if self._by_layer and self._layers:
+            write_png(self._filename, composite(self._layers))
 
     def clean(self):
         """Remove temporary files"""
         self._finalizer()
 
 
-class GrassRunner:
-    """Interface for running GRASS tools or anything else in GRASS GIS as commands"""
+class AsyncGrassRunner:
+    """Interface for running commands in GRASS GIS concurrently using asyncio
+
+    At most *max_jobs* commands run at the same time (the limit is shared with
+    runners created using for_mapset()). Commands running longer than *timeout*
+    seconds are killed including all their subprocesses. Output of the commands
+    is passed to the log line by line as it comes.
+
+    With *pool* (a WorkerPool from tools/worker_pool.py for the same mapset),
+    Python scripts run in already started workers (in a thread, so that other
+    commands can run meanwhile).
+    Python scripts can run with their gs.mapcalc calls evaluated together
+    (see tools/map_algebra.py).
+
+    The object needs to be created in a running event loop.
+    """
 
-    def __init__(self, executable, mapset):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self, executable, mapset, max_jobs=1, timeout=None, semaphore=None, pool=None
+    ):
         self.executable = executable
         self.mapset = mapset
+        self.timeout = timeout
+        self.pool = pool
+        self._semaphore = semaphore or asyncio.Semaphore(max_jobs)
+
+    def for_mapset(self, mapset):
+        """Return runner for another mapset sharing the concurrency limit"""
+        return AsyncGrassRunner(
+            executable=self.executable,
+            mapset=mapset,
+            timeout=self.timeout,
+            semaphore=self._semaphore,
+        )
+
+    async def create_mapset(self):
+        """Create the mapset of this runner"""
+        await self._execute(
+            [self.executable, "-c", str(self.mapset), "-e"], env=None, label="grass"
+        )
 
-    def run_env(self, env, args):
+    def remove_mapset(self):
+        """Delete the mapset of this runner"""
+        shutil.rmtree(self.mapset, ignore_errors=True)
+
+    async def run_env(self, env, args, timeout=None):
         """Run a command with environmental variables provided in env"""
-        subprocess.check_call([self.executable, self.mapset, "--exec"] + args, env=env)
+        command = [self.executable, str(self.mapset), "--exec"] + [str(i) for i in args]
+        label = Path(args[1]).name if args[0] == "python" else args[0]
+        await self._execute(command, env=env, label=label, timeout=timeout)
 
-    def run(self, *args):
+    async def run(self, *args):
         """Run a command"""
-        self.run_env(args=list(args), env=None)
+        await self.run_env(args=list(args), env=None)
 
-    def run_python(self, *args):
+    async def run_python(self, *args, keep_maps=None):
         """Run a Python script.
 
+        With *keep_maps*, gs.mapcalc calls in the script are evaluated
+        together and only maps in *keep_maps* are written from them.
         Assuming the correct Python interpreter is 'python'."""
-        self.run("python", *args)
+        if not self.pool:
+            if keep_maps is None:
+                await self.run("python", *args)
+                return
+            command = [self.executable, str(self.mapset), "--exec", "python"]
+            command += [map_algebra.__file__, "--keep", ",".join(sorted(keep_maps))]
+            command += [str(i) for i in args]
+            await self._execute(command, env=None, label=Path(args[0]).name)
+            return
+        async with self._semaphore:
+            # Maps are rendered in the region the script ended with.
+            result = await asyncio.get_running_loop().run_in_executor(
+                None,
+                functools.partial(
+                    self.pool.run,
+                    *args,
+                    timeout=self.timeout,
+                    keep_region=True,
+                    keep_maps=keep_maps,
+                ),
+            )
+        result.check()
+
+    async def _execute(self, command, env, label, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        async with self._semaphore:
+            # New session so that the whole process group can be killed.
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                env=env,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        log_stream(process.stdout, label, logging.INFO),
+                        log_stream(process.stderr, label, logging.WARNING),
+                        process.wait(),
+                    ),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                await kill_process_group(process)
+                raise subprocess.TimeoutExpired(command, timeout) from None
+            except asyncio.CancelledError:
+                await kill_process_group(process)
+                raise
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+
+async def log_stream(stream, name, level):
+    """Pass lines from a stream to the log as they come"""
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        LOGGER.log(level, "%s: %s", name, line.decode(errors="replace").rstrip())
+
+
+async def kill_process_group(process):
+    """Kill process and all processes it started"""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await process.wait()
 
 
 def image_to_text(filename):
@@ -161,10 +393,16 @@ def create_activity_page(activity, image, filename):
 
 
 class IndexPage:
-    """Multi-stage writter for a main/index file with multiple activities"""
+    """Multi-stage writter for a main/index file with multiple activities
+
+    Activities added with a *key* (e.g., path to their configuration file)
+    can be replaced later by replace_activities() and the file written again
+    by write() without recreating entries of the other activities.
+    """
 
     def __init__(self, title, filename):
         self._filename = filename
+        self._entries = {}
         impl = getDOMImplementation()
         doc_type = impl.createDocumentType(
             "html",
@@ -181,23 +419,60 @@ class IndexPage:
         heading.appendChild(self._dom.createTextNode(title))
         self._body.appendChild(heading)
 
-    def add_activity(self, activity, image):
+    def _create_entries(self, activities):
+        """Return fragment with elements for activities and list of the elements"""
+        fragment = self._dom.createDocumentFragment()
+        for activity, image in activities:
+            add_activity(
+                dom=self._dom,
+                parent=fragment,
+                activity=activity,
+                image=image,
+                heading_level="h2",
+                image_as_data=False,
+            )
+        return fragment, list(fragment.childNodes)
+
+    def add_activity(self, activity, image, key=None):
         """Add one activity and its image"""
-        add_activity(
-            dom=self._dom,
-            parent=self._body,
-            activity=activity,
-            image=image,
-            heading_level="h2",
-            image_as_data=False,
-        )
+        fragment, nodes = self._create_entries([(activity, image)])
+        self._body.appendChild(fragment)
+        if key is not None:
+            self._entries.setdefault(key, []).extend(nodes)
+
+    def replace_activities(self, key, activities, before=None):
+        """Replace activities added with a key by a list of activities and images
+
+        The new entries take the place of the old ones. Activities with a key
+        which was not added yet are placed before the activities of the key
+        *before* (at the end if there is no such key). An empty list removes
+        the activities.
+        """
+        old_nodes = self._entries.pop(key, [])
+        if old_nodes:
+            anchor = old_nodes[0]
+        else:
+            anchor = self._entries.get(before, [None])[0]
+        fragment, nodes = self._create_entries(activities)
+        if anchor is None:
+            self._body.appendChild(fragment)
+        else:
+            self._body.insertBefore(fragment, anchor)
+        for node in old_nodes:
+            self._body.removeChild(node).unlink()
+        if nodes:
+            self._entries[key] = nodes
+
+    def write(self):
+        """Write HTML to the file"""
+        with open(self._filename, mode="w") as out:
+            out.write(self._dom.toxml())
 
     def finish(self):
         """Finish creating HTML and write it to file"""
         # This is not most reusable, but it is all we need now.
         self._html.appendChild(self._body)
-        with open(self._filename, mode="w") as out:
-            out.write(self._dom.toxml())
+        self.write()
 
 
 def filename_matches_pattern(filename, patterns):
@@ -208,6 +483,332 @@ def filename_matches_pattern(filename, patterns):
     return False
 
 
+def collect_activities(path, config_file, exclude):
+    """Return list of activity configurations to process"""
+    result = []
+    for config in load_catalog(path).configs:
+        json_file = config.path
+        if json_file.samefile(config_file):
+            continue
+        if exclude and filename_matches_pattern(str(json_file), exclude):
+            continue
+        result.append(config.check())
+    return result
+
+
+def group_tasks(tasks):
+    """Return lists of tasks which share the analyses file and the base map
+
+    The groups and the tasks in them are in the order of the tasks.
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault((task.python_file, task.base), []).append(task)
+    return list(groups.values())
+
+
+async def render_task(runner, task, img_name, layer_cache=None, raster_renderer=None):
+    """Render layers of one task into an image using the current maps"""
+    if not is_cacheable(task.layers):
+        layer_cache = None
+        raster_renderer = None
+    grass_renderer = AsyncGrassRenderer(
+        runner=runner,
+        filename=img_name,
+        width=500,
+        height=500,
+        layer_cache=layer_cache,
+        raster_renderer=raster_renderer,
+    )
+    try:
+        await grass_renderer.erase()
+        await grass_renderer.prepare(task.layers)
+        for layer in task.layers:
+            await grass_renderer.run(*layer)
+        grass_renderer.finish()
+    finally:
+        grass_renderer.clean()
+
+
+async def process_activity(
+    runner,
+    config,
+    individual_pages,
+    scratch_mapset,
+    layer_cache=None,
+    raster_renderer=None,
+    fused_mapcalc=False,
+):
+    """Run analyses, render them, and create pages for tasks of one activity
+
+    Tasks which share the analyses file and the base map are rendered
+    from one run of the analyses (concurrently with each other).
+    With *scratch_mapset*, the activity runs in its own new mapset
+    which is removed afterwards, so that activities can run concurrently.
+    The *layer_cache* and *raster_renderer* are used only when the layers can
+    be rendered separately.
+    With *fused_mapcalc*, gs.mapcalc calls in the analyses are evaluated
+    together and only maps displayed by the tasks are written from them.
+    Returns list of activities (tasks) and names of the rendered images.
+    """
+    json_file = config.path
+    results = []
+
+    if scratch_mapset:
+        mapset = Path(runner.mapset)
+        runner = runner.for_mapset(mapset.parent / f"{mapset.name}_{json_file.stem}")
+        await runner.create_mapset()
+    try:
+        for tasks in group_tasks(config.tasks):
+            keep_maps = None
+            if fused_mapcalc:
+                keep_maps = set()
+                for task in tasks:
+                    keep_maps |= map_algebra.displayed_maps(task.layers)
+            await runner.run_python(tasks[0].python_file, keep_maps=keep_maps)
+            img_names = [str(Path(task.name).with_suffix(".png")) for task in tasks]
+            await asyncio.gather(
+                *[
+                    render_task(
+                        runner,
+                        task,
+                        img_name,
+                        layer_cache=layer_cache,
+                        raster_renderer=raster_renderer,
+                    )
+                    for task, img_name in zip(tasks, img_names)
+                ]
+            )
+            results.extend(zip(tasks, img_names))
+    finally:
+        if scratch_mapset:
+            runner.remove_mapset()
+    results.sort(key=lambda item: item[0].index)
+    if individual_pages:
+        for task, img_name in results:
+            html_name = str(Path(task.name).with_suffix(".html"))
+            create_activity_page(task.data, img_name, html_name)
+    return [(task.data, img_name) for task, img_name in results]
+
+
+async def process_activities(args, configs):
+    """Process activities and return list of activities and images
+
+    Activities run concurrently when each runs in its own mapset
+    (with more than one job), otherwise one after another.
+    """
+    runner = AsyncGrassRunner(
+        executable=args.grass,
+        mapset=args.mapset_path,
+        max_jobs=args.jobs,
+        timeout=args.timeout,
+    )
+    layer_cache = LayerCache(args.layer_cache) if args.layer_cache else None
+    raster_renderer = NumpyRasterRenderer() if args.numpy_rasters else None
+    scratch_mapset = args.jobs > 1
+
+    async def process(config):
+        return await process_activity(
+            runner,
+            config,
+            individual_pages=not args.no_individual_pages,
+            scratch_mapset=scratch_mapset,
+            layer_cache=layer_cache,
+            raster_renderer=raster_renderer,
+            fused_mapcalc=args.fused_mapcalc,
+        )
+
+    if scratch_mapset:
+        results = await asyncio.gather(*[process(config) for config in configs])
+    else:
+        # Activities in the shared mapset may write maps with the same names,
+        # so each one is run and rendered before the next one starts.
+        results = [await process(config) for config in configs]
+    results = [item for activity_results in results for item in activity_results]
+    if layer_cache:
+        LOGGER.info(
+            "Layers rendered: %s, reused from cache: %s",
+            layer_cache.rendered,
+            layer_cache.reused,
+        )
+        layer_cache.prune()
+    return results
+
+
+class ActivityWatcher:
+    """Reports changed activity files (Python and JSON) in directories
+
+    The directories are polled every *interval* seconds by reading
+    the modification time and size of the files in them, which is cheap
+    for directories with activities and works on any system. Changes which
+    come in bursts (e.g., an editor saving several files) are reported
+    together once there was no change for *debounce* seconds.
+    """
+
+    patterns = ("*.py", "*.json")
+
+    def __init__(self, directories, interval=0.2, debounce=0.5):
+        self.directories = [Path(directory).resolve() for directory in directories]
+        self.interval = interval
+        self.debounce = debounce
+        self._stamps = self.stamps()
+
+    def stamps(self):
+        """Return modification time and size of watched files by path"""
+        stamps = {}
+        for directory in self.directories:
+            for entry in os.scandir(directory):
+                if not filename_matches_pattern(entry.name, self.patterns):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                stamps[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    async def changes(self):
+        """Wait for changes and return set of added, modified, or removed files"""
+        loop = asyncio.get_running_loop()
+        changed = set()
+        last_change = None
+        while True:
+            await asyncio.sleep(self.interval)
+            stamps = self.stamps()
+            if stamps != self._stamps:
+                for path in set(stamps) | set(self._stamps):
+                    if stamps.get(path) != self._stamps.get(path):
+                        changed.add(path)
+                self._stamps = stamps
+                last_change = loop.time()
+            elif changed and loop.time() - last_change >= self.debounce:
+                return changed
+
+
+def affected_configs(configs, changed):
+    """Return configurations which use any of the changed files
+
+    Python files which are not analyses of any configuration may be modules
+    imported by analyses, so they affect all configurations with analyses
+    in the same directory.
+    """
+    analyses = {
+        Path(task.python_file).resolve() for config in configs for task in config.tasks
+    }
+    modules = {
+        path.parent for path in changed if path.suffix == ".py" and path not in analyses
+    }
+    result = []
+    for config in configs:
+        files = {Path(task.python_file).resolve() for task in config.tasks}
+        directories = {path.parent for path in files}
+        files.add(config.path.resolve())
+        if files & changed or directories & modules:
+            result.append(config)
+    return result
+
+
+def remove_outputs(results, keep):
+    """Remove images and pages of activities except for images in *keep*"""
+    for unused, img_name in results:
+        if img_name not in keep:
+            remove_if_exists(Path(img_name))
+            remove_if_exists(Path(img_name).with_suffix(".html"))
+
+
+async def rebuild_activities(runner, configs, changed, entries, index_page, **options):
+    """Run and render activities affected by changed files and update the index
+
+    The *entries* are activities and images of configurations in the index
+    by configuration path and they are updated together with the index page.
+    Configurations which are not in *configs* anymore are removed.
+    Activities which fail are logged and keep their previous entries.
+    The *options* are passed to process_activity().
+    """
+    paths = [config.path for config in configs]
+    for path in list(entries):
+        if path not in paths:
+            remove_outputs(entries.pop(path), keep=set())
+            index_page.replace_activities(path, [])
+    for config in affected_configs(configs, changed):
+        LOGGER.info("Rebuilding %s", config.path.name)
+        try:
+            results = await process_activity(
+                runner, config, scratch_mapset=False, **options
+            )
+        except (
+            OSError,
+            subprocess.CalledProcessError,
+            subprocess.TimeoutExpired,
+            WorkerError,
+        ) as error:
+            LOGGER.error("Rebuilding %s failed: %s", config.path.name, error)
+            continue
+        remove_outputs(
+            entries.get(config.path, []), keep={image for unused, image in results}
+        )
+        entries[config.path] = results
+        following = paths[paths.index(config.path) + 1 :]
+        before = next((path for path in following if path in entries), None)
+        index_page.replace_activities(config.path, results, before=before)
+    index_page.write()
+
+
+def watched_directories(path, configs):
+    """Return directories with activity configurations and their analyses files"""
+    directories = {Path(path).resolve()}
+    for config in configs:
+        directories.update(
+            Path(task.python_file).resolve().parent for task in config.tasks
+        )
+    return sorted(directories)
+
+
+async def watch_activities(args, path, index_page):
+    """Build all activities and rebuild the changed ones until interrupted
+
+    Analyses run in a warm worker in the mapset, so a rebuild starts only
+    the rendering commands. Changes made while a rebuild is running are
+    picked up by the next one.
+    """
+    options = {
+        "individual_pages": not args.no_individual_pages,
+        "layer_cache": LayerCache(args.layer_cache) if args.layer_cache else None,
+        "raster_renderer": NumpyRasterRenderer() if args.numpy_rasters else None,
+        "fused_mapcalc": args.fused_mapcalc,
+    }
+    with WorkerPool(args.grass, args.mapset_path, python="python") as pool:
+        runner = AsyncGrassRunner(
+            executable=args.grass,
+            mapset=args.mapset_path,
+            max_jobs=args.jobs,
+            timeout=args.timeout,
+            pool=pool,
+        )
+        configs = collect_activities(path, args.config_file, args.exclude)
+        watcher = ActivityWatcher(watched_directories(path, configs))
+        entries = {}
+        changed = {config.path.resolve() for config in configs}
+        while True:
+            await rebuild_activities(
+                runner, configs, changed, entries, index_page, **options
+            )
+            directories = watched_directories(path, configs)
+            if directories != watcher.directories:
+                watcher = ActivityWatcher(directories)
+            LOGGER.info("Watching for changes (press Ctrl+C to stop)")
+            changed = await watcher.changes()
+            # An invalid configuration (e.g., saved in the middle of editing)
+            # postpones the rebuild until the next change.
+            while True:
+                try:
+                    configs = collect_activities(path, args.config_file, args.exclude)
+                    break
+                except ActivityConfigError as error:
+                    LOGGER.error("%s", error)
+                    changed |= await watcher.changes()
+
+
 def main():
     """Process command line, collect files, and process them"""
     # We allow the main function to have more variables for sake of flow clarity.
@@ -230,42 +831,71 @@ def main():
         action="store_true",
         help="Do not generate separate pages for individual activities",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "Number of commands to run at the same time "
+            "(with more than one, each activity runs in its own temporary mapset)"
+        ),
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Maximum time in seconds for one command (tool or script) to run",
+    )
+    parser.add_argument(
+        "--layer-cache",
+        help=(
+            "Directory for rendered layers which are reused in the next runs "
+            "when the maps they show did not change"
+        ),
+    )
+    parser.add_argument(
+        "--numpy-rasters",
+        action="store_true",
+        help="Render d.rast layers using NumPy when possible instead of d.rast",
+    )
+    parser.add_argument(
+        "--fused-mapcalc",
+        action="store_true",
+        help=(
+            "Evaluate r.mapcalc expressions of analyses together "
+            "and write only the displayed maps from them"
+        ),
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Keep running and rebuild activities when their files change "
+            "(analyses run in a warm worker in the mapset)"
+        ),
+    )
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     with open(args.config_file) as main_config_file:
         main_config = json.load(main_config_file)
     path = resolve_path(main_config["includeTasks"], args.config_file)
 
-    grass_runner = GrassRunner(executable=args.grass, mapset=args.mapset_path)
-
     index_page = IndexPage(
         title="Tangible Landscape Activities Overview", filename="index.html"
     )
 
-    for json_file in path.iterdir():
-        if not is_json_file(json_file):
-            continue
-        if json_file.samefile(args.config_file):
-            continue
-        if args.exclude and filename_matches_pattern(str(json_file), args.exclude):
-            continue
-        with open(json_file) as file_o:
-            activity_config = json.load(file_o)
-
-        activity = activity_config["tasks"][0]
-        python_file = activity["analyses"]
-        python_file = resolve_path(python_file, json_file)
-
-        grass_runner.run_python(python_file)
-        img_name = str(Path(json_file.stem).with_suffix(".png"))
-        grass_renderer = GrassRenderer(
-            runner=grass_runner, filename=img_name, width=500, height=500
-        )
-        for layer in activity["layers"]:
-            grass_renderer.run(*layer)
-        if not args.no_individual_pages:
-            html_name = str(Path(json_file.stem).with_suffix(".html"))
-            create_activity_page(activity, img_name, html_name)
+    if args.watch:
+        index_page.finish()
+        try:
+            asyncio.run(watch_activities(args, path, index_page))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    configs = collect_activities(path, args.config_file, args.exclude)
+    results = asyncio.run(process_activities(args, configs))
+    for activity, img_name in results:
         index_page.add_activity(activity, img_name)
 
     index_page.finish()